@@ -0,0 +1,27 @@
+"""Misfire policy and max concurrency of scheduler jobs
+
+Revision ID: 0031_3c7a6d21
+Revises: 0030_9271ae91
+Create Date: 2016-11-14 10:12:41
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0031_3c7a6d21'
+down_revision = '0030_9271ae91'
+
+from alembic import op
+import sqlalchemy as sa
+
+# Zato
+from zato.common.odb import model
+
+# ################################################################################################################################
+
+def upgrade():
+    op.add_column(model.Job.__tablename__, sa.Column('misfire_policy', sa.String(20), nullable=True))
+    op.add_column(model.Job.__tablename__, sa.Column('max_concurrency', sa.Integer, nullable=True))
+
+def downgrade():
+    op.drop_column(model.Job.__tablename__, 'max_concurrency')
+    op.drop_column(model.Job.__tablename__, 'misfire_policy')
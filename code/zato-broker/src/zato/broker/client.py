@@ -10,6 +10,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging, time
+from functools import partial
 from traceback import format_exc
 
 # anyjson
@@ -25,8 +26,9 @@ from bunch import Bunch
 import redis
 
 # Zato
-from zato.common import BROKER, TRACE1, ZATO_NONE
-from zato.common.broker_message import KEYS, MESSAGE_TYPE, TOPICS
+from zato.broker.work_queue import WorkQueue
+from zato.common import BROKER, KVDB, TRACE1, ZATO_NONE
+from zato.common.broker_message import DATA_DICT, MESSAGE_TYPE, SCHEDULER, SERVICE, STATS, TOPICS
 from zato.common.kvdb import LuaContainer
 from zato.common.util import new_cid
 
@@ -38,12 +40,12 @@ FILE_DESCR_CLOSED_IN_ANOTHER_GREENLET = "Error while reading from socket: (9, 'F
 # We use textual messages because some error may have codes whereas different won't.
 EXPECTED_CONNECTION_ERRORS = [REMOTE_END_CLOSED_SOCKET, FILE_DESCR_CLOSED_IN_ANOTHER_GREENLET]
 
-NEEDS_TMP_KEY = [v for k,v in TOPICS.items() if k in(
-    MESSAGE_TYPE.TO_PARALLEL_ANY,
-)]
+# Messages of these types are meant for exactly one recipient and are sent through work queues rather than published
+QUEUED_MSG_TYPES = (MESSAGE_TYPE.TO_PARALLEL_ANY,)
 
-CODE_RENAMED = 10
-CODE_NO_SUCH_FROM_KEY = 11
+# Messages published to all parallel servers are about configuration changes, except for messages with these actions
+NON_CONFIG_ACTIONS = (DATA_DICT.CHANGED.value, SCHEDULER.JOB_EXECUTED.value, SERVICE.PUBLISH.value, STATS.DELETE.value,
+    STATS.DELETE_DAY.value)
 
 def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
     
@@ -94,9 +96,35 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
             self.keep_running = False
             self.client.close()
 
+    class _QueueConsumerThread(object):
+        """ Reads messages off a work queue and hands them over to a callback, one at a time.
+        """
+        def __init__(self, kvdb, msg_type, on_message):
+            self.kvdb = kvdb
+            self.msg_type = msg_type
+            self.on_message = on_message
+            self.queue = None
+            self.keep_running = ZATO_NONE
+
+        def run(self):
+
+            # Each consumer needs a KVDB connection of its own because BRPOP blocks it
+            self.kvdb.init()
+            self.queue = WorkQueue(self.kvdb.conn, self.msg_type)
+            self.keep_running = True
+
+            while self.keep_running:
+                try:
+                    for data in self.queue.get_many():
+                        self.on_message(data)
+                except redis.ConnectionError, e:
+                    if not self.keep_running:
+                        break
+                    logger.warn('Could not read messages off `%s`, e:`%s`', self.queue.key, format_exc(e))
+                    time.sleep(1)
+
     class _BrokerClient(object):
-        """ Zato broker client. Starts two background threads, one for publishing
-        and one for receiving of the messages.
+        """ Zato broker client. Starts background threads for publishing and receiving of the messages.
 
         There may be 3 types of messages sent out:
 
@@ -107,15 +135,9 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
         1) and 2) are straightforward, a message is being published on a topic,
            off which it is read by broker client(s).
 
-        3) needs more work - the actual message is added to Redis and what is really
-           being published is a Redis key it's been stored under. The first client
-           to read it will be the one to handle it.
-
-           Yup, it means the messages are sent across to all of the clients
-           and the winning one is the one that picked up the Redis message; it's not
-           that bad as it may seem, there will be at most as many clients as there
-           are servers in the cluster and truth to be told, Zero MQ < 3.x also would
-           do client-side PUB/SUB filtering and it did scale nicely.
+        3) is put on a work queue, a Redis list, with a single LPUSH. Each client interested in such messages
+           has a background thread blocking on BRPOP against the list so each message is received by exactly one
+           of them, with no further round trips to Redis.
         """
         def __init__(self, kvdb, client_type, topic_callbacks, initial_lua_programs):
             self.kvdb = kvdb
@@ -123,19 +145,32 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
             self.name = '{}-{}'.format(client_type, new_cid())
             self.topic_callbacks = topic_callbacks
             self.lua_container = LuaContainer(self.kvdb.conn, initial_lua_programs)
+            self.queues = {msg_type: WorkQueue(self.kvdb.conn, msg_type) for msg_type in QUEUED_MSG_TYPES}
+            self.queue_clients = []
             self.ready = False
 
         def run(self):
             logger.info('Starting broker client, host:[{}], port:[{}], name:[{}], topics:[{}]'.format(
                 self.kvdb.config.host, self.kvdb.config.port, self.name, sorted(self.topic_callbacks)))
 
+            # Topics for messages that are not published, only put on queues
+            queue_topics = {TOPICS[msg_type]: msg_type for msg_type in QUEUED_MSG_TYPES}
+            sub_callbacks = {topic: callback for topic, callback in self.topic_callbacks.items() if topic not in queue_topics}
+
             self.pub_client = _ClientThread(self.kvdb.copy(), 'pub', self.name)
-            self.sub_client = _ClientThread(self.kvdb.copy(), 'sub', self.name, self.topic_callbacks, self.on_message)
+            self.sub_client = _ClientThread(self.kvdb.copy(), 'sub', self.name, sub_callbacks, self.on_message)
+
+            for topic, msg_type in queue_topics.items():
+                if topic in self.topic_callbacks:
+                    self.queue_clients.append(_QueueConsumerThread(
+                        self.kvdb.copy(), msg_type, partial(self.on_queue_message, self.topic_callbacks[topic])))
 
-            start_new_thread(self.pub_client.run, ())
-            start_new_thread(self.sub_client.run, ())
+            clients = [self.pub_client, self.sub_client] + self.queue_clients
 
-            for client in(self.pub_client, self.sub_client):
+            for client in clients:
+                start_new_thread(client.run, ())
+
+            for client in clients:
                 while client.keep_running == ZATO_NONE:
                     time.sleep(0.01)
                 self.ready = True
@@ -143,6 +178,12 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
         def publish(self, msg, msg_type=MESSAGE_TYPE.TO_PARALLEL_ALL, *ignored_args, **ignored_kwargs):
             msg['msg_type'] = msg_type
             topic = TOPICS[msg_type]
+
+            # Configuration is about to change so snapshots of it that workers keep in KVDB are no longer valid.
+            # This needs to be done before publishing so no worker reads a stale snapshot after it receives the message.
+            if msg_type == MESSAGE_TYPE.TO_PARALLEL_ALL and msg.get('action') not in NON_CONFIG_ACTIONS:
+                self.kvdb.conn.incr(KVDB.CONFIG_VERSION)
+
             self.pub_client.publish(topic, dumps(msg))
 
         def invoke_async(self, msg, msg_type=MESSAGE_TYPE.TO_PARALLEL_ANY, expiration=BROKER.DEFAULT_EXPIRATION):
@@ -155,35 +196,52 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
                 logger.error(error_msg, msg, format_exc(e))
                 raise
             else:
-                topic = TOPICS[msg_type]
-                key = broker_msg = b'zato:broker{}:{}'.format(KEYS[msg_type], new_cid())
-                
-                self.kvdb.conn.set(key, str(msg))
-                self.kvdb.conn.expire(key, expiration)  # In seconds
+                self.queues[msg_type].put(str(msg), expiration)
+
+        def invoke_async_many(self, msgs, msg_type=MESSAGE_TYPE.TO_PARALLEL_ANY, expiration=BROKER.DEFAULT_EXPIRATION):
+            """ Like invoke_async but puts all the messages on the work queue in a single round trip.
+            """
+            data_list = []
+            for msg in msgs:
+                msg['msg_type'] = msg_type
+                try:
+                    data_list.append(str(dumps(msg)))
+                except Exception, e:
+                    error_msg = 'JSON serialization failed for msg:[%r], e:[%s]'
+                    logger.error(error_msg, msg, format_exc(e))
+                    raise
+
+            self.queues[msg_type].put_many(data_list, expiration)
+
+        def get_queue_stats(self):
+            """ Returns depths of all the work queues along with counters of messages put on and taken off them by this client.
+            """
+            out = {}
+            for msg_type, queue in self.queues.items():
+                stats = queue.get_stats()
+                for client in self.queue_clients:
+                    if client.msg_type == msg_type and client.queue:
+                        consumer_stats = client.queue.stats.to_dict()
+                        del consumer_stats['enqueued']
+                        stats.update(consumer_stats)
+
+                out[TOPICS[msg_type]] = stats
+
+            return out
+
+        def on_queue_message(self, callback, data):
+            payload = Bunch(loads(data))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('Got broker message payload [{}]'.format(payload))
 
-                self.pub_client.publish(topic, broker_msg)
+            spawn(callback, payload)
 
         def on_message(self, msg):
             if logger.isEnabledFor(logging.DEBUG):
                 logger.debug('Got broker message:[{}]'.format(msg))
 
             if msg.type == 'message':
-
-                # Replace payload with stuff read off the KVDB in case this is where the actual message happens to reside.
-                if msg.channel in NEEDS_TMP_KEY:
-                    tmp_key = '{}.tmp'.format(msg.data)
-
-                    if self.lua_container.run_lua('zato.rename_if_exists', [msg.data, tmp_key]) == CODE_NO_SUCH_FROM_KEY:
-                        payload = None
-                    else:
-                        payload = self.kvdb.conn.get(tmp_key)
-                        self.kvdb.conn.delete(tmp_key)  # Note that it would've expired anyway
-                        if not payload:
-                            logger.warning('No KVDB payload for key [{}] (already expired?)'.format(tmp_key))
-                        else:
-                            payload = loads(payload)
-                else:
-                    payload = loads(msg.data)
+                payload = loads(msg.data)
 
                 if payload:
                     payload = Bunch(payload)
@@ -198,7 +256,7 @@ def BrokerClient(kvdb, client_type, topic_callbacks, _initial_lua_programs):
                         logger.debug('No payload in msg:[{}]'.format(msg))
 
         def close(self):
-            for client in(self.pub_client, self.sub_client):
+            for client in [self.pub_client, self.sub_client] + self.queue_clients:
                 client.keep_running = False
                 client.kvdb.close()
 
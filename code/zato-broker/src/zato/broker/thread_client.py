@@ -23,16 +23,14 @@ from bunch import Bunch
 import redis
 
 # Zato
+from zato.broker.work_queue import WorkQueue
 from zato.common import BROKER, TRACE1, ZATO_NONE
-from zato.common.broker_message import KEYS, MESSAGE_TYPE, TOPICS
+from zato.common.broker_message import MESSAGE_TYPE, TOPICS
 from zato.common.util import new_cid
 
 logger = logging.getLogger(__name__)
 
 REMOTE_END_CLOSED_SOCKET = 'Socket closed on remote end'
-NEEDS_TMP_KEY = [v for k,v in TOPICS.items() if k in(
-    MESSAGE_TYPE.TO_PARALLEL_ANY,
-)]
 
 class _ClientThread(Thread):
     def __init__(self, kvdb, pubsub, name, topic_callbacks=None, on_message=None):
@@ -91,15 +89,8 @@ class BrokerClient(Thread):
     1) and 2) are straightforward, a message is being published on a topic,
        off which it is read by broker client(s).
     
-    3) needs more work - the actual message is added to Redis and what is really
-       being published is a Redis key it's been stored under. The first client
-       to read it will be the one to handle it.
-       
-       Yup, it means the messages are sent across to all of the clients
-       and the winning one is the one that picked up the Redis message; it's not
-       that bad as it may seem, there will be at most as many clients as there
-       are servers in the cluster and truth to be told, Zero MQ < 3.x also would
-       do client-side PUB/SUB filtering and it did scale nicely.
+    3) is put on a work queue, a Redis list, with a single LPUSH, off which it is
+       taken by exactly one of the parallel servers.
     """
     def __init__(self, kvdb, client_type, topic_callbacks):
         Thread.__init__(self)
@@ -107,6 +98,7 @@ class BrokerClient(Thread):
         self.decrypt_func = kvdb.decrypt_func
         self.name = '{}-{}'.format(client_type, new_cid())
         self.topic_callbacks = topic_callbacks
+        self.queue = WorkQueue(self.kvdb.conn, MESSAGE_TYPE.TO_PARALLEL_ANY)
         
     def run(self):
         logger.info('Starting broker client, host:[{}], port:[{}], name:[{}], topics:[{}]'.format(
@@ -137,41 +129,15 @@ class BrokerClient(Thread):
             logger.error(error_msg, msg, format_exc(e))
             raise
         else:
-            topic = TOPICS[msg_type]
-            key = broker_msg = b'zato:broker{}:{}'.format(KEYS[msg_type], new_cid())
-            
-            self.kvdb.conn.set(key, str(msg))
-            self.kvdb.conn.expire(key, expiration)  # In seconds
-            
-            self.pub_client.publish(topic, broker_msg)
+            self.queue.put(str(msg), expiration)
         
     def on_message(self, msg):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug('Got broker message:[{}]'.format(msg))
         
         if msg.type == 'message':
-    
-            # Replace payload with stuff read off the KVDB in case this is where the actual message happens to reside.
-            if msg.channel in NEEDS_TMP_KEY:
-                tmp_key = '{}.tmp'.format(msg.data)
-                
-                try:
-                    self.kvdb.conn.rename(msg.data, tmp_key)
-                except redis.ResponseError, e:
-                    if e.message != 'ERR no such key':  # Doh, I hope Redis guys don't change it out of a sudden :/
-                        raise
-                    else:
-                        payload = None
-                else:
-                    payload = self.kvdb.conn.get(tmp_key)
-                    self.kvdb.conn.delete(tmp_key)  # Note that it would've expired anyway
-                    if not payload:
-                        logger.warning('No KVDB payload for key [{}] (already expired?)'.format(tmp_key))
-                    else:
-                        payload = loads(payload)
-            else:
-                payload = loads(msg.data)
-                
+            payload = loads(msg.data)
+
             if payload:
                 payload = Bunch(payload)
                 if logger.isEnabledFor(logging.DEBUG):
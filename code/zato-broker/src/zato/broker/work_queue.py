@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import logging
+from time import time
+
+# Zato
+from zato.common import BROKER
+from zato.common.broker_message import KEYS
+
+logger = logging.getLogger(__name__)
+
+# ################################################################################################################################
+
+def get_queue_key(msg_type):
+    """ Returns a name of the Redis list messages of a given type are kept in.
+    """
+    return b'zato:broker:queue{}'.format(KEYS[msg_type])
+
+def encode(data, expiration, now):
+    """ Prepends to a serialized message the time it was enqueued at and the time it expires at.
+    """
+    return b'{:.6f}:{:.6f}:{}'.format(now, now + expiration, data)
+
+def decode(item):
+    """ Returns a tuple of enqueued_at, expires_at and the serialized message out of what encode produced.
+    """
+    enqueued_at, expires_at, data = item.split(b':', 2)
+    return float(enqueued_at), float(expires_at), data
+
+# ################################################################################################################################
+
+class WorkQueueStats(object):
+    """ Counters describing what a particular work queue client did so far.
+    """
+    __slots__ = ('enqueued', 'dequeued', 'expired', 'batches', 'last_lag', 'max_lag')
+
+    def __init__(self):
+        self.enqueued = 0   # Messages put on the queue
+        self.dequeued = 0   # Messages taken off the queue and not expired
+        self.expired = 0    # Messages taken off the queue after their expiration time
+        self.batches = 0    # Number of reads that returned anything
+        self.last_lag = 0.0 # In seconds, how long the most recently dequeued message waited in the queue
+        self.max_lag = 0.0  # In seconds, the longest any message waited in the queue
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+# ################################################################################################################################
+
+class WorkQueue(object):
+    """ A Redis list that messages meant for exactly one recipient are LPUSH-ed onto by producers and BRPOP-ed off
+    by consumers, so that each message costs a single round trip on either side and there is no race between recipients
+    to pick it up.
+
+    Each message carries the time it was put on the queue and the time it expires at. Consumers drop messages that have
+    expired and keep track of how long the ones they receive waited in the queue.
+    """
+    def __init__(self, conn, msg_type, batch_size=BROKER.DEQUEUE_BATCH_SIZE, timeout=BROKER.DEQUEUE_TIMEOUT):
+        self.conn = conn
+        self.key = get_queue_key(msg_type)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.stats = WorkQueueStats()
+
+# ################################################################################################################################
+
+    def put(self, data, expiration=BROKER.DEFAULT_EXPIRATION):
+        """ Puts a serialized message on the queue.
+        """
+        self.put_many([data], expiration)
+
+    def put_many(self, data_list, expiration=BROKER.DEFAULT_EXPIRATION):
+        """ Puts any number of serialized messages on the queue in one LPUSH.
+        """
+        if not data_list:
+            return
+
+        now = time()
+        self.conn.lpush(self.key, *[encode(data, expiration, now) for data in data_list])
+        self.stats.enqueued += len(data_list)
+
+# ################################################################################################################################
+
+    def get_many(self):
+        """ Blocks for up to self.timeout seconds waiting for messages and returns a list of at most self.batch_size
+        of them, oldest first, with expired ones left out. An empty list is returned if there were no messages.
+        """
+        result = self.conn.brpop(self.key, self.timeout)
+        if not result:
+            return []
+
+        items = [result[1]]
+
+        # There may be more messages waiting so they are taken off the queue in the same transaction they are read in
+        if self.batch_size > 1:
+            with self.conn.pipeline() as pipe:
+                pipe.lrange(self.key, -(self.batch_size - 1), -1)
+                pipe.ltrim(self.key, 0, -self.batch_size)
+                more, _ = pipe.execute()
+
+            # LPUSH adds to the head of the list so the oldest messages are at its end
+            items.extend(reversed(more))
+
+        self.stats.batches += 1
+
+        return self._get_not_expired(items, time())
+
+    def _get_not_expired(self, items, now):
+        out = []
+        for item in items:
+            enqueued_at, expires_at, data = decode(item)
+
+            if expires_at < now:
+                self.stats.expired += 1
+                logger.warn('Dropping expired broker message, expired at:`%s`, now:`%s`', expires_at, now)
+                continue
+
+            lag = now - enqueued_at
+            self.stats.last_lag = lag
+            self.stats.max_lag = max(self.stats.max_lag, lag)
+            self.stats.dequeued += 1
+
+            out.append(data)
+
+        return out
+
+# ################################################################################################################################
+
+    def get_depth(self):
+        """ Returns how many messages are waiting in the queue, possibly including expired ones.
+        """
+        return self.conn.llen(self.key)
+
+    def get_stats(self):
+        """ Returns current queue depth along with counters of this particular client.
+        """
+        out = self.stats.to_dict()
+        out['depth'] = self.get_depth()
+        return out
+
+# ################################################################################################################################
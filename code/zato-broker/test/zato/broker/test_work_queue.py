@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# mock
+from mock import patch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.broker.work_queue import decode, encode, get_queue_key, WorkQueue
+from zato.common.broker_message import MESSAGE_TYPE
+
+# ################################################################################################################################
+
+class FakePipeline(object):
+    """ Queues up LRANGE and LTRIM calls and runs them against its connection on execute.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignored):
+        pass
+
+    def lrange(self, *args):
+        self.calls.append((self.conn.lrange, args))
+
+    def ltrim(self, *args):
+        self.calls.append((self.conn.ltrim, args))
+
+    def execute(self):
+        return [func(*args) for func, args in self.calls]
+
+class FakeRedis(object):
+    """ Keeps lists in memory, with Redis semantics of the list commands a WorkQueue uses.
+    """
+    def __init__(self):
+        self.lists = {}
+        self.brpop_calls = []
+        self.pipelines = 0
+
+    def _range(self, key, start, stop):
+        items = self.lists.get(key, [])
+        start = max(len(items) + start, 0) if start < 0 else start
+        stop = len(items) + stop if stop < 0 else stop
+        return start, stop + 1
+
+    def lpush(self, key, *values):
+        items = self.lists.setdefault(key, [])
+        for value in values:
+            items.insert(0, value)
+        return len(items)
+
+    def brpop(self, key, timeout):
+        self.brpop_calls.append((key, timeout))
+        items = self.lists.get(key)
+        if items:
+            return key, items.pop()
+
+    def lrange(self, key, start, stop):
+        start, stop = self._range(key, start, stop)
+        return self.lists.get(key, [])[start:stop]
+
+    def ltrim(self, key, start, stop):
+        start, stop = self._range(key, start, stop)
+        self.lists[key] = self.lists.get(key, [])[start:stop]
+        return True
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def pipeline(self):
+        self.pipelines += 1
+        return FakePipeline(self)
+
+# ################################################################################################################################
+
+class EncodeTestCase(TestCase):
+
+    def test_encode_decode(self):
+        item = encode(b'{"a":"b:c"}', 10, 100.5)
+        eq_(decode(item), (100.5, 110.5, b'{"a":"b:c"}'))
+
+    def test_queue_key(self):
+        eq_(WorkQueue(FakeRedis(), MESSAGE_TYPE.TO_PARALLEL_ANY).key, get_queue_key(MESSAGE_TYPE.TO_PARALLEL_ANY))
+
+# ################################################################################################################################
+
+class WorkQueueTestCase(TestCase):
+
+    def get_queue(self, batch_size=3):
+        return WorkQueue(FakeRedis(), MESSAGE_TYPE.TO_PARALLEL_ANY, batch_size, 5)
+
+    def test_put_many_single_lpush(self):
+        queue = self.get_queue()
+        queue.put_many([b'1', b'2', b'3', b'4'])
+        queue.put(b'5')
+
+        eq_(queue.get_depth(), 5)
+        eq_(queue.stats.enqueued, 5)
+
+        # Nothing is sent if there are no messages
+        queue.put_many([])
+        eq_(queue.stats.enqueued, 5)
+
+    def test_get_many_batches(self):
+        queue = self.get_queue()
+        queue.put_many([b'1', b'2', b'3', b'4', b'5'])
+
+        # Oldest messages first, at most batch_size of them, each batch read in one transaction after BRPOP
+        eq_(queue.get_many(), [b'1', b'2', b'3'])
+        eq_(queue.get_many(), [b'4', b'5'])
+        eq_(queue.get_many(), [])
+
+        eq_(queue.conn.brpop_calls, [(queue.key, 5)] * 3)
+        eq_(queue.conn.pipelines, 2)
+        eq_(queue.get_depth(), 0)
+
+        eq_(queue.stats.dequeued, 5)
+        eq_(queue.stats.batches, 2)
+        eq_(queue.stats.expired, 0)
+
+    def test_get_many_no_batching(self):
+        queue = self.get_queue(batch_size=1)
+        queue.put_many([b'1', b'2'])
+
+        eq_(queue.get_many(), [b'1'])
+        eq_(queue.get_many(), [b'2'])
+        eq_(queue.conn.pipelines, 0)
+
+    def test_expired(self):
+        queue = self.get_queue()
+
+        with patch('zato.broker.work_queue.time', return_value=100.0):
+            queue.put(b'1', 5)
+            queue.put(b'2', 50)
+            queue.put(b'3', 5)
+
+        with patch('zato.broker.work_queue.time', return_value=110.0):
+            eq_(queue.get_many(), [b'2'])
+
+        eq_(queue.stats.expired, 2)
+        eq_(queue.stats.dequeued, 1)
+        eq_(queue.stats.last_lag, 10.0)
+
+    def test_stats(self):
+        queue = self.get_queue(batch_size=2)
+
+        with patch('zato.broker.work_queue.time', return_value=100.0):
+            queue.put(b'1')
+
+        with patch('zato.broker.work_queue.time', return_value=101.0):
+            queue.put(b'2')
+
+        with patch('zato.broker.work_queue.time', return_value=104.0):
+            queue.put(b'3')
+            eq_(queue.get_many(), [b'1', b'2'])
+
+        eq_(queue.get_stats(), {
+            'enqueued': 3, 'dequeued': 2, 'expired': 0, 'batches': 1, 'last_lag': 3.0, 'max_lag': 4.0, 'depth': 1})
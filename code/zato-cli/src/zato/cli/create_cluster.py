@@ -109,6 +109,8 @@ zato_services = {
     'zato.http-soap.ping':'zato.server.service.internal.http_soap.Ping',
 
     # Clusters - Connections map
+    'zato.info.get-auth-cache-stats':'zato.server.service.internal.info.GetAuthCacheStats',
+    'zato.info.get-broker-queue-stats':'zato.server.service.internal.info.GetBrokerQueueStats',
     'zato.info.get-info':'zato.server.service.internal.info.GetInfo',
     'zato.info.get-server-info':'zato.server.service.internal.info.GetServerInfo',
 
@@ -381,6 +383,8 @@ zato_services = {
     'zato.service.get-wsdl':'zato.server.service.internal.service.GetWSDL',
     'zato.service.has-wsdl':'zato.server.service.internal.service.HasWSDL',
     'zato.service.invoke':'zato.server.service.internal.service.Invoke',
+    'zato.service.invoke-many':'zato.server.service.internal.service.InvokeMany',
+    'zato.service.invoke-many-in-transaction':'zato.server.service.internal.service.InvokeManyInTransaction',
     'zato.service.set-wsdl':'zato.server.service.internal.service.SetWSDL',
     'zato.service.slow-response.get':'zato.server.service.internal.service.GetSlowResponse',
     'zato.service.slow-response.get-list':'zato.server.service.internal.service.GetSlowResponseList',
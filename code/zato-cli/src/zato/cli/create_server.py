@@ -114,6 +114,17 @@ use_soap_envelope=True
 
 [stats]
 expire_after=168 # In hours, 168 = 7 days = 1 week
+flush_interval=1.0 # In seconds, how often each worker stores service statistics it collected in Redis
+
+[audit]
+batch_size=100 # How many HTTP/SOAP audit entries to store in one INSERT
+flush_interval=1.0 # In seconds, how often to store audit entries if there are fewer of them than batch_size
+queue_max_size=10000 # How many audit entries a worker can keep in memory before new ones are dropped
+pending_max_age=120 # In seconds, for how long to wait for a response before storing a request on its own
+
+[auth_cache]
+max_size=10000 # How many positive results of HTTP Basic Auth and API key checks to keep, 0 = none
+ttl=60 # In seconds, for how long each result can be reused
 
 [kvdb]
 host={{kvdb_host}}
@@ -10,6 +10,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging, os, sys
+from collections import OrderedDict
 from copy import deepcopy
 from datetime import datetime
 from itertools import chain
@@ -151,6 +152,8 @@ class EnMasse(ManageCommand):
         {'name':'--import', 'help':'Import definitions from a local JSON (excludes --export-*)', 'action':'store_true'},
         {'name':'--ignore-missing-defs', 'help':'Ignore missing definitions when exporting to JSON', 'action':'store_true'},
         {'name':'--replace-odb-objects', 'help':'Force replacing objects already existing in ODB during import', 'action':'store_true'},
+        {'name':'--bulk', 'help':'Import objects of each type in one request and ODB transaction, with one broker message per type', 'action':'store_true'},
+        {'name':'--dry-run', 'help':'Report what an import would create and update in ODB without changing anything', 'action':'store_true'},
         {'name':'--input', 'help':'Path to an input JSON document'},
         {'name':'--cols_width', 'help':'A list of columns width to use for the table output, default: {}'.format(DEFAULT_COLS_WIDTH), 'action':'store_true'},
     ]
@@ -160,6 +163,8 @@ class EnMasse(ManageCommand):
         self.args = args
         self.curdir = abspath(self.original_dir)
         self.replace_odb_objects = self.args.replace_odb_objects
+        self.bulk = self.args.bulk
+        self.dry_run = self.args.dry_run
         self.has_import = getattr(args, 'import')
         self.ignore_missing_defs = args.ignore_missing_defs
         self.json = {}
@@ -487,17 +492,22 @@ class EnMasse(ManageCommand):
 
     def get_odb_objects(self):
 
+        # Names of all services and security definitions, each read in one query rather than one query per object
+        service_names = dict(self.client.odb_session.query(Service.id, Service.name).
+            filter(Service.cluster_id == self.client.cluster_id).all())
+
+        sec_def_names = dict(self.client.odb_session.query(SecurityBase.id, SecurityBase.name).
+            filter(SecurityBase.cluster_id == self.client.cluster_id).all())
+
         def _update_service_name(item):
-            item.service = self.client.odb_session.query(Service.name).\
-                filter(Service.id == item.service_id).one()[0]
+            item.service = service_names[item.service_id]
 
         def fix_up_odb_object(key, item):
             if key == 'http_soap':
                 if item.connection == 'channel':
                     _update_service_name(item)
                 if item.security_id:
-                    item.sec_def = self.client.odb_session.query(SecurityBase.name).\
-                        filter(SecurityBase.id == item.security_id).one()[0]
+                    item.sec_def = sec_def_names[item.security_id]
                 else:
                     item.sec_def = NO_SEC_DEF_NEEDED
             elif key == 'scheduler':
@@ -695,6 +705,48 @@ class EnMasse(ManageCommand):
 
         return Results(warnings, errors)
 
+# ################################################################################################################################
+
+    def get_dry_run_changes(self):
+        """ Returns what an import would create in ODB and which attributes of objects already in ODB it would update.
+        ODB objects are indexed by name once so each object in JSON is looked up rather than compared to all of them.
+        """
+        ignored = ('id', 'cluster_id', 'password')
+        odb_items = {}
+        out = {}
+
+        for key, items in self.odb_objects.items():
+            for item in items:
+                if key == 'http_soap':
+                    odb_items[(key, item.connection, item.transport, item.name)] = item
+                else:
+                    odb_items[(key, item.name)] = item
+
+        for key, values in self.json.items():
+            for value_dict in values:
+                name = value_dict.get('name')
+
+                if key == 'http_soap':
+                    odb_item = odb_items.get((key, value_dict.get('connection'), value_dict.get('transport'), name))
+                else:
+                    odb_item = odb_items.get((key.replace('-', '_'), name))
+
+                if odb_item is None:
+                    action = 'Create'
+                else:
+                    changed = sorted(attr for attr, value in value_dict.items()
+                        if attr not in ignored and odb_item.get(attr) != value)
+                    action = 'Update {}'.format(', '.join(changed)) if changed else 'No changes'
+
+                out['{} {}'.format(key, name)] = action
+
+        return out
+
+    def report_dry_run(self):
+        changes = self.get_dry_run_changes()
+        self.logger.info('Dry run, no changes made, {} object(s) checked:\n{}'.format(
+            len(changes), self.get_table(changes).draw()))
+
 # ################################################################################################################################
 
     def find_missing_defs(self):
@@ -1110,12 +1162,13 @@ class EnMasse(ManageCommand):
             if first in getattr(service_class.SimpleIO, 'input_required', []) and second in attrs:
                 attrs[first] = attrs[second]
 
-        def import_object(def_type, attrs, is_edit):
-            attrs_dict = attrs.toDict()
+        def prepare_object(def_type, attrs, is_edit):
+            """ Fills in attributes of an object that refer to other objects already in ODB
+            and returns import information and the name of a service to import the object with.
+            """
             info_dict, info_key = (def_sec_info, attrs.type) if 'sec' in def_type else (service_info, def_type)
             import_info = info_dict[info_key]
             service_class = getattr(import_info.mod, 'Edit' if is_edit else 'Create')
-            service_name = service_class.get_name()
 
             # service and service_name are interchangeable
             _swap_service_name(service_class, attrs, 'service', 'service_name')
@@ -1138,36 +1191,77 @@ class EnMasse(ManageCommand):
                 odb_item = get_odb_item(def_type_name, attrs.get('def_name'))
                 attrs.def_id = odb_item.id
 
+            return import_info, service_class.get_name()
+
+        def get_password_request(def_type, attrs, attrs_dict, is_edit, import_info, service_name, response_data):
+            """ Returns the name of a service to set a password of an object that has just been imported with and a request
+            to invoke it with, or an error message if the password is required but missing.
+            """
+            password = attrs.get('password')
+            if not password:
+                if import_info.needs_password == MAYBE_NEEDS_PASSWORD:
+                    self.logger.info("Password missing but not required '{}' ({} {})".format(
+                        attrs.name, def_type, service_name))
+                    return None, None, None
+                else:
+                    return None, None, "Password missing but is required '{}' ({} {}) attrs '{}'".format(
+                        attrs.name, def_type, service_name, attrs_dict)
+            else:
+                if not is_edit:
+                    attrs.id = response_data['id']
+
+                service_class = getattr(import_info.mod, 'ChangePassword')
+                request = {'id':attrs.id, 'password1':attrs.password, 'password2':attrs.password}
+
+                return service_class.get_name(), request, None
+
+        def import_object(def_type, attrs, is_edit):
+            attrs_dict = attrs.toDict()
+            import_info, service_name = prepare_object(def_type, attrs, is_edit)
+
             response = self.client.invoke(service_name, attrs)
             if not response.ok:
                 return service_name, response.details
             else:
                 verb = 'Updated' if is_edit else 'Created'
-                self.logger.info("{} object '{}' ({} {})".format(verb, attrs.name, item_type, service_name))
+                self.logger.info("{} object '{}' ({} {})".format(verb, attrs.name, def_type, service_name))
                 if import_info.needs_password:
 
-                    password = attrs.get('password')
-                    if not password:
-                        if import_info.needs_password == MAYBE_NEEDS_PASSWORD:
-                            self.logger.info("Password missing but not required '{}' ({} {})".format(
-                                attrs.name, item_type, service_name))
-                        else:
-                            return service_name, "Password missing but is required '{}' ({} {}) attrs '{}'".format(
-                                attrs.name, item_type, service_name, attrs_dict)
-                    else:
-                        if not is_edit:
-                            attrs.id = response.data['id']
+                    password_service_name, request, error_response = get_password_request(
+                        def_type, attrs, attrs_dict, is_edit, import_info, service_name, response.data)
 
-                        service_class = getattr(import_info.mod, 'ChangePassword')
-                        request = {'id':attrs.id, 'password1':attrs.password, 'password2':attrs.password}
-                        response = self.client.invoke(service_class.get_name(), request)
+                    if error_response:
+                        return service_name, error_response
+
+                    if password_service_name:
+                        response = self.client.invoke(password_service_name, request)
                         if not response.ok:
                             return service_name, response.details
                         else:
-                            self.logger.info("Updated password '{}' ({} {})".format(attrs.name, item_type, service_name))
+                            self.logger.info("Updated password '{}' ({} {})".format(attrs.name, def_type, service_name))
 
             return None, None
 
+        def add_import_error(item_type, attrs_dict, is_edit, service_name, error_response):
+            raw = (item_type, attrs_dict, error_response)
+            value = "Could not import (is_edit {}) '{}' with '{}', response from '{}' was '{}'".format(
+                is_edit, attrs_dict.get('name'), attrs_dict, service_name, error_response)
+            errors.append(Error(raw, value, ERROR_COULD_NOT_IMPORT_OBJECT))
+
+        def invoke_in_transaction(invocations):
+            """ Invokes services in one request, all of them in a single ODB transaction, and returns their results
+            in the same order. If the request fails, the whole transaction has been rolled back so each of the invocations
+            is given a failed result.
+            """
+            if not invocations:
+                return []
+
+            response = self.client.invoke_many(invocations, in_transaction=True)
+            if not response.ok:
+                return [{'ok':False, 'details':response.details} for _ in invocations]
+
+            return response.data
+
         def remove_from_import_list(item_type, name):
             for json_item_type, items in self.json_to_import.items():
                 if json_item_type == item_type:
@@ -1191,10 +1285,7 @@ class EnMasse(ManageCommand):
 
             # We quit on first error encountered
             if error_response:
-                raw = (item_type, attrs_dict, error_response)
-                value = "Could not import (is_edit {}) '{}' with '{}', response from '{}' was '{}'".format(
-                    is_edit, attrs.name, attrs_dict, service_name, error_response)
-                errors.append(Error(raw, value, ERROR_COULD_NOT_IMPORT_OBJECT))
+                add_import_error(item_type, attrs_dict, is_edit, service_name, error_response)
                 return Results(warnings, errors)
 
             # It's been just imported so we don't want to create in next steps
@@ -1206,6 +1297,67 @@ class EnMasse(ManageCommand):
             # let's see in practice if it's a burden.
             self.get_odb_objects()
 
+        def _import_bulk(item_type, attrs_list, is_edit):
+            """ Imports all objects of a given type in one request and one ODB transaction, so either all of them
+            are imported or none is, and servers receive a single broker message about all of them. Passwords are set
+            in another request and transaction, once IDs of new objects are known. Objects are read back from ODB
+            once all of them have been imported rather than after each one.
+            """
+            to_import = []
+            invocations = []
+
+            for attrs in attrs_list:
+                if should_skip_item(item_type, attrs, is_edit):
+                    continue
+
+                attrs_dict = attrs.toDict()
+                attrs.cluster_id = self.client.cluster_id
+                import_info, service_name = prepare_object(item_type, attrs, is_edit)
+
+                to_import.append((attrs, attrs_dict, import_info, service_name))
+                invocations.append({'name':service_name, 'payload':attrs})
+
+            # Services are invoked one by one, in the order given, so RBAC roles can be parents of the ones that follow them
+            results = invoke_in_transaction(invocations)
+
+            passwords = []
+            password_invocations = []
+            verb = 'Updated' if is_edit else 'Created'
+
+            for (attrs, attrs_dict, import_info, service_name), result in zip(to_import, results):
+                if not result['ok']:
+                    add_import_error(item_type, attrs_dict, is_edit, service_name, result['details'])
+                    continue
+
+                self.logger.info("{} object '{}' ({} {})".format(verb, attrs.name, item_type, service_name))
+
+                if import_info.needs_password:
+                    password_service_name, request, error_response = get_password_request(
+                        item_type, attrs, attrs_dict, is_edit, import_info, service_name, result['data'])
+
+                    if error_response:
+                        add_import_error(item_type, attrs_dict, is_edit, service_name, error_response)
+                    elif password_service_name:
+                        passwords.append((attrs, attrs_dict, service_name))
+                        password_invocations.append({'name':password_service_name, 'payload':request})
+
+            if password_invocations:
+                results = invoke_in_transaction(password_invocations)
+                for (attrs, attrs_dict, service_name), result in zip(passwords, results):
+                    if not result['ok']:
+                        add_import_error(item_type, attrs_dict, is_edit, service_name, result['details'])
+                    else:
+                        self.logger.info("Updated password '{}' ({} {})".format(attrs.name, item_type, service_name))
+
+            if errors:
+                return Results(warnings, errors)
+
+            if is_edit:
+                for attrs, _, _, _ in to_import:
+                    remove_from_import_list(item_type, attrs.name)
+
+            self.get_odb_objects()
+
         #
         # Update already existing objects first, definitions before any object
         # that may depend on them ..
@@ -1218,15 +1370,27 @@ class EnMasse(ManageCommand):
         #
         # .. actually invoke the updates now ..
         #
-        for w in chain(existing_defs, existing_other):
-            item_type, attrs = w.value_raw
+        if self.bulk:
+            existing_by_type = OrderedDict()
+            for w in chain(existing_defs, existing_other):
+                item_type, attrs = w.value_raw
+                existing_by_type.setdefault(item_type, []).append(attrs)
+
+            for item_type, attr_list in existing_by_type.items():
+                results = _import_bulk(item_type, attr_list, True)
+                if results:
+                    return results
+
+        else:
+            for w in chain(existing_defs, existing_other):
+                item_type, attrs = w.value_raw
 
-            if should_skip_item(item_type, attrs, True):
-                continue
+                if should_skip_item(item_type, attrs, True):
+                    continue
 
-            results = _import(item_type, attrs, True)
-            if results:
-                return results
+                results = _import(item_type, attrs, True)
+                if results:
+                    return results
 
         #
         # Create new objects, again, definitions come first ..
@@ -1240,6 +1404,13 @@ class EnMasse(ManageCommand):
         #
         for elem in chain(new_defs, new_other):
             for item_type, attr_list in elem.items():
+
+                if self.bulk:
+                    results = _import_bulk(item_type, attr_list, False)
+                    if results:
+                        return results
+                    continue
+
                 for attrs in attr_list:
 
                     if should_skip_item(item_type, attrs, False):
@@ -1264,6 +1435,10 @@ class EnMasse(ManageCommand):
         if not results.ok:
             return [results]
 
+        if self.dry_run:
+            self.report_dry_run()
+            return []
+
         already_existing = self.find_already_existing_odb_objects()
         if not already_existing.ok and not self.replace_odb_objects:
             return [already_existing]
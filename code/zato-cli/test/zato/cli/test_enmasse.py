@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch, bunchify
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.cli.enmasse import EnMasse, ERROR_COULD_NOT_IMPORT_OBJECT, Results
+from zato.server.service.internal.message import xpath as xpath_mod
+from zato.server.service.internal.outgoing import sql as outgoing_sql_mod
+from zato.server.service.internal.security.rbac import role as rbac_role_mod
+
+# ################################################################################################################################
+
+class FakeClient(object):
+    """ Returns results of invoke_many from a list of responses, one for each call, and records what it was invoked with.
+    """
+    def __init__(self, *responses):
+        self.cluster_id = 1
+        self.responses = list(responses)
+        self.invoke_many_calls = []
+
+    def invoke_many(self, invocations, max_concurrent=None, headers=None, in_transaction=False):
+        self.invoke_many_calls.append(([(item['name'], dict(item['payload'])) for item in invocations], in_transaction))
+        return self.responses.pop(0)
+
+def ok(data=None):
+    return {'ok':True, 'data':data or {}, 'details':None}
+
+def get_response(*results):
+    return Bunch(ok=True, data=list(results), details=None)
+
+# ################################################################################################################################
+
+class EnMasseTestCase(TestCase):
+
+    def get_enmasse(self, json, client=None, odb_objects=None):
+        enmasse = EnMasse(Bunch(verbose=False, store_config=False, store_log=False))
+        enmasse.args = Bunch(cols_width=None)
+        enmasse.bulk = True
+        enmasse.json = bunchify(json)
+        enmasse.odb_objects = bunchify(odb_objects or {})
+        enmasse.client = client
+
+        enmasse.odb_reads = 0
+
+        def get_odb_objects():
+            enmasse.odb_reads += 1
+        enmasse.get_odb_objects = get_odb_objects
+
+        return enmasse
+
+# ################################################################################################################################
+
+    def test_bulk_rollback(self):
+        client = FakeClient(Bunch(ok=False, data=None, details='Invalid XPath'))
+        enmasse = self.get_enmasse({'xpath': [
+            {'name':'xpath1', 'value':'/a'}, {'name':'xpath2', 'value':'/b['}, {'name':'xpath3', 'value':'/c'}]}, client)
+
+        results = enmasse.import_objects(Results([], []))
+
+        # All the objects were sent in one request and one transaction
+        eq_(len(client.invoke_many_calls), 1)
+
+        invocations, in_transaction = client.invoke_many_calls[0]
+        eq_([name for name, _ in invocations], [xpath_mod.Create.get_name()] * 3)
+        eq_(in_transaction, True)
+
+        # The transaction was rolled back so none of the objects was imported
+        eq_([error.code for error in results.errors], [ERROR_COULD_NOT_IMPORT_OBJECT] * 3)
+        eq_([error.value_raw[1]['name'] for error in results.errors], ['xpath1', 'xpath2', 'xpath3'])
+        eq_([error.value_raw[2] for error in results.errors], ['Invalid XPath'] * 3)
+
+        # Nothing is read back from ODB after an error
+        eq_(enmasse.odb_reads, 0)
+
+    def test_bulk_ok(self):
+        client = FakeClient(get_response(ok({'id':1}), ok({'id':2})), get_response(ok({'id':3})))
+        enmasse = self.get_enmasse({
+            'xpath': [{'name':'xpath1', 'value':'/a'}, {'name':'xpath2', 'value':'/b'}],
+            'json_pointer': [{'name':'pointer1', 'value':'/c'}]}, client)
+
+        results = enmasse.import_objects(Results([], []))
+        eq_(results.ok, True)
+
+        # Each type is imported in a request and transaction of its own
+        eq_(len(client.invoke_many_calls), 2)
+        eq_(sorted(len(invocations) for invocations, _ in client.invoke_many_calls), [1, 2])
+        eq_([in_transaction for _, in_transaction in client.invoke_many_calls], [True, True])
+
+        # Objects are read back from ODB once per type
+        eq_(enmasse.odb_reads, 2)
+
+# ################################################################################################################################
+
+    def test_bulk_passwords(self):
+        client = FakeClient(
+            get_response(ok({'id':11}), ok({'id':22}), ok({'id':33})),
+            Bunch(ok=False, data=None, details='Could not set password'))
+
+        enmasse = self.get_enmasse({'outconn_sql': [
+            {'name':'sql1', 'password':'secret1'},
+            {'name':'sql2'},
+            {'name':'sql3', 'password':'secret3'}]}, client)
+
+        results = enmasse.import_objects(Results([], []))
+
+        # Passwords are set in a second request and transaction, with IDs of objects just created,
+        # except for the object without one.
+        eq_(len(client.invoke_many_calls), 2)
+        eq_(client.invoke_many_calls[1], ([
+            (outgoing_sql_mod.ChangePassword.get_name(), {'id':11, 'password1':'secret1', 'password2':'secret1'}),
+            (outgoing_sql_mod.ChangePassword.get_name(), {'id':33, 'password1':'secret3', 'password2':'secret3'})], True))
+
+        eq_(len(results.errors), 3)
+
+        eq_(results.errors[0].value_raw[1]['name'], 'sql2')
+        self.assertIn('Password missing but is required', results.errors[0].value_raw[2])
+
+        # Setting passwords was rolled back for all the objects
+        eq_([error.value_raw[1]['name'] for error in results.errors[1:]], ['sql1', 'sql3'])
+        eq_([error.value_raw[2] for error in results.errors[1:]], ['Could not set password'] * 2)
+
+        eq_(enmasse.odb_reads, 0)
+
+# ################################################################################################################################
+
+    def test_bulk_rbac_role_order(self):
+        client = FakeClient(get_response(ok({'id':1}), ok({'id':2}), ok({'id':3})))
+        enmasse = self.get_enmasse({'rbac_role': [
+            {'name':'Root'}, {'name':'role1', 'parent_id':1}, {'name':'role2', 'parent_id':1}, {'name':'role3', 'parent_id':1}]},
+            client)
+
+        results = enmasse.import_objects(Results([], []))
+        eq_(results.ok, True)
+
+        # Root role is never imported, the other ones are imported in the order given, in one transaction
+        invocations, in_transaction = client.invoke_many_calls[0]
+
+        eq_(in_transaction, True)
+        eq_([name for name, _ in invocations], [rbac_role_mod.Create.get_name()] * 3)
+        eq_([payload['name'] for _, payload in invocations], ['role1', 'role2', 'role3'])
+
+# ################################################################################################################################
+
+    def test_dry_run_changes(self):
+        enmasse = self.get_enmasse({
+            'xpath': [{'name':'xpath1', 'value':'/a'}, {'name':'xpath2', 'value':'/b'}, {'name':'xpath3', 'value':'/c'}],
+            'http_soap': [
+                {'name':'channel1', 'connection':'channel', 'transport':'plain_http', 'url_path':'/new', 'password':'abc'},
+                {'name':'outconn1', 'connection':'outgoing', 'transport':'plain_http', 'host':'http://example.com'},
+            ]}, odb_objects={
+            'xpath': [{'id':1, 'cluster_id':1, 'name':'xpath1', 'value':'/a'}, {'id':3, 'name':'xpath3', 'value':'/cc'}],
+            'http_soap': [
+                {'id':1, 'name':'channel1', 'connection':'channel', 'transport':'plain_http', 'url_path':'/old'},
+                {'id':2, 'name':'outconn1', 'connection':'outgoing', 'transport':'soap', 'host':'http://example.com'},
+            ]})
+
+        eq_(enmasse.get_dry_run_changes(), {
+            'xpath xpath1': 'No changes',
+            'xpath xpath2': 'Create',
+            'xpath xpath3': 'Update value',
+            'http_soap channel1': 'Update url_path',
+
+            # Different transport so it is a different object
+            'http_soap outconn1': 'Create',
+        })
+
+# ################################################################################################################################
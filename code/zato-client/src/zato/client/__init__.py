@@ -11,6 +11,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 # stdlib
 import logging, os
 from datetime import datetime
+from functools import partial
 from inspect import getargspec
 from traceback import format_exc
 
@@ -241,31 +242,30 @@ class ServiceInvokeResponse(JSONSIOResponse):
     """
     def __init__(self, *args, **kwargs):
         self.inner_service_response = None
+        self.is_base64 = kwargs.pop('is_base64', True)
         super(ServiceInvokeResponse, self).__init__(*args, **kwargs)
 
+    def get_inner_data(self, inner_service_response):
+        try:
+            data = loads(inner_service_response)
+        except ValueError:
+            # Not a JSON response
+            return inner_service_response
+        else:
+            if isinstance(data, dict):
+                data_keys = data.keys()
+                if len(data_keys) == 1:
+                    data_key = data_keys[0]
+                    if isinstance(data_key, basestring) and data_key.startswith('zato'):
+                        return data[data_key]
+            return data
+
     def set_data(self, payload, has_zato_env):
         response = payload.get('response')
         if response:
             if has_zato_env:
-                self.inner_service_response = payload['response'].decode('base64')
-                try:
-                    data = loads(self.inner_service_response)
-                except ValueError:
-                    # Not a JSON response
-                    self.data = self.inner_service_response
-                else:
-                    if isinstance(data, dict):
-                        data_keys = data.keys()
-                        if len(data_keys) == 1:
-                            data_key = data_keys[0]
-                            if isinstance(data_key, basestring) and data_key.startswith('zato'):
-                                self.data = data[data_key]
-                            else:
-                                self.data = data
-                        else:
-                            self.data = data
-                    else:
-                        self.data = data
+                self.inner_service_response = response.decode('base64') if self.is_base64 else response
+                self.data = self.get_inner_data(self.inner_service_response)
             else:
                 try:
                     data = loads(response)
@@ -277,6 +277,26 @@ class ServiceInvokeResponse(JSONSIOResponse):
 
             return True
 
+class ServiceInvokeManyResponse(ServiceInvokeResponse):
+    """ Stores responses from services invoked through the zato.service.invoke-many service. Data is a list of results,
+    in the same order the services were given in, each with its own ok, details and data.
+    """
+    def set_data(self, payload, has_zato_env):
+        if super(ServiceInvokeManyResponse, self).set_data(payload, has_zato_env):
+            results = []
+
+            for result in self.data['results']:
+                response = result.get('response')
+                results.append({
+                    'ok': result['ok'],
+                    'details': result.get('details'),
+                    'data': self.get_inner_data(response) if response else None,
+                })
+
+            self.data = results
+
+            return True
+
 # ################################################################################################################################
                         
 class RawDataResponse(_Response):
@@ -376,33 +396,73 @@ class AnyServiceInvoker(_Client):
             return value.isoformat()
         raise TypeError('Cannot serialize [{}]'.format(value))
         
-    def _invoke(self, name=None, payload='', headers=None, channel='invoke', data_format='json',
-                transport=None, async=False, expiration=BROKER.DEFAULT_EXPIRATION, id=None,
-                to_json=True, output_repeated=ZATO_NOT_GIVEN):
+    def _get_invoke_request(self, name, payload, channel, data_format, transport, async, expiration, id, to_json, skip_base64):
 
         if not(name or id):
             raise ZatoException(msg='Either name or id must be provided')
-        
-        if name and output_repeated == ZATO_NOT_GIVEN:
-            output_repeated = name.lower().endswith('list')
 
         if to_json:
-            payload = dumps(payload, default=self.json_default_handler)
+
+            # Embedded as they are, without JSON-encoding them twice, if there is no need to base64-encode them
+            if not(skip_base64 and isinstance(payload, (dict, list))):
+                payload = dumps(payload, default=self.json_default_handler)
+
+        if not skip_base64:
+            payload = payload.encode('base64')
 
         id_, value = ('name', name) if name else ('id', id)
-        request = {id_: value, 'payload': payload.encode('base64'),
-                   'channel': channel, 'data_format': data_format, 'transport': transport,
-                   'async': async, 'expiration':expiration
-                   }
+        return {id_: value, 'payload': payload,
+                'channel': channel, 'data_format': data_format, 'transport': transport,
+                'async': async, 'expiration':expiration
+                }
+
+    def _invoke(self, name=None, payload='', headers=None, channel='invoke', data_format='json',
+                transport=None, async=False, expiration=BROKER.DEFAULT_EXPIRATION, id=None,
+                to_json=True, output_repeated=ZATO_NOT_GIVEN, skip_base64=False, response_class=ServiceInvokeResponse):
+
+        if name and output_repeated == ZATO_NOT_GIVEN:
+            output_repeated = name.lower().endswith('list')
+
+        request = self._get_invoke_request(
+            name, payload, channel, data_format, transport, async, expiration, id, to_json, skip_base64)
+
+        if skip_base64:
+            request['skip_base64'] = True
+            response_class = partial(response_class, is_base64=False)
+
+        return super(AnyServiceInvoker, self).invoke(
+            dumps(request, default=self.json_default_handler), response_class, async, headers, output_repeated)
 
-        return super(AnyServiceInvoker, self).invoke(dumps(request), ServiceInvokeResponse, async, headers, output_repeated)
-        
     def invoke(self, *args, **kwargs):
         return self._invoke(async=False, *args, **kwargs)
 
     def invoke_async(self, *args, **kwargs):
         return self._invoke(async=True, *args, **kwargs)
 
+    def invoke_many(self, invocations, max_concurrent=None, headers=None, in_transaction=False):
+        """ Invokes many services in one request, no more than max_concurrent of them at a time on server side.
+        Each invocation is a dictionary of what invoke accepts, such as name, payload or data_format. Payloads
+        are not base64-encoded. The response's data is a list of results, one for each invocation.
+
+        With in_transaction set, services are invoked one by one in a single ODB transaction, through
+        zato.service.invoke-many-in-transaction, and max_concurrent is not used.
+        """
+        requests = []
+        for invocation in invocations:
+            requests.append(self._get_invoke_request(invocation.get('name'), invocation.get('payload', ''),
+                invocation.get('channel', 'invoke'), invocation.get('data_format', 'json'), invocation.get('transport'),
+                invocation.get('async', False), invocation.get('expiration', BROKER.DEFAULT_EXPIRATION),
+                invocation.get('id'), invocation.get('to_json', True), True))
+
+        payload = {'invocations': requests, 'skip_base64': True}
+        if max_concurrent and not in_transaction:
+            payload['max_concurrent'] = max_concurrent
+
+        name = 'zato.service.invoke-many-in-transaction' if in_transaction else 'zato.service.invoke-many'
+
+        return self._invoke(name, payload, headers, output_repeated=False, skip_base64=True,
+            response_class=ServiceInvokeManyResponse)
+
 # ################################################################################################################################
     
 class XMLClient(_Client):
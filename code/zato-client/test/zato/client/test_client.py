@@ -46,6 +46,7 @@ class FakeSession(object):
         self.auth = auth
         
     def post(self, address, request, headers):
+        self.request = request
         return self.response
     
 # ##############################################################################
@@ -339,7 +340,117 @@ class AnyServiceInvokerTestCase(_Base):
         eq_(response.data.items(), service_response_payload.items())
         eq_(response.has_data, True)
         eq_(response.cid, cid)
-        
+
+    def test_client_skip_base64(self):
+
+        service_response_payload = {'service_id':5207, 'has_wsdl':True}
+        service_response = dumps({'zato_service_has_wsdl_response':service_response_payload})
+
+        text = dumps({
+            'zato_env':{'result':ZATO_OK, 'details':''},
+            'zato_service_invoke_response': {
+                'response':service_response
+            }
+        })
+
+        client = self.get_client(FakeInnerResponse({}, True, text, rand_int()))
+        response = client.invoke('zato.service.has-wsdl', {'name':'my.service'}, skip_base64=True)
+
+        request = loads(self.session.request)
+        eq_(request['skip_base64'], True)
+        eq_(request['payload'], {'name':'my.service'})
+
+        eq_(response.ok, True)
+        eq_(response.inner_service_response, service_response)
+        eq_(response.data.items(), service_response_payload.items())
+
+    def test_invoke_many(self):
+
+        invoke_many_response = dumps({'zato_service_invoke_many_response': {'results': [
+            {'ok':True, 'response':dumps({'zato_service_has_wsdl_response':{'has_wsdl':True}})},
+            {'ok':True, 'response':'Not JSON'},
+            {'ok':True, 'response':None},
+            {'ok':False, 'response':None, 'details':'Service not found'},
+        ]}})
+
+        text = dumps({
+            'zato_env':{'result':ZATO_OK, 'details':''},
+            'zato_service_invoke_response': {
+                'response':invoke_many_response
+            }
+        })
+
+        client = self.get_client(FakeInnerResponse({}, True, text, rand_int()))
+        response = client.invoke_many([
+            {'name':'zato.service.has-wsdl', 'payload':{'name':'my.service'}},
+            {'name':'my.service', 'payload':'abc', 'to_json':False, 'data_format':'xml'},
+            {'id':123, 'async':True},
+            {'name':'my.service2'},
+        ], 5)
+
+        request = loads(self.session.request)
+        eq_(request['name'], 'zato.service.invoke-many')
+        eq_(request['skip_base64'], True)
+
+        payload = request['payload']
+        eq_(payload['skip_base64'], True)
+        eq_(payload['max_concurrent'], 5)
+
+        invocations = payload['invocations']
+        eq_(len(invocations), 4)
+
+        eq_(invocations[0]['name'], 'zato.service.has-wsdl')
+        eq_(invocations[0]['payload'], {'name':'my.service'})
+
+        eq_(invocations[1]['payload'], 'abc')
+        eq_(invocations[1]['data_format'], 'xml')
+
+        eq_(invocations[2]['id'], 123)
+        eq_(invocations[2]['payload'], '""')
+        eq_(invocations[2]['async'], True)
+
+        eq_(response.ok, True)
+        eq_(len(response.data), 4)
+
+        eq_(response.data[0]['ok'], True)
+        eq_(response.data[0]['data'], {'has_wsdl':True})
+        eq_(response.data[1]['data'], 'Not JSON')
+        eq_(response.data[2]['data'], None)
+
+        eq_(response.data[3]['ok'], False)
+        eq_(response.data[3]['details'], 'Service not found')
+
+    def test_invoke_many_in_transaction(self):
+
+        invoke_many_response = dumps({'zato_service_invoke_many_in_transaction_response': {'results': [
+            {'ok':True, 'response':dumps({'zato_http_soap_create_response':{'id':1, 'name':'channel1'}})},
+            {'ok':True, 'response':dumps({'zato_http_soap_create_response':{'id':2, 'name':'channel2'}})},
+        ]}})
+
+        text = dumps({
+            'zato_env':{'result':ZATO_OK, 'details':''},
+            'zato_service_invoke_response': {
+                'response':invoke_many_response
+            }
+        })
+
+        client = self.get_client(FakeInnerResponse({}, True, text, rand_int()))
+        response = client.invoke_many([
+            {'name':'zato.http-soap.create', 'payload':{'name':'channel1'}},
+            {'name':'zato.http-soap.create', 'payload':{'name':'channel2'}},
+        ], 5, in_transaction=True)
+
+        request = loads(self.session.request)
+        eq_(request['name'], 'zato.service.invoke-many-in-transaction')
+
+        # Services in a transaction are always invoked one by one
+        self.assertNotIn('max_concurrent', request['payload'])
+        eq_(len(request['payload']['invocations']), 2)
+
+        eq_(response.ok, True)
+        eq_(response.data[0]['data'], {'id':1, 'name':'channel1'})
+        eq_(response.data[1]['data'], {'id':2, 'name':'channel2'})
+
 # ##############################################################################
 
 class RawDataClientTestCase(_Base):
@@ -335,6 +335,7 @@ class KVDB(Attrs):
     LOCK_SERVER_PREFIX = '{}server:'.format(LOCK_PREFIX)
     LOCK_SERVER_ALREADY_DEPLOYED = '{}already-deployed:'.format(LOCK_SERVER_PREFIX)
     LOCK_SERVER_STARTING = '{}starting:'.format(LOCK_SERVER_PREFIX)
+    LOCK_SERVER_CONFIG_SNAPSHOT = '{}config-snapshot:'.format(LOCK_SERVER_PREFIX)
 
     LOCK_PACKAGE_PREFIX = '{}package:'.format(LOCK_PREFIX)
     LOCK_PACKAGE_UPLOADING = '{}uploading:'.format(LOCK_PACKAGE_PREFIX)
@@ -350,9 +351,20 @@ class KVDB(Attrs):
 
     LOCK_ASYNC_INVOKE_WITH_TARGET_PATTERN = '{}async-invoke-with-pattern:{{}}:{{}}'.format(LOCK_PREFIX)
 
+    # Configuration a server's workers load from the ODB at startup, stored by the first of them for the others to reuse,
+    # and a counter increased each time configuration changes so that stale snapshots are not used.
+    CONFIG_SNAPSHOT = 'zato:config:snapshot:'
+    CONFIG_VERSION = 'zato:config:version'
+
+    # IDs and ODB options of services a server's first worker deployed, for the other workers to reuse
+    DEPLOYED_SERVICES = 'zato:server:deployed-services:'
+
     TRANSLATION = 'zato:kvdb:data-dict:translation'
     TRANSLATION_ID = TRANSLATION + ':id'
 
+    # How many keys SCAN is asked for at a time and how many of them are read in one pipeline
+    SCAN_BATCH_SIZE = 1000
+
     SERVICE_USAGE = 'zato:stats:service:usage:'
     SERVICE_TIME_BASIC = 'zato:stats:service:time:basic:'
     SERVICE_TIME_RAW = 'zato:stats:service:time:raw:'
@@ -363,6 +375,22 @@ class KVDB(Attrs):
     SERVICE_TIME_AGGREGATED_BY_MONTH = 'zato:stats:service:time:aggr-by-month:'
     SERVICE_TIME_SLOW = 'zato:stats:service:time:slow:'
 
+    # Serialized histograms of processing times, see zato.common.stats.Histogram
+    SERVICE_TIME_SKETCH = 'zato:stats:service:time:sketch:'
+    SERVICE_TIME_SKETCH_BY_MINUTE = 'zato:stats:service:time:sketch-by-minute:'
+
+    # Sets of names of services that have data under keys above or aggregated statistics for a given time suffix
+    SERVICE_TIME_SKETCH_INDEX = 'zato:stats:service:time:sketch-index'
+    SERVICE_TIME_SKETCH_INDEX_BY_MINUTE = 'zato:stats:service:time:sketch-index-by-minute:'
+    SERVICE_TIME_AGGREGATED_INDEX = 'zato:stats:service:time:aggr-index:'
+
+    # Sorted sets of time suffixes a service has aggregated statistics for under a given key prefix,
+    # scored by when the period each suffix stands for starts
+    SERVICE_TIME_AGGREGATED_BUCKETS = 'zato:stats:service:time:aggr-buckets:'
+
+    # How many commands are sent in one pipeline when reading aggregated statistics
+    SERVICE_TIME_AGGREGATED_BATCH_SIZE = 1000
+
     SERVICE_SUMMARY_PREFIX_PATTERN = 'zato:stats:service:summary:{}:'
     SERVICE_SUMMARY_BY_DAY = 'zato:stats:service:summary:by-day:'
     SERVICE_SUMMARY_BY_WEEK = 'zato:stats:service:summary:by-week:'
@@ -395,6 +423,16 @@ class SCHEDULER:
         DELETE = 'delete'
         INACTIVATE = 'inactivate'
 
+    # What to do with a job whose time came more than its misfire grace time ago, e.g. because the server was busy
+    class MISFIRE_POLICY:
+        RUN_ONCE = 'run_once' # Run it once now, no matter how many runs were missed, and continue with the next one due
+        SKIP = 'skip' # Don't run it now and continue with the next one due
+        DEFAULT = RUN_ONCE
+
+    DEFAULT_MISFIRE_GRACE_TIME = 1 # In seconds
+    DEFAULT_MAX_CONCURRENCY = 0 # How many runs of a job can be in progress at a time, 0 = no limit
+    MAX_SLEEP_TIME = 10 # In seconds, how long the scheduler can sleep for at most, even if no jobs are due
+
 class CHANNEL(Attrs):
     AMQP = 'amqp'
     AUDIT = 'audit'
@@ -467,6 +505,8 @@ class DELIVERY_CALLBACK_INVOKER(Attrs):
 
 class BROKER:
     DEFAULT_EXPIRATION = 15 # In seconds
+    DEQUEUE_BATCH_SIZE = 10 # How many messages a consumer takes off a work queue at most in one go
+    DEQUEUE_TIMEOUT = 1 # In seconds, how long a consumer blocks waiting for messages before checking if it should stop
 
 class MISC:
     DEFAULT_HTTP_TIMEOUT=10
@@ -475,6 +515,7 @@ class MISC:
     OAUTH_SIG_METHODS = ['HMAC-SHA1', 'PLAINTEXT']
     PIDFILE = 'pidfile'
     SEPARATOR = ':::'
+    ODB_IN_CLAUSE_BATCH_SIZE = 500 # How many values an IN clause may have at most, SQLite accepts up to 999 parameters
 
 class ADAPTER_PARAMS:
     APPLY_AFTER_REQUEST = 'apply-after-request'
@@ -483,6 +524,41 @@ class ADAPTER_PARAMS:
 class AUDIT_LOG:
     REPLACE_WITH = SECRET_SHADOW
 
+    # Defaults for the in-memory audit log of HTTP/SOAP channels
+    BATCH_SIZE = 100
+    FLUSH_INTERVAL = 1.0 # In seconds
+    QUEUE_MAX_SIZE = 10000
+    PENDING_MAX_AGE = 120 # In seconds
+
+class AUTH_CACHE:
+
+    # Defaults for the cache of positive authentication results of HTTP channels
+    MAX_SIZE = 10000
+    TTL = 60 # In seconds
+
+class SCATTER_GATHER:
+
+    # Defaults for concurrent invocations of HTTP outgoing connections from within a single request
+    MAX_CONCURRENT = 20
+
+class FTP_POOL:
+
+    # Defaults for pools of FTP connections, used if definitions of connections do not specify their own
+    SIZE = 10
+    CHECKOUT_TIMEOUT = 10 # In seconds, how long to wait for a connection if all of them are in use
+    MAX_IDLE = 60 # In seconds, connections not used for that long are closed
+    MAX_LIFETIME = 600 # In seconds, connections are closed once they are that old
+    PING_INTERVAL = 5 # In seconds, connections not used for that long are checked with NOOP before being handed out
+    CHUNK_SIZE = 65536 # In bytes, how much of a file to send or receive at a time
+
+class INVOKE_MANY:
+
+    # Default for how many services zato.service.invoke-many invokes concurrently
+    MAX_CONCURRENT = 10
+
+class STATS_COLLECTOR:
+    FLUSH_INTERVAL = 1.0 # In seconds, how often to store in Redis service statistics collected by workers
+
 class INFO_FORMAT:
     DICT = 'dict'
     TEXT = 'text'
@@ -571,6 +647,10 @@ class PUB_SUB:
     DEFAULT_MIME_TYPE = 'text/plain'
     DEFAULT_EXPIRATION = 60.0 # In seconds
     DEFAULT_GET_MAX_BATCH_SIZE = 100
+    DEFAULT_GET_TIMEOUT = 0 # In seconds, 0 = return immediately if there are no messages
+    MAX_GET_TIMEOUT = 60 # In seconds
+    PUBLISH_BATCH_SIZE = 1000 # How many messages to publish in one Lua call
+    ACK_BATCH_SIZE = 1000 # How many message IDs to acknowledge or reject in one Lua call
     DEFAULT_IS_FIFO = True
     DEFAULT_MAX_DEPTH = 500
     DEFAULT_MAX_BACKLOG = 1000
@@ -669,6 +749,10 @@ class CASSANDRA:
         ENABLED_LZ4 = ValueConstant('enabled-lz4')
         ENABLED_SNAPPY = ValueConstant('enabled-snappy')
 
+    class QUERY:
+        CONCURRENCY = 20 # How many executions of a query execute_many keeps in flight at most
+        FETCH_SIZE = 1000 # How many rows iter_pages fetches at a time
+
 class TLS:
     # All the BEGIN/END blocks we don't want to store in logs.
     # Taken from https://github.com/openssl/openssl/blob/master/crypto/pem/pem.h
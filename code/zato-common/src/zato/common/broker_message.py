@@ -389,6 +389,17 @@ class RBAC(Constants):
     ROLE_PERMISSION_EDIT = ValueConstant('')
     ROLE_PERMISSION_DELETE = ValueConstant('')
 
+class DATA_DICT(Constants):
+    code_start = 105400
+
+    CHANGED = ValueConstant('')
+
+class BULK(Constants):
+    code_start = 105600
+
+    # Messages that a set of services published while their changes were being committed in a single ODB transaction
+    CONFIG = ValueConstant('')
+
 code_to_name = {}
 
 # To prevent 'RuntimeError: dictionary changed size during iteration'
@@ -43,6 +43,8 @@ command = oneOf((
 parameters = (OneOrMore(Word(alphanums + '-' + punctuation))).setResultsName('parameters')
 redis_grammar = command + Optional(White().suppress() + parameters)
 
+TRANSLATION_PATTERN = _KVDB.TRANSLATION + _KVDB.SEPARATOR + '*'
+
 # ################################################################################################################################
 
 class LuaContainer(object):
@@ -60,9 +62,55 @@ class LuaContainer(object):
     def add_lua_program(self, name, program):
         self.lua_programs[name] = self.kvdb.register_script(program)
 
-    def run_lua(self, name, keys=None, args=None):
+    def run_lua(self, name, keys=None, args=None, client=None):
+        """ Runs a Lua program by its name. If client is a pipeline, the program's result will be returned
+        when the pipeline is executed.
+        """
         logger.debug('run_lua: name/keys/args:`%s %s %s`, lua_programs:`%s', name, keys, args, self.lua_programs)
-        return self.lua_programs[name](keys or [], args or [])
+        return self.lua_programs[name](keys or [], args or [], client)
+
+# ################################################################################################################################
+
+class TranslationCache(object):
+    """ An in-memory index of all the translations a worker may be asked for. It is loaded from KVDB in bulk,
+    when it is needed for the first time unless it has been loaded earlier, and it is reloaded each time
+    the data dictionary changes.
+    """
+    def __init__(self, kvdb):
+        self.kvdb = kvdb
+        self.values = None
+
+        # How many translations were found and how many were not, in which case the default value was returned
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """ (Re-)loads all the translations. Until it is done, the previous ones are still used.
+        """
+        values = {}
+        for name, item in self.kvdb.get_translations():
+
+            # Redis returns UTF-8 encoded keys whereas names translate looks up are always unicode
+            if isinstance(name, bytes):
+                name = name.decode('utf-8')
+
+            values[name] = item.get('value2')
+
+        self.values = values
+        logger.info('Loaded %d translation(s)', len(values))
+
+    def get(self, name, default=''):
+        if self.values is None:
+            self.load()
+
+        value = self.values.get(name)
+
+        if value:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        return default
 
 # ################################################################################################################################
 
@@ -77,6 +125,7 @@ class KVDB(object):
         self.lua_container = LuaContainer()
         self.run_lua = self.lua_container.run_lua # So it's more natural to use it
         self.has_sentinel = False
+        self.translations = TranslationCache(self)
 
     def _get_connection_class(self):
         """ Returns a concrete class to create Redis connections off basing on whether we use Redis sentinels or not.
@@ -164,9 +213,44 @@ class KVDB(object):
         return self.conn.subscribe(*args, **kwargs)
 
     def translate(self, system1, key1, value1, system2, key2, default=''):
-        return self.conn.hget(
+        return self.translations.get(
             _KVDB.SEPARATOR.join(
-                (_KVDB.TRANSLATION, system1, key1, value1, system2, key2)), 'value2') or default
+                (_KVDB.TRANSLATION, system1, key1, value1, system2, key2)), default)
+
+    def translate_many(self, items, default=''):
+        """ Translates each of the (system1, key1, value1, system2, key2) tuples given on input, returning a list
+        of the results, in the same order, with default used for the ones that could not be translated.
+        """
+        get = self.translations.get
+        join = _KVDB.SEPARATOR.join
+        translation = _KVDB.TRANSLATION
+
+        return [get(join((translation,) + tuple(item)), default) for item in items]
+
+    def get_translations(self, batch_size=_KVDB.SCAN_BATCH_SIZE):
+        """ Yields names of all the translations along with their hashes. Keys are found incrementally, with SCAN,
+        and hashes are read in pipelines, each of them covering batch_size keys.
+        """
+        seen = set()
+        cursor = 0
+
+        while True:
+            cursor, keys = self.conn.scan(cursor, TRANSLATION_PATTERN, batch_size)
+
+            # SCAN may return a key more than once
+            keys = [key for key in keys if key not in seen]
+            seen.update(keys)
+
+            if keys:
+                with self.conn.pipeline() as p:
+                    for key in keys:
+                        p.hgetall(key)
+
+                    for key, item in zip(keys, p.execute()):
+                        yield key, item
+
+            if not int(cursor):
+                break
 
     def copy(self):
         """ Returns an KVDB with the configuration copied over from self. Note that
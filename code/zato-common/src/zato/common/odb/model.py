@@ -668,6 +668,8 @@ class Job(Base):
                            SCHEDULER.JOB_TYPE.CRON_STYLE, name='job_type'), nullable=False)
     start_date = Column(DateTime(), nullable=False)
     extra = Column(LargeBinary(500000), nullable=True)
+    misfire_policy = Column(String(20), nullable=True)
+    max_concurrency = Column(Integer, nullable=True)
 
     cluster_id = Column(Integer, ForeignKey('cluster.id', ondelete='CASCADE'), nullable=False)
     cluster = relationship(Cluster, backref=backref('jobs', order_by=name, cascade='all, delete, delete-orphan'))
@@ -678,13 +680,15 @@ class Job(Base):
     def __init__(self, id=None, name=None, is_active=None, job_type=None,
                  start_date=None, extra=None, cluster=None, cluster_id=None,
                  service=None, service_id=None, service_name=None, interval_based=None,
-                 cron_style=None, definition_text=None, job_type_friendly=None):
+                 cron_style=None, definition_text=None, job_type_friendly=None, misfire_policy=None, max_concurrency=None):
         self.id = id
         self.name = name
         self.is_active = is_active
         self.job_type = job_type
         self.start_date = start_date
         self.extra = extra
+        self.misfire_policy = misfire_policy
+        self.max_concurrency = max_concurrency
         self.cluster = cluster
         self.cluster_id = cluster_id
         self.service = service
@@ -72,7 +72,7 @@ def _job(session, cluster_id):
         IntervalBasedJob.weeks, IntervalBasedJob.days,
         IntervalBasedJob.hours, IntervalBasedJob.minutes,
         IntervalBasedJob.seconds, IntervalBasedJob.repeats,
-        CronStyleJob.cron_definition).\
+        CronStyleJob.cron_definition, Job.misfire_policy, Job.max_concurrency).\
         outerjoin(IntervalBasedJob, Job.id==IntervalBasedJob.job_id).\
         outerjoin(CronStyleJob, Job.id==CronStyleJob.job_id).\
         filter(Job.cluster_id==Cluster.id).\
@@ -14,6 +14,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from datetime import datetime, timedelta
 from json import dumps, loads
 from logging import getLogger
+from math import ceil
 from sys import maxint
 from traceback import format_exc
 import logging
@@ -142,11 +143,12 @@ class GetCtx(HasAutoRepr):
     """ A set of data describing where to fetch messages from.
     """
     def __init__(self, sub_key=None, max_batch_size=PUB_SUB.DEFAULT_GET_MAX_BATCH_SIZE, is_fifo=PUB_SUB.DEFAULT_IS_FIFO,
-                   get_format=PUB_SUB.GET_FORMAT.OBJECT.id):
+                   get_format=PUB_SUB.GET_FORMAT.OBJECT.id, timeout=PUB_SUB.DEFAULT_GET_TIMEOUT):
         self.sub_key = sub_key
         self.max_batch_size = max_batch_size
         self.is_fifo = is_fifo # Fetch in FIFO or LIFO order
         self.get_format = get_format
+        self.timeout = timeout # How many seconds to wait for messages if there are none, 0 = don't wait
 
 # ################################################################################################################################
 
@@ -449,12 +451,14 @@ class RedisPubSub(PubSub, LuaContainer):
         self.MSG_IDS_PREFIX = '{}{}'.format(key_prefix, 'zset:msg-ids:{}')
         self.BACKLOG_FULL_KEY = '{}{}'.format(key_prefix, 'hash:backlog-full')
         self.CONSUMER_MSG_IDS_PREFIX = '{}{}'.format(key_prefix, 'list:consumer:msg-ids:{}')
+        self.CONSUMER_NOTIFY_PREFIX = '{}{}'.format(key_prefix, 'list:consumer:notify:{}')
         self.CONSUMER_IN_FLIGHT_IDS_PREFIX = '{}{}'.format(key_prefix, 'set:consumer:in-flight:ids:{}')
         self.CONSUMER_IN_FLIGHT_DATA_PREFIX = '{}{}'.format(key_prefix, 'hash:consumer:in-flight:data:{}')
         self.MSG_VALUES_KEY = '{}{}'.format(key_prefix, 'hash:msg-values')
         self.MSG_METADATA_KEY = '{}{}'.format(key_prefix, 'hash:msg-metadata')
         self.MSG_EXPIRE_AT_KEY = '{}{}'.format(key_prefix, 'hash:msg-expire-at') # In UTC
         self.UNACK_COUNTER_KEY = '{}{}'.format(key_prefix, 'hash:unack-counter')
+        self.OVERFLOWN_KEY = '{}{}'.format(key_prefix, 'list:overflown')
         self.LAST_PUB_TIME_KEY = '{}{}'.format(key_prefix, 'hash:last-pub-time') # In UTC
         self.LAST_SEEN_CONSUMER_KEY = '{}{}'.format(key_prefix, 'hash:last-seen-consumer') # In UTC
         self.LAST_SEEN_PRODUCER_KEY = '{}{}'.format(key_prefix, 'hash:last-seen-producer') # In UTC
@@ -500,44 +504,75 @@ class RedisPubSub(PubSub, LuaContainer):
 
     def delete_consumer_metadata(self, client):
         self.kvdb.hdel(self.LAST_SEEN_CONSUMER_KEY, client.id)
+        self.kvdb.delete(self.CONSUMER_NOTIFY_PREFIX.format(client.sub_key))
 
     def delete_producer_metadata(self, client):
         self.kvdb.hdel(self.LAST_SEEN_PRODUCER_KEY, client.id)
 
 # ################################################################################################################################
 
-    def _raise_cant_publish_error(self, ctx):
-        raise PermissionDenied("Permision denied. Can't publish to `{}`".format(ctx.topic))
+    def _raise_cant_publish_error(self, topic):
+        raise PermissionDenied("Permision denied. Can't publish to `{}`".format(topic))
+
+    def _get_target_queues(self, topic):
+        """ Returns keys of queues of all the consumers subscribed to a topic, each followed by a key of a list
+        their blocked readers wait on, and the queues' max. depths. Each queue is keyed by the sub_key its consumer
+        was added with, including consumers added without one, so that no consumer of a topic is ever skipped.
+        Must be called with self.update_lock held.
+        """
+        keys = []
+        max_depths = []
+
+        for consumer in self.topic_to_cons.get(topic, []):
+            sub_key = self.cons_to_sub[consumer]
+
+            keys.append(self.CONSUMER_MSG_IDS_PREFIX.format(sub_key))
+            keys.append(self.CONSUMER_NOTIFY_PREFIX.format(sub_key))
+            max_depths.append(self.consumers[consumer].max_depth)
+
+        return keys, max_depths
 
     def publish(self, ctx):
-        """ Publishes a message on a selected topic.
+        """ Publishes a message on a selected topic. The message is delivered to queues of all the topic's consumers
+        right away, it is only kept in the topic itself if there are none yet.
+        """
+        self.publish_many(ctx.client_id, ctx.topic, [ctx.msg])
+        return ctx
+
+    def publish_many(self, client_id, topic, msgs):
+        """ Publishes a list of messages on a selected topic. Permissions and the topic's depth are checked once
+        for the whole list, which is then written in batches of PUB_SUB.PUBLISH_BATCH_SIZE messages, each by a single
+        Lua call, all of them sent in one pipeline. Returns the messages.
         """
         # Note that the client always receives the same response but logs contain details
         with self.update_lock:
-            if not ctx.topic in self.topics:
-                self.logger.warn('Permision denied. No such topic `%s`, publisher `%s`', ctx.topic, ctx.client_id)
-                self._raise_cant_publish_error(ctx)
+            if topic not in self.topics:
+                self.logger.warn('Permision denied. No such topic `%s`, publisher `%s`', topic, client_id)
+                self._raise_cant_publish_error(topic)
 
-            if not ctx.client_id in self.topic_to_prod.get(ctx.topic, []):
-                self.logger.warn('Permision denied. Producer `%s` cannot publish to `%s`', ctx.client_id, ctx.topic)
-                self._raise_cant_publish_error(ctx)
+            if client_id not in self.topic_to_prod.get(topic, []):
+                self.logger.warn('Permision denied. Producer `%s` cannot publish to `%s`', client_id, topic)
+                self._raise_cant_publish_error(topic)
 
-            if not self.topics[ctx.topic].is_active:
-                self.logger.warn('Topic `%s` is not active. Producer `%s`.', ctx.topic, ctx.client_id)
-                self._raise_cant_publish_error(ctx)
+            if not self.topics[topic].is_active:
+                self.logger.warn('Topic `%s` is not active. Producer `%s`.', topic, client_id)
+                self._raise_cant_publish_error(topic)
 
-            if not self.producers[ctx.client_id].is_active:
-                self.logger.warn('Producer `%s` is not active. Producer `%s`.', ctx.client_id, ctx.topic)
-                self._raise_cant_publish_error(ctx)
+            if not self.producers[client_id].is_active:
+                self.logger.warn('Producer `%s` is not active. Producer `%s`.', client_id, topic)
+                self._raise_cant_publish_error(topic)
 
-        if self.get_topic_depth(ctx.topic) >= self.topics[ctx.topic].max_depth:
-            self.logger.warn('Topic full, `%s`, max depth `%s`', ctx.topic, self.topics[ctx.topic].max_depth)
-            raise ItemFull('Topic full', ctx.topic, self.topics[ctx.topic].max_depth)
+            target_queues, max_depths = self._get_target_queues(topic)
 
-        id_key = self.MSG_IDS_PREFIX.format(ctx.topic)
+        # Only messages no one is subscribed to yet are kept in the topic
+        if not target_queues:
+            if self.get_topic_depth(topic) + len(msgs) > self.topics[topic].max_depth:
+                self.logger.warn('Topic full, `%s`, max depth `%s`', topic, self.topics[topic].max_depth)
+                raise ItemFull('Topic full', topic, self.topics[topic].max_depth)
 
-        # Each message will carry information what topic it's intended for
-        ctx.msg.topic = ctx.topic
+        keys = [self.MSG_IDS_PREFIX.format(topic), self.MSG_VALUES_KEY, self.MSG_METADATA_KEY, self.MSG_EXPIRE_AT_KEY,
+            self.LAST_PUB_TIME_KEY, self.LAST_SEEN_PRODUCER_KEY, self.UNACK_COUNTER_KEY, self.OVERFLOWN_KEY] + target_queues
+        common_args = [topic, datetime.utcnow().isoformat(), client_id, len(max_depths)] + max_depths
 
         # The score is built by prefixing the number of milliseconds since UNIX epoch with message's priority. Hence higher
         # priority messages will get higher score whereas messages of equal priority will be still scored according
@@ -546,21 +581,42 @@ class RedisPubSub(PubSub, LuaContainer):
         # in sequences on client side.
 
         now_seconds = datetime_to_seconds(datetime.utcnow())
-        score = '{}{}'.format(ctx.msg.priority, now_seconds)
 
         try:
-            self.run_lua(
-                self.LUA_PUBLISH, [
-                    id_key, self.MSG_VALUES_KEY, self.MSG_METADATA_KEY, self.MSG_EXPIRE_AT_KEY, self.LAST_PUB_TIME_KEY,
-                      self.LAST_SEEN_PRODUCER_KEY],
-                    [score, ctx.msg.msg_id, ctx.msg.expire_at_utc.isoformat(), ctx.msg.payload, ctx.msg.to_json(),
-                       ctx.topic, datetime.utcnow().isoformat(), ctx.client_id])
+            with self.kvdb.pipeline(False) as pipe:
+                for batch_start in xrange(0, len(msgs), PUB_SUB.PUBLISH_BATCH_SIZE):
+                    args = common_args[:]
+
+                    for msg in msgs[batch_start:batch_start + PUB_SUB.PUBLISH_BATCH_SIZE]:
+
+                        # Each message will carry information what topic it's intended for
+                        msg.topic = topic
+
+                        args.append('{}{}'.format(msg.priority, now_seconds))
+                        args.append(msg.msg_id)
+                        args.append(msg.expire_at_utc.isoformat())
+                        args.append(msg.payload)
+                        args.append(msg.to_json())
+
+                    self.run_lua(self.LUA_PUBLISH, keys, args, pipe)
+
+                results = pipe.execute()
+
         except Exception, e:
             self.logger.error('Pub error `%s`', format_exc(e))
             raise
         else:
-            self.logger.info('Published `%s` to `%s`, exp `%s`', ctx.msg.msg_id, ctx.topic, ctx.msg.expire_at_utc.isoformat())
-            return ctx
+            # Overflows are already in Redis, whichever worker runs move_to_target_queues will store them
+            for overflown in results:
+                if overflown:
+                    self.logger.warn('Pub overflow `%s`', overflown)
+
+            if len(msgs) == 1:
+                self.logger.info('Published `%s` to `%s`, exp `%s`', msgs[0].msg_id, topic, msgs[0].expire_at_utc.isoformat())
+            else:
+                self.logger.info('Published `%s` messages to `%s`', len(msgs), topic)
+
+            return msgs
 
 # ################################################################################################################################
 
@@ -579,9 +635,9 @@ class RedisPubSub(PubSub, LuaContainer):
 
 # ################################################################################################################################
 
-    def get(self, ctx):
-        self.logger.debug('Get by sub_key `%s`', ctx.sub_key)
-
+    def _get_messages(self, ctx):
+        """ Returns messages currently in a consumer's queue and puts them in the in-flight state.
+        """
         with self.in_flight_lock:
             with self.update_lock:
 
@@ -600,31 +656,55 @@ class RedisPubSub(PubSub, LuaContainer):
                 cons_in_flight_ids = self.CONSUMER_IN_FLIGHT_IDS_PREFIX.format(ctx.sub_key)
                 cons_in_flight_data = self.CONSUMER_IN_FLIGHT_DATA_PREFIX.format(ctx.sub_key)
 
-                messages = self.run_lua(
+                return self.run_lua(
                     self.LUA_GET_FROM_CONSUMER_QUEUE,
                     [cons_queue, cons_in_flight_ids, cons_in_flight_data, self.LAST_SEEN_CONSUMER_KEY,
-                         self.MSG_METADATA_KEY, self.MSG_VALUES_KEY],
+                         self.MSG_METADATA_KEY, self.MSG_VALUES_KEY, self.CONSUMER_NOTIFY_PREFIX.format(ctx.sub_key)],
                     [ctx.max_batch_size, datetime.utcnow().isoformat(), self.sub_to_cons[ctx.sub_key]])
 
-                self.logger.debug('Get messages `%s`:`%r`', ctx.sub_key, messages)
+    def get(self, ctx):
+        self.logger.debug('Get by sub_key `%s`', ctx.sub_key)
+
+        messages = self._get_messages(ctx)
 
-                for msg in messages:
+        # Nothing in the queue so we block, with no locks held, until a publisher tells us that something has been
+        # delivered or until the timeout is reached.
+        # BRPOP takes whole seconds only and 0 means to block forever so sub-second timeouts are rounded up.
+        if not messages and ctx.timeout:
+            if self.kvdb.brpop(self.CONSUMER_NOTIFY_PREFIX.format(ctx.sub_key), max(1, int(ceil(ctx.timeout)))):
+                messages = self._get_messages(ctx)
 
-                    if self.logger.isEnabledFor(logging.DEBUG):
-                        self.logger.debug('Get result: sub_key `%s`, msg `%s`', ctx.sub_key, msg)
-                    else:
-                        self.logger.info('Get result: sub_key `%s`, metadata `%s`', ctx.sub_key, msg[1])
+        self.logger.debug('Get messages `%s`:`%r`', ctx.sub_key, messages)
 
-                    payload = msg[0][0] if msg[0] else None
-                    metadata = loads(msg[1][0])
+        for msg in messages:
 
-                    if ctx.get_format == PUB_SUB.GET_FORMAT.JSON.id:
-                        yield {'payload': payload, 'metadata':metadata}
-                    else:
-                        yield Message(payload=payload, **metadata)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug('Get result: sub_key `%s`, msg `%s`', ctx.sub_key, msg)
+            else:
+                self.logger.info('Get result: sub_key `%s`, metadata `%s`', ctx.sub_key, msg[1])
+
+            payload = msg[0][0] if msg[0] else None
+            metadata = loads(msg[1][0])
+
+            if ctx.get_format == PUB_SUB.GET_FORMAT.JSON.id:
+                yield {'payload': payload, 'metadata':metadata}
+            else:
+                yield Message(payload=payload, **metadata)
 
 # ################################################################################################################################
 
+    def _run_lua_batches(self, name, keys, args, msg_ids):
+        """ Runs a Lua program for each batch of PUB_SUB.ACK_BATCH_SIZE message IDs, all in one pipeline,
+        so that no program needs to be given an arbitrarily large list of arguments. Returns all the results combined.
+        """
+        msg_ids = list(msg_ids)
+
+        with self.kvdb.pipeline(False) as pipe:
+            for batch_start in xrange(0, len(msg_ids), PUB_SUB.ACK_BATCH_SIZE):
+                self.run_lua(name, keys, args + msg_ids[batch_start:batch_start + PUB_SUB.ACK_BATCH_SIZE], pipe)
+
+            return [msg_id for result in pipe.execute() for msg_id in result]
+
     def acknowledge_delete(self, ctx, is_delete=False):
         """ Consumer confirms and accepts one or more message.
         """
@@ -635,16 +715,20 @@ class RedisPubSub(PubSub, LuaContainer):
         cons_in_flight_data = self.CONSUMER_IN_FLIGHT_DATA_PREFIX.format(ctx.sub_key)
         cons_queue = self.CONSUMER_MSG_IDS_PREFIX.format(ctx.sub_key)
 
-        result = self.run_lua(
-            self.LUA_ACK_DELETE,
-            keys=[
-                cons_in_flight_ids, cons_in_flight_data, self.UNACK_COUNTER_KEY, self.MSG_VALUES_KEY, 
+        result = self._run_lua_batches(
+            self.LUA_ACK_DELETE, [
+                cons_in_flight_ids, cons_in_flight_data, self.UNACK_COUNTER_KEY, self.MSG_VALUES_KEY,
                 self.MSG_EXPIRE_AT_KEY, self.MSG_METADATA_KEY, cons_queue],
-            args=[int(is_delete)] + ctx.msg_ids) 
+            [int(is_delete)], ctx.msg_ids)
 
-        self.logger.info(
-            '%s: result `%s` for sub_key `%s` with msgs `%s`',
-              'Del from queue' if is_delete else 'Ack', result, ctx.sub_key, ', '.join(ctx.msg_ids))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                '%s: result `%s` for sub_key `%s` with msgs `%s`',
+                  'Del from queue' if is_delete else 'Ack', result, ctx.sub_key, ', '.join(ctx.msg_ids))
+        else:
+            self.logger.info(
+                '%s: `%s` out of `%s` msgs for sub_key `%s`',
+                'Del from queue' if is_delete else 'Ack', len(result), len(ctx.msg_ids), ctx.sub_key)
 
         return result
 
@@ -662,7 +746,7 @@ class RedisPubSub(PubSub, LuaContainer):
         cons_in_flight_ids = self.CONSUMER_IN_FLIGHT_IDS_PREFIX.format(ctx.sub_key)
         cons_in_flight_data = self.CONSUMER_IN_FLIGHT_DATA_PREFIX.format(ctx.sub_key)
 
-        result = self.run_lua(self.LUA_REJECT, keys=[cons_queue, cons_in_flight_ids, cons_in_flight_data], args=ctx.msg_ids) 
+        result = self._run_lua_batches(self.LUA_REJECT, [cons_queue, cons_in_flight_ids, cons_in_flight_data], [], ctx.msg_ids)
 
         if self.logger.isEnabledFor(logging.DEBUG):
             self.logger.info(
@@ -702,7 +786,9 @@ class RedisPubSub(PubSub, LuaContainer):
 # ############################################################################################################################
 
     def move_to_target_queues(self):
-        """ Invoked periodically in order to fetch data sent to a topic and move it to each consumer's queue.
+        """ Invoked periodically in order to move messages published before anyone subscribed to their topics
+        to each consumer's queue. Also returns information on messages that overflew consumer queues
+        when they were being published.
         """
         # TODO: We currently deliver messages to each consumer. However, we also need to support 
         # the delivery to only one consumer chosen randomly from each of the subscribed ones.
@@ -711,12 +797,24 @@ class RedisPubSub(PubSub, LuaContainer):
 
             out = []
 
-            for topic in self.topic_to_prod:
+            # Messages are delivered to consumers as soon as they are published so most topics will be empty
+            # and there is no need to run any Lua programs for them.
+            topics = [topic for topic in self.topic_to_prod if topic in self.topic_to_cons]
+
+            with self.kvdb.pipeline() as pipe:
+                for topic in topics:
+                    pipe.zcard(self.MSG_IDS_PREFIX.format(topic))
+                depths = pipe.execute()
+
+            for topic, depth in zip(topics, depths):
+
+                if not depth:
+                    continue
 
                 source_queue = self.MSG_IDS_PREFIX.format(topic)
                 topic_info = self.topics[topic]
 
-                # There are as many keys as there are arguments - items on idx 3 and above are related and come in pairs.
+                # Items on idx 3 and above are related and come in pairs - consumer queues and their notification lists.
 
                 # Keys the Lua program will operate on
                 keys = []
@@ -730,14 +828,10 @@ class RedisPubSub(PubSub, LuaContainer):
                 args.append(topic_info.max_depth)
                 args.append(maxint)
 
-                consumers = self.topic_to_cons.get(topic, [])
-                if consumers:
-                    for consumer in consumers:
-                        sub_key = self.cons_to_sub[consumer]
-                        self.logger.debug('Move: Found sub `%s` for topic `%s` by consumer `%s`', sub_key, topic, consumer)
-
-                        keys.append(self.CONSUMER_MSG_IDS_PREFIX.format(sub_key))
-                        args.append(self.consumers[consumer].max_depth)
+                target_queues, max_depths = self._get_target_queues(topic)
+                if target_queues:
+                    keys.extend(target_queues)
+                    args.extend(max_depths)
 
                     move_result = self.run_lua(self.LUA_MOVE_TO_TARGET_QUEUES, keys, args)
                     if move_result:
@@ -745,7 +839,16 @@ class RedisPubSub(PubSub, LuaContainer):
                         out.append(move_result)
 
                 else:
-                    self.logger.info('Move: no consumers for topic `%s`', topic)
+                    self.logger.info('Move: no subscriptions for topic `%s`', topic)
+
+            # Overflows that happened during publication, in this or any other worker
+            with self.kvdb.pipeline() as pipe:
+                pipe.lrange(self.OVERFLOWN_KEY, 0, -1)
+                pipe.delete(self.OVERFLOWN_KEY)
+                overflown, _ = pipe.execute()
+
+            if overflown:
+                out.append([loads(item) for item in overflown])
 
             return out
 
@@ -889,6 +992,23 @@ class PubSubAPI(object):
 
         return self.impl.publish(ctx)
 
+    def publish_many(self, payloads, topic, mime_type=None, priority=None, expiration=None, client_id=None):
+        """ Publishes a list of messages, one for each of the payloads given, to a given topic. All the messages share
+        the same parameters. Returns a list of the messages published.
+        """
+        client_id = client_id or self.get_default_producer().id
+        producer_name = self.impl.producers[client_id].name
+
+        mime_type = mime_type or PUB_SUB.DEFAULT_MIME_TYPE
+        priority = priority or PUB_SUB.DEFAULT_PRIORITY
+        expiration = expiration or PUB_SUB.DEFAULT_EXPIRATION
+        creation_time_utc = datetime.utcnow()
+
+        messages = [Message(payload, topic, mime_type, priority, expiration, None, producer_name, creation_time_utc)
+            for payload in payloads]
+
+        return self.impl.publish_many(client_id, topic, messages)
+
     def subscribe(self, client_id, topics, sub_key=None):
         """ Subscribes a client to one or more topic. Returns a subscription key assigned.
         """
@@ -906,10 +1026,11 @@ class PubSubAPI(object):
         return self.impl.subscribe(ctx, sub_key)
 
     def get(self, sub_key, max_batch_size=PUB_SUB.DEFAULT_GET_MAX_BATCH_SIZE, is_fifo=PUB_SUB.DEFAULT_IS_FIFO,
-            get_format=PUB_SUB.GET_FORMAT.DEFAULT.id):
-        """ Gets one or more message, if any are available, for the given subscription key.
+            get_format=PUB_SUB.GET_FORMAT.DEFAULT.id, timeout=PUB_SUB.DEFAULT_GET_TIMEOUT):
+        """ Gets one or more message, if any are available, for the given subscription key. If there are none,
+        waits up to timeout seconds for any to be published.
         """
-        return self.impl.get(GetCtx(sub_key, max_batch_size, is_fifo, get_format))
+        return self.impl.get(GetCtx(sub_key, max_batch_size, is_fifo, get_format, timeout))
 
     def acknowledge(self, sub_key, msg_ids):
         """ Acknowledges one or more message IDs for a given subscription key.
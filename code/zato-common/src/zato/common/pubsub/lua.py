@@ -16,41 +16,93 @@ lua_publish = """
    local msg_expire_at = KEYS[4]
    local last_pub_time_key = KEYS[5]
    local last_seen_producer_key = KEYS[6]
+   local unack_counter = KEYS[7]
+   local overflown_key = KEYS[8]
+
+   local topic_name = ARGV[1]
+   local utc_now = ARGV[2]
+   local client_id = ARGV[3]
+   local consumer_count = tonumber(ARGV[4])
+
+   local out = {}
+   local consumers = {}
+
+   -- Keys on idx 9 and above come in pairs - a consumer's queue and a list its blocked readers wait on,
+   -- arguments on idx 5 and above are max. depths of these queues. Depths of the queues are read once for the whole batch.
+   for idx = 1, consumer_count do
+       local cons_queue = KEYS[7 + idx * 2]
+       table.insert(consumers, {
+           queue = cons_queue,
+           notify = KEYS[8 + idx * 2],
+           max_depth = tonumber(ARGV[4 + idx]),
+           depth = redis.call('llen', cons_queue),
+           has_new = false
+       })
+   end
+
+   -- Each message is described by five arguments following max. depths of consumer queues
+   for msg_idx = 5 + consumer_count, #ARGV, 5 do
+
+       local score = ARGV[msg_idx]
+       local msg_id = ARGV[msg_idx+1]
+       local expire_at = ARGV[msg_idx+2]
+       local msg_value = ARGV[msg_idx+3]
+       local msg_metadata = ARGV[msg_idx+4]
+
+       -- Nobody is subscribed to the topic yet so the message waits in it until move_to_target_queues
+       -- hands it over to consumers that subscribe later on.
+       if consumer_count == 0 then
+           redis.pcall('zadd', id_key, score, msg_id)
+       else
+           for cons_idx, consumer in ipairs(consumers) do
+               if consumer.depth >= consumer.max_depth then
+                   -- Overflows are kept in Redis until move_to_target_queues, which runs in one worker only, picks them up
+                   local overflown = {'overflow', consumer.queue, msg_id}
+                   redis.pcall('rpush', overflown_key, cjson.encode(overflown))
+                   table.insert(out, overflown)
+               else
+                   redis.call('lpush', consumer.queue, msg_id)
+                   redis.pcall('hincrby', unack_counter, msg_id, 1)
+                   consumer.depth = consumer.depth + 1
+                   consumer.has_new = true
+               end
+           end
+       end
+
+       redis.pcall('hset', msg_values, msg_id, msg_value)
+       redis.pcall('hset', msg_metadata_key, msg_id, msg_metadata)
+       redis.pcall('hset', msg_expire_at, msg_id, expire_at)
+   end
+
+   -- A single token is enough to wake up a reader, it will fetch everything that is in the queue.
+   for cons_idx, consumer in ipairs(consumers) do
+       if consumer.has_new then
+           redis.pcall('lpush', consumer.notify, '1')
+           redis.pcall('ltrim', consumer.notify, 0, 0)
+       end
+   end
 
-   local score = ARGV[1]
-   local msg_id = ARGV[2]
-   local expire_at = ARGV[3]
-   local msg_value = ARGV[4]
-   local msg_metadata = ARGV[5]
-   local topic_name = ARGV[6]
-   local utc_now = ARGV[7]
-   local client_id = ARGV[8]
-
-   redis.pcall('zadd', id_key, score, msg_id)
-   redis.pcall('hset', msg_values, msg_id, msg_value)
-   redis.pcall('hset', msg_metadata_key, msg_id, msg_metadata)
-   redis.pcall('hset', msg_expire_at, msg_id, expire_at)
    redis.pcall('hset', last_pub_time_key, topic_name, utc_now)
    redis.pcall('hset', last_seen_producer_key, client_id, utc_now)
+
+   return out
 """
 
 lua_move_to_target_queues = """
 
-    -- A function to copy Redis keys we operate over to a table which skips the first one, the source queue.
+    -- A function to copy Redis keys we operate over to tables which skip the first few ones, the source queue and counters.
+    -- Keys on idx 4 and above come in pairs - a consumer's queue and a list its blocked readers wait on,
+    -- arguments on idx 4 and above are max. depths of these queues.
     local function get_target_queues(keys, argv)
         local target_queues = {}
+        local notify_queues = {}
         local max_depths = {}
-        if #keys == 4 then
-          target_queues = {keys[4]}
-          max_depths = {argv[4]}
-        else
-            for idx = 1, #keys do
-                -- Note - the whole point is that we're skipping the first few items which are not target queues
-                target_queues[idx] = keys[idx+3]
-                max_depths[idx] = argv[idx+3]
-            end
+        for idx = 4, #keys, 2 do
+            table.insert(max_depths, argv[#target_queues + 4])
+            table.insert(target_queues, keys[idx])
+            table.insert(notify_queues, keys[idx+1])
         end
-        return {target_queues, max_depths}
+        return {target_queues, notify_queues, max_depths}
     end
 
     local source_queue = KEYS[1]
@@ -75,7 +127,8 @@ lua_move_to_target_queues = """
 
     local target_queues_max_depths = get_target_queues(KEYS, ARGV)
     local target_queues = target_queues_max_depths[1]
-    local max_depths = target_queues_max_depths[2]
+    local notify_queues = target_queues_max_depths[2]
+    local max_depths = target_queues_max_depths[3]
 
     for queue_idx, target_queue in ipairs(target_queues) do
 
@@ -92,6 +145,8 @@ lua_move_to_target_queues = """
 
             if can_push_to_target then
                 redis.call('lpush', target_queue, id)
+                redis.pcall('lpush', notify_queues[queue_idx], '1')
+                redis.pcall('ltrim', notify_queues[queue_idx], 0, 0)
                 redis.pcall('hincrby', unack_counter, id, 1)
                 table.insert(out, {'moved', target_queue, id})
             else
@@ -119,9 +174,14 @@ lua_get_from_cons_queue = """
    local utc_now = ARGV[2]
    local client_id = ARGV[3]
 
+   local cons_notify = KEYS[7]
+
    local ids = redis.pcall('lrange', cons_queue, 0, max_batch_size)
    local values = {}
 
+   -- Whatever woke up a reader is consumed now, if anything is left in the queue it will be read the next time around.
+   redis.pcall('del', cons_notify)
+
    redis.pcall('hset', last_seen_consumer_key, client_id, utc_now)
 
     -- It may well be the case that there are no messages for this client
@@ -151,7 +211,11 @@ lua_reject = """
    local ids = ARGV
    local out = {}
 
-   redis.pcall('hdel', cons_in_flight_data, unpack(ids))
+   -- Delete in chunks, unpacking all of ids at once would exceed Lua's stack size for large ARGVs
+   local chunk_size = 500
+   for idx = 1, #ids, chunk_size do
+       redis.pcall('hdel', cons_in_flight_data, unpack(ids, idx, math.min(idx + chunk_size - 1, #ids)))
+   end
 
     for id_idx, id in ipairs(ids) do
         if redis.pcall('srem', cons_in_flight_ids, id) == 1 then
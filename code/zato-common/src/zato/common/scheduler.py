@@ -10,7 +10,9 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import datetime
-from logging import basicConfig, getLogger, DEBUG, INFO
+from heapq import heapify, heappop, heappush
+from itertools import count
+from logging import getLogger, DEBUG
 from traceback import format_exc
 
 # datetime
@@ -19,6 +21,7 @@ from dateutil.rrule import rrule, SECONDLY
 # gevent
 import gevent # Imported directly so it can be mocked out in tests
 from gevent import lock
+from gevent.event import Event
 
 # paodate
 from paodate import Delta
@@ -51,7 +54,9 @@ class Interval(object):
 
 class Job(object):
     def __init__(self, id, name, type, interval, start_time=None, callback=None, cb_kwargs=None, max_repeats=None,
-            on_max_repeats_reached_cb=None, is_active=True, clone_start_time=False, cron_definition=None):
+            on_max_repeats_reached_cb=None, is_active=True, clone_start_time=False, cron_definition=None,
+            misfire_policy=SCHEDULER.MISFIRE_POLICY.DEFAULT, misfire_grace_time=SCHEDULER.DEFAULT_MISFIRE_GRACE_TIME,
+            max_concurrency=SCHEDULER.DEFAULT_MAX_CONCURRENCY):
         self.id = id
         self.name = name
         self.type = type
@@ -62,11 +67,16 @@ class Job(object):
         self.on_max_repeats_reached_cb = on_max_repeats_reached_cb
         self.is_active = is_active
         self.cron_definition = cron_definition
+        self.misfire_policy = misfire_policy
+        self.misfire_grace_time = misfire_grace_time
+        self.max_concurrency = max_concurrency
 
         self.current_run = 0 # Starts over each time scheduler is started
         self.max_repeats_reached = False
         self.max_repeats_reached_at = None
         self.keep_running = True
+        self.in_progress = 0 # How many runs of this job are currently in progress
+        self.misfires = 0 # How many runs were skipped because of self.misfire_policy or self.max_concurrency
 
         if clone_start_time:
             self.start_time = start_time
@@ -78,10 +88,6 @@ class Job(object):
         else:
             self.start_time = self.get_start_time(start_time if start_time is not None else datetime.datetime.utcnow())
 
-        self.wait_sleep_time = 1
-        self.wait_iter_cb = None
-        self.wait_iter_cb_args = ()
-
         # TODO: Add skip_days, skip_hours and skip_dates
 
     def __str__(self):
@@ -95,7 +101,8 @@ class Job(object):
 
     def clone(self):
         return Job(self.id, self.name, self.type, self.interval, self.start_time, self.callback, self.cb_kwargs, self.max_repeats,
-            self.on_max_repeats_reached_cb, self.is_active, True)
+            self.on_max_repeats_reached_cb, self.is_active, True, self.cron_definition, self.misfire_policy,
+            self.misfire_grace_time, self.max_concurrency)
 
     def get_start_time(self, start_time):
         """ Converts initial start time to the time the job should be invoked next.
@@ -193,77 +200,58 @@ class Job(object):
         else:
             raise ValueError('Unsupported job type `{}` ({})'.format(self.type, self.name))
 
-    def main_loop(self):
-
-        if logger.isEnabledFor(DEBUG):
-            logger.debug('Job entering main loop `%s`', self)
-
-        _sleep = gevent.sleep
-        _spawn = gevent.spawn
-
-        while self.keep_running:
-            try:
-                self.current_run += 1
-
-                # Perhaps we've already been executed enough times
-                if self.max_repeats and self.current_run == self.max_repeats:
-                    self.keep_running = False
-                    self.max_repeats_reached = True
-                    self.max_repeats_reached_at = datetime.datetime.utcnow()
-
-                    if self.on_max_repeats_reached_cb:
-                        self.on_max_repeats_reached_cb(self)
-
-                # Invoke callback in a new greenlet so it doesn't block the current one.
-                _spawn(self.callback, **{'ctx':self.get_context()})
-
-            except Exception, e:
-                logger.warn(format_exc(e))
-
-            finally:
-                # Pause the greenlet for however long is needed
-                _sleep(self.get_sleep_time(datetime.datetime.utcnow()))
-
-        if logger.isEnabledFor(DEBUG):
-            logger.debug('Job leaving main loop `%s` after %d iterations', self, self.current_run)
-
-        return True
-
-    def run(self):
-        if logger.isEnabledFor(DEBUG):
-            logger.debug('Job starting `%s`', self)
-
-        _utcnow = datetime.datetime.utcnow
-        _sleep = gevent.sleep
-
-        # If the job has a start time in the future, sleep until it's ready to go.
-        now = _utcnow()
+    def get_next_fire_time(self, fire_time, now):
+        """ Returns the time the job should run at after the one it was due at, fire_time, or None if it should not
+        run anymore. The result is computed off fire_time rather than now so that runs don't drift however late
+        the scheduler is, unless the next run would have been already missed too, in which case all the missed runs
+        are coalesced and the first one still in the future is returned.
+        """
+        if self.type == SCHEDULER.JOB_TYPE.ONE_TIME:
+            return None
 
-        while self.start_time > now:
-            _sleep(self.wait_sleep_time)
+        next_fire_time = fire_time + datetime.timedelta(seconds=self.get_sleep_time(fire_time))
 
-            if self.wait_iter_cb:
-                self.wait_iter_cb(self.start_time, now, *self.wait_iter_cb_args)
+        if next_fire_time <= now:
+            if self.type == SCHEDULER.JOB_TYPE.INTERVAL_BASED:
+                interval = self.interval.in_seconds
+                missed = int((now - fire_time).total_seconds() // interval)
+                next_fire_time = fire_time + datetime.timedelta(seconds=interval * (missed + 1))
 
-            now = _utcnow()
+                # Rounding may have put it right at now
+                if next_fire_time <= now:
+                    next_fire_time += datetime.timedelta(seconds=interval)
+            else:
+                next_fire_time = now + datetime.timedelta(seconds=self.get_sleep_time(now))
 
-        # OK, we're ready
-        self.main_loop()
+        return next_fire_time
 
 # ################################################################################################################################
 
 class Scheduler(object):
+    """ Runs jobs out of a single greenlet. All the jobs are kept in a heap ordered by the time each of them is to run at
+    next so adding, editing and unscheduling a job is O(log n) and the scheduler wakes up only when the earliest job
+    is due, or when a job that is due earlier than any other is added.
+    """
     def __init__(self, on_job_executed_cb=None):
         self.on_job_executed_cb = on_job_executed_cb
         self.jobs = set()
-        self.job_greenlets = {}
         self.keep_running = True
         self.lock = lock.RLock()
-        self.sleep_time = 0.1
+        self.max_sleep_time = SCHEDULER.MAX_SLEEP_TIME
         self.iter_cb = None
         self.iter_cb_args = ()
         self.ready = False
 
+        # A heap of [next_fire_time, seq, job] entries. Entries of jobs unscheduled have their job set to None
+        # and are dropped only once they reach the top of the heap or there are too many of them.
+        self.queue = []
+        self.queue_entries = {} # Job name -> its entry in self.queue
+        self.queue_removed = 0
+        self.queue_seq = count() # Keeps entries with the same next_fire_time in the order they were added in
+
+        # Set each time a job is added to the top of the heap or the scheduler is stopped
+        self.wakeup = Event()
+
     def on_max_repeats_reached(self, job):
         with self.lock:
             job.is_active = False
@@ -307,11 +295,18 @@ class Scheduler(object):
             self.jobs.remove(job)
             found = True
 
-        if job.name in self.job_greenlets:
-            self.job_greenlets[job.name].kill(timeout=2.0)
-            del self.job_greenlets[job.name]
+        entry = self.queue_entries.pop(job.name, None)
+        if entry:
+            entry[-1] = None
+            self.queue_removed += 1
             found = True
 
+            # Don't let the heap grow with entries of jobs that have been unscheduled
+            if self.queue_removed > len(self.queue) // 2:
+                self.queue = [elem for elem in self.queue if elem[-1]]
+                heapify(self.queue)
+                self.queue_removed = 0
+
         return found
 
     def _unschedule_stop(self, job, message):
@@ -360,10 +355,13 @@ class Scheduler(object):
             for job in jobs:
                 self._unschedule_stop(job.clone(), 'stopped')
 
+            self.keep_running = False
+            self.wakeup.set()
+
     def sleep(self, value):
-        """ A method introduced so the class is easier to mock out in tests.
+        """ Sleeps until value seconds pass or until woken up. A method introduced so the class is easier to mock out in tests.
         """
-        gevent.sleep(value)
+        self.wakeup.wait(value)
 
     def execute(self, name):
         """ Executes a job no matter if it's active or not. One-time job are not unscheduled afterwards.
@@ -384,29 +382,130 @@ class Scheduler(object):
         if ctx['type'] == SCHEDULER.JOB_TYPE.ONE_TIME and unschedule_one_time:
             self.unschedule_by_name(ctx['name'])
 
+# ################################################################################################################################
+
+    def _push(self, job, fire_time):
+        """ Adds a job to the heap. Must be called with self.lock held.
+        """
+        # A job of that name may be already in the heap, it needs to be replaced rather than run twice
+        old_entry = self.queue_entries.get(job.name)
+        if old_entry:
+            old_entry[-1] = None
+            self.queue_removed += 1
+
+        entry = [fire_time, next(self.queue_seq), job]
+        self.queue_entries[job.name] = entry
+        heappush(self.queue, entry)
+
+        return entry
+
     def spawn_job(self, job):
-        """ Spawns a job's greenlet. Must be called with self.lock held.
+        """ Schedules a job to run at its start time. Must be called with self.lock held.
         """
         job.callback = self.on_job_executed
         job.on_max_repeats_reached_cb = self.on_max_repeats_reached
-        self.job_greenlets[job.name] = gevent.spawn(job.run)
+
+        # Already run out of max_repeats so there is nothing to schedule
+        if not job.start_time:
+            return
+
+        # The job is the earliest one now so the scheduler needs to recompute how long to sleep for
+        if self._push(job, job.start_time) is self.queue[0]:
+            self.wakeup.set()
+
+    def _invoke(self, job):
+        """ Invokes a job's callback, runs in a greenlet of its own. The context is built here rather than in _run_job
+        so that creating it does not delay other jobs due at the same time.
+        """
+        try:
+            job.callback(ctx=job.get_context())
+        except Exception, e:
+            logger.warn(format_exc(e))
+        finally:
+            job.in_progress -= 1
+
+    def _run_job(self, job, fire_time, now):
+        """ Runs a job that was due at fire_time unless it was due too long ago or too many of its runs are still
+        in progress. Must be called with self.lock held.
+        """
+        if job.misfire_policy == SCHEDULER.MISFIRE_POLICY.SKIP and \
+           (now - fire_time).total_seconds() > job.misfire_grace_time:
+            job.misfires += 1
+            logger.warn('Job `%s` skipped, it was due at `%s` UTC', job.name, fire_time)
+
+        elif job.max_concurrency and job.in_progress >= job.max_concurrency:
+            job.misfires += 1
+            logger.warn('Job `%s` skipped, %s of its runs still in progress', job.name, job.in_progress)
+
+        else:
+            job.current_run += 1
+
+            # Perhaps we've already been executed enough times
+            if job.max_repeats and job.current_run == job.max_repeats:
+                job.keep_running = False
+                job.max_repeats_reached = True
+                job.max_repeats_reached_at = now
+
+                if job.on_max_repeats_reached_cb:
+                    job.on_max_repeats_reached_cb(job)
+
+            # Invoke callback in a new greenlet so it doesn't block the scheduler.
+            job.in_progress += 1
+            gevent.spawn(self._invoke, job)
+
+    def run_due_jobs(self, now):
+        """ Runs all the jobs that are due and schedules their next runs. Returns the number of seconds until
+        the next job is due or None if there are no jobs.
+        """
+        with self.lock:
+            queue = self.queue
+
+            while queue:
+                fire_time, _, job = queue[0]
+
+                # Unscheduled in the meantime
+                if not job:
+                    heappop(queue)
+                    self.queue_removed -= 1
+                    continue
+
+                if fire_time > now:
+                    return (fire_time - now).total_seconds()
+
+                heappop(queue)
+                del self.queue_entries[job.name]
+
+                try:
+                    self._run_job(job, fire_time, now)
+                    next_fire_time = job.get_next_fire_time(fire_time, now) if job.keep_running else None
+                except Exception, e:
+                    logger.warn('Job `%s` could not be run, e:`%s`', job.name, format_exc(e))
+                else:
+                    if next_fire_time:
+                        self._push(job, next_fire_time)
 
     def run(self):
-        _sleep = self.sleep
-        _sleep_time = self.sleep_time
+        _utcnow = datetime.datetime.utcnow
 
         with self.lock:
             for job in sorted(self.jobs):
                 if job.max_repeats_reached:
                     logger.info('Job `%s` already reached max runs count (%s UTC)', job.name, job.max_repeats_reached_at)
-                else:
+                elif job.is_active and job.name not in self.queue_entries:
                     self.spawn_job(job)
 
         # Ok, we're good now.
         self.ready = True
 
         while self.keep_running:
-            _sleep(_sleep_time)
+
+            # Cleared before looking at the heap so that no job added while jobs are being run is missed.
+            self.wakeup.clear()
+
+            sleep_time = self.run_due_jobs(_utcnow())
 
             if self.iter_cb:
                 self.iter_cb(*self.iter_cb_args)
+
+            if self.keep_running:
+                self.sleep(self.max_sleep_time if sleep_time is None else min(sleep_time, self.max_sleep_time))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from math import ceil
+
+# ################################################################################################################################
+
+class Histogram(object):
+    """ A sparse histogram of non-negative integer values, such as service processing times in milliseconds.
+
+    Values up to 999 are kept exactly, larger ones are rounded down to three significant digits, e.g. 12345 is counted
+    as 12300, so percentiles computed out of a histogram are never off by more than 1%. Count, min, max and sum
+    of all values are tracked exactly.
+
+    Histograms can be merged with each other, which yields the same result as if all the values were added
+    to a single one, and serialized to a compact string.
+    """
+    __slots__ = ('buckets', 'count', 'min', 'max', 'sum')
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0
+
+    @staticmethod
+    def get_bucket(value):
+        """ Returns the lower bound of a bucket a given value belongs to.
+        """
+        if value < 1000:
+            return value
+
+        step = 10 ** (len(str(value)) - 3)
+        return value // step * step
+
+    def add(self, value, count=1):
+        value = int(value)
+        bucket = self.get_bucket(value)
+
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """ Adds all values from another histogram to this one.
+        """
+        if not other.count:
+            return
+
+        for bucket, count in other.buckets.iteritems():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+# ################################################################################################################################
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0
+
+    def percentile(self, percentile):
+        """ Returns a value below which a given percentage of all values is, e.g. percentile(99) is the 99th percentile.
+        """
+        if not self.count:
+            return 0
+
+        rank = max(1, int(ceil(self.count * percentile / 100.0)))
+        seen = 0
+
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(max(bucket, self.min), self.max)
+
+        return self.max
+
+    def trimmed_mean(self, upper_limit):
+        """ Returns a mean of all the values not greater than upper_limit.
+        """
+        total, count = 0, 0
+        for bucket, bucket_count in self.buckets.iteritems():
+            if bucket <= upper_limit:
+                total += bucket * bucket_count
+                count += bucket_count
+
+        return total / count if count else 0
+
+# ################################################################################################################################
+
+    def to_string(self):
+        """ Serializes the histogram to a string of comma-separated fields - count, min, max and sum followed by
+        bucket:count pairs.
+        """
+        if not self.count:
+            return ''
+
+        out = [str(self.count), str(self.min), str(self.max), str(self.sum)]
+        out.extend('{}:{}'.format(bucket, count) for bucket, count in sorted(self.buckets.iteritems()))
+
+        return ','.join(out)
+
+    @staticmethod
+    def from_string(value):
+        """ Creates a histogram out of a string produced by to_string.
+        """
+        histogram = Histogram()
+        if not value:
+            return histogram
+
+        fields = value.split(',')
+        histogram.count, histogram.min, histogram.max, histogram.sum = (int(elem) for elem in fields[:4])
+
+        for field in fields[4:]:
+            bucket, count = field.split(':')
+            histogram.buckets[int(bucket)] = int(count)
+
+        return histogram
+
+    def __repr__(self):
+        return '<{} at {} count:{}, min:{}, max:{}, mean:{}>'.format(
+            self.__class__.__name__, hex(id(self)), self.count, self.min, self.max, self.mean)
+
+# ################################################################################################################################
@@ -150,6 +150,9 @@ class FakeKVDB(object):
     def translate(self, *ignored_args, **ignored_kwargs):
         raise NotImplementedError()
 
+    def translate_many(self, *ignored_args, **ignored_kwargs):
+        raise NotImplementedError()
+
 class FakeServices(object):
     def __getitem__(self, ignored):
         return {'slow_threshold': 1234}
@@ -163,6 +166,9 @@ class FakeServiceStore(object):
     def new_instance(self, impl_name):
         return self.impl_name_to_service[impl_name]()
 
+    def release_instance(self, service):
+        pass
+
 class FakeServer(object):
     """ A fake mock server used in test cases.
     """
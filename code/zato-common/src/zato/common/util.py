@@ -1016,7 +1016,7 @@ class StaticConfig(Bunch):
 
 def add_scheduler_jobs(server, spawn=True):
     for(id, name, is_active, job_type, start_date, extra, service_name, _,
-        _, weeks, days, hours, minutes, seconds, repeats, cron_definition)\
+        _, weeks, days, hours, minutes, seconds, repeats, cron_definition, misfire_policy, max_concurrency)\
             in server.odb.get_job_list(server.cluster_id):
 
         if is_active:
@@ -1025,7 +1025,8 @@ def add_scheduler_jobs(server, spawn=True):
                 'extra':extra, 'service':service_name, 'weeks':weeks,
                 'days':days, 'hours':hours, 'minutes':minutes,
                 'seconds':seconds, 'repeats':repeats,
-                'cron_definition':cron_definition})
+                'cron_definition':cron_definition, 'misfire_policy':misfire_policy,
+                'max_concurrency':max_concurrency})
             server.singleton_server.scheduler.create_edit('create', job_data, spawn=spawn)
 
 # ################################################################################################################################
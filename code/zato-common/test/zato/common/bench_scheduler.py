@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Measures how long it takes to schedule, edit and unschedule 100,000 interval-based jobs, how long it takes to dispatch
+# all of them when they are due at once and how late, in relation to the time they were due at, their callbacks are run
+# when each of them is due at a different time.
+#
+# Run it from the zato-common directory: py -m test.zato.common.bench_scheduler
+
+# stdlib
+from datetime import datetime, timedelta
+from time import time
+
+# gevent
+from gevent import sleep, spawn
+
+# Zato
+from zato.common import SCHEDULER
+from zato.common.scheduler import Interval, Job, Scheduler
+from zato.common.stats import Histogram
+
+# ################################################################################################################################
+
+JOBS = 100000
+INTERVAL = 3600 # In seconds, long enough for each job to run once only
+SPREAD = 30 # In seconds, jobs in the lateness test are due within this many seconds ..
+START_DELAY = 10 # .. counting from this many seconds from now, which is enough for all of them to be created first
+
+# ################################################################################################################################
+
+def get_jobs(start_time, spread=0):
+    return [Job(idx, 'job-{}'.format(idx), SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=INTERVAL),
+        start_time + timedelta(seconds=spread * idx / JOBS), clone_start_time=True) for idx in xrange(JOBS)]
+
+def timed(func, *args):
+    start = time()
+    func(*args)
+    return time() - start
+
+def print_per_job(label, total):
+    print('{:<35} {:>8.3f} s total, {:>6.2f} us per job'.format(label, total, total / JOBS * 1000000))
+
+# ################################################################################################################################
+
+def run_crud():
+    scheduler = Scheduler(lambda ctx: None)
+    jobs = get_jobs(datetime.utcnow() + timedelta(seconds=INTERVAL))
+
+    def create():
+        for job in jobs:
+            scheduler.create(job)
+
+    def edit():
+        for job in jobs:
+            scheduler.edit(job)
+
+    def unschedule():
+        for job in list(scheduler.jobs):
+            scheduler.unschedule(job)
+
+    print_per_job('Create', timed(create))
+    print_per_job('Edit', timed(edit))
+    print_per_job('Unschedule', timed(unschedule))
+
+def run_dispatch():
+    scheduler = Scheduler(lambda ctx: None)
+    now = datetime.utcnow()
+
+    for job in get_jobs(now):
+        scheduler.create(job)
+
+    print_per_job('Dispatch, all jobs due at once', timed(scheduler.run_due_jobs, now))
+
+    # Let all the greenlets spawned complete
+    sleep(0)
+
+def run_lateness():
+    histogram = Histogram()
+
+    jobs = get_jobs(datetime.utcnow() + timedelta(seconds=START_DELAY), SPREAD)
+    start_times = dict((job.name, job.start_time) for job in jobs)
+
+    def on_job_executed(ctx):
+        histogram.add((datetime.utcnow() - start_times[ctx['name']]).total_seconds() * 1000000)
+
+    scheduler = Scheduler(on_job_executed)
+    for job in jobs:
+        scheduler.create(job)
+
+    greenlet = spawn(scheduler.run)
+    while histogram.count < JOBS:
+        sleep(0.1)
+
+    scheduler.stop()
+    greenlet.join()
+
+    print('Lateness, jobs due within {} s      p50 {:>9.2f} ms, p99 {:>9.2f} ms, max {:>9.2f} ms'.format(
+        SPREAD, histogram.percentile(50) / 1000, histogram.percentile(99) / 1000, histogram.max / 1000))
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    print('{} interval-based jobs'.format(JOBS))
+
+    run_crud()
+    run_dispatch()
+    run_lateness()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares the publish->get latency of messages pushed to consumer queues as soon as they are published, with consumers
+# blocked waiting for them, against the latency of messages moved to consumer queues by a periodic job, with consumers
+# polling their queues. Many topics with many consumers each are used and messages are published to random topics.
+#
+# Requires a Redis server on localhost, all the keys created are deleted afterwards.
+#
+# Run it from the zato-common directory: py -m test.zato.common.pubsub.bench_delivery
+
+# stdlib
+from datetime import datetime
+from random import choice
+
+# gevent
+from gevent import monkey, sleep, spawn
+from gevent.event import Event
+
+# Redis
+from redis import StrictRedis
+
+# Zato
+from zato.common import PUB_SUB
+from zato.common.pubsub import AckCtx, Client, Consumer, GetCtx, Message, PubCtx, RedisPubSub, Topic
+from zato.common.stats import Histogram
+from zato.common.util import new_cid
+
+# ################################################################################################################################
+
+TOPICS = 50
+CONSUMERS_PER_TOPIC = 10
+MESSAGES = 1000
+PUBLISH_INTERVAL = 0.005 # In seconds
+
+# How often the periodic job moved messages to consumer queues and how often consumers polled them.
+# The job's default interval is 3s, a lower one is used here so the benchmark does not take too long.
+MOVE_INTERVAL = 0.5
+POLL_INTERVAL = 0.1
+
+GET_TIMEOUT = 1 # In seconds
+
+# ################################################################################################################################
+
+class PollingRedisPubSub(RedisPubSub):
+    """ Delivers messages the way it was done before publish pushed them to consumer queues - messages are kept
+    in their topics until move_to_target_queues is called.
+    """
+    is_publishing = False
+
+    def _get_target_queues(self, topic):
+        if self.is_publishing:
+            return [], []
+        return super(PollingRedisPubSub, self)._get_target_queues(topic)
+
+    def publish(self, ctx):
+        self.is_publishing = True
+        try:
+            return super(PollingRedisPubSub, self).publish(ctx)
+        finally:
+            self.is_publishing = False
+
+# ################################################################################################################################
+
+def get_pubsub(class_, kvdb, key_prefix):
+    ps = class_(kvdb, key_prefix)
+    producer = Client('producer', 'producer')
+    sub_keys = []
+
+    for topic_idx in range(TOPICS):
+        topic = Topic('/bench/{}'.format(topic_idx), max_depth=MESSAGES)
+        ps.add_topic(topic)
+        ps.add_producer(producer, topic)
+
+        for consumer_idx in range(CONSUMERS_PER_TOPIC):
+            consumer = Consumer(
+                'consumer-{}-{}'.format(topic_idx, consumer_idx), 'consumer', sub_key=new_cid(), max_depth=MESSAGES)
+            ps.add_consumer(consumer, topic)
+            sub_keys.append(consumer.sub_key)
+
+    return ps, producer, sub_keys
+
+def consume(ps, sub_key, histogram, is_blocking, done):
+    ctx = GetCtx(sub_key, get_format=PUB_SUB.GET_FORMAT.JSON.id, timeout=GET_TIMEOUT if is_blocking else 0)
+
+    while not done.is_set():
+        msg_ids = []
+
+        for msg in ps.get(ctx):
+            created = datetime.strptime(msg['metadata']['creation_time_utc'], '%Y-%m-%dT%H:%M:%S.%f')
+            histogram.add((datetime.utcnow() - created).total_seconds() * 1000000)
+            msg_ids.append(msg['metadata']['msg_id'])
+
+        if msg_ids:
+            ps.acknowledge_delete(AckCtx(sub_key, msg_ids))
+
+        if not is_blocking:
+            sleep(POLL_INTERVAL)
+
+def move(ps, done):
+    while not done.is_set():
+        ps.move_to_target_queues()
+        sleep(MOVE_INTERVAL)
+
+def run_one(class_, kvdb, is_blocking):
+    key_prefix = 'zato:pubsub:bench:{}:'.format(new_cid())
+    ps, producer, sub_keys = get_pubsub(class_, kvdb, key_prefix)
+    topics = list(ps.topics)
+    histogram = Histogram()
+    done = Event()
+
+    greenlets = [spawn(consume, ps, sub_key, histogram, is_blocking, done) for sub_key in sub_keys]
+    if not is_blocking:
+        greenlets.append(spawn(move, ps, done))
+
+    try:
+        for x in range(MESSAGES):
+            ps.publish(PubCtx(producer.id, choice(topics), Message('"bench"')))
+            sleep(PUBLISH_INTERVAL)
+
+        # Let consumers get everything that was published
+        expected = MESSAGES * CONSUMERS_PER_TOPIC
+        while histogram.count < expected:
+            sleep(0.1)
+
+    finally:
+        done.set()
+        for greenlet in greenlets:
+            greenlet.join()
+
+        for key in kvdb.keys('{}*'.format(key_prefix)):
+            kvdb.delete(key)
+
+    return histogram
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    # Sockets must cooperate with greenlets before anything uses them
+    monkey.patch_all()
+
+    kvdb = StrictRedis()
+
+    print('{} topics, {} consumers each, {} messages'.format(TOPICS, CONSUMERS_PER_TOPIC, MESSAGES))
+
+    runs = (
+        ('Periodic move, polling consumers', PollingRedisPubSub, False),
+        ('Push on publish, blocking consumers', RedisPubSub, True),
+    )
+
+    for name, class_, is_blocking in runs:
+        histogram = run_one(class_, kvdb, is_blocking)
+        print('{:<40} p50 {:>9.2f} ms, p99 {:>9.2f} ms, max {:>9.2f} ms'.format(
+            name, histogram.percentile(50) / 1000, histogram.percentile(99) / 1000, histogram.max / 1000))
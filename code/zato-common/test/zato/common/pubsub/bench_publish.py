@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Measures how many small messages per second can be published, and then fetched and acknowledged, when it is done
+# in batches of 1, 100 and 10,000 messages. A batch of 1 is the same as calling publish and acknowledge for each message.
+#
+# Requires a Redis server on localhost, all the keys created are deleted afterwards.
+#
+# Run it from the zato-common directory: py -m test.zato.common.pubsub.bench_publish
+
+# stdlib
+from time import time
+
+# Redis
+from redis import StrictRedis
+
+# Zato
+from zato.common import PUB_SUB
+from zato.common.pubsub import Client, Consumer, PubSubAPI, RedisPubSub, Topic
+from zato.common.util import new_cid
+
+# ################################################################################################################################
+
+MESSAGES = 20000
+BATCH_SIZES = (1, 100, 10000)
+CONSUMERS = 3
+
+# ################################################################################################################################
+
+def get_api(kvdb, key_prefix):
+    api = PubSubAPI(RedisPubSub(kvdb, key_prefix))
+
+    topic = Topic('/bench/publish', max_depth=MESSAGES)
+    api.add_topic(topic)
+
+    producer = Client('producer', 'producer')
+    api.add_producer(producer, topic)
+
+    sub_keys = []
+    for idx in range(CONSUMERS):
+        consumer = Consumer('consumer-{}'.format(idx), 'consumer', sub_key=new_cid(), max_depth=MESSAGES)
+        api.add_consumer(consumer, topic)
+        sub_keys.append(consumer.sub_key)
+
+    return api, topic, producer, sub_keys
+
+def run_one(kvdb, batch_size):
+    key_prefix = 'zato:pubsub:bench:{}:'.format(new_cid())
+    api, topic, producer, sub_keys = get_api(kvdb, key_prefix)
+    payloads = ['{"id":%d}' % idx for idx in range(MESSAGES)]
+
+    try:
+        start = time()
+        for batch_start in range(0, MESSAGES, batch_size):
+            batch = payloads[batch_start:batch_start + batch_size]
+            if batch_size == 1:
+                api.publish(batch[0], topic.name, client_id=producer.id)
+            else:
+                api.publish_many(batch, topic.name, client_id=producer.id)
+        publish_time = time() - start
+
+        start = time()
+        for sub_key in sub_keys:
+            while True:
+                msg_ids = [msg['metadata']['msg_id'] for msg in api.get(sub_key, max_batch_size=batch_size)]
+                if not msg_ids:
+                    break
+                api.acknowledge(sub_key, msg_ids)
+        get_ack_time = time() - start
+
+    finally:
+        for key in kvdb.keys('{}*'.format(key_prefix)):
+            kvdb.delete(key)
+
+    return MESSAGES / publish_time, MESSAGES * CONSUMERS / get_ack_time
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+    kvdb = StrictRedis()
+
+    print('{} messages, {} consumers, up to {} messages per Lua call'.format(
+        MESSAGES, CONSUMERS, PUB_SUB.PUBLISH_BATCH_SIZE))
+
+    for batch_size in BATCH_SIZES:
+        published, got_acked = run_one(kvdb, batch_size)
+        print('Batch size {:>6} - publish {:>9.0f} msg/s, get + ack {:>9.0f} msg/s'.format(batch_size, published, got_acked))
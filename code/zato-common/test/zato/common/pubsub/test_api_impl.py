@@ -13,6 +13,9 @@ from json import loads
 from datetime import datetime
 from unittest import TestCase
 
+# mock
+from mock import patch
+
 # datadiff
 from datadiff.tools import assert_equal
 
@@ -413,6 +416,38 @@ class RedisPubSubTestCase(RedisPubSubCommonTestCase):
         self.api.impl.producers[producer.id].is_active = True
         invoke_publish(payload, topic.name, producer.id)
 
+    def test_publish_many_acknowledge(self):
+        topic = Topic(rand_string())
+        self.api.add_topic(topic)
+
+        # More messages than fit in one Lua call, both when publishing and acknowledging
+        count = PUB_SUB.PUBLISH_BATCH_SIZE + PUB_SUB.ACK_BATCH_SIZE + 1
+
+        client_id, client_name = rand_int(), rand_string()
+        self.api.add_producer(Client(client_id, client_name), topic)
+        self.api.add_consumer(Consumer(client_id, client_name, max_depth=count), topic)
+        sub_key = self.api.subscribe(client_id, topic.name)
+
+        payloads = [rand_string() for x in range(count)]
+
+        msgs = self.api.publish_many(payloads, topic.name, priority=7, client_id=client_id)
+        msg_ids = [msg.msg_id for msg in msgs]
+
+        self.assertEquals([msg.payload for msg in msgs], payloads)
+        self.assertEquals(set(msg.priority for msg in msgs), set([7]))
+        self.assertEquals(len(set(msg_ids)), count)
+
+        # All the messages went straight to the consumer's queue
+        consumer_msg_ids = self.kvdb.lrange(self.api.impl.CONSUMER_MSG_IDS_PREFIX.format(sub_key), 0, -1)
+        self.assertEquals(sorted(consumer_msg_ids), sorted(msg_ids))
+
+        got = list(self.api.get(sub_key, max_batch_size=count, get_format=PUB_SUB.GET_FORMAT.OBJECT.id))
+        self.assertEquals(sorted(msg.payload for msg in got), sorted(payloads))
+
+        self.assertEquals(sorted(self.api.acknowledge(sub_key, msg_ids)), sorted(msg_ids))
+        self.assertEquals(self.kvdb.hgetall(self.api.impl.UNACK_COUNTER_KEY), {})
+        self.assertEquals(self.kvdb.hgetall(self.api.impl.MSG_VALUES_KEY), {})
+
     def test_ping(self):
         response = self.api.impl.ping()
         self.assertIsInstance(response, bool)
@@ -488,6 +523,39 @@ class RedisPubSubTestCase(RedisPubSubCommonTestCase):
 
 # ################################################################################################################################
 
+class GetTimeoutTestCase(TestCase):
+
+    def _get_brpop_timeout(self, timeout):
+
+        class FakeKVDB(object):
+            def __init__(self):
+                self.timeouts = []
+
+            def register_script(self, program):
+                pass
+
+            def brpop(self, key, timeout):
+                self.timeouts.append(timeout)
+
+        kvdb = FakeKVDB()
+        impl = RedisPubSub(kvdb)
+
+        with patch.object(RedisPubSub, '_get_messages', return_value=[]):
+            self.assertEquals(list(impl.get(GetCtx(sub_key=rand_string(), timeout=timeout))), [])
+
+        self.assertEquals(len(kvdb.timeouts), 1)
+        return kvdb.timeouts[0]
+
+    def test_get_sub_second_timeout(self):
+        self.assertEquals(self._get_brpop_timeout(0.5), 1)
+        self.assertEquals(self._get_brpop_timeout(0.01), 1)
+
+    def test_get_fractional_timeout(self):
+        self.assertEquals(self._get_brpop_timeout(1.2), 2)
+        self.assertEquals(self._get_brpop_timeout(3), 3)
+
+# ################################################################################################################################
+
 class CtxObjectsTestCase(TestCase):
 
     def _get_object(self, class_, kwargs=None):
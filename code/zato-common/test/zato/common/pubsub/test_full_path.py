@@ -12,7 +12,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from json import loads
 from logging import getLogger
 from operator import attrgetter
-from time import sleep
+from time import sleep, time
 
 # Arrow
 import arrow
@@ -406,35 +406,30 @@ class RedisPubSubInternalTestCase(RedisPubSubCommonTestCase):
 
         msg_billing2_id = ps.publish(pub_ctx_msg_billing2).msg.msg_id
 
+        # All the topics have subscribers so messages went straight to their queues, with readers notified of them.
+
         keys = self.kvdb.keys('{}*'.format(self.key_prefix))
-        eq_(len(keys), 9)
+        eq_(len(keys), 12)
 
-        expected_keys = [ps.MSG_VALUES_KEY, ps.MSG_EXPIRE_AT_KEY, ps.LAST_PUB_TIME_KEY]
-        for topic in topic_cust_new, topic_cust_update, topic_adsl_new, topic_adsl_update:
-            expected_keys.append(ps.MSG_IDS_PREFIX.format(topic.name))
+        expected_keys = [ps.MSG_VALUES_KEY, ps.MSG_EXPIRE_AT_KEY, ps.LAST_PUB_TIME_KEY, ps.UNACK_COUNTER_KEY]
+        for sub_key in(sub_key_crm, sub_key_billing, sub_key_erp):
+            expected_keys.append(ps.CONSUMER_MSG_IDS_PREFIX.format(sub_key))
+            expected_keys.append(ps.CONSUMER_NOTIFY_PREFIX.format(sub_key))
 
         for key in expected_keys:
             self.assertIn(key, keys)
 
+        for topic in topic_cust_new, topic_cust_update, topic_adsl_new, topic_adsl_update:
+            self.assertNotIn(ps.MSG_IDS_PREFIX.format(topic.name), keys)
+
         # Check values of messages published
         self._check_msg_values_metadata(ps, msg_crm1_id, msg_crm2_id, msg_billing1_id, msg_billing2_id, True)
 
-        # Now move the messages just published to each of the subscriber's queue.
-        # In a real environment this is done by a background job.
-        ps.move_to_target_queues()
-
-        # Now all the messages have been moved we can check if everything is in place
-        # ready for subscribers to get their messages.
+        # There is nothing left to move by the background job.
+        eq_(ps.move_to_target_queues(), [])
 
         keys = self.kvdb.keys('{}*'.format(self.key_prefix))
-        eq_(len(keys), 9)
-
-        self.assertIn(ps.UNACK_COUNTER_KEY, keys)
-        self.assertIn(ps.MSG_VALUES_KEY, keys)
-
-        for sub_key in(sub_key_crm, sub_key_billing, sub_key_erp):
-            key = ps.CONSUMER_MSG_IDS_PREFIX.format(sub_key)
-            self.assertIn(key, keys)
+        eq_(len(keys), 12)
 
         self._check_unack_counter(ps, msg_crm1_id, msg_crm2_id, msg_billing1_id, msg_billing2_id, 1, 1, 2, 2)
 
@@ -753,6 +748,119 @@ class RedisPubSubInternalTestCase(RedisPubSubCommonTestCase):
         result = self.kvdb.lrange(ps.CONSUMER_MSG_IDS_PREFIX.format(consumer.sub_key), 0, -1)
         eq_(result, [])
 
+# ######################################################################################################################
+
+    def _get_publish_ctx(self, ps, consumer_max_depth=PUB_SUB.DEFAULT_MAX_BACKLOG, sub_key=None):
+
+        topic = Topic('/test/push')
+        ps.add_topic(topic)
+
+        producer = Client('Producer', 'producer')
+        ps.add_producer(producer, topic)
+
+        consumer = Consumer('Consumer', 'consumer', sub_key=sub_key or new_cid(), max_depth=consumer_max_depth)
+        ps.add_consumer(consumer, topic)
+
+        def publish():
+            pub_ctx = PubCtx()
+            pub_ctx.client_id = producer.id
+            pub_ctx.topic = topic.name
+            pub_ctx.msg = Message('"msg_value"')
+
+            return ps.publish(pub_ctx).msg.msg_id
+
+        return consumer, publish
+
+    def test_get_timeout(self):
+        """ Tests that readers wait for messages if there are none and that they are notified of new ones.
+        """
+        if not self.has_redis:
+            return
+
+        ps = RedisPubSub(self.kvdb, self.key_prefix)
+        consumer, publish = self._get_publish_ctx(ps)
+        notify_key = ps.CONSUMER_NOTIFY_PREFIX.format(consumer.sub_key)
+
+        # Nothing has been published yet so the reader waits until the timeout is reached
+        start = time()
+        eq_(list(ps.get(GetCtx(consumer.sub_key, timeout=1))), [])
+        self.assertTrue(time() - start >= 1)
+
+        # Two messages published but there is always one notification only
+        msg_id1 = publish()
+        msg_id2 = publish()
+        eq_(self.kvdb.lrange(notify_key, 0, -1), ['1'])
+
+        # Messages are already there so the reader does not wait, the notification is consumed
+        start = time()
+        msgs = list(ps.get(GetCtx(consumer.sub_key, timeout=1)))
+        self.assertTrue(time() - start < 1)
+
+        eq_(sorted(msg.msg_id for msg in msgs), sorted([msg_id1, msg_id2]))
+        eq_(self.kvdb.exists(notify_key), False)
+
+    def test_publish_overflow(self):
+        """ Tests that messages not fitting in a consumer's queue are reported by move_to_target_queues.
+        """
+        if not self.has_redis:
+            return
+
+        ps = RedisPubSub(self.kvdb, self.key_prefix)
+        consumer, publish = self._get_publish_ctx(ps, 1)
+        cons_queue = ps.CONSUMER_MSG_IDS_PREFIX.format(consumer.sub_key)
+
+        msg_id1 = publish()
+        msg_id2 = publish()
+
+        eq_(self.kvdb.lrange(cons_queue, 0, -1), [msg_id1])
+        eq_(ps.move_to_target_queues(), [[[PUB_SUB.MOVE_RESULT.OVERFLOW, cons_queue, msg_id2]]])
+
+        # Reported once only
+        eq_(ps.move_to_target_queues(), [])
+
+    def test_publish_overflow_other_worker(self):
+        """ Tests that overflows in workers other than the one running move_to_target_queues are reported by it.
+        """
+        if not self.has_redis:
+            return
+
+        ps1 = RedisPubSub(self.kvdb, self.key_prefix)
+        ps2 = RedisPubSub(self.kvdb, self.key_prefix)
+
+        consumer, _ = self._get_publish_ctx(ps1, 1)
+        _, publish = self._get_publish_ctx(ps2, 1, consumer.sub_key)
+        cons_queue = ps1.CONSUMER_MSG_IDS_PREFIX.format(consumer.sub_key)
+
+        msg_id1 = publish()
+        msg_id2 = publish()
+        msg_id3 = publish()
+
+        eq_(self.kvdb.lrange(cons_queue, 0, -1), [msg_id1])
+        eq_(ps1.move_to_target_queues(), [[
+            [PUB_SUB.MOVE_RESULT.OVERFLOW, cons_queue, msg_id2],
+            [PUB_SUB.MOVE_RESULT.OVERFLOW, cons_queue, msg_id3]]])
+
+        # Nothing is kept in the worker that published the messages
+        eq_(ps2.move_to_target_queues(), [])
+        eq_(self.kvdb.exists(ps1.OVERFLOWN_KEY), False)
+
+    def test_publish_consumer_without_sub_key(self):
+        """ Tests that messages are queued for consumers added without a sub_key too.
+        """
+        if not self.has_redis:
+            return
+
+        ps = RedisPubSub(self.kvdb, self.key_prefix)
+        consumer, publish = self._get_publish_ctx(ps)
+
+        no_sub_key = Consumer('Consumer2', 'consumer2')
+        ps.add_consumer(no_sub_key, Topic('/test/push'))
+
+        msg_id = publish()
+
+        eq_(self.kvdb.lrange(ps.CONSUMER_MSG_IDS_PREFIX.format(consumer.sub_key), 0, -1), [msg_id])
+        eq_(self.kvdb.lrange(ps.CONSUMER_MSG_IDS_PREFIX.format(no_sub_key.sub_key), 0, -1), [msg_id])
+
 # ######################################################################################################################
 
     def test_get_callback_consumers(self):
@@ -18,6 +18,7 @@ from bunch import Bunch
 from nose.tools import eq_
 
 # Zato
+from zato.common import KVDB as _KVDB
 from zato.common.kvdb import KVDB
 from zato.common.test import rand_string, rand_int
 
@@ -94,4 +95,106 @@ class KVDBTestCase(TestCase):
         kvdb = FakeKVDB(config=config, decrypt_func=decrypt_func)
         kvdb.init()
 
-        self.assertTrue(isinstance(kvdb.conn, FakeStrictRedis))
\ No newline at end of file
+        self.assertTrue(isinstance(kvdb.conn, FakeStrictRedis))
+
+# ##############################################################################
+
+class FakePipeline(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignored):
+        pass
+
+    def hgetall(self, key):
+        self.commands.append(key)
+
+    def execute(self):
+        self.conn.pipelines += 1
+        return [self.conn.data[key] for key in self.commands]
+
+class FakeRedis(object):
+    """ Stores translations and returns their keys from SCAN two at a time, repeating one of them as Redis may do.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.scans = 0
+        self.pipelines = 0
+
+    def scan(self, cursor, match, count):
+        self.scans += 1
+        keys = sorted(self.data)
+        cursor = int(cursor)
+        next_cursor = cursor + 2 if cursor + 2 < len(keys) else 0
+
+        return str(next_cursor), keys[max(cursor - 1, 0):cursor + 2]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+class TranslateTestCase(TestCase):
+
+    def get_kvdb(self):
+        data = {}
+        for idx in range(5):
+            name = _KVDB.SEPARATOR.join((_KVDB.TRANSLATION, 'sys1', 'key1', 'value{}'.format(idx), 'sys2', 'key2'))
+            data[name] = {'id':str(idx), 'value2':'translated{}'.format(idx)}
+
+        return KVDB(FakeRedis(data))
+
+    def test_get_translations(self):
+        kvdb = self.get_kvdb()
+        translations = list(kvdb.get_translations())
+
+        eq_(sorted(translations), sorted(kvdb.conn.data.items()))
+        eq_(kvdb.conn.scans, 3)
+        eq_(kvdb.conn.pipelines, 3)
+
+    def test_translate(self):
+        kvdb = self.get_kvdb()
+
+        eq_(kvdb.translate('sys1', 'key1', 'value1', 'sys2', 'key2'), 'translated1')
+        eq_(kvdb.translate('sys1', 'key1', 'value3', 'sys2', 'key2'), 'translated3')
+        eq_(kvdb.translate('sys1', 'key1', 'value9', 'sys2', 'key2'), '')
+        eq_(kvdb.translate('sys1', 'key1', 'value9', 'sys2', 'key2', 'abc'), 'abc')
+
+        # All the translations were loaded at once, the first time they were needed
+        eq_(kvdb.conn.scans, 3)
+
+        eq_(kvdb.translations.hits, 2)
+        eq_(kvdb.translations.misses, 2)
+
+    def test_translate_many(self):
+        kvdb = self.get_kvdb()
+
+        items = [('sys1', 'key1', 'value{}'.format(idx), 'sys2', 'key2') for idx in (4, 0, 7)]
+        eq_(kvdb.translate_many(items, 'zzz'), ['translated4', 'translated0', 'zzz'])
+
+        eq_(kvdb.translations.hits, 2)
+        eq_(kvdb.translations.misses, 1)
+
+    def test_translate_non_ascii(self):
+        # Keys come from Redis encoded to UTF-8
+        name = _KVDB.SEPARATOR.join((_KVDB.TRANSLATION, 'sys1', 'city', 'Zürich', 'sys2', 'code'))
+        kvdb = KVDB(FakeRedis({name.encode('utf-8'): {'id':'1', 'value2':'ZRH'}}))
+
+        eq_(kvdb.translate('sys1', 'city', 'Zürich', 'sys2', 'code', 'DEFAULT'), 'ZRH')
+        eq_(kvdb.translate_many([('sys1', 'city', 'Zürich', 'sys2', 'code')], 'DEFAULT'), ['ZRH'])
+        eq_(kvdb.translate('sys1', 'city', 'Zurich', 'sys2', 'code', 'DEFAULT'), 'DEFAULT')
+
+    def test_reload(self):
+        kvdb = self.get_kvdb()
+        kvdb.translations.load()
+
+        name = _KVDB.SEPARATOR.join((_KVDB.TRANSLATION, 'sys1', 'key1', 'value1', 'sys2', 'key2'))
+        kvdb.conn.data[name]['value2'] = 'changed'
+
+        # Changes are not seen until translations are reloaded
+        eq_(kvdb.translate('sys1', 'key1', 'value1', 'sys2', 'key2'), 'translated1')
+
+        kvdb.translations.load()
+        eq_(kvdb.translate('sys1', 'key1', 'value1', 'sys2', 'key2'), 'changed')
@@ -10,6 +10,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 from datetime import datetime, timedelta
+from heapq import heappop
 from random import choice, seed
 from unittest import TestCase
 
@@ -20,7 +21,7 @@ from crontab import CronTab
 from dateutil.parser import parse
 
 # gevent
-from gevent import sleep, spawn
+from gevent import sleep
 
 # mock
 from mock import patch
@@ -204,143 +205,71 @@ class JobTestCase(TestCase):
 
             self.assertDictEqual(ctx, expected)
 
-    def test_main_loop_keep_running_false(self):
+    def test_run_due_jobs_max_repeats_reached(self):
 
-        job = get_job()
-        job.keep_running = False
-
-        self.assertTrue(job.main_loop())
-        self.assertFalse(job.keep_running)
-        self.assertFalse(job.max_repeats_reached)
-
-        self.assertEquals(job.current_run, 0)
-
-    def test_main_loop_max_repeats_reached(self):
-
-        runs_ctx = []
+        spawn_history = []
 
-        def callback(ctx):
-            runs_ctx.append(ctx)
+        def spawn(func, job):
+            spawn_history.append(job.get_context())
 
         cb_kwargs = {
             rand_string():rand_string(),
             rand_string():rand_string()
         }
 
-        interval_in_seconds = 0.01
+        interval_in_seconds = 5
         max_repeats = choice(range(2, 5))
+        start_time = parse('2019-12-23 22:19:03')
 
         job = get_job(interval_in_seconds=interval_in_seconds, max_repeats=max_repeats)
-        job.callback = callback
         job.cb_kwargs = cb_kwargs
+        job.start_time = start_time
+
+        scheduler = Scheduler(dummy_callback)
+        scheduler.create(job)
 
-        self.assertTrue(job.main_loop())
-        sleep(0.2)
+        with patch('gevent.spawn', spawn):
+            for idx in range(max_repeats + 2):
+                scheduler.run_due_jobs(start_time + timedelta(seconds=interval_in_seconds * idx))
 
-        len_runs_ctx = len(runs_ctx)
+        len_runs_ctx = len(spawn_history)
         self.assertEquals(len_runs_ctx, max_repeats)
 
         self.assertFalse(job.keep_running)
-        self.assertIs(job.callback, callback)
+        self.assertFalse(scheduler.queue_entries)
+        self.assertIs(job.callback.im_func, scheduler.on_job_executed.im_func)
 
-        for idx, ctx in enumerate(runs_ctx, 1):
+        for idx, ctx in enumerate(spawn_history, 1):
             self.check_ctx(ctx, job, interval_in_seconds, max_repeats, idx, cb_kwargs, len_runs_ctx)
 
-    def test_main_loop_sleep_spawn_called(self):
-
-        wait_time = 0.2
-        sleep_time = rand_int()
-
-        now_values = [parse('2019-12-23 22:19:03'), parse('2021-05-13 17:35:48')]
-
-        sleep_history = []
-        spawn_history = []
-        sleep_time_history = []
-
-        def sleep(value):
-            if value != wait_time:
-                sleep_history.append(value)
-
-        def spawn(*args, **kwargs):
-            spawn_history.append([args, kwargs])
-
-        def get_sleep_time(*args, **kwargs):
-            sleep_time_history.append(args[1])
-            return sleep_time
-
-        with patch('gevent.sleep', sleep):
-            with patch('gevent.spawn', spawn):
-                with patch('zato.common.scheduler.Job.get_sleep_time', get_sleep_time):
-                    for now in now_values:
-                        self.now = now
-                        with patch('zato.common.scheduler.datetime', self._datetime):
-                            for job_type in SCHEDULER.JOB_TYPE.CRON_STYLE, SCHEDULER.JOB_TYPE.INTERVAL_BASED:
-
-                                max_repeats = choice(range(2, 5))
+    def test_get_next_fire_time_interval_based(self):
+        fire_time = parse('2019-12-23 22:19:03.123')
+        job = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=5), fire_time, clone_start_time=True)
 
-                                cb_kwargs = {
-                                    rand_string():rand_string(),
-                                    rand_string():rand_string()
-                                }
+        # On time or a bit late - the next run is always computed off the previous one so there is no drift
+        for now in (fire_time, fire_time + timedelta(seconds=0.3), fire_time + timedelta(seconds=4.9)):
+            self.assertEquals(job.get_next_fire_time(fire_time, now), parse('2019-12-23 22:19:08.123'))
 
-                                interval = Interval(seconds=sleep_time) if job_type == SCHEDULER.JOB_TYPE.INTERVAL_BASED \
-                                    else CronTab(DEFAULT_CRON_DEFINITION)
+        # Several runs missed - they are coalesced into one and the next run is still at a multiple of the interval
+        now = fire_time + timedelta(seconds=17.5)
+        self.assertEquals(job.get_next_fire_time(fire_time, now), parse('2019-12-23 22:19:23.123'))
 
-                                job = Job(rand_int(), rand_string(), job_type, interval, max_repeats=max_repeats)
+        now = fire_time + timedelta(seconds=20)
+        self.assertEquals(job.get_next_fire_time(fire_time, now), parse('2019-12-23 22:19:28.123'))
 
-                                if job.type == SCHEDULER.JOB_TYPE.CRON_STYLE:
-                                    job.cron_definition = DEFAULT_CRON_DEFINITION
+    def test_get_next_fire_time_cron_style(self):
+        fire_time = parse('2019-12-23 22:19:00')
+        job = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.CRON_STYLE, CronTab(DEFAULT_CRON_DEFINITION), fire_time)
 
-                                job.cb_kwargs = cb_kwargs
-                                job.start_time = datetime.utcnow()
-                                job.callback = dummy_callback
+        self.assertEquals(job.get_next_fire_time(fire_time, fire_time), parse('2019-12-23 22:20:00'))
+        self.assertEquals(job.get_next_fire_time(fire_time, parse('2019-12-23 22:19:42')), parse('2019-12-23 22:20:00'))
+        self.assertEquals(job.get_next_fire_time(fire_time, parse('2019-12-23 22:23:42')), parse('2019-12-23 22:24:00'))
 
-                                self.assertTrue(job.main_loop())
-                                sleep(0.2)
+    def test_get_next_fire_time_one_time(self):
+        fire_time = datetime.utcnow()
+        job = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.ONE_TIME, Interval(seconds=5), fire_time)
 
-                                self.assertEquals(max_repeats, len(sleep_history))
-                                self.assertEquals(max_repeats, len(spawn_history))
-
-                                for item in sleep_history:
-                                    self.assertEquals(sleep_time, item)
-
-                                for idx, (callback, ctx_dict) in enumerate(spawn_history, 1):
-                                    self.assertEquals(1, len(callback))
-                                    callback = callback[0]
-                                    self.check_ctx(
-                                        ctx_dict['ctx'], job, sleep_time, max_repeats, idx, cb_kwargs, len(spawn_history), job_type)
-                                    self.assertIs(callback, dummy_callback)
-
-                                del sleep_history[:]
-                                del spawn_history[:]
-
-                            for item in sleep_time_history:
-                                self.assertEquals(item, now)
-
-                            del sleep_time_history[:]
-
-    def test_run(self):
-
-        data = {'main_loop_called':False, 'sleep': False}
-
-        def main_loop():
-            data['main_loop_called'] = True
-
-        def sleep(value):
-            data['sleep'] = value # Should not be executed if start_time is None
-
-        start_time = datetime.utcnow() + timedelta(seconds=1.2)
-
-        with patch('gevent.sleep', sleep):
-
-            job = get_job()
-            job.main_loop = main_loop
-            job.start_time = start_time
-    
-            job.run()
-    
-            self.assertTrue(data['main_loop_called'])
-            self.assertEquals(data['sleep'], 1)
+        self.assertIsNone(job.get_next_fire_time(fire_time, fire_time))
 
     def test_hash_eq(self):
         job1 = get_job(name='a')
@@ -387,38 +316,23 @@ class JobStartTimeTestCase(TestCase):
         expected = parse(expected)
 
         interval = 1 # Days
-        data = {'start_time':[], 'now':[]}
-
-        def wait_iter_cb(start_time, now, *ignored):
-            data['start_time'].append(start_time)
-            data['now'].append(now)
 
         with patch('zato.common.scheduler.datetime', self._datetime):
 
             interval = Interval(days=interval)
             job = Job(rand_int(), rand_string(), SCHEDULER.JOB_TYPE.INTERVAL_BASED, start_time=start_time, interval=interval)
-            job.wait_iter_cb = wait_iter_cb
-            job.wait_sleep_time = 0.1
 
             self.assertEquals(job.start_time, expected)
             self.assertTrue(job.keep_running)
             self.assertFalse(job.max_repeats_reached)
             self.assertIs(job.max_repeats_reached_at, None)
 
-            spawn(job.run)
-            sleep(0.2)
-
-            len_start_time = len(data['start_time'])
-            len_now = len(data['now'])
-
-            self.assertNotEquals(len_start_time, 0)
-            self.assertNotEquals(len_now, 0)
-
-            for item in data['start_time']:
-                self.assertEquals(expected, item)
+            # The job is due at its start time, and then every interval, counting from the start time rather than from now.
+            scheduler = Scheduler(dummy_callback)
+            scheduler.create(job)
 
-            for item in data['now']:
-                self.assertEquals(self.now, item)
+            self.assertEquals(scheduler.run_due_jobs(self.now), (expected - self.now).total_seconds())
+            self.assertEquals(scheduler.queue[0][0], expected)
 
     def test_get_start_time_result_in_future(self):
         self.check_get_start_time('2017-03-20 19:11:37', '2017-03-21 15:11:37', '2017-03-21 19:11:37')
@@ -443,6 +357,14 @@ class JobStartTimeTestCase(TestCase):
 
 class SchedulerTestCase(TestCase):
 
+    def get_scheduler(self, test_wait_time, on_job_executed_cb=dummy_callback):
+        scheduler = Scheduler(on_job_executed_cb)
+        scheduler.max_sleep_time = 0.05
+        scheduler.iter_cb = iter_cb
+        scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
+
+        return scheduler
+
     def test_create(self):
 
         data = {'spawned_jobs': 0}
@@ -450,57 +372,56 @@ class SchedulerTestCase(TestCase):
         def on_job_executed(*ignored):
             pass
 
-        def job_run(*ignored):
-            pass
-
-        def spawn(func):
-            self.assertIs(func, job_run)
-            data['spawned_jobs'] += 1
-
         scheduler = Scheduler(dummy_callback)
         scheduler.on_job_executed = on_job_executed
         scheduler.lock = RLock()
 
-        job1 = get_job()
-        job1.run = job_run
+        _spawn_job = scheduler.spawn_job
 
-        job2 = get_job()
-        job2.run = job_run
+        def spawn_job(job):
+            data['spawned_jobs'] += 1
+            _spawn_job(job)
 
-        job3 = get_job(name=job2.name)
-        job3.run = job_run
+        scheduler.spawn_job = spawn_job
 
+        job1 = get_job()
+        job2 = get_job()
+        job3 = get_job(name=job2.name)
         job4 = get_job()
         job5 = get_job()
 
         job6 = get_job()
         job6.is_active = False
 
-        with patch('gevent.spawn', spawn):
-            scheduler.create(job1)
-            scheduler.create(job2)
+        scheduler.create(job1)
+        scheduler.create(job2)
 
-            # These two won't be added because scheduler.jobs is a set hashed by a job's name.
-            scheduler.create(job2)
-            scheduler.create(job3)
+        # These two won't be added because scheduler.jobs is a set hashed by a job's name.
+        scheduler.create(job2)
+        scheduler.create(job3)
 
-            # The first one won't be spawned but the second one will.
-            scheduler.create(job4, spawn=False)
-            scheduler.create(job5, spawn=True)
+        # The first one won't be spawned but the second one will.
+        scheduler.create(job4, spawn=False)
+        scheduler.create(job5, spawn=True)
 
-            # Won't be added anywhere nor spawned because it's inactive.
-            scheduler.create(job6)
+        # Won't be added anywhere nor spawned because it's inactive.
+        scheduler.create(job6)
 
-            self.assertEquals(scheduler.lock.called, 7)
-            self.assertEquals(len(scheduler.jobs), 5)
+        self.assertEquals(scheduler.lock.called, 7)
+        self.assertEquals(len(scheduler.jobs), 5)
+
+        self.assertIn(job1, scheduler.jobs)
+        self.assertIn(job2, scheduler.jobs)
 
-            self.assertIn(job1, scheduler.jobs)
-            self.assertIn(job2, scheduler.jobs)
+        self.assertIs(job1.callback, scheduler.on_job_executed)
+        self.assertIs(job2.callback, scheduler.on_job_executed)
 
-            self.assertIs(job1.callback, scheduler.on_job_executed)
-            self.assertIs(job2.callback, scheduler.on_job_executed)
+        self.assertEquals(data['spawned_jobs'], 5)
 
-            self.assertEquals(data['spawned_jobs'], 4)
+        # Jobs of the same name replace each other in the queue rather than being scheduled twice
+        self.assertEquals(sorted(scheduler.queue_entries), sorted([job1.name, job2.name, job5.name]))
+        self.assertEquals(len([entry for entry in scheduler.queue if entry[-1]]), 3)
+        self.assertIs(scheduler.queue_entries[job2.name][-1], job3)
 
     def test_run(self):
 
@@ -515,25 +436,17 @@ class SchedulerTestCase(TestCase):
         def spawn_job(job):
             data['jobs'].add(job)
 
-        def job_run(self):
-            pass
-
         job1, job2, job3 = [get_job(str(x)) for x in range(3)]
 
         # Already run out of max_repeats and should not be started
         job4 = Job(rand_int(), rand_string(), SCHEDULER.JOB_TYPE.INTERVAL_BASED, start_time=parse('1997-12-23 21:24:27'),
             interval=Interval(seconds=5), max_repeats=3)
 
-        job1.run = job_run
-        job2.run = job_run
-        job3.run = job_run
-        job4.run = job_run
-
         scheduler = Scheduler(dummy_callback)
         scheduler.spawn_job = spawn_job
         scheduler.lock = RLock()
         scheduler.sleep = _sleep
-        scheduler.sleep_time = sched_sleep_time
+        scheduler.max_sleep_time = sched_sleep_time
         scheduler.iter_cb = iter_cb
         scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
 
@@ -555,21 +468,155 @@ class SchedulerTestCase(TestCase):
 
         self.assertNotIn(job4, data['jobs'])
 
+    def test_run_sleeps_until_next_job(self):
+
+        data = {'sleep': []}
+        now = parse('2019-12-23 22:19:03')
+
+        def _sleep(value):
+            data['sleep'].append(value)
+            scheduler.keep_running = False
+
+        class _datetime(datetime):
+            class datetime:
+                @staticmethod
+                def utcnow():
+                    return now
+
+        job1 = get_job('a', interval_in_seconds=60)
+        job1.start_time = now + timedelta(seconds=3)
+
+        job2 = get_job('b', interval_in_seconds=60)
+        job2.start_time = now + timedelta(seconds=1.5)
+
+        scheduler = Scheduler(dummy_callback)
+        scheduler.sleep = _sleep
+
+        scheduler.create(job1)
+        scheduler.create(job2)
+
+        with patch('zato.common.scheduler.datetime', _datetime):
+            scheduler.run()
+
+        # Woken up only once, when the earliest job is due, rather than polling
+        self.assertEquals(data['sleep'], [1.5])
+
+    def test_spawn_job_wakes_up_scheduler(self):
+
+        scheduler = Scheduler(dummy_callback)
+
+        job1 = get_job('a')
+        job1.start_time = datetime.utcnow() + timedelta(seconds=60)
+
+        job2 = get_job('b')
+        job2.start_time = job1.start_time + timedelta(seconds=60)
+
+        job3 = get_job('c')
+        job3.start_time = job1.start_time + timedelta(seconds=-30)
+
+        scheduler.create(job1)
+        self.assertTrue(scheduler.wakeup.is_set())
+
+        # Not earlier than job1 so there is no need to wake up the scheduler ..
+        scheduler.wakeup.clear()
+        scheduler.create(job2)
+        self.assertFalse(scheduler.wakeup.is_set())
+
+        # .. but this one is.
+        scheduler.create(job3)
+        self.assertTrue(scheduler.wakeup.is_set())
+
+        self.assertEquals([heappop(scheduler.queue)[-1] for x in range(3)], [job3, job1, job2])
+
+    def test_misfire_policy(self):
+
+        data = {'spawned':[]}
+
+        def spawn(func, job):
+            data['spawned'].append(job.name)
+
+        fire_time = parse('2019-12-23 22:19:03')
+        now = fire_time + timedelta(seconds=2)
+
+        job1 = get_job('a', interval_in_seconds=5)
+        job1.start_time = fire_time
+        job1.misfire_policy = SCHEDULER.MISFIRE_POLICY.SKIP
+        job1.misfire_grace_time = 1
+
+        job2 = get_job('b', interval_in_seconds=5)
+        job2.start_time = fire_time
+        job2.misfire_policy = SCHEDULER.MISFIRE_POLICY.SKIP
+        job2.misfire_grace_time = 3
+
+        job3 = get_job('c', interval_in_seconds=5)
+        job3.start_time = fire_time
+        job3.misfire_policy = SCHEDULER.MISFIRE_POLICY.RUN_ONCE
+
+        scheduler = Scheduler(dummy_callback)
+        for job in job1, job2, job3:
+            scheduler.create(job)
+
+        with patch('gevent.spawn', spawn):
+            scheduler.run_due_jobs(now)
+
+        self.assertEquals(sorted(data['spawned']), ['b', 'c'])
+
+        self.assertEquals(job1.misfires, 1)
+        self.assertEquals(job1.current_run, 0)
+
+        for job in job2, job3:
+            self.assertEquals(job.misfires, 0)
+            self.assertEquals(job.current_run, 1)
+
+        # All of them are still scheduled to run at the next interval
+        for job in job1, job2, job3:
+            self.assertEquals(scheduler.queue_entries[job.name][0], fire_time + timedelta(seconds=5))
+
+    def test_max_concurrency(self):
+
+        data = {'spawned':0}
+
+        # Runs never complete here so job.in_progress is never decremented
+        def spawn(func, job):
+            data['spawned'] += 1
+
+        fire_time = parse('2019-12-23 22:19:03')
+
+        job = get_job('a', interval_in_seconds=1)
+        job.start_time = fire_time
+        job.max_concurrency = 2
+
+        scheduler = Scheduler(dummy_callback)
+        scheduler.create(job)
+
+        with patch('gevent.spawn', spawn):
+            for idx in range(5):
+                scheduler.run_due_jobs(fire_time + timedelta(seconds=idx))
+
+        self.assertEquals(data['spawned'], 2)
+        self.assertEquals(job.in_progress, 2)
+        self.assertEquals(job.misfires, 3)
+
+        # Once runs complete new ones can be started again
+        job.in_progress = 0
+        with patch('gevent.spawn', spawn):
+            scheduler.run_due_jobs(fire_time + timedelta(seconds=5))
+
+        self.assertEquals(data['spawned'], 3)
+
     def test_on_max_repeats_reached(self):
 
         test_wait_time = 0.5
-        job_sleep_time = 0.02
         job_max_repeats = 3
 
         data = {'job':None, 'called':0}
 
         job = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-        job.wait_sleep_time = job_sleep_time
 
         # Just to make sure it's inactive by default.
         self.assertTrue(job.is_active)
 
-        scheduler = Scheduler(dummy_callback)
+        scheduler = self.get_scheduler(test_wait_time)
         data['old_on_max_repeats_reached'] = scheduler.on_max_repeats_reached
 
         def on_max_repeats_reached(job):
@@ -578,8 +625,6 @@ class SchedulerTestCase(TestCase):
             data['old_on_max_repeats_reached'](job)
 
         scheduler.on_max_repeats_reached = on_max_repeats_reached
-        scheduler.iter_cb = iter_cb
-        scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
 
         scheduler.create(job)
         scheduler.run()
@@ -599,93 +644,81 @@ class SchedulerTestCase(TestCase):
 
     def test_delete(self):
         test_wait_time = 0.5
-        job_sleep_time = 10
         job_max_repeats = 30
 
-        job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-        job1.wait_sleep_time = job_sleep_time
+        job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=10), max_repeats=job_max_repeats)
+        job2 = Job(rand_int(), 'b', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=10), max_repeats=job_max_repeats)
 
-        job2 = Job(rand_int(), 'b', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-        job2.wait_sleep_time = job_sleep_time
-
-        scheduler = Scheduler(dummy_callback)
+        scheduler = self.get_scheduler(test_wait_time)
         scheduler.lock = RLock()
-        scheduler.iter_cb = iter_cb
-        scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
 
         scheduler.create(job1)
         scheduler.create(job2)
         scheduler.run()
 
+        lock_called = scheduler.lock.called
         scheduler.unschedule(job1)
 
         self.assertIn(job2, scheduler.jobs)
         self.assertNotIn(job1, scheduler.jobs)
         self.assertFalse(job1.keep_running)
 
-        # run - 1
-        # create - 2
-        # delete - 1
-        # on_max_repeats_reached - 0 (because of how long it takes to run job_max_repeats with test_wait_time)
-        # 1+2+1 = 4
-        self.assertEquals(scheduler.lock.called, 4)
+        self.assertEquals(scheduler.lock.called, lock_called + 1)
 
-    def test_job_greenlets(self):
+    def test_queue_entries(self):
 
-        data = {'spawned':[], 'stopped': []}
+        test_wait_time = 0.2
+        job_max_repeats = 30
 
-        class FakeGreenlet(object):
-            def __init__(self, run):
-                self.run = self._run = run
+        job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=10), max_repeats=job_max_repeats)
+        job2 = Job(rand_int(), 'b', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=10), max_repeats=job_max_repeats)
 
-            def kill(self, *args, **kwargs):
-                data['stopped'].append([self, args, kwargs])
+        scheduler = self.get_scheduler(test_wait_time)
 
-        def spawn(job):
-            g = FakeGreenlet(job)
-            data['spawned'].append(g)
-            return g
+        scheduler.create(job1, spawn=False)
+        scheduler.create(job2, spawn=False)
+        scheduler.run()
 
-        with patch('gevent.spawn', spawn):
+        self.assertIs(scheduler.queue_entries[job1.name][-1], job1)
+        self.assertIs(scheduler.queue_entries[job2.name][-1], job2)
+
+        self.assertTrue(job1.keep_running)
+        self.assertTrue(job2.keep_running)
 
-            test_wait_time = 0.5
-            job_sleep_time = 10
-            job_max_repeats = 30
+        entry1 = scheduler.queue_entries[job1.name]
+        scheduler.unschedule(job1)
 
-            job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-            job1.wait_sleep_time = job_sleep_time
+        self.assertFalse(job1.keep_running)
+        self.assertTrue(job2.keep_running)
 
-            job2 = Job(rand_int(), 'b', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-            job2.wait_sleep_time = job_sleep_time
+        # job1's entry is still in the queue but it is not going to be run anymore
+        self.assertNotIn(job1.name, scheduler.queue_entries)
+        self.assertIn(entry1, scheduler.queue)
+        self.assertIs(entry1[-1], None)
+        self.assertIs(scheduler.queue_entries[job2.name][-1], job2)
 
-            scheduler = Scheduler(dummy_callback)
-            scheduler.lock = RLock()
-            scheduler.iter_cb = iter_cb
-            scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
+        self.assertEquals(scheduler.queue_removed, 1)
 
-            scheduler.create(job1, spawn=False)
-            scheduler.create(job2, spawn=False)
-            scheduler.run()
+    def test_queue_compacted(self):
 
-            self.assertEquals(scheduler.job_greenlets[job1.name]._run, job1.run)
-            self.assertEquals(scheduler.job_greenlets[job2.name]._run, job2.run)
+        scheduler = Scheduler(dummy_callback)
+        jobs = [get_job(str(x)) for x in range(10)]
 
-            self.assertTrue(job1.keep_running)
-            self.assertTrue(job2.keep_running)
+        for job in jobs:
+            scheduler.create(job)
 
-            scheduler.unschedule(job1)
+        for job in jobs[:5]:
+            scheduler.unschedule(job)
 
-            self.assertFalse(job1.keep_running)
-            self.assertTrue(job2.keep_running)
+        self.assertEquals(len(scheduler.queue), 10)
+        self.assertEquals(scheduler.queue_removed, 5)
 
-            self.assertNotIn(job1.name, scheduler.job_greenlets)
-            self.assertEquals(scheduler.job_greenlets[job2.name]._run, job2.run)
+        # More than half of the entries are no longer needed now
+        scheduler.unschedule(jobs[5])
 
-            self.assertEquals(len(data['stopped']), 1)
-            g, args, kwargs = data['stopped'][0]
-            self.assertIs(g.run.im_func, job1.run.im_func) # That's how we know it was job1 deleted not job2
-            self.assertIs(args, ())
-            self.assertDictEqual(kwargs, {'timeout':2.0})
+        self.assertEquals(len(scheduler.queue), 4)
+        self.assertEquals(scheduler.queue_removed, 0)
+        self.assertEquals(sorted(entry[-1] for entry in scheduler.queue), sorted(jobs[6:]))
 
     def test_edit(self):
 
@@ -698,24 +731,20 @@ class SchedulerTestCase(TestCase):
         start_time = datetime.utcnow()
         test_wait_time = 0.5
         job_interval1, job_interval2 = 2, 3
-        job_sleep_time = 10
         job_max_repeats1, job_max_repeats2 = 20, 30
 
-        scheduler = Scheduler(dummy_callback)
+        scheduler = self.get_scheduler(test_wait_time)
         scheduler.lock = RLock()
-        scheduler.iter_cb = iter_cb
-        scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
 
         def check(scheduler, job, label):
-            self.assertIn(job.name, scheduler.job_greenlets)
+            self.assertIn(job.name, scheduler.queue_entries)
             self.assertIn(job, scheduler.jobs)
 
-            self.assertEquals(1, len(scheduler.job_greenlets))
+            self.assertEquals(1, len(scheduler.queue_entries))
             self.assertEquals(1, len(scheduler.jobs))
 
-            self.assertIs(job.run.im_func, scheduler.job_greenlets.values()[0]._run.im_func)
-
             clone = list(scheduler.jobs)[0]
+            self.assertIs(clone, scheduler.queue_entries.values()[0][-1])
 
             for name in 'name', 'interval', 'cb_kwargs', 'max_repeats', 'is_active':
                 expected = getattr(job, name)
@@ -741,12 +770,10 @@ class SchedulerTestCase(TestCase):
         job1 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=job_interval1), start_time, max_repeats=job_max_repeats1)
         job1.callback = callback
         job1.on_max_repeats_reached_cb = on_max_repeats_reached_cb
-        job1.wait_sleep_time = job_sleep_time
 
         job2 = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=job_interval2), start_time, max_repeats=job_max_repeats2)
         job2.callback = callback
         job2.on_max_repeats_reached_cb = on_max_repeats_reached_cb
-        job2.wait_sleep_time = job_sleep_time
 
         scheduler.run()
         scheduler.create(job1)
@@ -775,22 +802,21 @@ class SchedulerTestCase(TestCase):
             data['runs'].append(ctx)
 
         test_wait_time = 0.5
-        job_sleep_time = 0.1
         job_max_repeats = 10
 
         job = Job(rand_int(), 'a', SCHEDULER.JOB_TYPE.INTERVAL_BASED, Interval(seconds=0.1), max_repeats=job_max_repeats)
-        job.wait_sleep_time = job_sleep_time
         job.get_context = get_context
 
-        scheduler = Scheduler(dummy_callback)
+        scheduler = self.get_scheduler(test_wait_time, on_job_executed_cb)
         scheduler.lock = RLock()
-        scheduler.iter_cb = iter_cb
-        scheduler.iter_cb_args = (scheduler, datetime.utcnow() + timedelta(seconds=test_wait_time))
-        scheduler.on_job_executed_cb = on_job_executed_cb
 
         scheduler.create(job, spawn=False)
         scheduler.run()
 
+        # Let the greenlets of the last runs complete
+        sleep(0.1)
+
+        self.assertTrue(data['runs'])
         self.assertEquals(len(data['runs']), len(data['ctx']))
 
         for idx, item in enumerate(data['runs']):
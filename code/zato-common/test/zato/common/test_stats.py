@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common.stats import Histogram
+
+# ################################################################################################################################
+
+class HistogramTestCase(TestCase):
+
+    def test_get_bucket(self):
+        eq_(Histogram.get_bucket(0), 0)
+        eq_(Histogram.get_bucket(999), 999)
+        eq_(Histogram.get_bucket(1000), 1000)
+        eq_(Histogram.get_bucket(1234), 1230)
+        eq_(Histogram.get_bucket(12345), 12300)
+
+    def test_add(self):
+        histogram = Histogram()
+        for value in (5, 1, 10, 1234):
+            histogram.add(value)
+
+        eq_(histogram.count, 4)
+        eq_(histogram.min, 1)
+        eq_(histogram.max, 1234)
+        eq_(histogram.sum, 1250)
+        eq_(histogram.mean, 312.5)
+        eq_(histogram.buckets, {1:1, 5:1, 10:1, 1230:1})
+
+    def test_percentile(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.add(value)
+
+        eq_(histogram.percentile(50), 50)
+        eq_(histogram.percentile(99), 99)
+        eq_(histogram.percentile(100), 100)
+        eq_(Histogram().percentile(99), 0)
+
+    def test_merge(self):
+        histogram1, histogram2, expected = Histogram(), Histogram(), Histogram()
+
+        for value in (1, 2, 3000):
+            histogram1.add(value)
+            expected.add(value)
+
+        for value in (2, 50):
+            histogram2.add(value)
+            expected.add(value)
+
+        histogram1.merge(histogram2)
+
+        eq_(histogram1.buckets, expected.buckets)
+        eq_(histogram1.count, expected.count)
+        eq_(histogram1.min, expected.min)
+        eq_(histogram1.max, expected.max)
+        eq_(histogram1.sum, expected.sum)
+
+    def test_to_from_string(self):
+        histogram = Histogram()
+        histogram.add(10, 3)
+        histogram.add(12345)
+
+        value = histogram.to_string()
+        eq_(value, '4,10,12345,12375,10:3,12300:1')
+
+        histogram = Histogram.from_string(value)
+        eq_(histogram.count, 4)
+        eq_(histogram.min, 10)
+        eq_(histogram.max, 12345)
+        eq_(histogram.sum, 12375)
+        eq_(histogram.buckets, {10:3, 12300:1})
+
+        eq_(Histogram.from_string('').count, 0)
+        eq_(Histogram().to_string(), '')
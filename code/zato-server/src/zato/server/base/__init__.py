@@ -12,9 +12,12 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import logging
 from traceback import format_exc
 
+# Bunch
+from bunch import Bunch
+
 # Zato
 from zato.common import ZATO_NONE
-from zato.common.broker_message import code_to_name
+from zato.common.broker_message import BULK, code_to_name
 from zato.common.util import new_cid
 
 logger = logging.getLogger(__name__)
@@ -41,7 +44,11 @@ class BrokerMessageReceiver(object):
             if logger.isEnabledFor(logging.DEBUG):
                 logger.debug('Got message [{!r}]'.format(msg))
     
-            if self.filter(msg):
+            # Bulk messages are never filtered out, only the messages they carry can be
+            if msg['action'] == BULK.CONFIG.value:
+                self.on_broker_msg_BULK_CONFIG(msg)
+
+            elif self.filter(msg):
                 action = code_to_name[msg['action']]
                 handler = 'on_broker_msg_{0}'.format(action)
                 getattr(self, handler)(msg)
@@ -51,6 +58,12 @@ class BrokerMessageReceiver(object):
         except Exception, e:
             msg = 'Could not handle broker msg:[{!r}], e:[{}]'.format(msg, format_exc(e))
             logger.error(msg)
+
+    def on_broker_msg_BULK_CONFIG(self, msg, *ignored_args):
+        """ Handles each of the messages a bulk one carries, in the order they were published in.
+        """
+        for item in msg['messages']:
+            self.on_broker_msg(Bunch(item))
             
     def filter(self, msg):
         """ Subclasses may override the method in order to filter the messages
@@ -18,7 +18,7 @@ from traceback import format_exc
 from uuid import uuid4
 
 # anyjson
-from anyjson import dumps
+from anyjson import dumps, loads
 
 # arrow
 from arrow import utcnow
@@ -50,7 +50,7 @@ from tzlocal import get_localzone
 
 # Zato
 from zato.broker.client import BrokerClient
-from zato.common import ACCESS_LOG_DT_FORMAT, CHANNEL, KVDB, MISC, SERVER_JOIN_STATUS, SERVER_UP_STATUS,\
+from zato.common import ACCESS_LOG_DT_FORMAT, CHANNEL, KVDB, SERVER_JOIN_STATUS, SERVER_UP_STATUS,\
      ZATO_ODB_POOL_NAME
 from zato.common.broker_message import AMQP_CONNECTOR, code_to_name, HOT_DEPLOY,\
      JMS_WMQ_CONNECTOR, MESSAGE_TYPE, SERVICE, TOPICS, ZMQ_CONNECTOR
@@ -60,7 +60,8 @@ from zato.common.util import add_startup_jobs, get_kvdb_config_for_log, \
      register_diag_handlers
 from zato.server.base import BrokerMessageReceiver
 from zato.server.base.worker import WorkerStore
-from zato.server.config import ConfigDict, ConfigStore
+from zato.server.config import add_secret_config, ConfigDict, ConfigSnapshot, ConfigStore, get_config_from_odb, \
+     get_secret_config_from_odb
 from zato.server.connection.amqp.channel import start_connector as amqp_channel_start_connector
 from zato.server.connection.amqp.outgoing import start_connector as amqp_out_start_connector
 from zato.server.connection.jms_wmq.channel import start_connector as jms_wmq_channel_start_connector
@@ -208,21 +209,38 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
         outside this method but basing on whether the method returns True or not.
         """
 
-        def import_initial_services_jobs():
-            # (re-)deploy the services from a clear state
-            self.service_store.import_services_from_anywhere(
+        def import_initial_services_jobs(is_first):
+
+            # All workers need to import services ..
+            to_deploy = self.service_store.import_services_from_anywhere(
                 self.internal_service_modules + self.service_modules +
                 self.service_sources, self.base_dir)
 
-            # Add the statistics-related scheduler jobs to the ODB
-            add_startup_jobs(self.cluster_id, self.odb, self.startup_jobs)
+            # .. but only the first one adds them to the ODB, in bulk, and the rest reuse what it found there.
+            if is_first:
+                odb_info = self.service_store.add_to_odb(to_deploy)
+                redis_conn.set(deployed_services_key, dumps(odb_info))
+                redis_conn.expire(deployed_services_key, self.deployment_lock_expires)
+
+                # Add the statistics-related scheduler jobs to the ODB
+                add_startup_jobs(self.cluster_id, self.odb, self.startup_jobs)
+
+                # Migrations
+                self.odb.add_channels_2_0()
 
-            # Migrations
-            self.odb.add_channels_2_0()
+            else:
+                odb_info = redis_conn.get(deployed_services_key)
+
+                # The first worker's deployment may have been deleted from Redis in the meantime
+                if odb_info:
+                    self.service_store.set_odb_info(to_deploy, loads(odb_info))
+                else:
+                    self.service_store.add_to_odb(to_deploy)
 
         lock_name = '{}{}:{}'.format(KVDB.LOCK_SERVER_STARTING, self.fs_server_config.main.token, deployment_key)
         already_deployed_flag = '{}{}:{}'.format(KVDB.LOCK_SERVER_ALREADY_DEPLOYED,
             self.fs_server_config.main.token, deployment_key)
+        deployed_services_key = '{}{}:{}'.format(KVDB.DEPLOYED_SERVICES, self.fs_server_config.main.token, deployment_key)
 
         logger.debug('Will use the lock_name: [{}]'.format(lock_name))
 
@@ -233,8 +251,8 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
                 msg = 'Not attempting to grab the lock_name:[{}]'.format(lock_name)
                 logger.debug(msg)
 
-                # Simply deploy services, the first worker has already cleared out the ODB
-                import_initial_services_jobs()
+                # Simply import services, the first worker has already deployed them in the ODB
+                import_initial_services_jobs(False)
             else:
                 # We are this server's first worker so we need to re-populate
                 # the database and create the flag indicating we're done.
@@ -246,7 +264,7 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
                 self.odb.drop_deployed_services(server.id)
 
                 # .. deploy them back.
-                import_initial_services_jobs()
+                import_initial_services_jobs(True)
 
                 # Add the flag to Redis indicating that this server has already
                 # deployed its services. Note that by default the expiration
@@ -301,6 +319,9 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
         for name, program in self.get_lua_programs():
             self.kvdb.lua_container.add_lua_program(name, program)
 
+        # Translations from data dictionaries, so that looking them up does not need KVDB
+        self.kvdb.translations.load()
+
         # Service sources
         self.service_sources = []
         for name in open(os.path.join(self.repo_location, self.fs_server_config.main.service_sources)):
@@ -369,235 +390,39 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
         # the server's configuration from.
         self.config.repo_location = self.repo_location
 
-        # 
-        # Cassandra - start
-        #
-
-        query = self.odb.get_cassandra_conn_list(server.cluster.id, True)
-        self.config.cassandra_conn = ConfigDict.from_query('cassandra_conn', query)
-
-        query = self.odb.get_cassandra_query_list(server.cluster.id, True)
-        self.config.cassandra_query = ConfigDict.from_query('cassandra_query', query)
-
-        # 
-        # Cassandra - end
-        #
-
-        # 
-        # Search - start
-        #
-
-        query = self.odb.get_search_es_list(server.cluster.id, True)
-        self.config.search_es = ConfigDict.from_query('search_es', query)
-
-        query = self.odb.get_search_solr_list(server.cluster.id, True)
-        self.config.search_solr = ConfigDict.from_query('search_solr', query)
-
-        # 
-        # Search - end
-        #
-
-        # 
-        # Cloud - start
-        #
-
-        # OpenStack - Swift
-
-        query = self.odb.get_cloud_openstack_swift_list(server.cluster.id, True)
-        self.config.cloud_openstack_swift = ConfigDict.from_query('cloud_openstack_swift', query)
-
-        query = self.odb.get_cloud_aws_s3_list(server.cluster.id, True)
-        self.config.cloud_aws_s3 = ConfigDict.from_query('cloud_aws_s3', query)
-
-        # 
-        # Cloud - end
-        #
-
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-        # Services
-        query = self.odb.get_service_list(server.cluster.id, True)
-        self.config.service = ConfigDict.from_query('service_list', query)
-
-        #
-        # Channels - start
-        #
-
-        # STOMP
-        query = self.odb.get_channel_stomp_list(server.cluster.id, True)
-        self.config.channel_stomp = ConfigDict.from_query('channel_stomp', query)
-
-        #
-        # Channels - end
-        #
-
-        #
-        # Outgoing connections - start
-        #
-
-        # AMQP
-        query = self.odb.get_out_amqp_list(server.cluster.id, True)
-        self.config.out_amqp = ConfigDict.from_query('out_amqp', query)
-
-        # FTP
-        query = self.odb.get_out_ftp_list(server.cluster.id, True)
-        self.config.out_ftp = ConfigDict.from_query('out_ftp', query)
-
-        # JMS WMQ
-        query = self.odb.get_out_jms_wmq_list(server.cluster.id, True)
-        self.config.out_jms_wmq = ConfigDict.from_query('out_jms_wmq', query)
-
-        # Odoo
-        query = self.odb.get_out_odoo_list(server.cluster.id, True)
-        self.config.out_odoo = ConfigDict.from_query('out_odoo', query)
-
-        # Plain HTTP
-        query = self.odb.get_http_soap_list(server.cluster.id, 'outgoing', 'plain_http', True)
-        self.config.out_plain_http = ConfigDict.from_query('out_plain_http', query)
-
-        # SOAP
-        query = self.odb.get_http_soap_list(server.cluster.id, 'outgoing', 'tym resoap', True)
-        self.config.out_soap = ConfigDict.from_query('out_soap', query)
-
-        # SQL
-        query = self.odb.get_out_sql_list(server.cluster.id, True)
-        self.config.out_sql = ConfigDict.from_query('out_sql', query)
-
-        # STOMP
-        query = self.odb.get_out_stomp_list(server.cluster.id, True)
-        self.config.out_stomp = ConfigDict.from_query('out_stomp', query)
-
-        # ZMQtym re
-        query = self.odb.get_out_zmq_list(server.cluster.id, True)
-        self.config.out_zmq = ConfigDict.from_query('out_zmq', query)
-
-        #
-        # Outgoing connections - end
-        #
-
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-        #
-        # Notifications - start
-        #
-
-        # OpenStack Swift
-        query = self.odb.get_notif_cloud_openstack_swift_list(server.cluster.id, True)
-        self.config.notif_cloud_openstack_swift = ConfigDict.from_query('notif_cloud_openstack_swift', query)
-
-        # SQL
-        query = self.odb.get_notif_sql_list(server.cluster.id, True)
-        self.config.notif_sql = ConfigDict.from_query('notif_sql', query)
-
-        #
-        # Notifications - end
-        #
-
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-        #
-        # Security - start
-        #
+        # All the configuration loaded from the ODB, possibly by another worker of this server, apart from passwords
+        # and private keys which are never stored in KVDB so each worker loads them itself.
+        snapshot = self.get_config_snapshot(server, deployment_key)
+        add_secret_config(snapshot.data, get_secret_config_from_odb(self.odb, server.cluster.id))
 
-        # API keys
-        query = self.odb.get_apikey_security_list(server.cluster.id, True)
-        self.config.apikey = ConfigDict.from_query('apikey', query)
+        config_dicts = {}
+        for attr_name, (config_name, impl) in snapshot.data['config_dicts'].iteritems():
+            config_dicts[attr_name] = ConfigDict(config_name, impl)
 
-        # AWS
-        query = self.odb.get_aws_security_list(server.cluster.id, True)
-        self.config.aws = ConfigDict.from_query('aws', query)
-
-        # HTTP Basic Auth
-        query = self.odb.get_basic_auth_list(server.cluster.id, True)
-        self.config.basic_auth = ConfigDict.from_query('basic_auth', query)
-
-        # NTLM
-        query = self.odb.get_ntlm_list(server.cluster.id, True)
-        self.config.ntlm = ConfigDict.from_query('ntlm', query)
-
-        # OAuth
-        query = self.odb.get_oauth_list(server.cluster.id, True)
-        self.config.oauth = ConfigDict.from_query('oauth', query)
-
-        # OpenStack
-        query = self.odb.get_openstack_security_list(server.cluster.id, True)
-        self.config.openstack_security = ConfigDict.from_query('openstack_security', query)
-
-        # RBAC - permissions
-        query = self.odb.get_rbac_permission_list(server.cluster.id, True)
-        self.config.rbac_permission = ConfigDict.from_query('rbac_permission', query)
-
-        # RBAC - roles
-        query = self.odb.get_rbac_role_list(server.cluster.id, True)
-        self.config.rbac_role = ConfigDict.from_query('rbac_role', query)
-
-        # RBAC - client roles
-        query = self.odb.get_rbac_client_role_list(server.cluster.id, True)
-        self.config.rbac_client_role = ConfigDict.from_query('rbac_client_role', query)
-
-        # RBAC - role permission
-        query = self.odb.get_rbac_role_permission_list(server.cluster.id, True)
-        self.config.rbac_role_permission = ConfigDict.from_query('rbac_role_permission', query)
-
-        # Technical accounts
-        query = self.odb.get_tech_acc_list(server.cluster.id, True)
-        self.config.tech_acc = ConfigDict.from_query('tech_acc', query)
-
-        # TLS CA certs
-        query = self.odb.get_tls_ca_cert_list(server.cluster.id, True)
-        self.config.tls_ca_cert = ConfigDict.from_query('tls_ca_cert', query)
-
-        # TLS channel security
-        query = self.odb.get_tls_channel_sec_list(server.cluster.id, True)
-        self.config.tls_channel_sec = ConfigDict.from_query('tls_channel_sec', query)
-
-        # TLS key/cert pairs
-        query = self.odb.get_tls_key_cert_list(server.cluster.id, True)
-        self.config.tls_key_cert = ConfigDict.from_query('tls_key_cert', query)
-
-        # WS-Security
-        query = self.odb.get_wss_list(server.cluster.id, True)
-        self.config.wss = ConfigDict.from_query('wss', query)
+        # Pub/sub config
+        self.config.pubsub = Bunch()
+        self.config.pubsub.topics = config_dicts.pop('pubsub_topics')
+        self.config.pubsub.producers = config_dicts.pop('pubsub_producers')
+        self.config.pubsub.consumers = config_dicts.pop('pubsub_consumers')
 
-        # XPath
-        query = self.odb.get_xpath_sec_list(server.cluster.id, True)
-        self.config.xpath_sec = ConfigDict.from_query('xpath_sec', query)
+        self.config.pubsub.default_consumer = Bunch()
+        self.config.pubsub.default_consumer.id, self.config.pubsub.default_consumer.name = snapshot.data['pubsub_default_consumer']
 
-        #
-        # Security - end
-        #
+        self.config.pubsub.default_producer = Bunch()
+        self.config.pubsub.default_producer.id, self.config.pubsub.default_producer.name = snapshot.data['pubsub_default_producer']
 
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        # Everything else
+        for attr_name, config_dict in config_dicts.iteritems():
+            setattr(self.config, attr_name, config_dict)
 
         # All the HTTP/SOAP channels.
-        http_soap = []
-        for item in self.odb.get_http_soap_list(server.cluster.id, 'channel'):
-
-            hs_item = Bunch()
-            for key in item.keys():
-                hs_item[key] = getattr(item, key)
-
-            hs_item.replace_patterns_json_pointer = item.replace_patterns_json_pointer
-            hs_item.replace_patterns_xpath = item.replace_patterns_xpath
-
-            hs_item.match_target = '{}{}{}'.format(hs_item.soap_action, MISC.SEPARATOR, hs_item.url_path)
+        for hs_item in snapshot.data['http_soap']:
             hs_item.match_target_compiled = parse_compile(hs_item.match_target)
 
-            http_soap.append(hs_item)
-
-        self.config.http_soap = http_soap
+        self.config.http_soap = snapshot.data['http_soap']
 
-        # Namespaces
-        query = self.odb.get_namespace_list(server.cluster.id, True)
-        self.config.msg_ns = ConfigDict.from_query('msg_ns', query)
-
-        # XPath
-        query = self.odb.get_xpath_list(server.cluster.id, True)
-        self.config.xpath = ConfigDict.from_query('msg_xpath', query)
-
-        # JSON Pointer
-        query = self.odb.get_json_pointer_list(server.cluster.id, True)
-        self.config.json_pointer = ConfigDict.from_query('json_pointer', query)
+        # Security of HTTP/SOAP channels
+        self.config.url_sec = snapshot.data['url_sec']
 
         # SimpleIO
         self.config.simple_io = ConfigDict('simple_io', Bunch())
@@ -605,34 +430,6 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
         self.config.simple_io['int_parameter_suffixes'] = self.int_parameter_suffixes
         self.config.simple_io['bool_parameter_prefixes'] = self.bool_parameter_prefixes
 
-        # Pub/sub config
-        self.config.pubsub = Bunch()
-        self.config.pubsub.default_consumer = Bunch()
-        self.config.pubsub.default_producer = Bunch()
-
-        query = self.odb.get_pubsub_topic_list(server.cluster.id, True)
-        self.config.pubsub.topics = ConfigDict.from_query('pubsub_topics', query)
-
-        id, name = self.odb.get_pubsub_default_client(server.cluster.id, 'zato.pubsub.default-consumer')
-        self.config.pubsub.default_consumer.id, self.config.pubsub.default_consumer.name = id, name
-
-        id, name = self.odb.get_pubsub_default_client(server.cluster.id, 'zato.pubsub.default-producer')
-        self.config.pubsub.default_producer.id, self.config.pubsub.default_producer.name = id, name
-
-        query = self.odb.get_pubsub_producer_list(server.cluster.id, True)
-        self.config.pubsub.producers = ConfigDict.from_query('pubsub_producers', query, list_config=True)
-
-        query = self.odb.get_pubsub_consumer_list(server.cluster.id, True)
-        self.config.pubsub.consumers = ConfigDict.from_query('pubsub_consumers', query, list_config=True)
-
-        # E-mail - SMTP
-        query = self.odb.get_email_smtp_list(server.cluster.id, True)
-        self.config.email_smtp = ConfigDict.from_query('email_smtp', query)
-
-        # E-mail - IMAP
-        query = self.odb.get_email_imap_list(server.cluster.id, True)
-        self.config.email_imap = ConfigDict.from_query('email_imap', query)
-
         # Assign config to worker
         self.worker_store.worker_config = self.config
         self.worker_store.pubsub = self.pubsub
@@ -666,6 +463,29 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
 
         return is_singleton
 
+    def get_config_snapshot(self, server, deployment_key):
+        """ Returns configuration of all the objects that workers need. Only the first of this server's workers
+        loads it from the ODB, storing it in KVDB for the other ones, which reuse it unless configuration changed
+        in the meantime, as indicated by KVDB.CONFIG_VERSION, or services were deployed again.
+        """
+        snapshot_key = '{}{}'.format(KVDB.CONFIG_SNAPSHOT, self.fs_server_config.main.token)
+        lock_name = '{}{}'.format(KVDB.LOCK_SERVER_CONFIG_SNAPSHOT, self.fs_server_config.main.token)
+
+        with Lock(lock_name, self.deployment_lock_expires, self.deployment_lock_timeout, self.kvdb.conn):
+            version, value = self.kvdb.conn.mget(KVDB.CONFIG_VERSION, snapshot_key)
+            snapshot = ConfigSnapshot.loads(value) if value else None
+
+            if snapshot and snapshot.is_current(version, deployment_key):
+                logger.info('Using config snapshot, version:`%s`', version)
+                return snapshot
+
+            start = time.time()
+            snapshot = ConfigSnapshot(version, deployment_key, get_config_from_odb(self.odb, server.cluster.id))
+            self.kvdb.conn.set(snapshot_key, snapshot.dumps(), self.deployment_lock_expires)
+
+            logger.info('Config snapshot stored, version:`%s`, loaded in %.3fs', version, time.time() - start)
+
+            return snapshot
 
     def init_connectors(self):
         """ Starts all the connector subprocesses.
@@ -883,6 +703,11 @@ class ParallelServer(DisposableObject, BrokerMessageReceiver):
             if self.singleton_server.is_cluster_wide:
                 self.odb.clear_cluster_wide()
 
+        # Store any audit entries and statistics this worker still keeps in memory
+        if self.worker_store:
+            self.worker_store.request_dispatcher.url_data.audit_log.stop()
+            self.worker_store.stats_collector.stop()
+
         # Tell the ODB we've gone through a clean shutdown but only if this is
         # the main process going down (Arbiter) not one of Gunicorn workers.
         # We know it's the main process because its ODB's session has never
@@ -38,8 +38,8 @@ from gunicorn.workers.sync import SyncWorker as GunicornSyncWorker
 from retools.lock import Lock
 
 # Zato
-from zato.common import CHANNEL, DATA_FORMAT, HTTP_SOAP_SERIALIZATION_TYPE, KVDB, MSG_PATTERN_TYPE, NOTIF, PUB_SUB, \
-     SEC_DEF_TYPE, SIMPLE_IO, TRACE1, ZATO_NONE, ZATO_ODB_POOL_NAME
+from zato.common import AUDIT_LOG, AUTH_CACHE, CHANNEL, DATA_FORMAT, HTTP_SOAP_SERIALIZATION_TYPE, KVDB, MSG_PATTERN_TYPE, \
+     NOTIF, PUB_SUB, SEC_DEF_TYPE, SIMPLE_IO, STATS_COLLECTOR, TRACE1, ZATO_NONE, ZATO_ODB_POOL_NAME
 from zato.common import broker_message
 from zato.common.broker_message import code_to_name, SERVICE
 from zato.common.dispatch import dispatcher
@@ -53,6 +53,8 @@ from zato.server.connection.cloud.aws.s3 import S3Wrapper
 from zato.server.connection.cloud.openstack.swift import SwiftWrapper
 from zato.server.connection.email import IMAPAPI, IMAPConnStore, SMTPAPI, SMTPConnStore
 from zato.server.connection.ftp import FTPStore
+from zato.server.connection.http_soap.audit import AuditLog
+from zato.server.connection.http_soap.auth_cache import AuthCache
 from zato.server.connection.http_soap.channel import RequestDispatcher, RequestHandler
 from zato.server.connection.http_soap.outgoing import HTTPSOAPWrapper, SudsSOAPWrapper
 from zato.server.connection.http_soap.url_data import URLData
@@ -67,7 +69,8 @@ from zato.server.message import JSONPointerStore, NamespaceStore, XPathStore
 from zato.server.query import CassandraQueryAPI, CassandraQueryStore
 
 from zato.server.rbac_ import RBAC
-from zato.server.stats import MaintenanceTool
+from zato.server.service import ServiceFacades
+from zato.server.stats import MaintenanceTool, ServiceStatsCollector
 
 logger = logging.getLogger(__name__)
 
@@ -94,6 +97,7 @@ class WorkerStore(BrokerMessageReceiver):
         self.broker_client = None
         self.pubsub = None
         self.rbac = RBAC()
+        self.service_facades = None
 
         # Which services can be invoked
         self.invoke_matcher = Matcher()
@@ -106,6 +110,11 @@ class WorkerStore(BrokerMessageReceiver):
         # Statistics maintenance
         self.stats_maint = MaintenanceTool(self.kvdb.conn)
 
+        # Service statistics are collected locally and stored in Redis periodically
+        self.stats_collector = ServiceStatsCollector(self.kvdb, float(
+            self.server.fs_server_config.get('stats', {}).get('flush_interval', STATS_COLLECTOR.FLUSH_INTERVAL)))
+        self.stats_collector.start()
+
         self.msg_ns_store = NamespaceStore()
         self.json_pointer_store = JSONPointerStore()
         self.xpath_store = XPathStore()
@@ -170,11 +179,12 @@ class WorkerStore(BrokerMessageReceiver):
         self.request_dispatcher = RequestDispatcher(simple_io_config=self.worker_config.simple_io)
         self.request_dispatcher.url_data = URLData(
             deepcopy(self.worker_config.http_soap),
-            self.server.odb.get_url_security(self.server.cluster_id, 'channel')[0],
+            self.worker_config.url_sec,
             self.worker_config.basic_auth, self.worker_config.ntlm, self.worker_config.oauth, self.worker_config.tech_acc,
             self.worker_config.wss, self.worker_config.apikey, self.worker_config.aws, self.worker_config.openstack_security,
             self.worker_config.xpath_sec, self.worker_config.tls_channel_sec, self.worker_config.tls_key_cert, self.kvdb,
-            self.broker_client, self.server.odb, self.json_pointer_store, self.xpath_store)
+            self.broker_client, self.server.odb, self.json_pointer_store, self.xpath_store, self.get_audit_log(),
+            self.get_auth_cache())
 
         self.request_dispatcher.request_handler = RequestHandler(self.server)
 
@@ -186,12 +196,39 @@ class WorkerStore(BrokerMessageReceiver):
         self.init_pubsub()
         self.init_notifiers()
 
+        # Facades shared by all services - must come after all the connections they point to have been created
+        self.init_service_facades()
+
         # All set, whoever is waiting for us, if anyone at all, can now proceed
         self.is_ready = True
 
+    def get_audit_log(self):
+        """ Returns an in-memory audit log of HTTP/SOAP channels, configured as in server.conf.
+        """
+        config = self.server.fs_server_config.get('audit', {})
+
+        return AuditLog(self.server.odb,
+            int(config.get('batch_size', AUDIT_LOG.BATCH_SIZE)),
+            float(config.get('flush_interval', AUDIT_LOG.FLUSH_INTERVAL)),
+            int(config.get('queue_max_size', AUDIT_LOG.QUEUE_MAX_SIZE)),
+            float(config.get('pending_max_age', AUDIT_LOG.PENDING_MAX_AGE)))
+
+    def get_auth_cache(self):
+        """ Returns a cache of authentication results of HTTP/SOAP channels, configured as in server.conf.
+        """
+        config = self.server.fs_server_config.get('auth_cache', {})
+
+        return AuthCache(int(config.get('max_size', AUTH_CACHE.MAX_SIZE)), float(config.get('ttl', AUTH_CACHE.TTL)))
+
     def set_broker_client(self, broker_client):
         self.broker_client = broker_client
         self.request_dispatcher.url_data.broker_client = broker_client
+        self.init_service_facades()
+
+    def init_service_facades(self):
+        """ Builds facades through which all services access outgoing connections, cloud, e-mail and search.
+        """
+        self.service_facades = ServiceFacades(self)
 
     def filter(self, msg):
         # TODO: Fix it, worker doesn't need to accept all the messages
@@ -1040,6 +1077,8 @@ class WorkerStore(BrokerMessageReceiver):
 
             self.broker_client.invoke_async(cb_msg)
 
+        self.server.service_store.release_instance(service)
+
 # ################################################################################################################################
 
     def on_broker_msg_SCHEDULER_JOB_EXECUTED(self, msg, args=None):
@@ -1211,6 +1250,11 @@ class WorkerStore(BrokerMessageReceiver):
     def on_broker_msg_HOT_DEPLOY_AFTER_DEPLOY(self, msg, *args):
         self.rbac.create_resource(msg.id)
 
+# ################################################################################################################################
+
+    def on_broker_msg_DATA_DICT_CHANGED(self, msg, *args):
+        self.kvdb.translations.load()
+
 # ################################################################################################################################
 
     def on_broker_msg_STATS_DELETE(self, msg, *args):
@@ -10,8 +10,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 from copy import deepcopy
+from json import dumps, loads
 from logging import getLogger
+from operator import attrgetter
 from threading import RLock
+from zlib import compress, decompress
 
 # Paste
 from paste.util.multidict import MultiDict
@@ -20,18 +23,102 @@ from paste.util.multidict import MultiDict
 from zato.bunch import Bunch
 
 # Zato
-from zato.common import ZATO_NONE
+from zato.common import MISC, ZATO_NONE
 
 logger = getLogger(__name__)
 
+# Configuration loaded from the ODB at startup - name of the attribute in ConfigStore, name of the ConfigDict,
+# the ODBManager method to load it with, that method's arguments other than cluster_id and whether it is a list config.
+ODB_CONFIG = (
+
+    # Cassandra
+    ('cassandra_conn', 'cassandra_conn', 'get_cassandra_conn_list', (), False),
+    ('cassandra_query', 'cassandra_query', 'get_cassandra_query_list', (), False),
+
+    # Search
+    ('search_es', 'search_es', 'get_search_es_list', (), False),
+    ('search_solr', 'search_solr', 'get_search_solr_list', (), False),
+
+    # Cloud
+    ('cloud_openstack_swift', 'cloud_openstack_swift', 'get_cloud_openstack_swift_list', (), False),
+    ('cloud_aws_s3', 'cloud_aws_s3', 'get_cloud_aws_s3_list', (), False),
+
+    # Services
+    ('service', 'service_list', 'get_service_list', (), False),
+
+    # Channels
+    ('channel_stomp', 'channel_stomp', 'get_channel_stomp_list', (), False),
+
+    # Outgoing connections
+    ('out_amqp', 'out_amqp', 'get_out_amqp_list', (), False),
+    ('out_ftp', 'out_ftp', 'get_out_ftp_list', (), False),
+    ('out_jms_wmq', 'out_jms_wmq', 'get_out_jms_wmq_list', (), False),
+    ('out_odoo', 'out_odoo', 'get_out_odoo_list', (), False),
+    ('out_plain_http', 'out_plain_http', 'get_http_soap_list', ('outgoing', 'plain_http'), False),
+    ('out_soap', 'out_soap', 'get_http_soap_list', ('outgoing', 'soap'), False),
+    ('out_sql', 'out_sql', 'get_out_sql_list', (), False),
+    ('out_stomp', 'out_stomp', 'get_out_stomp_list', (), False),
+    ('out_zmq', 'out_zmq', 'get_out_zmq_list', (), False),
+
+    # Notifications
+    ('notif_cloud_openstack_swift', 'notif_cloud_openstack_swift', 'get_notif_cloud_openstack_swift_list', (), False),
+    ('notif_sql', 'notif_sql', 'get_notif_sql_list', (), False),
+
+    # Security
+    ('apikey', 'apikey', 'get_apikey_security_list', (), False),
+    ('aws', 'aws', 'get_aws_security_list', (), False),
+    ('basic_auth', 'basic_auth', 'get_basic_auth_list', (), False),
+    ('ntlm', 'ntlm', 'get_ntlm_list', (), False),
+    ('oauth', 'oauth', 'get_oauth_list', (), False),
+    ('openstack_security', 'openstack_security', 'get_openstack_security_list', (), False),
+    ('rbac_permission', 'rbac_permission', 'get_rbac_permission_list', (), False),
+    ('rbac_role', 'rbac_role', 'get_rbac_role_list', (), False),
+    ('rbac_client_role', 'rbac_client_role', 'get_rbac_client_role_list', (), False),
+    ('rbac_role_permission', 'rbac_role_permission', 'get_rbac_role_permission_list', (), False),
+    ('tech_acc', 'tech_acc', 'get_tech_acc_list', (), False),
+    ('tls_ca_cert', 'tls_ca_cert', 'get_tls_ca_cert_list', (), False),
+    ('tls_channel_sec', 'tls_channel_sec', 'get_tls_channel_sec_list', (), False),
+    ('tls_key_cert', 'tls_key_cert', 'get_tls_key_cert_list', (), False),
+    ('wss', 'wss', 'get_wss_list', (), False),
+    ('xpath_sec', 'xpath_sec', 'get_xpath_sec_list', (), False),
+
+    # Message handling
+    ('msg_ns', 'msg_ns', 'get_namespace_list', (), False),
+    ('xpath', 'msg_xpath', 'get_xpath_list', (), False),
+    ('json_pointer', 'json_pointer', 'get_json_pointer_list', (), False),
+
+    # Pub/sub
+    ('pubsub_topics', 'pubsub_topics', 'get_pubsub_topic_list', (), False),
+    ('pubsub_producers', 'pubsub_producers', 'get_pubsub_producer_list', (), True),
+    ('pubsub_consumers', 'pubsub_consumers', 'get_pubsub_consumer_list', (), True),
+
+    # E-mail
+    ('email_smtp', 'email_smtp', 'get_email_smtp_list', (), False),
+    ('email_imap', 'email_imap', 'get_email_imap_list', (), False),
+)
+
+# Configuration of objects with passwords or private keys - it is never stored in config snapshots,
+# each worker loads it from the ODB on its own.
+ODB_CONFIG_SECRET = frozenset((
+    'cassandra_conn', 'cloud_openstack_swift', 'cloud_aws_s3', 'channel_stomp', 'out_ftp', 'out_odoo', 'out_plain_http',
+    'out_soap', 'out_sql', 'out_stomp', 'notif_sql', 'apikey', 'aws', 'basic_auth', 'ntlm', 'oauth', 'tech_acc', 'tls_key_cert',
+    'wss', 'xpath_sec', 'email_smtp', 'email_imap',
+))
+
+# Attributes of HTTP channels and of their security definitions which are taken out of config snapshots
+# and filled in from configuration of security definitions each worker loads itself.
+SNAPSHOT_SECRET_ATTRS = ('password', 'salt')
+
 class ConfigDict(object):
     """ Stores configuration of a particular item of interest, such as an
     outgoing HTTP connection. Could've been a dict and we wouldn't have been using
     .get and .set but things like connection names aren't necessarily proper
-    Python attribute names. Also, despite certain dict operations being atomic
-    in CPython, the class employs a threading.Lock in critical places so the code
-    doesn't assume anything about CPython's byte code-specific implementation
-    details.
+    Python attribute names.
+
+    Configuration is read on each request yet it changes rarely so readers never lock. Instead, the underlying
+    mapping is never modified in place - each change creates a new one which replaces the current one in a single
+    assignment, so each read sees a consistent snapshot of the configuration. Changes themselves are serialized
+    with a lock so that none is lost. Note that values are not copied, they are shared by all the snapshots.
     """
     def __init__(self, name, _bunch=None):
         self.name = name
@@ -39,95 +126,93 @@ class ConfigDict(object):
         self.lock = RLock()
 
     def get(self, key, default=None):
-        with self.lock:
-            return self._impl.get(key, default)
+        return self._impl.get(key, default)
 
     def set(self, key, value):
         with self.lock:
-            self._impl[key] = value
+            impl = self._impl.__class__(self._impl)
+            impl[key] = value
+            self._impl = impl
 
     __setitem__ = set
 
     def __getitem__(self, key):
-        with self.lock:
-            return self._impl.__getitem__(key)
+        return self._impl[key]
 
     def __delitem__(self, key):
         with self.lock:
-            del self._impl[key]
+            impl = self._impl.__class__(self._impl)
+            del impl[key]
+            self._impl = impl
 
     def pop(self, key, default):
         with self.lock:
-            return self._impl.pop(key, default)
+            if key not in self._impl:
+                return default
+
+            impl = self._impl.__class__(self._impl)
+            value = impl.pop(key)
+            self._impl = impl
+
+            return value
 
     def __iter__(self):
-        with self.lock:
-            return iter(self._impl)
+        return iter(self._impl)
 
     def __repr__(self):
-        with self.lock:
-            return '<{} at {} keys:[{}]>'.format(self.__class__.__name__,
-                hex(id(self)), sorted(self._impl.keys()))
+        return '<{} at {} keys:[{}]>'.format(self.__class__.__name__,
+            hex(id(self)), sorted(self._impl.keys()))
 
     __str__ = __repr__
 
     def __nonzero__(self):
-        with self.lock:
-            return bool(self._impl)
+        return bool(self._impl)
 
     def keys(self):
-        with self.lock:
-            return self._impl.keys()
+        return self._impl.keys()
 
     def values(self):
-        with self.lock:
-            return self._impl.values()
+        return self._impl.values()
 
     def itervalues(self):
-        with self.lock:
-            return self._impl.itervalues()
+        return self._impl.itervalues()
 
     def items(self):
-        with self.lock:
-            return self._impl.items()
+        return self._impl.items()
 
     def copy(self):
         """ Returns a new instance of ConfigDict with items copied over from self.
         """
-        with self.lock:
-            config_dict = ConfigDict(self.name)
-            config_dict._impl = Bunch()
-            config_dict._impl.update(deepcopy(self._impl))
+        config_dict = ConfigDict(self.name)
+        config_dict._impl = Bunch()
+        config_dict._impl.update(deepcopy(self._impl))
 
-            return config_dict
+        return config_dict
 
     def get_config_list(self):
         """ Returns a list of deepcopied config Bunch objects.
         """
-        with self.lock:
-            out = []
-            for value in self._impl.values():
-                config = value['config']
-                out.append(deepcopy(config))
-
-        return out
+        return [deepcopy(value['config']) for value in self._impl.values()]
 
     def copy_keys(self):
         """ Returns a deepcopy of the underlying Bunch's keys
         """
-        with self.lock:
-            return deepcopy(self._impl.keys())
+        return deepcopy(self._impl.keys())
 
     @staticmethod
     def from_query(name, query_data, impl_class=Bunch, item_class=Bunch, list_config=False):
         """ Return a new ConfigDict with items taken from an SQL query.
         """
-        config_dict = ConfigDict(name)
-        config_dict._impl = impl_class()
+        impl = impl_class()
 
         if query_data:
             query, attrs = query_data
 
+            # All attributes of each row are read in one call
+            attr_names = tuple(attrs.keys())
+            get_values = attrgetter(*attr_names) if attr_names else (lambda item: ())
+            is_single = len(attr_names) == 1
+
             for item in query:
 
                 if hasattr(item, 'name'):
@@ -135,24 +220,15 @@ class ConfigDict(object):
                 else:
                     item_name = item.get_name()
 
-                if list_config:
-                    list_dict = Bunch()
-                    if item_name not in config_dict._impl:
-                        config_dict._impl[item_name] = []
-                    config_dict._impl[item_name].append(list_dict)
-                else:
-                    config_dict._impl[item_name] = item_class()
+                values = get_values(item)
+                values = zip(attr_names, (values,) if is_single else values)
 
                 if list_config:
-                    for attr_name in attrs.keys():
-                        list_dict[attr_name] = getattr(item, attr_name)
-
+                    impl.setdefault(item_name, []).append(Bunch(values))
                 else:
-                    config_dict._impl[item_name].config = item_class()
-                    for attr_name in attrs.keys():
-                        config_dict._impl[item_name]['config'][attr_name] = getattr(item, attr_name)
+                    impl[item_name] = item_class(config=item_class(values))
 
-        return config_dict
+        return ConfigDict(name, impl)
 
 class ConfigStore(object):
     """ The central place for storing a Zato server's thread configuration.
@@ -254,3 +330,114 @@ class ConfigStore(object):
         config_store.odb_data = deepcopy(self.odb_data)
 
         return config_store
+
+class ConfigSnapshot(object):
+    """ Configuration loaded from the ODB by one of a server's workers, serialized to JSON so that the server's other
+    workers can reuse it instead of loading it again. Valid only for as long as version, the value of a counter increased
+    each time configuration changes, is the current one and the services deployed are the same, i.e. deployment_key
+    has not changed. Each start of a server deploys its services anew so snapshots are never reused across restarts.
+    """
+    # Increase whenever the layout of data changes so that snapshots stored by previous versions are not used
+    format_version = 2
+
+    def __init__(self, version, deployment_key, data=None):
+        self.version = version
+        self.deployment_key = deployment_key
+        self.data = data or {}
+
+    def is_current(self, version, deployment_key):
+        return self.version == version and self.deployment_key == deployment_key
+
+    def dumps(self):
+        return compress(dumps([self.format_version, self.version, self.deployment_key, self.data]))
+
+    @staticmethod
+    def loads(value):
+        """ Returns a snapshot serialized with .dumps or None if it was serialized in a format no longer used.
+        All the dictionaries in data are returned as Bunch objects.
+        """
+        try:
+            format_version, version, deployment_key, data = loads(decompress(value), object_hook=Bunch)
+        except ValueError:
+            return None
+
+        if format_version == ConfigSnapshot.format_version:
+            return ConfigSnapshot(version, deployment_key, data)
+
+def _get_config_dicts(odb, cluster_id, is_secret):
+    config_dicts = {}
+
+    for attr_name, config_name, func_name, args, list_config in ODB_CONFIG:
+        if (attr_name in ODB_CONFIG_SECRET) == is_secret:
+            query = getattr(odb, func_name)(cluster_id, *(args + (True,)))
+            config_dict = ConfigDict.from_query(config_name, query, list_config=list_config)
+            config_dicts[attr_name] = (config_dict.name, config_dict._impl)
+
+    return config_dicts
+
+def get_secret_config_from_odb(odb, cluster_id):
+    """ Loads from the ODB configuration of all the objects with passwords or private keys that workers need,
+    in the same form as that of configuration returned by get_config_from_odb.
+    """
+    return _get_config_dicts(odb, cluster_id, True)
+
+def add_secret_config(data, secret_config_dicts):
+    """ Adds to configuration returned by get_config_from_odb configuration of objects with passwords or private keys,
+    along with secret attributes of HTTP channels and of their security definitions.
+    """
+    data['config_dicts'].update(secret_config_dicts)
+
+    def fill_in(item, sec_type, sec_name):
+        impl = secret_config_dicts.get(sec_type, (None, {}))[1]
+        sec_config = impl.get(sec_name, {}).get('config', {})
+
+        for attr in SNAPSHOT_SECRET_ATTRS:
+            if attr in item:
+                item[attr] = sec_config.get(attr)
+
+    for hs_item in data['http_soap']:
+        if hs_item.get('security_id'):
+            fill_in(hs_item, hs_item.sec_type, hs_item.security_name)
+
+    for url_sec_item in data['url_sec'].values():
+        if url_sec_item.sec_def != ZATO_NONE:
+            fill_in(url_sec_item.sec_def, url_sec_item.sec_def.sec_type, url_sec_item.sec_def.name)
+
+def _remove_secrets(item):
+    for attr in SNAPSHOT_SECRET_ATTRS:
+        if attr in item:
+            item[attr] = None
+
+def get_config_from_odb(odb, cluster_id):
+    """ Loads from the ODB configuration of all the objects that workers need, in a form that ConfigSnapshot can serialize.
+    Passwords and private keys are left out, they are added by add_secret_config.
+    """
+    config_dicts = _get_config_dicts(odb, cluster_id, False)
+
+    http_soap = []
+    for item in odb.get_http_soap_list(cluster_id, 'channel'):
+
+        hs_item = Bunch()
+        for key in item.keys():
+            hs_item[key] = getattr(item, key)
+
+        hs_item.replace_patterns_json_pointer = item.replace_patterns_json_pointer
+        hs_item.replace_patterns_xpath = item.replace_patterns_xpath
+
+        hs_item.match_target = '{}{}{}'.format(hs_item.soap_action, MISC.SEPARATOR, hs_item.url_path)
+
+        _remove_secrets(hs_item)
+        http_soap.append(hs_item)
+
+    url_sec = odb.get_url_security(cluster_id, 'channel')[0]
+    for url_sec_item in url_sec.values():
+        if url_sec_item.sec_def != ZATO_NONE:
+            _remove_secrets(url_sec_item.sec_def)
+
+    return {
+        'config_dicts': config_dicts,
+        'http_soap': http_soap,
+        'url_sec': url_sec,
+        'pubsub_default_consumer': odb.get_pubsub_default_client(cluster_id, 'zato.pubsub.default-consumer'),
+        'pubsub_default_producer': odb.get_pubsub_default_client(cluster_id, 'zato.pubsub.default-producer'),
+    }
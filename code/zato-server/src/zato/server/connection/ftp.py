@@ -10,29 +10,174 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
+from collections import deque
 from copy import deepcopy
 from threading import RLock
+from time import time
 from traceback import format_exc
 
+# gevent
+from gevent.lock import Semaphore
+
 # pyfilesystem
-from fs.ftpfs import FTPFS, _GLOBAL_DEFAULT_TIMEOUT
+from fs.ftpfs import _encode, FTPFS, ftperrors, _GLOBAL_DEFAULT_TIMEOUT
+from fs.path import normpath
 
 # Zato
-from zato.common import Inactive, SECRET_SHADOW, TRACE1
+from zato.common import FTP_POOL, Inactive, SECRET_SHADOW, TimeoutException, TRACE1
 
 logger = logging.getLogger(__name__)
 
+# ################################################################################################################################
+
 class FTPFacade(FTPFS):
-    """ A thin wrapper around fs's FTPFS so it looks like the other Zato connection objects.
+    """ A thin wrapper around fs's FTPFS so it looks like the other Zato connection objects. Facades handed out by a pool
+    go back to it when they are closed, which includes leaving a with block.
     """
+    zato_pool = None
+    zato_is_checked_out = False
+
     def conn(self):
         return self
 
+    def close(self):
+        if self.zato_pool:
+            if self.zato_is_checked_out:
+                self.zato_pool.put(self)
+        else:
+            self.disconnect()
+
+    def disconnect(self):
+        """ Closes the underlying FTP connection, without opening one first if there is none.
+        """
+        if getattr(self, '_ftp', None):
+            FTPFS.close(self)
+        else:
+            self.closed = True
+
+    @ftperrors
+    def ping(self):
+        self.ftp.voidcmd(b'NOOP')
+
+    def upload(self, path, source, chunk_size=FTP_POOL.CHUNK_SIZE):
+        """ Stores under path everything read from a file-like source object, one chunk at a time.
+        """
+        self.setcontents(path, source, chunk_size)
+
+    @ftperrors
+    def download(self, path, target, chunk_size=FTP_POOL.CHUNK_SIZE):
+        """ Writes contents of path to a file-like target object, one chunk at a time.
+        """
+        self.ftp.retrbinary(b'RETR %s' % _encode(normpath(path)), target.write, blocksize=chunk_size)
+
+# ################################################################################################################################
+
+class FTPPool(object):
+    """ A bounded pool of logged-in connections to one FTP server. The most recently used connections are handed out first,
+    those idle or open for too long are closed and those idle for a while are checked with NOOP before being handed out.
+    """
+    def __init__(self, params):
+        self.params = params
+        self.size = int(params.get('pool_size') or FTP_POOL.SIZE)
+        self.checkout_timeout = float(params.get('pool_checkout_timeout') or FTP_POOL.CHECKOUT_TIMEOUT)
+        self.max_idle = float(params.get('pool_max_idle') or FTP_POOL.MAX_IDLE)
+        self.max_lifetime = float(params.get('pool_max_lifetime') or FTP_POOL.MAX_LIFETIME)
+        self.ping_interval = float(params.get('pool_ping_interval') or FTP_POOL.PING_INTERVAL)
+        self.idle = deque()
+        self.slots = Semaphore(self.size)
+        self.is_closed = False
+
+    def _new(self, now):
+        params = self.params
+        timeout = float(params.timeout) if params.timeout else _GLOBAL_DEFAULT_TIMEOUT
+        conn = FTPFacade(params.host, params.user, params.get('password'), params.acct, timeout, int(params.port), params.dircache)
+        conn.zato_created = now
+
+        return conn
+
+    def _disconnect(self, conn):
+        conn.zato_pool = None
+        try:
+            conn.disconnect()
+        except Exception, e:
+            logger.warn('Could not close the FTP connection `%s`, e:`%s`', self.params.name, format_exc(e))
+
+    def _is_expired(self, conn, now):
+        return now - conn.zato_created > self.max_lifetime or now - conn.zato_last_used > self.max_idle
+
+    def get(self):
+        """ Returns a connection from the pool, waiting for one to be put back if all of them are in use.
+        """
+        if not self.slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutException(None, 'No FTP connection `{}` became available within {}s'.format(
+                self.params.name, self.checkout_timeout))
+
+        try:
+            now = time()
+
+            # Least recently used connections are the first ones to become idle for too long
+            while self.idle and self._is_expired(self.idle[0], now):
+                self._disconnect(self.idle.popleft())
+
+            while self.idle:
+                conn = self.idle.pop()
+
+                if self._is_expired(conn, now):
+                    self._disconnect(conn)
+                    continue
+
+                if now - conn.zato_last_used > self.ping_interval:
+                    try:
+                        conn.ping()
+                    except Exception, e:
+                        logger.info('FTP connection `%s` failed a health check, e:`%s`', self.params.name, format_exc(e))
+                        self._disconnect(conn)
+                        continue
+
+                break
+            else:
+                conn = self._new(now)
+
+            conn.zato_pool = self
+            conn.zato_is_checked_out = True
+
+            return conn
+
+        except Exception:
+            self.slots.release()
+            raise
+
+    def put(self, conn):
+        """ Puts a connection back to the pool, unless the pool is closed or the connection is too old to be reused.
+        """
+        conn.zato_is_checked_out = False
+        now = time()
+
+        try:
+            if self.is_closed or conn.closed or now - conn.zato_created > self.max_lifetime:
+                self._disconnect(conn)
+            else:
+                conn.zato_last_used = now
+                self.idle.append(conn)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """ Closes all idle connections. Connections in use will be closed when they are put back.
+        """
+        self.is_closed = True
+        while self.idle:
+            self._disconnect(self.idle.pop())
+
+# ################################################################################################################################
+
 class FTPStore(object):
-    """ An object through which services access FTP connections.
+    """ An object through which services access FTP connections. Each connection has its own pool, created on first use
+    and rebuilt each time the connection's definition or password changes.
     """
     def __init__(self):
         self.conn_params = {}
+        self.pools = {}
         self._lock = RLock()
 
     def _add(self, params):
@@ -63,28 +208,33 @@ class FTPStore(object):
         with self._lock:
             return [elem.encode('utf-8') for elem in sorted(self.conn_params)]
 
+    def _delete_pool(self, name):
+        """ Closes a connection's pool, if there is one. Must not be called without holding onto self._lock
+        """
+        pool = self.pools.pop(name, None)
+        if pool:
+            pool.close()
+
     def get(self, name):
+        """ Returns a connection from the pool of a given name. Closing it, or leaving a with block, puts it back to the pool.
+        """
         with self._lock:
             params = self.conn_params[name]
-            if params.is_active:
-                timeout = float(params.timeout) if params.timeout else _GLOBAL_DEFAULT_TIMEOUT
-                return FTPFacade(params.host, params.user, params.get('password'), params.acct, timeout, int(params.port), params.dircache)
-            else:
+            if not params.is_active:
                 raise Inactive(params.name)
 
+            pool = self.pools.get(name)
+            if not pool:
+                pool = self.pools[name] = FTPPool(params)
+
+        # Outside the lock because it may need to wait for a connection
+        return pool.get()
+
     def create_edit(self, params, old_name):
         with self._lock:
             if params:
-                _name = old_name if old_name else params.name
-                ftp = params.get(_name)
-                try:
-                    if ftp:
-                        ftp.close()
-                except Exception, e:
-                    msg = 'Could not close the FTP connection [{0}], e [{1}]'.format(params.name, format_exc(e))
-                    logger.warn(msg)
-                finally:
-                    self._add(params)
+                self._delete_pool(old_name if old_name else params.name)
+                self._add(params)
 
             if old_name and old_name != params.name:
                 del self.conn_params[old_name]
@@ -95,9 +245,11 @@ class FTPStore(object):
     def change_password(self, name, password):
         with self._lock:
             self.conn_params[name].password = password
+            self._delete_pool(name)
             logger.info('Password updated - FTP connection [{}]'.format(name))
 
     def delete(self, name):
         with self._lock:
             del self.conn_params[name]
+            self._delete_pool(name)
             logger.info('FTP connection [{}] deleted'.format(name))
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import logging
+from collections import deque
+from datetime import datetime
+from json import dumps
+from time import time
+from traceback import format_exc
+
+# gevent
+from gevent import spawn
+from gevent.event import Event
+
+# Zato
+from zato.common import AUDIT_LOG
+
+logger = logging.getLogger(__name__)
+
+# Columns of HTTSOAPAudit that payloads and headers are stored in
+_binary_columns = ('req_headers', 'req_payload', 'resp_headers', 'resp_payload')
+
+# ################################################################################################################################
+
+def dump_wsgi_environ(wsgi_environ):
+    """ A convenience function to dump WSGI environment with all the element repr'ed.
+    """
+    # TODO: There should be another copy of WSGI environ added with password masked out
+    env = wsgi_environ.items()
+    for elem in env:
+        if elem[0] == 'zato.http.channel_item':
+            elem[1]['password'] = AUDIT_LOG.REPLACE_WITH
+
+    return dumps({key: repr(value) for key, value in env})
+
+# ################################################################################################################################
+
+class AuditStats(object):
+    """ Counters describing what happened to audit entries so far.
+    """
+    __slots__ = ('enqueued', 'flushed', 'dropped', 'failed', 'orphaned', 'flushes')
+
+    def __init__(self):
+        self.enqueued = 0 # Requests accepted
+        self.flushed = 0  # Entries written out to the ODB
+        self.dropped = 0  # Requests rejected because the queue was full
+        self.failed = 0   # Entries lost because the ODB could not store them
+        self.orphaned = 0 # Responses to requests that were dropped
+        self.flushes = 0  # Number of multi-row INSERTs issued
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+# ################################################################################################################################
+
+class AuditLog(object):
+    """ Collects audit entries of HTTP/SOAP channels in memory and writes them out to the ODB in batches, in a background
+    greenlet, so that requests to channels with auditing enabled are not slowed down by synchronous INSERTs.
+
+    The request and response halves of an entry are merged in memory - an entry is queued for writing only once its response
+    is known, or when it has waited for the response longer than pending_max_age seconds. Entries are written when batch_size
+    of them have been queued or every flush_interval seconds, whichever comes first.
+
+    There are never more than queue_max_size entries kept in memory, either waiting for responses or queued for writing.
+    New requests are dropped, and counted as such, if that limit is reached, which means that an ODB that cannot keep up
+    will never make requests wait for it.
+    """
+    def __init__(self, odb, batch_size=AUDIT_LOG.BATCH_SIZE, flush_interval=AUDIT_LOG.FLUSH_INTERVAL,
+            queue_max_size=AUDIT_LOG.QUEUE_MAX_SIZE, pending_max_age=AUDIT_LOG.PENDING_MAX_AGE):
+        self.odb = odb
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_max_size = queue_max_size
+        self.pending_max_age = pending_max_age
+
+        # CID -> (time queued, entry, WSGI environ) of requests still waiting for their responses
+        self.pending = {}
+
+        # Entries ready to be written out
+        self.queue = deque()
+
+        self.stats = AuditStats()
+        self.keep_running = True
+        self._flush_needed = Event()
+        self._flusher = None
+
+# ################################################################################################################################
+
+    def start(self):
+        if not self._flusher:
+            self._flusher = spawn(self._run_flusher)
+
+    def stop(self):
+        """ Stops the background greenlet and writes out everything that was collected so far.
+        """
+        self.keep_running = False
+        self._flush_needed.set()
+
+        if self._flusher:
+            self._flusher.join()
+            self._flusher = None
+
+# ################################################################################################################################
+
+    def get_size(self):
+        return len(self.pending) + len(self.queue)
+
+    def get_stats(self):
+        """ Returns counters and current sizes of the in-memory buffers.
+        """
+        out = self.stats.to_dict()
+        out['pending'] = len(self.pending)
+        out['queued'] = len(self.queue)
+        return out
+
+# ################################################################################################################################
+
+    def set_request(self, cid, channel_item, payload, remote_addr, wsgi_environ):
+        """ Stores initial audit information, right after receiving a request. Returns False if the entry had to be dropped.
+        """
+        if self.get_size() >= self.queue_max_size:
+            self.stats.dropped += 1
+            return False
+
+        entry = {
+            'conn_id': channel_item['id'],
+            'name': channel_item['name'],
+            'cid': cid,
+            'transport': channel_item['transport'],
+            'connection': channel_item['connection'],
+            'req_time': datetime.utcnow(),
+            'user_token': channel_item.get('username'),
+            'remote_addr': remote_addr,
+            'req_payload': payload,
+        }
+
+        # A shallow copy is enough because the environment will be dumped in the background,
+        # after the request will have been processed, and new keys are added to it in the meantime.
+        self.pending[cid] = (time(), entry, dict(wsgi_environ))
+        self.stats.enqueued += 1
+
+        # Lazily, so that there is no greenlet for workers that never audit anything
+        if not self._flusher:
+            self.start()
+
+        return True
+
+    def set_response(self, cid, response, wsgi_environ):
+        """ Merges response information with a previously stored request and queues the whole entry for writing.
+        """
+        pending = self.pending.pop(cid, None)
+        if not pending:
+            self.stats.orphaned += 1
+            return
+
+        _, entry, req_environ = pending
+        status = wsgi_environ['zato.http.response.status']
+
+        entry['invoke_ok'] = status[0] not in ('4', '5')
+        entry['auth_ok'] = status[0] != '4'
+        entry['resp_time'] = datetime.utcnow()
+        entry['resp_payload'] = response
+
+        self._enqueue(entry, req_environ, dict(wsgi_environ))
+
+    def _enqueue(self, entry, req_environ, resp_environ):
+        self.queue.append((entry, req_environ, resp_environ))
+
+        if len(self.queue) >= self.batch_size:
+            self._flush_needed.set()
+
+# ################################################################################################################################
+
+    def _move_stale_pending(self, now):
+        """ Queues for writing entries whose responses did not arrive in time, or all of them if the log is being stopped.
+        """
+        for cid, (queued_at, entry, req_environ) in self.pending.items():
+            if not self.keep_running or now - queued_at > self.pending_max_age:
+                del self.pending[cid]
+                self._enqueue(entry, req_environ, None)
+
+    def _get_batch(self):
+        batch = []
+        while self.queue and len(batch) < self.batch_size:
+            entry, req_environ, resp_environ = self.queue.popleft()
+            entry['req_headers'] = dump_wsgi_environ(req_environ)
+            if resp_environ is not None:
+                entry['resp_headers'] = dump_wsgi_environ(resp_environ)
+
+            # All of these are binary columns
+            for name in _binary_columns:
+                value = entry.get(name)
+                if isinstance(value, unicode):
+                    entry[name] = value.encode('utf-8')
+
+            batch.append(entry)
+
+        return batch
+
+    def flush(self):
+        """ Writes out to the ODB all the entries queued so far, batch_size of them in one transaction.
+        """
+        self._move_stale_pending(time())
+
+        while self.queue:
+            batch = self._get_batch()
+            try:
+                self.odb.audit_set_http_soap_many(batch)
+            except Exception, e:
+                self.stats.failed += len(batch)
+                logger.warn('Could not store %d audit entries, e:`%s`', len(batch), format_exc(e))
+            else:
+                self.stats.flushed += len(batch)
+                self.stats.flushes += 1
+
+    def _run_flusher(self):
+        while self.keep_running:
+            self._flush_needed.wait(self.flush_interval)
+            self._flush_needed.clear()
+
+            try:
+                self.flush()
+            except Exception, e:
+                logger.warn('Audit log flush error, e:`%s`', format_exc(e))
+
+        # We are stopping so anything that is still in memory needs to be stored
+        self.flush()
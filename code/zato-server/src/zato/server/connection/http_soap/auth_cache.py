@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from collections import OrderedDict
+from hashlib import sha256
+from time import time
+
+# Zato
+from zato.common import AUTH_CACHE
+
+# ################################################################################################################################
+
+class AuthCacheStats(object):
+    """ Counters describing how useful the cache of authentication results has been so far.
+    """
+    __slots__ = ('hits', 'misses', 'expired', 'evicted', 'flushes', 'miss_time')
+
+    def __init__(self):
+        self.hits = 0        # Requests authenticated from the cache
+        self.misses = 0      # Requests that had to be authenticated in full and were found valid
+        self.expired = 0     # Results found in the cache but too old to be used
+        self.evicted = 0     # Results removed because the cache was full
+        self.flushes = 0     # How many times the whole cache was cleared
+        self.miss_time = 0.0 # In seconds, how long it took to authenticate all the misses
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+# ################################################################################################################################
+
+class AuthCache(object):
+    """ A bounded cache of positive authentication results of HTTP Basic Auth and API keys.
+
+    Results are kept under a SHA-256 digest of the security definition's type and configuration and of the credentials
+    a request was authenticated with, so that credentials themselves are never kept in the cache. Each result is valid
+    for ttl seconds from when it was added. Once there are max_size results, the oldest ones are removed to make room
+    for new ones.
+
+    Only positive results are cached - invalid credentials are always checked in full. The whole cache is cleared
+    each time a security definition is changed or deleted.
+    """
+    def __init__(self, max_size=AUTH_CACHE.MAX_SIZE, ttl=AUTH_CACHE.TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # Key -> time the result expires at, oldest first
+        self.results = OrderedDict()
+
+        self.stats = AuthCacheStats()
+
+# ################################################################################################################################
+
+    def get_key(self, *values):
+        """ Returns a key to keep a result of authentication under. Values are the type of a security definition,
+        whatever in its configuration the result depends on and the credentials a request was authenticated with.
+        repr is used so that values are never confused with their neighbours and those that were not provided at all,
+        i.e. are None, never share a key with empty ones. Returns None, without computing anything, if nothing is to be cached.
+        """
+        if self.max_size:
+            return sha256(repr(values)).digest()
+
+# ################################################################################################################################
+
+    def has(self, key):
+        """ Returns True if there is a result under a given key that has not expired yet.
+        """
+        if not self.max_size:
+            return False
+
+        expires_at = self.results.get(key)
+
+        if expires_at is None:
+            return False
+
+        if expires_at < time():
+            del self.results[key]
+            self.stats.expired += 1
+            return False
+
+        self.stats.hits += 1
+        return True
+
+    def add(self, key, auth_time):
+        """ Stores a positive result under a given key. auth_time is how long it took to authenticate the request in full.
+        """
+        self.stats.misses += 1
+        self.stats.miss_time += auth_time
+
+        if not self.max_size:
+            return
+
+        self.results.pop(key, None)
+
+        while len(self.results) >= self.max_size:
+            self.results.popitem(False)
+            self.stats.evicted += 1
+
+        self.results[key] = time() + self.ttl
+
+    def clear(self):
+        self.results.clear()
+        self.stats.flushes += 1
+
+# ################################################################################################################################
+
+    def get_stats(self):
+        """ Returns counters, the current size, the ratio of hits to all requests authenticated and an estimate
+        of how much time, in seconds, was saved by not authenticating in full the requests that were found in the cache.
+        """
+        out = self.stats.to_dict()
+        out['size'] = len(self.results)
+
+        total = self.stats.hits + self.stats.misses
+        out['hit_ratio'] = self.stats.hits / total if total else 0.0
+        out['time_saved'] = self.stats.hits * self.stats.miss_time / self.stats.misses if self.stats.misses else 0.0
+
+        return out
+
+# ################################################################################################################################
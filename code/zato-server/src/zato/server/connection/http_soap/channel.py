@@ -25,10 +25,10 @@ from paste.util.converters import asbool
 # Zato
 from zato.common import CHANNEL, DATA_FORMAT, HTTP_RESPONSES, SEC_DEF_TYPE, SIMPLE_IO, TOO_MANY_REQUESTS, TRACE1, \
      URL_PARAMS_PRIORITY, URL_TYPE, zato_namespace, ZATO_ERROR, ZATO_NONE, ZATO_OK
-from zato.common.util import payload_from_request
 from zato.server.connection.http_soap import BadRequest, ClientHTTPError, Forbidden, MethodNotAllowed, NotFound, \
      TooManyRequests, Unauthorized
 from zato.server.service.internal import AdminService
+from zato.server.service.reqresp.payload import LazyPayload
 
 logger = logging.getLogger(__name__)
 
@@ -150,8 +150,13 @@ class RequestDispatcher(object):
         # OK, we can possibly handle it
         if url_match:
 
-            # This is a synchronous call so that whatever happens next we are always
-            # able to have at least initial audit log of requests.
+            # The request will be parsed at most once, only when anything needs it for the first time,
+            # and the result will be shared by audit log, security and the service.
+            wsgi_environ['zato.request.lazy_payload'] = lazy_payload = LazyPayload(
+                cid, payload, channel_item.get('data_format'), channel_item.get('transport'))
+
+            # Stored in memory before anything else happens so that we are always able to have
+            # at least initial audit log of requests, it will be written out to the ODB in background.
             if channel_item['audit_enabled']:
                 self.url_data.audit_set_request(cid, channel_item, payload, wsgi_environ)
 
@@ -182,11 +187,10 @@ class RequestDispatcher(object):
                 # This is handy if someone invoked URLData's OAuth API manually
                 wsgi_environ['zato.oauth.post_data'] = post_data
 
-                # Eagerly parse the request but only if we expect XPath-based credentials. The request will be re-used
+                # Parse the request now but only if we expect XPath-based credentials. The request will be re-used
                 # in later steps, it won't be parsed twice or more.
                 if sec.sec_def != ZATO_NONE and sec.sec_def.sec_type == SEC_DEF_TYPE.XPATH_SEC:
-                    wsgi_environ['zato.request.payload'] = payload_from_request(
-                        cid, payload, channel_item.data_format, channel_item.transport)
+                    wsgi_environ['zato.request.payload'] = lazy_payload.get()
 
                 # Will raise an exception on any security violation
                 self.url_data.check_security(
@@ -343,14 +347,15 @@ class RequestHandler(object):
         else:
             channel_params = None
 
-        response = service.update_handle(self._set_response_data, service, raw_request,
-            CHANNEL.HTTP_SOAP, channel_item.data_format, channel_item.transport, self.server, worker_store.broker_client,
-            worker_store, cid, simple_io_config, wsgi_environ=wsgi_environ,
-            url_match=url_match, channel_item=channel_item, channel_params=channel_params,
-            merge_channel_params=channel_item.merge_url_params_req,
-            params_priority=channel_item.params_pri)
-
-        return response
+        try:
+            return service.update_handle(self._set_response_data, service, raw_request,
+                CHANNEL.HTTP_SOAP, channel_item.data_format, channel_item.transport, self.server, worker_store.broker_client,
+                worker_store, cid, simple_io_config, wsgi_environ=wsgi_environ,
+                url_match=url_match, channel_item=channel_item, channel_params=channel_params,
+                merge_channel_params=channel_item.merge_url_params_req,
+                params_priority=channel_item.params_pri)
+        finally:
+            self.server.service_store.release_instance(service)
 
     # ##########################################################################
 
@@ -14,10 +14,12 @@ from copy import deepcopy
 from cStringIO import StringIO
 from datetime import datetime
 from json import dumps, loads
+from time import time
 from traceback import format_exc
 
 # gevent
-from gevent.lock import RLock
+from gevent import joinall, killall, spawn
+from gevent.lock import RLock, Semaphore
 
 # parse
 from parse import PARSE_RE
@@ -27,8 +29,8 @@ import requests
 from requests.exceptions import Timeout as RequestsTimeout
 
 # Zato
-from zato.common import CONTENT_TYPE, DATA_FORMAT, HTTP_SOAP_SERIALIZATION_TYPE, Inactive, SEC_DEF_TYPE, TimeoutException, \
-     URL_TYPE, ZATO_NONE
+from zato.common import CONTENT_TYPE, DATA_FORMAT, HTTP_SOAP_SERIALIZATION_TYPE, Inactive, SCATTER_GATHER, SEC_DEF_TYPE, \
+     TimeoutException, URL_TYPE, ZATO_NONE
 from zato.common.util import get_component_name
 from zato.server.connection.queue import ConnectionQueue
 
@@ -76,9 +78,12 @@ class BaseHTTPSOAPWrapper(object):
             # Suds connections don't have requests_auth
             auth = getattr(self, 'requests_auth', None)
 
+            # Each call may have its own timeout
+            timeout = kwargs.pop('timeout', self.config['timeout'])
+
             return self.session.request(
                 method, address, data=data, auth=auth, headers=headers, hooks=hooks,
-                cert=cert, verify=verify, timeout=self.config['timeout'], *args, **kwargs)
+                cert=cert, verify=verify, timeout=timeout, *args, **kwargs)
         except RequestsTimeout, e:
             raise TimeoutException(cid, format_exc(e))
 
@@ -369,6 +374,123 @@ class HTTPSOAPWrapper(BaseHTTPSOAPWrapper):
     def patch(self, cid, data='', params=None, *args, **kwargs):
         return self.http_request('PATCH', cid, data, params, *args, **kwargs)
 
+# ################################################################################################################################
+
+    def scatter_gather(self, cid, calls, timeout=None, call_timeout=None, max_concurrent=SCATTER_GATHER.MAX_CONCURRENT):
+        """ Same as the module-level scatter_gather but all the calls are sent through this connection, each one given
+        as a dict of arguments to http_request, e.g. {'method':'GET', 'params':{'id':123}}.
+        """
+        return scatter_gather(cid, [HTTPCall(self, **call) for call in calls], timeout, call_timeout, max_concurrent)
+
+# ################################################################################################################################
+
+class HTTPCall(object):
+    """ A single request to be sent through an outgoing connection by scatter_gather.
+    """
+    __slots__ = ('conn', 'method', 'data', 'params', 'kwargs')
+
+    def __init__(self, conn, method='GET', data='', params=None, **kwargs):
+        self.conn = conn
+        self.method = method
+        self.data = data
+        self.params = params
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return '<{} at {}, conn:`{}`, method:`{}`>'.format(
+            self.__class__.__name__, hex(id(self)), self.conn.config['name'], self.method)
+
+class HTTPCallResult(object):
+    """ Outcome of an HTTPCall - either a response or an exception the call ended with. Calls that did not complete
+    before their timeout or the deadline of all the calls have is_timeout set to True.
+    """
+    __slots__ = ('call', 'response', 'exception', 'is_timeout', 'time')
+
+    def __init__(self, call):
+        self.call = call
+        self.response = None
+        self.exception = None
+        self.is_timeout = False
+        self.time = None # In seconds, how long it took to complete the call, None if it never started
+
+    @property
+    def is_ok(self):
+        return self.response is not None
+
+    def __repr__(self):
+        return '<{} at {}, call:`{}`, is_ok:`{}`, is_timeout:`{}`, time:`{}`>'.format(
+            self.__class__.__name__, hex(id(self)), self.call, self.is_ok, self.is_timeout, self.time)
+
+# ################################################################################################################################
+
+def scatter_gather(cid, calls, timeout=None, call_timeout=None, max_concurrent=SCATTER_GATHER.MAX_CONCURRENT):
+    """ Sends HTTPCall objects concurrently, possibly through different connections, and returns a list of HTTPCallResult
+    objects, one for each call, in the same order. Exceptions raised by calls are not re-raised, they are returned
+    in results along with responses of all the calls that did succeed.
+
+    timeout is a deadline, in seconds, for all of the calls together - those not completed by then are cancelled.
+    call_timeout, if given, is used by each call instead of its connection's own timeout. At most max_concurrent calls
+    are in progress at a time and never more than a connection's pool_size of them through any single connection
+    so that each call reuses a connection from its pool.
+    """
+    results = [HTTPCallResult(call) for call in calls]
+    deadline = time() + timeout if timeout else None
+
+    limit = Semaphore(max_concurrent)
+    conn_limits = {}
+
+    for result in results:
+        conn = result.call.conn
+        if conn not in conn_limits:
+            conn_limits[conn] = Semaphore(conn.config['pool_size'])
+
+    def _invoke(result):
+        call = result.call
+
+        with conn_limits[call.conn]:
+            with limit:
+
+                kwargs = dict(call.kwargs)
+                _timeout = call_timeout or call.conn.config['timeout']
+
+                if deadline:
+                    remaining = deadline - time()
+
+                    # A connection may have no timeout of its own, in which case only the deadline applies
+                    _timeout = min(_timeout, remaining) if _timeout else remaining
+
+                    # The deadline passed while waiting for other calls to complete
+                    if _timeout <= 0:
+                        result.is_timeout = True
+                        return
+
+                kwargs['timeout'] = _timeout
+
+                start = time()
+
+                try:
+                    result.response = call.conn.http_request(call.method, cid, call.data, call.params, **kwargs)
+                except Exception, e:
+                    result.exception = e
+                    result.is_timeout = isinstance(e, TimeoutException)
+                    logger.warn('CID:[%s] Call `%r` failed, e:`%s`', cid, call, format_exc(e))
+                finally:
+                    result.time = time() - start
+
+    greenlets = [spawn(_invoke, result) for result in results]
+    joinall(greenlets, timeout=timeout)
+
+    pending = [greenlet for greenlet in greenlets if not greenlet.ready()]
+    if pending:
+        logger.warn('CID:[%s] Cancelling %d/%d call(s) not completed within %s s', cid, len(pending), len(results), timeout)
+        killall(pending)
+
+        for result in results:
+            if not (result.is_ok or result.exception):
+                result.is_timeout = True
+
+    return results
+
 # ################################################################################################################################
 
 class SudsSOAPWrapper(BaseHTTPSOAPWrapper):
@@ -10,11 +10,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
-from datetime import datetime
+from functools import partial
 from hashlib import sha256
-from json import dumps, loads
-from operator import attrgetter
+from json import dumps
 from threading import RLock
+from time import time
 from traceback import format_exc
 
 # Bunch
@@ -31,15 +31,17 @@ from parse import compile as parse_compile
 from secwall.server import on_basic_auth, on_wsse_pwd
 from secwall.wsse import WSSE
 
-# SortedContainers
-from sortedcontainers import SortedListWithKey
-
 # Zato
 from zato.common import AUDIT_LOG, DATA_FORMAT, MISC, MSG_PATTERN_TYPE, SEC_DEF_TYPE, TRACE1, ZATO_NONE
-from zato.common.broker_message import code_to_name, CHANNEL, SECURITY
+from zato.common.broker_message import code_to_name, SECURITY
 from zato.common.dispatch import dispatcher
 from zato.common.util import parse_tls_channel_security_definition
 from zato.server.connection.http_soap import Forbidden, Unauthorized
+from zato.server.connection.http_soap.audit import AuditLog, dump_wsgi_environ
+from zato.server.connection.http_soap.auth_cache import AuthCache
+from zato.server.connection.http_soap.url_index import ChannelData
+from zato.server.message import xpath_cache
+from zato.server.service.reqresp.payload import LazyPayload
 
 logger = logging.getLogger(__name__)
 
@@ -53,8 +55,8 @@ class URLData(OAuthDataStore):
     def __init__(self, channel_data=None, url_sec=None, basic_auth_config=None, ntlm_config=None, oauth_config=None,
                  tech_acc_config=None, wss_config=None, apikey_config=None, aws_config=None, openstack_config=None,
                  xpath_sec_config=None, tls_channel_sec_config=None, tls_key_cert_config=None, kvdb=None, broker_client=None,
-                 odb=None, json_pointer_store=None, xpath_store=None):
-        self.channel_data = SortedListWithKey(channel_data, key=attrgetter('name'))
+                 odb=None, json_pointer_store=None, xpath_store=None, audit_log=None, auth_cache=None):
+        self.channel_data = ChannelData(channel_data)
         self.url_sec = url_sec
         self.basic_auth_config = basic_auth_config
         self.ntlm_config = ntlm_config
@@ -74,6 +76,19 @@ class URLData(OAuthDataStore):
         self.json_pointer_store = json_pointer_store
         self.xpath_store = xpath_store
 
+        # Request and response audit entries are written out in batches in background
+        self.audit_log = audit_log or AuditLog(odb)
+
+        # Positive results of HTTP Basic Auth and API key checks
+        self.auth_cache = auth_cache or AuthCache()
+
+        # Security definition type -> method handling it, resolved on first use
+        self._sec_handlers = {}
+
+        # Expressions of XPath security definitions are compiled up front rather than on first use
+        for item in (xpath_sec_config or {}).values():
+            self._compile_xpath_sec(item.config)
+
         self.url_sec_lock = RLock()
         self.update_lock = RLock()
         self._wss = WSSE()
@@ -136,6 +151,13 @@ class URLData(OAuthDataStore):
     def _handle_security_apikey(self, cid, sec_def, path_info, body, wsgi_environ, ignored_post_data=None):
         """ Performs the authentication against an API key in a specified HTTP header.
         """
+        cache_key = self.auth_cache.get_key(
+            SEC_DEF_TYPE.APIKEY, sec_def['username'], sec_def.get('password'), wsgi_environ.get(sec_def['username']))
+        if self.auth_cache.has(cache_key):
+            return
+
+        start = time()
+
         # Find out if the header was provided at all
         if sec_def['username'] not in wsgi_environ:
             msg = 'UNAUTHORIZED path_info:`{}`, cid:`{}`'.format(path_info, cid)
@@ -150,9 +172,18 @@ class URLData(OAuthDataStore):
             logger.error(msg + ' (Invalid key)')
             raise Unauthorized(cid, msg, 'zato-apikey')
 
+        self.auth_cache.add(cache_key, time() - start)
+
     def _handle_security_basic_auth(self, cid, sec_def, path_info, body, wsgi_environ, ignored_post_data=None):
         """ Performs the authentication using HTTP Basic Auth.
         """
+        cache_key = self.auth_cache.get_key(
+            SEC_DEF_TYPE.BASIC_AUTH, sec_def['username'], sec_def['password'], wsgi_environ.get('HTTP_AUTHORIZATION'))
+        if self.auth_cache.has(cache_key):
+            return
+
+        start = time()
+
         env = {'HTTP_AUTHORIZATION':wsgi_environ.get('HTTP_AUTHORIZATION')}
         url_config = {'basic-auth-username':sec_def.username, 'basic-auth-password':sec_def.password}
 
@@ -164,6 +195,8 @@ class URLData(OAuthDataStore):
             logger.error(msg)
             raise Unauthorized(cid, msg, 'Basic realm="{}"'.format(sec_def.realm))
 
+        self.auth_cache.add(cache_key, time() - start)
+
     def _handle_security_wss(self, cid, sec_def, path_info, body, wsgi_environ, ignored_post_data=None):
         """ Performs the authentication using WS-Security.
         """
@@ -227,7 +260,8 @@ class URLData(OAuthDataStore):
             wsgi_environ['zato.oauth.request'] = oauth_request
 
     def _handle_security_tech_acc(self, cid, sec_def, path_info, body, wsgi_environ, ignored_post_data=None):
-        """ Performs the authentication using technical accounts.
+        """ Performs the authentication using technical accounts. Results are not cached - checking a password
+        takes a single SHA-256 digest, no more than computing a key in the cache would.
         """
         zato_headers = ('HTTP_X_ZATO_USER', 'HTTP_X_ZATO_PASSWORD')
 
@@ -263,7 +297,7 @@ class URLData(OAuthDataStore):
         payload = wsgi_environ['zato.request.payload']
         user_msg = 'Invalid username or password'
 
-        username = payload.xpath(sec_def.username_expr)
+        username = xpath_cache.get(sec_def.username_expr)(payload)
         if not username:
             logger.error('%s `%s` expr:`%s`, value:`%r`', user_msg, '(no username)', sec_def.username_expr, username)
             raise Unauthorized(cid, user_msg, 'zato-xpath')
@@ -276,7 +310,7 @@ class URLData(OAuthDataStore):
 
         if sec_def.get('password_expr'):
 
-            password = payload.xpath(sec_def.password_expr)
+            password = xpath_cache.get(sec_def.password_expr)(payload)
             if not password:
                 logger.error('%s `%s` expr:`%s`', user_msg, '(no password)', sec_def.password_expr)
                 raise Unauthorized(cid, user_msg, 'zato-xpath')
@@ -307,12 +341,13 @@ class URLData(OAuthDataStore):
         the list of HTTP channel targets.
         """
         target = '{}{}{}'.format(soap_action, self._target_separator, url_path)
-        for item in self.channel_data:
-            match = item.match_target_compiled.parse(target)
-            if match:
-                if logger.isEnabledFor(TRACE1):
-                    logger.log(TRACE1, 'Matched target:[%s] with:[%r]', target, item)
-                return match, item
+
+        # Only channels that can possibly match are tried, in the same order the full list would be scanned in.
+        match, item = self.channel_data.match(target)
+        if match:
+            if logger.isEnabledFor(TRACE1):
+                logger.log(TRACE1, 'Matched target:[%s] with:[%r]', target, item)
+            return match, item
 
         return None, None
 
@@ -325,9 +360,13 @@ class URLData(OAuthDataStore):
             # Regular security permissions
 
             sec_def, sec_def_type = sec.sec_def, sec.sec_def.sec_type
-            handler_name = '_handle_security_{0}'.format(sec_def_type.replace('-', '_'))
-            getattr(self, handler_name)(
-                cid, sec_def, path_info, payload, wsgi_environ, post_data)
+
+            handler = self._sec_handlers.get(sec_def_type)
+            if not handler:
+                handler = self._sec_handlers[sec_def_type] = getattr(
+                    self, '_handle_security_{0}'.format(sec_def_type.replace('-', '_')))
+
+            handler(cid, sec_def, path_info, payload, wsgi_environ, post_data)
 
             # Ok, we now know that the credentials are valid so we can check RBAC permissions if need be.
             if channel_item.get('has_rbac'):
@@ -391,6 +430,7 @@ class URLData(OAuthDataStore):
         """ Updates an existing API key security definition.
         """
         with self.url_sec_lock:
+            self.auth_cache.clear()
             del self.apikey_config[msg.old_name]
             self._update_apikey(msg.name, msg)
             self._update_url_sec(msg, SEC_DEF_TYPE.APIKEY)
@@ -399,6 +439,7 @@ class URLData(OAuthDataStore):
         """ Deletes an API key security definition.
         """
         with self.url_sec_lock:
+            self.auth_cache.clear()
             self._delete_channel_data('apikey', msg.name)
             del self.apikey_config[msg.name]
             self._update_url_sec(msg, SEC_DEF_TYPE.APIKEY, True)
@@ -407,6 +448,7 @@ class URLData(OAuthDataStore):
         """ Changes password of an API key security definition.
         """
         with self.url_sec_lock:
+            self.auth_cache.clear()
             self.apikey_config[msg.name]['config']['password'] = msg.password
             self._update_url_sec(msg, SEC_DEF_TYPE.APIKEY)
 
@@ -509,6 +551,7 @@ class URLData(OAuthDataStore):
         """ Updates an existing HTTP Basic Auth security definition.
         """
         with self.url_sec_lock:
+            self.auth_cache.clear()
             del self.basic_auth_config[msg.old_name]
             self._update_basic_auth(msg.name, msg)
             self._update_url_sec(msg, SEC_DEF_TYPE.BASIC_AUTH)
@@ -517,6 +560,7 @@ class URLData(OAuthDataStore):
         """ Deletes an HTTP Basic Auth security definition.
         """
         with self.url_sec_lock:
+            self.auth_cache.clear()
             self._delete_channel_data('basic_auth', msg.name)
             del self.basic_auth_config[msg.name]
             self._update_url_sec(msg, SEC_DEF_TYPE.BASIC_AUTH, True)
@@ -525,6 +569,7 @@ class URLData(OAuthDataStore):
         """ Changes password of an HTTP Basic Auth security definition.
         """
         with self.url_sec_lock:
+            self.auth_cache.clear()
             self.basic_auth_config[msg.name]['config']['password'] = msg.password
             self._update_url_sec(msg, SEC_DEF_TYPE.BASIC_AUTH)
 
@@ -702,7 +747,20 @@ class URLData(OAuthDataStore):
 
 # ################################################################################################################################
 
+    def _compile_xpath_sec(self, config):
+        """ Compiles the expressions of an XPath security definition, logging rather than raising an exception
+        if any of them is invalid - requests to channels using the definition will fail in such a case.
+        """
+        for name in 'username_expr', 'password_expr':
+            expr = config.get(name)
+            if expr:
+                try:
+                    xpath_cache.get(expr)
+                except Exception, e:
+                    logger.warn('Could not compile %s:`%s` of `%s`, e:`%s`', name, expr, config.get('name'), format_exc(e))
+
     def _update_xpath_sec(self, name, config):
+        self._compile_xpath_sec(config)
         self.xpath_sec_config[name] = Bunch()
         self.xpath_sec_config[name].config = config
 
@@ -918,34 +976,45 @@ class URLData(OAuthDataStore):
 
 # ################################################################################################################################
 
+    def _mask_json(self, pattern_list, payload):
+        """ Returns a JSON payload serialized with elements matching JSON Pointers from pattern_list replaced.
+        The payload itself is not modified.
+        """
+        for name in pattern_list:
+            logger.debug('Before `%r`:`%r`', name, payload)
+            payload = self.json_pointer_store.replace(name, payload, AUDIT_LOG.REPLACE_WITH)
+            logger.debug('After `%r`:`%r`', name, payload)
+
+        return dumps(payload)
+
     def _dump_wsgi_environ(self, wsgi_environ):
         """ A convenience method to dump WSGI environment with all the element repr'ed.
         """
-        # TODO: There should be another copy of WSGI environ added with password masked out
-        env = wsgi_environ.items()
-        for elem in env:
-            if elem[0] == 'zato.http.channel_item':
-                elem[1]['password'] = AUDIT_LOG.REPLACE_WITH
-
-        return dumps({key: repr(value) for key, value in env})
+        return dump_wsgi_environ(wsgi_environ)
 
     def audit_set_request(self, cid, channel_item, payload, wsgi_environ):
-        """ Stores initial audit information, right after receiving a request.
+        """ Stores initial audit information, right after receiving a request. The information is kept in memory
+        until a response is known and it will be written out to the ODB in background along with other entries.
         """
         if channel_item['audit_repl_patt_type'] == MSG_PATTERN_TYPE.JSON_POINTER.id:
-            payload = loads(payload) if payload else ''
             pattern_list = channel_item['replace_patterns_json_pointer']
+
+            # No need to parse the request at all if there is nothing to mask in it. Otherwise, a masked copy is made
+            # of the request parsed once for all the consumers, so that they don't see the masked values.
+            if payload and pattern_list:
+                lazy_payload = wsgi_environ.get('zato.request.lazy_payload')
+                if not (lazy_payload and lazy_payload.raw_request is payload and lazy_payload.data_format == DATA_FORMAT.JSON):
+                    lazy_payload = LazyPayload(cid, payload, DATA_FORMAT.JSON, None)
+
+                payload = lazy_payload.get_view(('audit', tuple(pattern_list)), partial(self._mask_json, pattern_list))
         else:
             pattern_list = channel_item['replace_patterns_xpath']
 
-        if payload:
-            for name in pattern_list:
-                logger.debug('Before `%r`:`%r`', name, payload)
-                payload = self.replace_payload(name, payload, channel_item.audit_repl_patt_type)
-                logger.debug('After `%r`:`%r`', name, payload)
-
-        if channel_item['audit_repl_patt_type'] == MSG_PATTERN_TYPE.JSON_POINTER.id:
-            payload = dumps(payload)
+            if payload:
+                for name in pattern_list:
+                    logger.debug('Before `%r`:`%r`', name, payload)
+                    payload = self.replace_payload(name, payload, channel_item.audit_repl_patt_type)
+                    logger.debug('After `%r`:`%r`', name, payload)
 
         if channel_item['audit_max_payload']:
             payload = payload[:channel_item['audit_max_payload']]
@@ -954,29 +1023,13 @@ class URLData(OAuthDataStore):
         if not remote_addr:
             remote_addr = wsgi_environ.get('REMOTE_ADDR', '(None)')
 
-        self.odb.audit_set_request_http_soap(channel_item['id'], channel_item['name'], cid,
-            channel_item['transport'], channel_item['connection'], datetime.utcnow(),
-            channel_item.get('username'), remote_addr, self._dump_wsgi_environ(wsgi_environ), payload)
+        self.audit_log.set_request(cid, channel_item, payload, remote_addr, wsgi_environ)
 
     def audit_set_response(self, cid, response, wsgi_environ):
-        """ Stores audit info regarding a response to a previous request.
-        """
-        payload = dumps({
-            'cid': cid,
-            'invoke_ok': wsgi_environ['zato.http.response.status'][0] not in ('4', '5'),
-            'auth_ok':  wsgi_environ['zato.http.response.status'][0] != '4',
-            'resp_time': datetime.utcnow().isoformat(),
-            'resp_headers': self._dump_wsgi_environ(wsgi_environ),
-            'resp_payload': response,
-        })
-
-        self.broker_client.publish({
-            'cid': cid,
-            'data_format':DATA_FORMAT.JSON,
-            'action': CHANNEL.HTTP_SOAP_AUDIT_RESPONSE.value,
-            'payload': payload,
-            'service': 'zato.http-soap.set-audit-response-data'
-        })
+        """ Stores audit info regarding a response to a previous request. Responses are merged with their requests
+        in memory, without any round-trips to the broker or ODB.
+        """
+        self.audit_log.set_response(cid, response, wsgi_environ)
 
     def on_broker_msg_CHANNEL_HTTP_SOAP_AUDIT_CONFIG(self, msg):
         for item in self.channel_data:
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from bisect import insort
+from heapq import merge
+from itertools import count
+from operator import attrgetter
+
+# SortedContainers
+from sortedcontainers import SortedListWithKey
+
+# ################################################################################################################################
+
+_name_key = attrgetter('name')
+
+# ################################################################################################################################
+
+class ChannelData(SortedListWithKey):
+    """ A list of HTTP/SOAP channels sorted by their names, just like a regular SortedListWithKey, with an index built on top
+    of it so that matching incoming requests does not need to try out each channel in turn.
+
+    Channels whose match targets have no parameters are kept in a dictionary keyed by the target itself. Channels with
+    parameters are grouped by the literal prefix of their targets, up to the last slash before the first parameter,
+    which means that only the ones whose prefix is also a prefix of the incoming target need to be tried.
+
+    All the matching is still carried out by the channels' compiled parse expressions, the index is only used for choosing
+    the candidates, which in turn means that the order of precedence is the same as if the whole list was scanned.
+
+    Note that parse matches targets case-insensitively and the index follows suit.
+    """
+    def __init__(self, iterable=None, key=_name_key, *args, **kwargs):
+
+        # Keys are lower-cased targets, values are lists of (name, seq, channel) tuples,
+        # the sequence number is there for ties to be resolved in order of insertion, just like SortedListWithKey does it.
+        self._static = {}
+
+        # Keys are lower-cased literal prefixes of targets, values are the same as above.
+        self._dynamic = {}
+
+        # Maps IDs of Python objects to (buckets, key, entry) tuples so that items can be quickly removed from the index.
+        self._entries = {}
+
+        self._seq = count()
+
+        super(ChannelData, self).__init__(iterable, key=key, *args, **kwargs)
+
+# ################################################################################################################################
+
+    def _get_bucket_info(self, match_target):
+        """ Returns a dictionary an item with a given match target belongs to along with its key in that dictionary.
+        """
+        if '{' not in match_target and '}' not in match_target:
+            return self._static, match_target.lower()
+
+        literal = match_target[:match_target.find('{')] if '{' in match_target else match_target
+        return self._dynamic, literal[:literal.rfind('/') + 1].lower()
+
+    def _add_to_index(self, item):
+        match_target = getattr(item, 'match_target', None)
+
+        # Already indexed or there is nothing to index by
+        if id(item) in self._entries or match_target is None:
+            return
+
+        buckets, key = self._get_bucket_info(match_target)
+        entry = (item.name, next(self._seq), item)
+        insort(buckets.setdefault(key, []), entry)
+        self._entries[id(item)] = (buckets, key, entry)
+
+    def _remove_from_index(self, item):
+        info = self._entries.pop(id(item), None)
+        if not info:
+            return
+
+        buckets, key, entry = info
+        bucket = buckets[key]
+        bucket.remove(entry)
+
+        if not bucket:
+            del buckets[key]
+
+    def _rebuild_index(self):
+        self._static.clear()
+        self._dynamic.clear()
+        self._entries.clear()
+
+        for item in self:
+            self._add_to_index(item)
+
+# ################################################################################################################################
+
+    def add(self, value):
+        super(ChannelData, self).add(value)
+        self._add_to_index(value)
+
+    def append(self, value):
+        super(ChannelData, self).append(value)
+        self._add_to_index(value)
+
+    def insert(self, idx, value):
+        super(ChannelData, self).insert(idx, value)
+        self._add_to_index(value)
+
+    def update(self, iterable):
+        values = list(iterable)
+        super(ChannelData, self).update(values)
+        for value in values:
+            self._add_to_index(value)
+
+    def extend(self, values):
+        values = list(values)
+        super(ChannelData, self).extend(values)
+        for value in values:
+            self._add_to_index(value)
+
+    def discard(self, value):
+        super(ChannelData, self).discard(value)
+        if value not in self:
+            self._remove_from_index(value)
+
+    def remove(self, value):
+        super(ChannelData, self).remove(value)
+        if value not in self:
+            self._remove_from_index(value)
+
+    def pop(self, idx=-1):
+        value = super(ChannelData, self).pop(idx)
+        self._remove_from_index(value)
+        return value
+
+    def __delitem__(self, idx):
+        super(ChannelData, self).__delitem__(idx)
+        self._rebuild_index()
+
+    def __setitem__(self, idx, value):
+        super(ChannelData, self).__setitem__(idx, value)
+        self._rebuild_index()
+
+    def clear(self):
+        super(ChannelData, self).clear()
+        self._rebuild_index()
+
+# ################################################################################################################################
+
+    def get_candidates(self, target):
+        """ Yields all channels that may possibly match the target, in the order they are kept in the list.
+        """
+        target_lower = target.lower()
+        buckets = []
+
+        static = self._static.get(target_lower)
+        if static:
+            buckets.append(static)
+
+        dynamic = self._dynamic
+        if dynamic:
+
+            # Parameterized targets without any slashes in their literal prefixes
+            bucket = dynamic.get('')
+            if bucket:
+                buckets.append(bucket)
+
+            pos = target_lower.find('/')
+            while pos != -1:
+                bucket = dynamic.get(target_lower[:pos+1])
+                if bucket:
+                    buckets.append(bucket)
+                pos = target_lower.find('/', pos+1)
+
+        if not buckets:
+            return ()
+
+        return buckets[0] if len(buckets) == 1 else merge(*buckets)
+
+    def match(self, target):
+        """ Returns a parse result and the first channel matching the target or (None, None) if there is no match.
+        """
+        for _, _, item in self.get_candidates(target):
+            match = item.match_target_compiled.parse(target)
+            if match:
+                return match, item
+
+        return None, None
+
+# ################################################################################################################################
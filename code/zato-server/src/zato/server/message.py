@@ -10,6 +10,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
+from copy import copy
 from decimal import Decimal
 from threading import RLock
 from traceback import format_exc
@@ -90,6 +91,37 @@ class MessageFacade(object):
 
 # ################################################################################################################################
 
+class XPathCache(object):
+    """ Compiled XPath expressions, keyed by an expression and the namespace map it was compiled with, shared by everything
+    that evaluates expressions from configuration, so that no expression is compiled more than once. There are never
+    more than max_size expressions kept - the cache is cleared if there would be more, e.g. after many of them were edited.
+    """
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.data = {}
+        self.update_lock = RLock()
+
+    def get(self, expr, ns_map=None):
+        """ Returns an etree.XPath object for an expression and a namespace map, compiling it first if needed.
+        """
+        key = (expr, tuple(sorted(ns_map.items())) if ns_map else ())
+        compiled = self.data.get(key)
+
+        if compiled is None:
+            compiled = etree.XPath(expr, namespaces=ns_map)
+            with self.update_lock:
+                if len(self.data) >= self.max_size:
+                    self.data.clear()
+                self.data[key] = compiled
+
+        return compiled
+
+
+# Shared by all XPath stores and XPath security definitions
+xpath_cache = XPathCache()
+
+# ################################################################################################################################
+
 class NamespaceStore(object):
     """ A store of all the namespaces used with XML processing.
     """
@@ -148,7 +180,7 @@ class BaseStore(object):
         prefixes are valid.
         """
         try:
-            compiled = etree.XPath(expr, namespaces=ns_map)
+            compiled = xpath_cache.get(expr, ns_map)
             compiled.evaluate(self.dummy_doc)
         except Exception:
             logger.warn('Failed to compile expr:[%s] with ns_map:[%s]', expr, ns_map)
@@ -208,7 +240,7 @@ class XPathStore(BaseStore):
         # Mostly taken from https://stackoverflow.com/a/5547668
         ns_map = ns_map or {}
         path = self.data[name].config.value
-        nodes = doc.xpath(path, namespaces=ns_map)
+        nodes = xpath_cache.get(path, ns_map)(doc)
 
         if nodes:
             node = nodes
@@ -217,7 +249,7 @@ class XPathStore(BaseStore):
             parts = (part for part in parts if part)
             p = doc
             for part in parts:
-                nodes = p.xpath(part, namespaces=ns_map)
+                nodes = xpath_cache.get(part, ns_map)(p)
                 if not nodes:
                     name_elems = part.split(':')
 
@@ -274,6 +306,29 @@ class JSONPointerStore(BaseStore):
             dpath_util.new(doc, '/' + '/'.join(pointer.parts), value)
             return doc
 
+    def replace(self, name, doc, value):
+        """ Returns a copy of a doc with a value under a given name replaced, or the doc itself if there's nothing there.
+        Unlike with set(doc, value, in_place=False), only containers on the path to the value are copied rather than
+        the whole doc, which is not modified in either case.
+        """
+        if not self.get(name, doc):
+            return doc
+
+        pointer = self.data[name]
+        if not pointer.parts:
+            return value
+
+        out = parent = copy(doc)
+
+        for part in pointer.parts[:-1]:
+            part = pointer.get_part(parent, part)
+            parent[part] = copy(parent[part])
+            parent = parent[part]
+
+        parent[pointer.get_part(parent, pointer.parts[-1])] = value
+
+        return out
+
     def add(self, name, value, *ignored_args, **ignored_kwargs):
         """ Adds a new JSON Pointer expression to the store.
         """
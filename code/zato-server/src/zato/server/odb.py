@@ -15,7 +15,7 @@ from datetime import datetime, timedelta
 from traceback import format_exc
 
 # SQLAlchemy
-from sqlalchemy.exc import IntegrityError, ProgrammingError
+from sqlalchemy.exc import IntegrityError
 
 # Bunch
 from bunch import Bunch
@@ -23,7 +23,8 @@ from bunch import Bunch
 # Zato
 from zato.common import DEPLOYMENT_STATUS, MISC, SEC_DEF_TYPE, TRACE1, ZATO_NONE, ZATO_ODB_POOL_NAME
 from zato.common.odb.model import APIKeySecurity, Cluster, DeployedService, DeploymentPackage, DeploymentStatus, HTTPBasicAuth, \
-     HTTPSOAP, HTTSOAPAudit, OAuth, Server, Service, TechnicalAccount, TLSChannelSecurity, XPathSecurity, WSSDefinition
+     HTTPSOAP, HTTSOAPAudit, HTTSOAPAuditReplacePatternsJSONPointer, HTTSOAPAuditReplacePatternsXPath, JSONPointer, OAuth, \
+     Server, Service, TechnicalAccount, TLSChannelSecurity, XPath, XPathSecurity, WSSDefinition
 from zato.common.odb import query
 from zato.common.util import current_host, get_http_json_channel, get_http_soap_channel, parse_tls_channel_security_definition
 from zato.server.connection.sql import SessionWrapper
@@ -126,7 +127,27 @@ class ODBManager(SessionWrapper):
             for c in q.statement.columns:
                 columns[c.name] = None
 
-            for item in q.all():
+            items = q.all()
+
+            # Security definitions of each type are fetched in batches rather than one by one for each channel.
+            sec_defs = {}
+            sec_ids = {}
+
+            for item in items:
+                if item.security_id:
+                    sec_ids.setdefault(item.sec_type, set()).add(item.security_id)
+
+            for sec_type, ids in sec_ids.items():
+
+                # Will raise KeyError if the DB gets somehow misconfigured.
+                db_class = sec_type_db_class[sec_type]
+
+                ids = sorted(ids)
+                for idx in xrange(0, len(ids), MISC.ODB_IN_CLAUSE_BATCH_SIZE):
+                    for sec_def in session.query(db_class).filter(db_class.id.in_(ids[idx:idx+MISC.ODB_IN_CLAUSE_BATCH_SIZE])):
+                        sec_defs[sec_type, sec_def.id] = sec_def
+
+            for item in items:
                 target = '{}{}{}'.format(item.soap_action, MISC.SEPARATOR, item.url_path)
 
                 result[target] = Bunch()
@@ -137,12 +158,7 @@ class ODBManager(SessionWrapper):
                 if item.security_id:
                     result[target].sec_def = Bunch()
 
-                    # Will raise KeyError if the DB gets somehow misconfigured.
-                    db_class = sec_type_db_class[item.sec_type]
-
-                    sec_def = session.query(db_class).\
-                            filter(db_class.id==item.security_id).\
-                            one()
+                    sec_def = sec_defs[item.sec_type, item.security_id]
 
                     # Common things first
                     result[target].sec_def.id = sec_def.id
@@ -185,31 +201,87 @@ class ODBManager(SessionWrapper):
 
             return result, columns
 
-    def add_service(self, name, impl_name, is_internal, deployment_time, details, source_info):
-        """ Adds information about the server's service into the ODB.
+    def add_services(self, services):
+        """ Adds information about the server's services, and about their having been deployed on this server,
+        into the ODB in one transaction. Returns a dictionary of service names to their IDs, is_active flags
+        and slow thresholds. Any error other than another server adding the same services first is re-raised
+        so that the server does not start without its services.
         """
         try:
-            service = Service(None, name, True, impl_name, is_internal, self.cluster)
-            self._session.add(service)
             try:
-                self._session.commit()
-            except(IntegrityError, ProgrammingError), e:
+                return self._add_services(services)
+            except IntegrityError, e:
+
+                # Another server of this cluster may have added some of the same services in the meantime,
+                # in which case trying again will find them already in the ODB.
                 logger.log(TRACE1, 'IntegrityError (Service), e:[%s]', format_exc(e).decode('utf-8'))
                 self._session.rollback()
 
-                service = self._session.query(Service).\
-                    join(Cluster, Service.cluster_id==Cluster.id).\
-                    filter(Service.name==name).\
-                    filter(Cluster.id==self.cluster.id).\
-                    one()
-
-            self.add_deployed_service(deployment_time, details, service, source_info)
-
-            return service.id, service.is_active, service.slow_threshold
+                return self._add_services(services)
 
         except Exception, e:
-            logger.error('Could not add service, name:[%s], e:[%s]', name, format_exc(e).decode('utf-8'))
+            logger.error('Could not add services, e:[%s]', format_exc(e).decode('utf-8'))
             self._session.rollback()
+            raise
+
+    def _add_services(self, services):
+        session = self._session
+        by_name = dict((item.name, item) for item in services)
+        names = sorted(by_name)
+
+        odb_services = {}
+        for idx in xrange(0, len(names), MISC.ODB_IN_CLAUSE_BATCH_SIZE):
+            query = session.query(Service).\
+                filter(Service.cluster_id==self.cluster.id).\
+                filter(Service.name.in_(names[idx:idx+MISC.ODB_IN_CLAUSE_BATCH_SIZE]))
+
+            for service in query:
+                odb_services[service.name] = service
+
+        new = [Service(None, name, True, by_name[name].impl_name, by_name[name].is_internal, self.cluster)
+            for name in names if name not in odb_services]
+
+        session.add_all(new)
+        session.flush()
+
+        for service in new:
+            odb_services[service.name] = service
+
+        service_ids = sorted(service.id for service in odb_services.itervalues())
+        deployed = {}
+
+        for idx in xrange(0, len(service_ids), MISC.ODB_IN_CLAUSE_BATCH_SIZE):
+            query = session.query(DeployedService).\
+                filter(DeployedService.server_id==self.server.id).\
+                filter(DeployedService.service_id.in_(service_ids[idx:idx+MISC.ODB_IN_CLAUSE_BATCH_SIZE]))
+
+            for ds in query:
+                deployed[ds.service_id] = ds
+
+        out = {}
+
+        for name, service in odb_services.iteritems():
+            item = by_name[name]
+            si = item.source_info
+
+            ds = deployed.get(service.id)
+            if ds:
+                ds.deployment_time = item.deployment_time
+                ds.details = item.details
+                ds.source = si.source
+                ds.source_path = si.path
+                ds.source_hash = si.hash
+                ds.source_hash_method = si.hash_method
+            else:
+                session.add(DeployedService(item.deployment_time, item.details, self.server.id, service,
+                    si.source, si.path, si.hash, si.hash_method))
+
+            # Read before commit expires the objects
+            out[name] = (service.id, service.is_active, service.slow_threshold)
+
+        session.commit()
+
+        return out
 
     def drop_deployed_services(self, server_id):
         """ Removes all the deployed services from a server.
@@ -220,40 +292,6 @@ class ODBManager(SessionWrapper):
                 delete()
             session.commit()
 
-    def add_deployed_service(self, deployment_time, details, service, source_info):
-        """ Adds information about the server's deployed service into the ODB.
-        """
-        try:
-            ds = DeployedService(deployment_time, details, self.server.id, service,
-                source_info.source, source_info.path, source_info.hash, source_info.hash_method)
-            self._session.add(ds)
-            try:
-                self._session.commit()
-            except(IntegrityError, ProgrammingError), e:
-
-                logger.log(TRACE1, 'IntegrityError (DeployedService), e:[%s]', format_exc(e).decode('utf-8'))
-                self._session.rollback()
-
-                ds = self._session.query(DeployedService).\
-                    filter(DeployedService.service_id==service.id).\
-                    filter(DeployedService.server_id==self.server.id).\
-                    one()
-
-                ds.deployment_time = deployment_time
-                ds.details = details
-                ds.source = source_info.source
-                ds.source_path = source_info.path
-                ds.source_hash = source_info.hash
-                ds.source_hash_method = source_info.hash_method
-
-                self._session.add(ds)
-                self._session.commit()
-
-        except Exception, e:
-            msg = 'Could not add the DeployedService, e:[{e}]'.format(e=format_exc(e))
-            logger.error(msg)
-            self._session.rollback()
-
     def is_service_active(self, service_id):
         """ Returns whether the given service is active or not.
         """
@@ -406,6 +444,10 @@ class ODBManager(SessionWrapper):
             ('zato.definition.cassandra.edit.json', 'zato.server.service.internal.definition.cassandra.Edit'),
             ('zato.definition.cassandra.get-list', 'zato.server.service.internal.definition.cassandra.GetList'),
             ('zato.definition.cassandra.get-list.json', 'zato.server.service.internal.definition.cassandra.GetList'),
+            ('zato.info.get-auth-cache-stats', 'zato.server.service.internal.info.GetAuthCacheStats'),
+            ('zato.info.get-auth-cache-stats.json', 'zato.server.service.internal.info.GetAuthCacheStats'),
+            ('zato.info.get-broker-queue-stats', 'zato.server.service.internal.info.GetBrokerQueueStats'),
+            ('zato.info.get-broker-queue-stats.json', 'zato.server.service.internal.info.GetBrokerQueueStats'),
             ('zato.info.get-info', 'zato.server.service.internal.info.GetInfo'),
             ('zato.info.get-info.json', 'zato.server.service.internal.info.GetInfo'),
             ('zato.info.get-server-info', 'zato.server.service.internal.info.GetServerInfo'),
@@ -470,6 +512,8 @@ class ODBManager(SessionWrapper):
             ('zato.security.xpath.edit.json', 'zato.server.service.internal.security.xpath.Edit'),
             ('zato.security.xpath.get-list', 'zato.server.service.internal.security.xpath.GetList'),
             ('zato.security.xpath.get-list.json', 'zato.server.service.internal.security.xpath.GetList'),
+            ('zato.service.invoke-many-in-transaction', 'zato.server.service.internal.service.InvokeManyInTransaction'),
+            ('zato.service.invoke-many-in-transaction.json', 'zato.server.service.internal.service.InvokeManyInTransaction'),
         )
 
         with closing(self.session()) as session:
@@ -517,15 +561,32 @@ class ODBManager(SessionWrapper):
             item_list = query.http_soap_list(session, cluster_id, connection, transport, True, needs_columns)
 
             if connection == 'channel':
-                for item in item_list:
-                    item.replace_patterns_json_pointer = [elem.pattern.name for elem in session.query(HTTPSOAP).\
-                        filter(HTTPSOAP.id == item.id).one().replace_patterns_json_pointer]
+                json_pointer = self._get_replace_patterns(session, item_list, HTTSOAPAuditReplacePatternsJSONPointer, JSONPointer)
+                xpath = self._get_replace_patterns(session, item_list, HTTSOAPAuditReplacePatternsXPath, XPath)
 
-                    item.replace_patterns_xpath = [elem.pattern.name for elem in session.query(HTTPSOAP).\
-                        filter(HTTPSOAP.id == item.id).one().replace_patterns_xpath]
+                for item in item_list:
+                    item.replace_patterns_json_pointer = json_pointer.get(item.id, [])
+                    item.replace_patterns_xpath = xpath.get(item.id, [])
 
             return item_list
 
+    def _get_replace_patterns(self, session, item_list, assoc_class, pattern_class):
+        """ Returns names of replace patterns of all the HTTP/SOAP connections given on input, keyed by connection IDs.
+        """
+        out = {}
+        ids = sorted(item.id for item in item_list)
+
+        for idx in xrange(0, len(ids), MISC.ODB_IN_CLAUSE_BATCH_SIZE):
+            q = session.query(assoc_class.conn_id, pattern_class.name).\
+                filter(assoc_class.pattern_id==pattern_class.id).\
+                filter(assoc_class.conn_id.in_(ids[idx:idx+MISC.ODB_IN_CLAUSE_BATCH_SIZE])).\
+                order_by(assoc_class.id)
+
+            for conn_id, name in q:
+                out.setdefault(conn_id, []).append(name)
+
+        return out
+
 # ################################################################################################################################
 
     def get_job_list(self, cluster_id, needs_columns=False):
@@ -830,6 +891,27 @@ class ODBManager(SessionWrapper):
             session.add(audit)
             session.commit()
 
+    def audit_set_http_soap_many(self, entries):
+        """ Stores a batch of complete HTTP/SOAP audit entries, each a dictionary of HTTSOAPAudit's columns,
+        using a single multi-row INSERT in one transaction.
+        """
+        if not entries:
+            return
+
+        columns = ('conn_id', 'name', 'cid', 'transport', 'connection', 'req_time', 'resp_time', 'user_token', 'invoke_ok',
+            'auth_ok', 'remote_addr', 'req_headers', 'req_payload', 'resp_headers', 'resp_payload')
+
+        # All rows need to have the same keys for them to be inserted in one go
+        rows = []
+        for entry in entries:
+            row = {name: entry.get(name) for name in columns}
+            row['cluster_id'] = self.cluster.id
+            rows.append(row)
+
+        with closing(self.session()) as session:
+            session.execute(HTTSOAPAudit.__table__.insert(), rows)
+            session.commit()
+
 # ################################################################################################################################
 
     def get_cloud_openstack_swift_list(self, cluster_id, needs_columns=False):
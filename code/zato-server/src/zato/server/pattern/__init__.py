@@ -9,9 +9,15 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
-from bunch import Bunch
 from json import dumps, loads
 from logging import DEBUG, getLogger
+from traceback import format_exc
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+from gevent import joinall, spawn
 
 logger = getLogger(__name__)
 
@@ -34,9 +40,14 @@ class ParallelBase(object):
         self.source = source
         self.cid = source.cid
 
-    def invoke(self, targets, on_final, on_target=None, cid=None):
+    def invoke(self, targets, on_final, on_target=None, cid=None, local=False):
         """ Invokes targets collecting their responses, can be both as a whole or individual ones,
         and executes callback(s).
+
+        By default, targets are invoked asynchronously, possibly on other servers, and their responses are kept in Redis
+        until all of them complete. With local=True, targets are invoked in greenlets of the current worker instead,
+        their responses are collected in memory and callbacks are invoked directly - in that case, this method returns
+        only after all the targets and callbacks have completed.
         """
         # Can be user-provided or what our source gave us
         cid = cid or self.cid
@@ -47,6 +58,9 @@ class ParallelBase(object):
         on_final = on_final or ''
         on_target = on_target or ''
 
+        if local:
+            return self.invoke_local(targets, on_final, on_target, cid)
+
         # Keep everything under a distributed lock
         with self.source.lock(self.lock_pattern.format(cid)):
 
@@ -67,6 +81,79 @@ class ParallelBase(object):
 
         return cid
 
+    def invoke_local(self, targets, on_final, on_target, cid):
+        """ Invokes targets concurrently in the current worker and waits for all of them, and for callbacks, to complete.
+        Callbacks receive the same data that they would have been given if targets were invoked through Redis.
+        """
+        source_name = self.source.name
+        req_ts_utc = self.source.time.utcnow()
+        data = {}
+
+        def _invoke_target(name, payload):
+            response, exception = '', None
+
+            try:
+                response = self.source.invoke(name, payload, self.call_channel, wsgi_environ={
+                    'zato.request_ctx.{}'.format(self.request_ctx_cid_key): cid,
+                    'zato.request_ctx.is_local': True,
+                })
+            except Exception, e:
+                exception = format_exc(e)
+
+            target_data = Bunch()
+            target_data.cid = cid
+            target_data.resp_ts_utc = self.source.time.utcnow()
+            target_data.response = response
+            target_data.exception = exception
+            target_data.ok = False if exception else True
+            target_data.source = source_name
+            target_data.target = name
+            target_data.req_ts_utc = req_ts_utc
+
+            data[name] = target_data
+
+            if logger.isEnabledFor(DEBUG):
+                logger.debug('(%s) Before on_target callbacks `%s` after `%s`', self.pattern_name, on_target, name)
+
+            self.invoke_local_callbacks(target_data, on_target, self.on_target_channel, cid)
+
+        joinall([spawn(_invoke_target, name, payload) for name, payload in targets.items()])
+
+        # Not every subclass will need final callbacks
+        if self.needs_on_final:
+
+            if logger.isEnabledFor(DEBUG):
+                logger.debug('(%s) Before on_final callbacks `%s` after `%s`', self.pattern_name, on_final, source_name)
+
+            payload = {
+                'source': source_name,
+                'on_final': on_final,
+                'on_target': on_target,
+                'req_ts_utc': req_ts_utc,
+                'data': data,
+            }
+
+            self.invoke_local_callbacks(payload, on_final, self.on_final_channel, cid)
+
+        return cid
+
+    def invoke_local_callbacks(self, payload, cb_list, channel, cid):
+        """ Invokes callbacks synchronously. As with callbacks invoked asynchronously, they receive their input
+        as a dict deserialized from JSON, and any exception they raise is only logged.
+        """
+        cb_list = [name for name in cb_list if name]
+
+        if cb_list:
+
+            # The same round-trip through JSON that payloads of callbacks invoked asynchronously make
+            payload = loads(dumps(payload))
+
+            for name in cb_list:
+                try:
+                    self.source.invoke(name, payload, channel, wsgi_environ={'zato.request_ctx.fanout_cid': cid})
+                except Exception, e:
+                    logger.warn('(%s) Callback `%s` failed, cid:`%s`, e:`%s`', self.pattern_name, name, cid, format_exc(e))
+
     def _log_before_callbacks(self, cb_type, cb_list, invoked_service):
         logger.debug('(%s) Before %s callbacks `%s` after `%s`', self.pattern_name, cb_type, cb_list, invoked_service.name)
 
@@ -21,5 +21,5 @@ class ParallelExec(ParallelBase):
     on_target_channel = CHANNEL.PARALLEL_EXEC_ON_TARGET
     request_ctx_cid_key = 'parallel_exec_cid'
 
-    def invoke(self, targets, on_target, cid=None):
-        return super(ParallelExec, self).invoke(targets, None, on_target, cid)
\ No newline at end of file
+    def invoke(self, targets, on_target, cid=None, local=False):
+        return super(ParallelExec, self).invoke(targets, None, on_target, cid, local)
\ No newline at end of file
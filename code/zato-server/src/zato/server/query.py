@@ -9,13 +9,145 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
+from collections import deque
 from logging import getLogger
+from time import time
+
+# Bunch
+from bunch import Bunch
+
+# Cassandra
+from cassandra import OperationTimedOut
+
+# gevent
+from gevent.event import Event
 
 # Zato
+from zato.common import CASSANDRA
 from zato.server.store import BaseAPI, BaseStore
 
 logger = getLogger(__name__)
 
+# ################################################################################################################################
+
+class CassandraQuery(object):
+    """ Executes a prepared statement in a session and keeps statistics of its executions - how many of them there were,
+    how many failed, how many rows were received and how long, in milliseconds, it took to receive first responses.
+    """
+    def __init__(self, name, session, statement):
+        self.name = name
+        self.session = session
+        self.statement = statement
+        self.stats = Bunch(executions=0, errors=0, rows=0, time_total=0.0, time_max=0.0)
+
+    def _add_time(self, start):
+        elapsed = (time() - start) * 1000
+        self.stats.time_total += elapsed
+        self.stats.time_max = max(self.stats.time_max, elapsed)
+
+    def _execute_async(self, kwargs, fetch_size=None):
+        if not self.session:
+            raise Exception('Cannot execute the query without a session')
+
+        statement = self.statement.bind(kwargs)
+        if fetch_size:
+            statement.fetch_size = fetch_size
+
+        start = time()
+        future = self.session.execute_async(statement)
+        self.stats.executions += 1
+
+        # Callbacks are invoked for each page of results, all of them count towards the number of rows
+        # but only the first one tells how long it took for the query to execute.
+        is_first = [True]
+
+        def on_rows(rows):
+            if is_first[0]:
+                is_first[0] = False
+                self._add_time(start)
+            self.stats.rows += len(rows or ())
+
+        def on_error(exc):
+            self.stats.errors += 1
+            self._add_time(start)
+
+        future.add_callbacks(on_rows, on_error)
+
+        return future
+
+    def execute(self, **kwargs):
+        """ Executes the query and returns its result, waiting for it no longer than the session's default timeout.
+        """
+        return self._execute_async(kwargs).result(self.session.default_timeout)
+
+    def execute_async(self, **kwargs):
+        """ Executes the query without waiting for its result - returns the driver's ResponseFuture.
+        """
+        return self._execute_async(kwargs)
+
+    def execute_many(self, params_list, concurrency=CASSANDRA.QUERY.CONCURRENCY, raise_on_first_error=True):
+        """ Executes the query once for each dictionary of parameters, with no more than concurrency executions in flight
+        at a time. Returns a list of (is_ok, result or exception) tuples in the same order the parameters were in.
+        Each execution is waited for no longer than the session's default timeout.
+        """
+        in_flight = deque()
+        results = []
+
+        def wait_oldest():
+            try:
+                results.append((True, in_flight.popleft().result(self.session.default_timeout)))
+            except Exception, e:
+                if raise_on_first_error:
+                    raise
+                results.append((False, e))
+
+        for params in params_list:
+            if len(in_flight) >= concurrency:
+                wait_oldest()
+            in_flight.append(self._execute_async(params))
+
+        while in_flight:
+            wait_oldest()
+
+        return results
+
+    def iter_pages(self, fetch_size=CASSANDRA.QUERY.FETCH_SIZE, **kwargs):
+        """ Executes the query and yields lists of rows, one page at a time. Each next page is fetched
+        only after the previous one has been consumed so no more than one page is kept in memory.
+        """
+        future = self._execute_async(kwargs, fetch_size)
+
+        is_ready = Event()
+        page = {}
+
+        def on_rows(rows):
+            page['rows'] = rows or []
+            is_ready.set()
+
+        def on_error(exc):
+            page['exc'] = exc
+            is_ready.set()
+
+        future.add_callbacks(on_rows, on_error)
+
+        while True:
+            if not is_ready.wait(self.session.default_timeout):
+                raise OperationTimedOut('Query `{}` timed out waiting for a page of results'.format(self.name))
+            is_ready.clear()
+
+            if 'exc' in page:
+                raise page['exc']
+
+            has_more_pages = future.has_more_pages
+            yield page.pop('rows')
+
+            if not has_more_pages:
+                break
+
+            future.start_fetching_next_page()
+
+# ################################################################################################################################
+
 class CassandraQueryAPI(BaseAPI):
     """ API to query Cassandra through prepared statements.
     """
@@ -23,6 +155,15 @@ class CassandraQueryAPI(BaseAPI):
 class CassandraQueryStore(BaseStore):
     """ Stores Cassandra prepared statements.
     """
+    def add_execute(self, item, session, statement):
+        query = CassandraQuery(item.config.name, session, statement)
+
+        item.execute = query.execute
+        item.execute_async = query.execute_async
+        item.execute_many = query.execute_many
+        item.iter_pages = query.iter_pages
+        item.stats = query.stats
+
     def create_impl(self, config, config_no_sensitive, **extra):
         conn = extra['def_'].conn
         if not conn:
@@ -10,6 +10,8 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 from logging import getLogger
+from sys import getsizeof
+from time import time
 
 # simple-rbac
 from rbac.acl import Registry as _Registry
@@ -88,6 +90,13 @@ class RBAC(object):
         self.client_def_to_role_id = {}
         self.role_id_to_client_def = {}
 
+        # A flattened table of (client_def, http_verb, resource) tuples that are allowed, built out of roles,
+        # their parents, permissions, resources and client roles, and kept up to date as any of them changes.
+        self.http_decisions = set()
+        self.client_def_to_http_decisions = {}
+        self.http_decisions_built = False
+        self.http_decisions_info = {'entries':0, 'size':0, 'rebuild_time':0.0}
+
 # ################################################################################################################################
 
     def __repr__(self):
@@ -109,6 +118,7 @@ class RBAC(object):
         with self.update_lock:
             del self.permissions[id]
             self.registry.delete_from_permissions('operation', id)
+            self.update_http_decisions(self.client_def_to_role_id)
 
     def set_http_permissions(self):
         """ Maps HTTP verbs to CRUD permissions.
@@ -127,6 +137,8 @@ class RBAC(object):
                     self.http_permissions[verb] = perm_id
                     break
 
+        self.rebuild_http_decisions()
+
 # ################################################################################################################################
 
     def _rbac_create_role(self, id, name, parent_id):
@@ -150,10 +162,13 @@ class RBAC(object):
             self._rbac_delete_role(id, old_name)
             self.registry._roles[id].clear() # Roles can have one parent only
             self._rbac_create_role(id, name, parent_id)
+            self.update_http_decisions(self.get_role_client_defs(id))
 
     def delete_role(self, id, name):
         with self.update_lock:
+            client_defs = self.get_role_client_defs(id)
             self.registry.delete_role(id)
+            self.update_http_decisions(client_defs)
 
 # ################################################################################################################################
 
@@ -165,11 +180,13 @@ class RBAC(object):
 
             self.client_def_to_role_id.setdefault(client_def, set()).add(role_id)
             self.role_id_to_client_def.setdefault(role_id, set()).add(client_def)
+            self.update_http_decisions([client_def])
 
     def delete_client_role(self, client_def, role_id):
         with self.update_lock:
             self.client_def_to_role_id[client_def].remove(role_id)
             self.role_id_to_client_def[role_id].remove(client_def)
+            self.update_http_decisions([client_def])
 
 # ################################################################################################################################
 
@@ -177,27 +194,169 @@ class RBAC(object):
         with self.update_lock:
             self.registry.add_resource(resource)
 
+            # A new resource is of interest only to clients whose roles are allowed to access any resource
+            if any(rule[2] is None for rule in self.registry._allowed):
+                self.update_http_decisions(self.client_def_to_role_id)
+
     def delete_resource(self, resource):
         with self.update_lock:
             self.registry.delete_resource(resource)
+            self.update_http_decisions([client_def for client_def, decisions in self.client_def_to_http_decisions.items()
+                if any(resource == decision_resource for _, decision_resource in decisions)])
 
 # ################################################################################################################################
 
     def create_role_permission_allow(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.allow(role_id, perm_id, resource)
+            self.update_http_decisions(self.get_role_client_defs(role_id))
 
     def create_role_permission_deny(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.deny(role_id, perm_id, resource)
+            self.update_http_decisions(self.get_role_client_defs(role_id))
 
     def delete_role_permission_allow(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.delete_allow((role_id, perm_id, resource))
+            self.update_http_decisions(self.get_role_client_defs(role_id))
 
     def delete_role_permission_deny(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.delete_deny((role_id, perm_id, resource))
+            self.update_http_decisions(self.get_role_client_defs(role_id))
+
+# ################################################################################################################################
+
+    def get_role_client_defs(self, role_id):
+        """ Returns all client definitions that have a given role or any of the roles that inherit from it.
+        """
+        children = {}
+        for child_id, parents in self.registry._roles.items():
+            for parent_id in parents:
+                children.setdefault(parent_id, []).append(child_id)
+
+        client_defs = set()
+        seen = set()
+        to_visit = [role_id]
+
+        while to_visit:
+            current = to_visit.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            client_defs.update(self.role_id_to_client_def.get(current, ()))
+            to_visit.extend(children.get(current, ()))
+
+        return client_defs
+
+    def _get_rules_by_role(self):
+        """ Returns allowed and denied (perm_id, resource) pairs, each grouped by the role they were granted to.
+        """
+        allowed, denied = {}, {}
+
+        for rules, out in ((self.registry._allowed, allowed), (self.registry._denied, denied)):
+            for role_id, perm_id, resource in rules:
+                out.setdefault(role_id, set()).add((perm_id, resource))
+
+        return allowed, denied
+
+    def _get_role_rules(self, role_id, rules_by_role, cache):
+        """ Returns all (perm_id, resource) pairs that apply to a role, i.e. the role's own ones, those of its parents
+        and those granted to all roles (None), caching results for each role so that parents are visited once only.
+        """
+        if role_id in cache:
+            return cache[role_id]
+
+        out = cache[role_id] = set(rules_by_role.get(role_id, ()))
+        out.update(rules_by_role.get(None, ()))
+
+        for parent_id in self.registry._roles.get(role_id, ()):
+            out.update(self._get_role_rules(parent_id, rules_by_role, cache))
+
+        return out
+
+    def _get_client_http_decisions(self, client_def, allowed, denied, allowed_cache, denied_cache, perm_id_to_verbs):
+        """ Returns (http_verb, resource) pairs a client is allowed to access, which is what Registry.is_any_allowed
+        would return True for - at least one of the client's roles needs to be allowed and none of them may be denied.
+        Rules that apply to any permission or resource (None) are expanded to all of the ones that currently exist.
+        """
+        client_allowed, client_denied = set(), set()
+
+        for role_id in self.client_def_to_role_id.get(client_def, ()):
+            if role_id in self.registry._roles:
+                client_allowed.update(self._get_role_rules(role_id, allowed, allowed_cache))
+                client_denied.update(self._get_role_rules(role_id, denied, denied_cache))
+
+        decisions = set()
+
+        for perm_id, resource in client_allowed:
+            for perm_id in (perm_id_to_verbs if perm_id is None else [perm_id]):
+                for resource in (self.registry._resources if resource is None else [resource]):
+                    if (perm_id, resource) in client_denied or (None, resource) in client_denied \
+                       or (perm_id, None) in client_denied or (None, None) in client_denied:
+                        continue
+                    for verb in perm_id_to_verbs.get(perm_id, ()):
+                        decisions.add((verb, resource))
+
+        return decisions
+
+    def update_http_decisions(self, client_defs):
+        """ Recomputes HTTP decisions of selected clients only. Does nothing until the whole table is built for the first time.
+        """
+        if not self.http_decisions_built:
+            return
+
+        allowed, denied = self._get_rules_by_role()
+        allowed_cache, denied_cache = {}, {}
+
+        perm_id_to_verbs = {}
+        for verb, perm_id in self.http_permissions.items():
+            perm_id_to_verbs.setdefault(perm_id, []).append(verb)
+
+        for client_def in client_defs:
+            new = self._get_client_http_decisions(
+                client_def, allowed, denied, allowed_cache, denied_cache, perm_id_to_verbs)
+            old = self.client_def_to_http_decisions.get(client_def, set())
+
+            for verb, resource in new - old:
+                self.http_decisions.add((client_def, verb, resource))
+
+            for verb, resource in old - new:
+                self.http_decisions.discard((client_def, verb, resource))
+
+            if new:
+                self.client_def_to_http_decisions[client_def] = new
+            else:
+                self.client_def_to_http_decisions.pop(client_def, None)
+
+        self._set_http_decisions_info()
+
+    def rebuild_http_decisions(self):
+        """ Builds the whole table of HTTP decisions from scratch.
+        """
+        with self.update_lock:
+            start = time()
+
+            self.http_decisions_built = True
+            self.http_decisions.clear()
+            self.client_def_to_http_decisions.clear()
+            self.update_http_decisions(self.client_def_to_role_id)
+
+            self.http_decisions_info['rebuild_time'] = time() - start
+
+        logger.info('RBAC HTTP decisions built, entries:`%s`, size:`%s` bytes, time:`%.4f` s',
+            self.http_decisions_info['entries'], self.http_decisions_info['size'], self.http_decisions_info['rebuild_time'])
+
+    def _set_http_decisions_info(self):
+        """ Sets how many entries there are in the table of HTTP decisions and roughly how much memory it uses,
+        not counting client definitions and resources that are shared with the rest of the server.
+        """
+        self.http_decisions_info['entries'] = len(self.http_decisions)
+        self.http_decisions_info['size'] = getsizeof(self.http_decisions) + \
+            sum(getsizeof(elem) for elem in self.http_decisions) + \
+            getsizeof(self.client_def_to_http_decisions) + \
+            sum(getsizeof(elem) for elem in self.client_def_to_http_decisions.itervalues())
 
 # ################################################################################################################################
 
@@ -214,8 +373,9 @@ class RBAC(object):
         return self.registry.is_any_allowed(roles, perm_id, resource) if roles != ZATO_NONE else False
 
     def is_http_client_allowed(self, client_def, http_verb, resource):
-        """ Same as is_client_allowed but accepts a HTTP verb rather than a permission ID.
+        """ Same as is_client_allowed but accepts a HTTP verb rather than a permission ID. Uses the flattened table
+        of HTTP decisions instead of walking the role hierarchy.
         """
-        return self.is_client_allowed(client_def, self.http_permissions[http_verb], resource)
+        return (client_def, http_verb, resource) in self.http_decisions
 
 # ################################################################################################################################
@@ -123,8 +123,9 @@ class Scheduler(object):
 # ################################################################################################################################
 
     def create_edit_job(self, id, name, start_time, job_type, service, is_create=True, max_repeats=1, days=0, hours=0,
-            minutes=0, seconds=0, extra=None, cron_definition=None, **kwargs):
-        """ A base method for scheduling of jobs.
+            minutes=0, seconds=0, extra=None, cron_definition=None, misfire_policy=None, max_concurrency=None, **kwargs):
+        """ A base method for scheduling of jobs. Jobs created before misfire_policy and max_concurrency
+        were stored in the ODB have them set to None, in which case the scheduler's defaults are used.
         """
         cb_kwargs = {
             'service': service,
@@ -137,7 +138,8 @@ class Scheduler(object):
             interval = Interval(days=days, hours=hours, minutes=minutes, seconds=seconds)
 
         job = Job(id, name, job_type, interval, start_time, cb_kwargs=cb_kwargs, max_repeats=max_repeats,
-            cron_definition=cron_definition)
+            cron_definition=cron_definition, misfire_policy=misfire_policy or SCHEDULER.MISFIRE_POLICY.DEFAULT,
+            max_concurrency=max_concurrency or SCHEDULER.DEFAULT_MAX_CONCURRENCY)
 
         func = self.sched.create if is_create else self.sched.edit
         func(job, **kwargs)
@@ -148,7 +150,8 @@ class Scheduler(object):
         """ Re-/schedules the execution of a one-time job.
         """
         self.create_edit_job(job_data.id, job_data.name, _start_date(job_data), SCHEDULER.JOB_TYPE.ONE_TIME,
-            job_data.service, is_create, extra=job_data.extra, **kwargs)
+            job_data.service, is_create, extra=job_data.extra, misfire_policy=job_data.get('misfire_policy'),
+            max_concurrency=job_data.get('max_concurrency'), **kwargs)
 
     def create_one_time(self, job_data, broker_msg_type, **kwargs):
         """ Schedules the execution of a one-time job.
@@ -175,7 +178,8 @@ class Scheduler(object):
         max_repeats = job_data.repeats if job_data.get('repeats') else None
 
         self.create_edit_job(job_data.id, job_data.name, start_date, SCHEDULER.JOB_TYPE.INTERVAL_BASED, job_data.service,
-            is_create, max_repeats, days+weeks*7, hours, minutes, seconds, job_data.extra, **kwargs)
+            is_create, max_repeats, days+weeks*7, hours, minutes, seconds, job_data.extra,
+            misfire_policy=job_data.get('misfire_policy'), max_concurrency=job_data.get('max_concurrency'), **kwargs)
 
     def create_interval_based(self, job_data, broker_msg_type, **kwargs):
         """ Schedules the execution of an interval-based job.
@@ -195,7 +199,8 @@ class Scheduler(object):
         """
         start_date = _start_date(job_data)
         self.create_edit_job(job_data.id, job_data.name, start_date, SCHEDULER.JOB_TYPE.CRON_STYLE, job_data.service,
-            is_create, max_repeats=None, extra=job_data.extra, cron_definition=job_data.cron_definition, **kwargs)
+            is_create, max_repeats=None, extra=job_data.extra, cron_definition=job_data.cron_definition,
+            misfire_policy=job_data.get('misfire_policy'), max_concurrency=job_data.get('max_concurrency'), **kwargs)
 
     def create_cron_style(self, job_data, broker_msg_type, **kwargs):
         """ Schedules the execution of a cron-style job.
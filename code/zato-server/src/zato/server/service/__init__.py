@@ -38,7 +38,7 @@ from gevent import Timeout, spawn
 from zato.common import BROKER, CHANNEL, DATA_FORMAT, KVDB, PARAMS_PRIORITY, ZatoException
 from zato.common.broker_message import SERVICE
 from zato.common.nav import DictNav, ListNav
-from zato.common.util import uncamelify, new_cid, payload_from_request, service_name_from_impl
+from zato.common.util import uncamelify, new_cid, service_name_from_impl
 from zato.server.connection import request_response, slow_response
 from zato.server.connection.amqp.outgoing import PublisherFacade
 from zato.server.connection.email import EMailAPI
@@ -50,6 +50,8 @@ from zato.server.pattern.fanout import FanOut
 from zato.server.pattern.invoke_retry import InvokeRetry
 from zato.server.pattern.parallel import ParallelExec
 from zato.server.service.reqresp import Cloud, Outgoing, Request, Response
+from zato.server.service.reqresp.payload import LazyPayload
+from zato.server.service.reqresp.sio import get_compiled_sio
 
 # Not used here in this module but it's convenient for callers to be able to import everything from a single namespace
 from zato.server.service.reqresp.sio import AsIs, CSV, Boolean, Dict, Float, ForceType, Integer, List, ListOfDicts, Nested, \
@@ -158,6 +160,40 @@ class PatternsFacade(object):
 
 # ################################################################################################################################
 
+class ServiceFacades(object):
+    """ Facades through which services access outgoing connections, cloud, e-mail and search. Built once by each worker store
+    and shared by all the services it invokes - connection stores they point to are updated in place by broker messages so
+    the facades need to be built anew only if a whole store, or the broker client, is replaced.
+    """
+    __slots__ = ('outgoing', 'cloud', 'email', 'search')
+
+    def __init__(self, worker_store):
+        worker_config = worker_store.worker_config
+
+        # Queues
+        out_amqp = PublisherFacade(worker_store.broker_client)
+        out_jms_wmq = WMQFacade(worker_store.broker_client)
+        out_zmq = ZMQFacade(worker_store.server)
+
+        # Regular outconns
+        out_ftp, out_odoo, out_plain_http, out_soap = worker_config.outgoing_connections()
+        self.outgoing = Outgoing(
+            out_amqp, out_ftp, out_jms_wmq, out_odoo, out_plain_http, out_soap, worker_store.sql_pool_store,
+            worker_store.stomp_outconn_api, out_zmq)
+
+        # Cloud
+        self.cloud = Cloud()
+        self.cloud.openstack.swift = worker_config.cloud_openstack_swift
+        self.cloud.aws.s3 = worker_config.cloud_aws_s3
+
+        # E-mail
+        self.email = EMailAPI(worker_store.email_smtp_api, worker_store.email_imap_api)
+
+        # Search
+        self.search = SearchAPI(worker_store.search_es_api, worker_store.search_solr_api)
+
+# ################################################################################################################################
+
 class Service(object):
     """ A base class for all services deployed on Zato servers, no matter
     the transport and protocol, be it plain HTTP, SOAP, WebSphere MQ or any other,
@@ -165,6 +201,11 @@ class Service(object):
     """
     http_method_handlers = {}
 
+    # How many instances of the service to keep for reuse, 0 means that a new one is created for each invocation.
+    # Services that set it must not hold onto self once they return and need to override reset
+    # if they keep any per-invocation state of their own in instance attributes.
+    instance_pool_size = 0
+
     def __init__(self, *ignored_args, **ignored_kwargs):
         self.logger = logging.getLogger(self.get_name())
         self.server = None
@@ -193,7 +234,8 @@ class Service(object):
         self.name = self.__class__.get_name()
         self.impl_name = self.__class__.get_impl_name()
         self.time = TimeUtil(None)
-        self.patterns = None
+        self._patterns = None
+        self._msg = None
         self.user_config = None
         self.dictnav = DictNav
         self.listnav = ListNav
@@ -250,48 +292,35 @@ class Service(object):
                 method = name.replace('handle_', '')
                 class_.http_method_handlers[method] = getattr(class_, name)
 
+    @classmethod
+    def compile_sio(class_):
+        """ Compiles the service's SimpleIO definition, if there is any, so it is not read again during each invocation.
+        """
+        if hasattr(class_, 'SimpleIO'):
+            get_compiled_sio(class_.SimpleIO)
+
     def _init(self):
         """ Actually initializes the service.
         """
-        self.odb = self.worker_store.server.odb
+        # Services invoked as part of a larger ODB transaction are given an ODB manager that shares its session
+        self.odb = self.environ.get('zato.odb') or self.worker_store.server.odb
         self.kvdb = self.worker_store.kvdb
         self.time.kvdb = self.kvdb
         self.pubsub = self.worker_store.pubsub
 
         self.slow_threshold = self.server.service_store.services[self.impl_name]['slow_threshold']
 
-        # Queues
-        out_amqp = PublisherFacade(self.broker_client)
-        out_jms_wmq = WMQFacade(self.broker_client)
-        out_zmq = ZMQFacade(self.server)
-
-        # Patterns
-        self.patterns = PatternsFacade(self)
-
-        # SQL
-        out_sql = self.worker_store.sql_pool_store
-
-        # Regular outconns
-        out_ftp, out_odoo, out_plain_http, out_soap = self.worker_store.worker_config.outgoing_connections()
-        self.outgoing = Outgoing(
-            out_amqp, out_ftp, out_jms_wmq, out_odoo, out_plain_http, out_soap, out_sql,
-            self.worker_store.stomp_outconn_api, out_zmq)
-
-        # Cloud
-        self.cloud = Cloud()
-        self.cloud.openstack.swift = self.worker_store.worker_config.cloud_openstack_swift
-        self.cloud.aws.s3 = self.worker_store.worker_config.cloud_aws_s3
+        # Outgoing connections, cloud, e-mail and search
+        facades = self.worker_store.service_facades
+        self.outgoing = facades.outgoing
+        self.cloud = facades.cloud
+        self.email = facades.email
+        self.search = facades.search
 
         # Cassandra
         self.cassandra_conn = self.worker_store.cassandra_api
         self.cassandra_query = self.worker_store.cassandra_query_api
 
-        # E-mail
-        self.email = EMailAPI(self.worker_store.email_smtp_api, self.worker_store.email_imap_api)
-
-        # Search
-        self.search = SearchAPI(self.worker_store.search_es_api, self.worker_store.search_solr_api)
-
         is_sio = hasattr(self, 'SimpleIO')
         self.request.http.init(self.wsgi_environ)
 
@@ -299,9 +328,46 @@ class Service(object):
             self.request.init(is_sio, self.cid, self.SimpleIO, self.data_format, self.transport, self.wsgi_environ)
             self.response.init(self.cid, self.SimpleIO, self.data_format)
 
-        self.msg = MessageFacade(self.worker_store.msg_ns_store,
-            self.worker_store.json_pointer_store, self.worker_store.xpath_store, self.worker_store.msg_ns_store,
-            self.request.payload, self.time)
+    @property
+    def patterns(self):
+        """ Integration patterns, created only if a service uses any.
+        """
+        if not self._patterns:
+            self._patterns = PatternsFacade(self)
+        return self._patterns
+
+    @property
+    def msg(self):
+        """ Message-related features, created only if a service uses any.
+        """
+        if not self._msg:
+            self._msg = MessageFacade(self.worker_store.msg_ns_store,
+                self.worker_store.json_pointer_store, self.worker_store.xpath_store, self.worker_store.msg_ns_store,
+                self.request.payload, self.time)
+        return self._msg
+
+    def reset(self):
+        """ Clears all the per-invocation state so that a pooled instance can be used again.
+        """
+        self.channel = None
+        self.cid = None
+        self.in_reply_to = None
+        self.data_format = None
+        self.transport = None
+        self.wsgi_environ = None
+        self.job_type = None
+        self.environ = {}
+        self.request.reset()
+
+        # Not reset in place because whoever invoked the service may still be using it
+        self.response = Response(self.logger)
+
+        self.invocation_time = None
+        self.handle_return_time = None
+        self.processing_time_raw = None
+        self.processing_time = None
+        self._patterns = None
+        self._msg = None
 
     def set_response_data(self, service, **kwargs):
         response = service.response.payload
@@ -372,7 +438,13 @@ class Service(object):
         # (though possibly with attributes), checking for 'not payload' alone won't suffice - this evaluates
         # to False so we'd be parsing the payload again superfluously.
         if not isinstance(payload, ObjectifiedElement) and not payload:
-            payload = payload_from_request(cid, raw_request, data_format, transport)
+
+            # The request will be parsed only if the service needs it. Channels may have already wrapped it up
+            # so as to share the parsing results, e.g. with audit log, but the service may be also invoked
+            # by another one with the same WSGI environment yet with a different request.
+            payload = wsgi_environ.get('zato.request.lazy_payload')
+            if not (payload and payload.raw_request is raw_request):
+                payload = LazyPayload(cid, raw_request, data_format, transport)
 
         job_type = kwargs.get('job_type')
         channel_params = kwargs.get('channel_params', {})
@@ -413,8 +485,10 @@ class Service(object):
             finally:
                 response = set_response_func(service, data_format=data_format, transport=transport, **kwargs)
 
-                # If this is was fan-out/fan-in we need to always notify our callbacks no matter the result
-                if channel in (CHANNEL.FANOUT_CALL, CHANNEL.PARALLEL_EXEC_CALL):
+                # If this is was fan-out/fan-in we need to always notify our callbacks no matter the result,
+                # unless we were invoked in-process, in which case callbacks are invoked by the pattern itself.
+                if channel in (CHANNEL.FANOUT_CALL, CHANNEL.PARALLEL_EXEC_CALL) and \
+                   not wsgi_environ.get('zato.request_ctx.is_local'):
                     func = self.patterns.fanout.on_call_finished if channel == CHANNEL.FANOUT_CALL else \
                         self.patterns.parallel.on_call_finished
                     spawn(func, self, service.response.payload, exc_formatted)
@@ -474,6 +548,8 @@ class Service(object):
         except Exception, e:
             logger.warn('Could not invoke `%s`, e:`%s`', service.name, format_exc(e))
             raise
+        finally:
+            self.server.service_store.release_instance(service)
 
     def invoke(self, name, *args, **kwargs):
         """ Invokes a service synchronously by its name.
@@ -553,7 +629,7 @@ class Service(object):
         Used for incrementing the service's usage count and storing the service invocation time.
         """
         if self.server.component_enabled.stats:
-            self.usage = self.kvdb.conn.incr('{}{}'.format(KVDB.SERVICE_USAGE, self.name))
+            self.usage = self.worker_store.stats_collector.incr_usage(self.name)
 
         self.invocation_time = datetime.utcnow()
 
@@ -577,27 +653,14 @@ class Service(object):
 
             self.processing_time = int(round(proc_time))
 
-            with self.kvdb.conn.pipeline() as pipe:
-
-                pipe.hset('{}{}'.format(KVDB.SERVICE_TIME_BASIC, self.name), 'last', self.processing_time)
-                pipe.rpush('{}{}'.format(KVDB.SERVICE_TIME_RAW, self.name), self.processing_time)
-
-                key = '{}{}:{}'.format(KVDB.SERVICE_TIME_RAW_BY_MINUTE,
-                    self.name, self.handle_return_time.strftime('%Y:%m:%d:%H:%M'))
-                pipe.rpush(key, self.processing_time)
-
-                # .. we'll have 5 minutes (5 * 60 seconds = 300 seconds)
-                # to aggregate processing times for a given minute and then it will expire
-
-                # Note that we need Redis 2.1.3+ otherwise the key has just been overwritten
-                pipe.expire(key, 300)
-
-                pipe.execute()
+            # Stored in Redis in background, along with statistics of other services
+            self.worker_store.stats_collector.add_time(self.name, self.processing_time, self.handle_return_time)
 
         #
         # Sample requests/responses
         #
-        key, freq = request_response.should_store(self.kvdb, self.usage, self.name)
+        key, freq = request_response.should_store(
+            self.kvdb, self.usage, self.name, self.worker_store.stats_collector.get_req_resp_freq(self.name))
         if freq:
 
             # TODO: Don't parse it here and a moment later below
@@ -637,6 +700,9 @@ class Service(object):
     def translate(self, *args, **kwargs):
         raise NotImplementedError('An initializer should override this method')
 
+    def translate_many(self, *args, **kwargs):
+        raise NotImplementedError('An initializer should override this method')
+
     def handle(self):
         """ The only method Zato services need to implement in order to process
         incoming requests.
@@ -825,6 +891,7 @@ class Service(object):
         service.wsgi_environ = wsgi_environ
         service.job_type = job_type
         service.translate = server.kvdb.translate
+        service.translate_many = server.kvdb.translate_many
         service.user_config = server.user_config
 
         if channel_params:
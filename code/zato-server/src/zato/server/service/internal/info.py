@@ -68,3 +68,24 @@ class GetServerInfo(Service):
     def handle(self):
         self.response.content_type = 'application/json'
         self.response.payload.info = format_info(get_info(self.server.base_dir, INFO_FORMAT.JSON), INFO_FORMAT.JSON)
+
+class GetBrokerQueueStats(Service):
+    """ Returns depths of broker work queues along with counters of messages the server it's invoked on
+    put on and took off them.
+    """
+    class SimpleIO(object):
+        output_required = ('stats',)
+
+    def handle(self):
+        self.response.content_type = 'application/json'
+        self.response.payload.stats = dumps(self.broker_client.get_queue_stats())
+
+class GetAuthCacheStats(Service):
+    """ Returns counters of the cache of HTTP channels' authentication results in the worker the service is invoked in.
+    """
+    class SimpleIO(object):
+        output_required = ('stats',)
+
+    def handle(self):
+        self.response.content_type = 'application/json'
+        self.response.payload.stats = dumps(self.worker_store.request_dispatcher.url_data.auth_cache.get_stats())
@@ -8,6 +8,7 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 # Zato
 from zato.common import KVDB, ZatoException
+from zato.common.broker_message import DATA_DICT
 from zato.common.util import multikeysort, translation_name
 from zato.server.service.internal import AdminService
 
@@ -57,9 +58,13 @@ class DataDictService(AdminService):
     def _get_translations(self):
         """ Yields nicely formatted translations defined in the KVDB.
         """
-        for item in self.server.kvdb.conn.keys(KVDB.TRANSLATION + KVDB.SEPARATOR + '*'):
-            vals = self.server.kvdb.conn.hgetall(item)
+        for item, vals in self.server.kvdb.get_translations():
             item = item.decode('utf-8').split(KVDB.SEPARATOR)
             yield {'system1':item[1], 'key1':item[2], 'value1':item[3], 'system2':item[4], 
                    'key2':item[5], 'id':str(vals.get('id')), 'value2':vals.get('value2').decode('utf-8'),
                    'id1':str(vals.get('id1')), 'id2':str(vals.get('id2')),}
+
+    def _on_changed(self):
+        """ Lets all workers know that they need to reload their translations.
+        """
+        self.broker_client.publish({'cid':self.cid, 'action':DATA_DICT.CHANGED.value})
@@ -117,6 +117,8 @@ class Edit(_CreateEdit):
                 if item['id2'] == id:
                     self.server.kvdb.conn.hset(hash_name, 'value2', self.request.input.value)
 
+        self._on_changed()
+
 class Delete(DataDictService):
     """ Deletes a dictionary entry by its ID.
     """
@@ -132,7 +134,8 @@ class Delete(DataDictService):
         for item in self._get_translations():
             if item['id1'] == id or item['id2'] == id:
                 self.server.kvdb.conn.delete(self._name(item['system1'], item['key1'], item['value1'], item['system2'], item['key2']))
-                
+
+        self._on_changed()
         self.response.payload.id = self.request.input.id
         
 class _DictionaryEntryService(DataDictService):
@@ -52,3 +52,5 @@ class Import(DataDictService):
                     p.hset(key, value_key, value)
                 
             p.execute()
+
+        self._on_changed()
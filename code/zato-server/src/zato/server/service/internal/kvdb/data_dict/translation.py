@@ -100,6 +100,7 @@ class _CreateEdit(DataDictService):
         
         if self._validate_name(hash_name, system1, key1, value1, system2, key2, self.request.input.get('id')):
             self.response.payload.id = self._handle(hash_name, item_ids)
+            self._on_changed()
             
     def _handle(self, *args, **kwargs):
         raise NotImplementedError('Must be implemented by a subclass')
@@ -154,6 +155,7 @@ class Delete(_DeletingService):
         
     def handle(self):
         self.delete(self.request.input.id)
+        self._on_changed()
 
 class Translate(AdminService):
     class SimpleIO(AdminSIO):
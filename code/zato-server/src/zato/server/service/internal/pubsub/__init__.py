@@ -112,7 +112,8 @@ class InvokeCallbacks(AdminService):
 # ################################################################################################################################
 
 class MoveToTargetQueues(AdminService):
-    """ Invoked when a server is starting - periodically spawns a greenlet moving published messages to recipient queues.
+    """ Invoked when a server is starting - periodically spawns a greenlet moving messages published before anyone
+    subscribed to their topics to recipient queues and storing messages that overflew these queues.
     """
     def _move_to_target_queues(self):
 
@@ -164,7 +165,7 @@ class RESTHandler(Service):
     class SimpleIO(object):
         input_required = ('item_type', 'item')
         input_optional = ('max', 'dir', 'format', 'mime_type', Int('priority'), Int('expiration'), AsIs('msg_id'),
-            Bool('ack'), Bool('reject'))
+            Bool('ack'), Bool('reject'), Int('timeout'))
         default = ZATO_NONE
         use_channel_params_only = True
 
@@ -250,9 +251,11 @@ class RESTHandler(Service):
 
         max_batch_size = int(self.request.input.max) if self.request.input.max else PUB_SUB.DEFAULT_GET_MAX_BATCH_SIZE
         is_fifo = True if (self.request.input.dir == PUB_SUB.GET_DIR.FIFO or not self.request.input.dir) else False
+        timeout = self.request.input.timeout
+        timeout = min(int(timeout), PUB_SUB.MAX_GET_TIMEOUT) if timeout and timeout != ZATO_NONE else PUB_SUB.DEFAULT_GET_TIMEOUT
 
         try:
-            for item in self.pubsub.get(self.environ['sub_key'], max_batch_size, is_fifo, self.environ['format']):
+            for item in self.pubsub.get(self.environ['sub_key'], max_batch_size, is_fifo, self.environ['format'], timeout):
 
                 if self.environ['is_json']:
                     out_item = item
@@ -68,6 +68,14 @@ def _create_edit(action, cid, input, payload, logger, session, broker_client, re
         logger.error(msg)
         raise ZatoException(cid, msg)
 
+    misfire_policy = input.misfire_policy or SCHEDULER.MISFIRE_POLICY.DEFAULT
+    if misfire_policy not in (SCHEDULER.MISFIRE_POLICY.RUN_ONCE, SCHEDULER.MISFIRE_POLICY.SKIP):
+        msg = 'Unrecognized misfire policy [{0}]'.format(misfire_policy)
+        logger.error(msg)
+        raise ZatoException(cid, msg)
+
+    max_concurrency = int(input.max_concurrency or SCHEDULER.DEFAULT_MAX_CONCURRENCY)
+
     # We can create/edit a base Job object now and - optionally - another one
     # if the job type's is either interval-based or Cron-style. The base
     # instance will be enough if it's a one-time job.
@@ -77,7 +85,8 @@ def _create_edit(action, cid, input, payload, logger, session, broker_client, re
     start_date = parse(input.start_date)
     
     if action == 'create':
-        job = Job(None, name, is_active, job_type, start_date, extra, cluster_id=cluster_id, service=service)
+        job = Job(None, name, is_active, job_type, start_date, extra, cluster_id=cluster_id, service=service,
+            misfire_policy=misfire_policy, max_concurrency=max_concurrency)
     else:
         job = session.query(Job).filter_by(id=job_id).one()
         old_name = job.name
@@ -86,6 +95,8 @@ def _create_edit(action, cid, input, payload, logger, session, broker_client, re
         job.start_date = start_date
         job.service = service
         job.extra = extra
+        job.misfire_policy = misfire_policy
+        job.max_concurrency = max_concurrency
 
     try:
         # Add but don't commit yet.
@@ -133,7 +144,8 @@ def _create_edit(action, cid, input, payload, logger, session, broker_client, re
             msg = {'action': msg_action, 'job_type': job_type,
                    'is_active':is_active, 'start_date':start_date.isoformat(),
                    'extra':extra, 'service': service.name,
-                   'id':job.id, 'name': name
+                   'id':job.id, 'name': name, 'misfire_policy':misfire_policy,
+                   'max_concurrency':max_concurrency
                    }
 
             if action == 'edit':
@@ -171,7 +183,8 @@ class _CreateEdit(AdminService):
     """
     class SimpleIO(AdminSIO):
         input_required = ('cluster_id', 'name', 'is_active', 'job_type', 'service', 'start_date')
-        input_optional = ('id', 'extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats', 'cron_definition')
+        input_optional = ('id', 'extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats', 'cron_definition',
+            'misfire_policy', 'max_concurrency')
         output_required = ('id', 'name')
         output_optional = ('cron_definition',)
         default_value = ''
@@ -185,7 +198,8 @@ class _Get(AdminService):
     class SimpleIO(AdminSIO):
         input_required = ('cluster_id',)
         output_required = ('id', 'name', 'is_active', 'job_type', 'start_date', 'service_id', 'service_name')
-        output_optional = ('extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats', 'cron_definition')
+        output_optional = ('extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats', 'cron_definition',
+            'misfire_policy', 'max_concurrency')
         output_repeated = True
         default_value = ''
         date_time_format = scheduler_date_time_format
@@ -9,6 +9,7 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
+from collections import OrderedDict
 from contextlib import closing
 from httplib import BAD_REQUEST, NOT_FOUND
 from mimetypes import guess_type
@@ -20,17 +21,20 @@ from uuid import uuid4
 # anyjson
 from anyjson import loads
 
+# gevent
+from gevent.pool import Pool
+
 # validate
 from validate import is_boolean
 
 # Zato
-from zato.common import BROKER, KVDB, ZatoException
-from zato.common.broker_message import SERVICE
+from zato.common import BROKER, INVOKE_MANY, KVDB, ZatoException
+from zato.common.broker_message import BULK, MESSAGE_TYPE, SERVICE
 from zato.common.odb.model import Cluster, ChannelAMQP, ChannelWMQ, ChannelZMQ, \
      DeployedService, HTTPSOAP, Server, Service
 from zato.common.odb.query import service_list
 from zato.common.util import hot_deploy, payload_from_request
-from zato.server.service import Boolean, Integer
+from zato.server.service import Boolean, Integer, List
 from zato.server.service.internal import AdminService, AdminSIO
 
 _no_such_service_name = uuid4().hex
@@ -234,33 +238,38 @@ class GetChannelList(AdminService):
             
 class Invoke(AdminService):
     """ Invokes the service directly, as though it was exposed through some channel
-    which doesn't necessarily have to be true.
+    which doesn't necessarily have to be true. Payloads and responses are base64-encoded
+    unless skip_base64 is set.
     """
     class SimpleIO(AdminSIO):
         request_elem = 'zato_service_invoke_request'
         response_elem = 'zato_service_invoke_response'
         input_optional = ('id', 'name', 'payload', 'channel', 'data_format', 'transport', 
-            Boolean('async'), Integer('expiration'))
+            Boolean('async'), Integer('expiration'), Boolean('skip_base64'))
         output_optional = ('response',)
 
-    def handle(self):
-        payload = self.request.input.get('payload')
-        if payload:
-            payload = payload_from_request(self.cid, payload.decode('base64'), 
-                self.request.input.data_format, self.request.input.transport)
+    def invoke_item(self, item, skip_base64, **kwargs):
+        """ Invokes a service an item describes and returns its response, if it was a string.
+        Payloads other than strings are handed over to the service as they are. Any keyword arguments
+        are passed on to synchronous invocations.
+        """
+        payload = item.get('payload')
+        if payload and isinstance(payload, basestring):
+            payload = payload_from_request(self.cid, payload if skip_base64 else payload.decode('base64'), 
+                item.get('data_format'), item.get('transport'))
 
-        id = self.request.input.get('id')
-        name = self.request.input.get('name')
+        id = item.get('id')
+        name = item.get('name')
 
-        channel = self.request.input.get('channel')
-        data_format = self.request.input.get('data_format')
-        transport = self.request.input.get('transport')
-        expiration = self.request.input.get('expiration') or BROKER.DEFAULT_EXPIRATION
+        channel = item.get('channel')
+        data_format = item.get('data_format')
+        transport = item.get('transport')
+        expiration = item.get('expiration') or BROKER.DEFAULT_EXPIRATION
 
         if name and id:
             raise ZatoException('Cannot accept both id:[{}] and name:[{}]'.format(id, name))
 
-        if self.request.input.get('async'):
+        if item.get('async'):
             if id:
                 impl_name = self.server.service_store.id_to_impl_name[id]
                 name = self.server.service_store.service_data(impl_name)['name']
@@ -268,11 +277,131 @@ class Invoke(AdminService):
         else:
 
             func, id_ = (self.invoke, name) if name else (self.invoke_by_id, id)
-            response = func(id_, payload, channel, data_format, transport, serialize=True)
+            response = func(id_, payload, channel, data_format, transport, serialize=True, **kwargs)
+
+        if isinstance(response, basestring) and response:
+            return response if skip_base64 else response.encode('base64')
+
+    def handle(self):
+        response = self.invoke_item(self.request.input, self.request.input.get('skip_base64'))
+        if response:
+            self.response.payload.response = response
+
+class InvokeMany(Invoke):
+    """ Invokes a list of services, no more than max_concurrent of them at a time, and returns a list of their results
+    in the same order. Each invocation is described the same way zato.service.invoke's input is and each result
+    has its own 'ok' flag, 'response' and, if the invocation failed, 'details' of what went wrong.
+    """
+    class SimpleIO(AdminSIO):
+        request_elem = 'zato_service_invoke_many_request'
+        response_elem = 'zato_service_invoke_many_response'
+        input_required = (List('invocations'),)
+        input_optional = (Integer('max_concurrent'), Boolean('skip_base64'))
+        output_optional = (List('results'),)
+
+    def handle(self):
+        skip_base64 = self.request.input.get('skip_base64')
+
+        def invoke(item):
+            try:
+                return {'ok': True, 'response': self.invoke_item(item, skip_base64)}
+            except Exception, e:
+                self.logger.warn('Could not invoke `%s`, e:`%s`', item.get('name') or item.get('id'), format_exc(e))
+                return {'ok': False, 'response': None, 'details': format_exc(e)}
+
+        pool = Pool(self.request.input.get('max_concurrent') or INVOKE_MANY.MAX_CONCURRENT)
+        self.response.payload.results = pool.map(invoke, self.request.input.invocations)
+
+class _TransactionSession(object):
+    """ An ODB session shared by all the services zato.service.invoke-many-in-transaction invokes. Committing it
+    only flushes changes and closing it does nothing, the actual commit takes place once all the services have been invoked.
+    """
+    def __init__(self, session):
+        self._session = session
+
+    def commit(self):
+        self._session.flush()
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+class _TransactionODB(object):
+    """ Gives the same ODB session to each service that asks for one and delegates everything else to the actual ODB manager.
+    """
+    def __init__(self, odb, session):
+        self._odb = odb
+        self._session = _TransactionSession(session)
+
+    def session(self):
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._odb, name)
+
+class _BulkBrokerClient(object):
+    """ Keeps messages services publish, grouped by their message type, instead of publishing them immediately.
+    """
+    def __init__(self, broker_client):
+        self._broker_client = broker_client
+        self.messages = OrderedDict()
+
+    def publish(self, msg, msg_type=MESSAGE_TYPE.TO_PARALLEL_ALL, *ignored_args, **ignored_kwargs):
+        msg['msg_type'] = msg_type
+        self.messages.setdefault(msg_type, []).append(msg)
+
+    def __getattr__(self, name):
+        return getattr(self._broker_client, name)
+
+class InvokeManyInTransaction(InvokeMany):
+    """ Invokes a list of services one by one, all of them in a single ODB transaction, and returns a list of their results
+    in the same order. If any of the services fails, the transaction is rolled back and the exception is re-raised.
+    Broker messages published by the services are sent only after a commit, as one BULK.CONFIG message per message type.
+    """
+    class SimpleIO(AdminSIO):
+        request_elem = 'zato_service_invoke_many_in_transaction_request'
+        response_elem = 'zato_service_invoke_many_in_transaction_response'
+        input_required = (List('invocations'),)
+        input_optional = (Boolean('skip_base64'),)
+        output_optional = (List('results'),)
+
+    def handle(self):
+        skip_base64 = self.request.input.get('skip_base64')
+        results = []
+
+        broker_client = self.broker_client
+        bulk_broker_client = _BulkBrokerClient(broker_client)
+
+        with closing(self.odb.session()) as session:
+            odb = _TransactionODB(self.odb, session)
+
+            # Services invoked below will publish their messages through the bulk client
+            self.broker_client = bulk_broker_client
+
+            try:
+                for item in self.request.input.invocations:
+                    if item.get('async'):
+                        raise ZatoException(self.cid, 'Services cannot be invoked asynchronously in a transaction')
+
+                    results.append({'ok': True, 'response': self.invoke_item(item, skip_base64, environ={'zato.odb': odb})})
+
+                session.commit()
+
+            except Exception, e:
+                session.rollback()
+                self.logger.warn('Rolled back after %s of %s invocation(s), e:`%s`', len(results),
+                    len(self.request.input.invocations), format_exc(e))
+                raise
+
+            finally:
+                self.broker_client = broker_client
+
+        for msg_type, messages in bulk_broker_client.messages.items():
+            self.broker_client.publish({'action': BULK.CONFIG.value, 'messages': messages}, msg_type)
 
-        if isinstance(response, basestring):
-            if response:
-                self.response.payload.response = response.encode('base64') if response else ''
+        self.response.payload.results = results
 
 class GetDeploymentInfoList(AdminService):
     """ Returns detailed information regarding the service's deployment status
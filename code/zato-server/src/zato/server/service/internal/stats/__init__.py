@@ -9,13 +9,12 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
-from calendar import mdays
+from calendar import mdays, timegm
 from collections import OrderedDict
 from contextlib import closing
 from datetime import datetime, timedelta
 from heapq import nlargest
 from operator import itemgetter
-from sys import maxint
 
 # Bunch
 from bunch import Bunch
@@ -23,7 +22,7 @@ from bunch import Bunch
 # dateutil
 from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta
-from dateutil.rrule import MINUTELY, rrule, rruleset
+from dateutil.rrule import DAILY, HOURLY, MINUTELY, MONTHLY, rrule, rruleset
 
 # SciPy
 from scipy import stats as sp_stats
@@ -32,11 +31,20 @@ from scipy import stats as sp_stats
 from zato.common import KVDB, SECONDS_IN_DAY, StatsElem, ZatoException
 from zato.common.broker_message import STATS
 from zato.common.odb.model import Service
+from zato.common.stats import Histogram
 from zato.server.service import Integer, UTC
 from zato.server.service.internal import AdminService, AdminSIO
 
 STATS_KEYS = ('usage', 'max', 'rate', 'mean', 'min')
 
+# Formats of time suffixes of keys aggregated statistics are stored under, by how often they are created
+SUFFIX_FORMAT = {
+    MINUTELY: '%Y:%m:%d:%H:%M',
+    HOURLY: '%Y:%m:%d:%H',
+    DAILY: '%Y:%m:%d',
+    MONTHLY: '%Y:%m',
+}
+
 def stop_excluding_rrset(freq, start, stop):
     rrs = rruleset()
     rrs.rrule(rrule(freq, dtstart=start, until=stop))
@@ -44,6 +52,19 @@ def stop_excluding_rrset(freq, start, stop):
     
     return rrs
 
+def get_suffix_timestamp(key_suffix):
+    """ Returns a UTC timestamp of when the period a time suffix stands for starts, e.g. 2016:05:01:10 -> 1462096800.
+    """
+    parts = [int(elem) for elem in key_suffix.split(':')]
+    parts.extend([1] * (3 - len(parts))) # Month and day, if the suffix is for a whole year or month
+
+    return timegm(datetime(*parts).utctimetuple())
+
+def get_buckets_key(key_prefix, service_name):
+    """ Returns the key of a sorted set of time suffixes a service has statistics for under a given key prefix.
+    """
+    return '{}{}{}'.format(KVDB.SERVICE_TIME_AGGREGATED_BUCKETS, key_prefix, service_name)
+
 # ##############################################################################    
     
 class Delete(AdminService):
@@ -62,128 +83,145 @@ class Delete(AdminService):
 
 class BaseAggregatingService(AdminService):
     """ A base class for all services that process statistics into aggregated values.
+
+    Processing times are kept in Redis as histograms which can be merged with each other, hence aggregating statistics
+    from one period into a longer one never requires reading each of the processing times again. Names of services
+    that have any data for a given period are found in index sets rather than with KEYS, and all the reads and writes
+    are pipelined.
     """
     def stats_enabled(self):
         return self.server.component_enabled.stats
 
-    def aggregate_raw_times(self, key, service_name, max_batch_size=None):
-        """ Aggregates values from a list living under a given key. Returns its
-        min, max, mean and an overall usage count. 'max_batch_size' controls how
-        many items will be fetched from the list so it's possible to fetch less
-        items than its LLEN returns.
+    def get_histogram(self, sketches):
+        """ Returns a histogram all the serialized ones on input are merged into.
         """
-        key_len = self.server.kvdb.conn.llen(key)
-        if max_batch_size:
-            batch_size = min(key_len, max_batch_size)
-            if batch_size < key_len:
-                msg = ('batch_size:[{}] < key_len:[{}], max_batch_size:[{}], key:[{}], '
-                'consider decreasing the job interval or increasing the max_batch_size').format(
-                    batch_size, key_len, max_batch_size, key)
-                self.logger.warn(msg)
-        else:
-            batch_size = key_len
-            
-        times = [int(elem) for elem in self.server.kvdb.conn.lrange(key, 0, batch_size)]
+        histogram = Histogram()
+        for sketch in sketches:
+            if sketch:
+                histogram.merge(Histogram.from_string(sketch))
 
-        if times:
-            mean_percentile = int(self.server.kvdb.conn.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'mean_percentile') or 0)
-            max_score = int(sp_stats.scoreatpercentile(times, mean_percentile))
-            
-            return min(times), max(times), (sp_stats.tmean(times, (None, max_score)) or 0), len(times)
-        else:
-            return 0, 0, 0, 0
-    
-    def collect_service_stats(self, keys_pattern, key_prefix, key_suffix, total_seconds, 
-                              suffix_needs_colon=True, chop_off_service_name=True, needs_rate=True):
+        return histogram
 
-        service_stats = {}
-        if suffix_needs_colon:
-            key_suffix = ':' + key_suffix
-            
-        for key in self.kvdb.conn.keys(keys_pattern):
-            service_name = key.replace(key_prefix, '').replace(key_suffix, '')
-            if chop_off_service_name:
-                service_name = service_name[:-3]
-                
-            values = self.kvdb.conn.hgetall(key)
-            
-            stats = service_stats.setdefault(service_name, {})
-            
-            for name in STATS_KEYS:
-            
-                value = values.get(name)
-                if value:
-                    if name in('rate', 'mean'):
-                        value = float(value)
-                    else:
-                        value = int(value)
-
-                    if not name in stats:
-                        if name == 'mean':
-                            stats[name] = []
-                        elif name == 'min':
-                            stats[name] = maxint
-                        else:
-                            stats[name] = 0
-
-                    if name == 'usage':
-                        stats[name] += value
-                    elif name == 'max':
-                        stats[name] = max(stats[name], value)
-                    elif name == 'mean':
-                        stats[name].append(value)
-                    elif name == 'min':
-                        stats[name] = min(stats[name], value)
-                    
-        for service_name, values in service_stats.items():
-            mean = values.get('mean')
-            if mean:
-                values['mean'] = sp_stats.tmean(mean)
-            
-            if needs_rate:
-                values['rate'] = values['usage'] / total_seconds
-            
-        return service_stats
-        
-    def aggregate_partly_aggregated(self, delta, source_strftime_format, source, target, now=None):
+    def get_mean_percentiles(self, service_names):
+        """ Returns a dictionary of service names and percentiles above which processing times are not included
+        in the services' mean processing times.
+        """
+        with self.server.kvdb.conn.pipeline() as pipe:
+            for service_name in service_names:
+                pipe.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'mean_percentile')
+
+            return dict(zip(service_names, (int(elem or 0) for elem in pipe.execute())))
+
+    def get_aggr_stats(self, histogram, mean_percentile, total_seconds=None):
+        """ Returns min, max, mean, usage and, if total_seconds is given, rate of a service along with its histogram.
+        """
+        stats = {
+            'min': histogram.min or 0,
+            'max': histogram.max or 0,
+            'mean': histogram.trimmed_mean(histogram.percentile(mean_percentile)),
+            'usage': histogram.count,
+            'sketch': histogram.to_string(),
+        }
+
+        if total_seconds:
+            stats['rate'] = histogram.count / total_seconds
+
+        return stats
+
+    def aggregate_histograms(self, histograms, total_seconds=None):
+        """ Turns a dictionary of service names and histograms into one of service names and aggregated statistics.
+        """
+        mean_percentiles = self.get_mean_percentiles(histograms.keys())
+        return {service_name: self.get_aggr_stats(histogram, mean_percentiles[service_name], total_seconds)
+            for service_name, histogram in histograms.iteritems()}
+
+    def collect_service_stats(self, key_prefix, key_suffixes):
+        """ Returns histograms of all the services that have aggregated statistics under a given key prefix
+        and any of the suffixes, merged across all the suffixes.
+        """
+        key_suffixes = list(key_suffixes)
+
+        with self.server.kvdb.conn.pipeline() as pipe:
+            for key_suffix in key_suffixes:
+                pipe.smembers(KVDB.SERVICE_TIME_AGGREGATED_INDEX + key_suffix)
+            index = pipe.execute()
+
+        service_names = []
+
+        with self.server.kvdb.conn.pipeline() as pipe:
+            for key_suffix, suffix_service_names in zip(key_suffixes, index):
+                for service_name in suffix_service_names:
+                    pipe.hget('{}{}:{}'.format(key_prefix, service_name, key_suffix), 'sketch')
+                    service_names.append(service_name)
+
+            sketches = pipe.execute()
+
+        histograms = {}
+        for service_name, sketch in zip(service_names, sketches):
+            if sketch:
+                histogram = histograms.get(service_name)
+                if not histogram:
+                    histogram = histograms[service_name] = Histogram()
+                histogram.merge(Histogram.from_string(sketch))
+
+        return histograms
+
+    def aggregate_partly_aggregated(self, delta, source_strftime_format, source, target, source_freq, now=None):
         """ Further aggregates service statistics, e.g. turns per-minute statistics
         into per-hour statistcs.
         """
         if not now:
             now = datetime.utcnow()
         delta_diff = (now - delta)
-        
+
         if hasattr(delta, 'total_seconds'):
-            total_seconds = delta.total_seconds() 
+            total_seconds = delta.total_seconds()
         else:
             # I.e. number of days in the month * seconds a day has
             total_seconds = mdays[delta_diff.month] * SECONDS_IN_DAY # TODO: Use calendar.monthrange instead of mdays so leap years are taken into account
-        
+
+        # Suffixes of all the source keys that the target one is made of, e.g. each minute of an hour
         key_suffix = delta_diff.strftime(source_strftime_format)
-        service_stats = self.collect_service_stats(
-            '{}*:{}*'.format(source, key_suffix), source, key_suffix, total_seconds)
-        
-        self.hset_aggr_keys(service_stats, target, key_suffix)
-        
-    def hset_aggr_keys(self, service_stats, key_prefix, key_suffix):
-        for service_name, values in service_stats.items():
-            if service_name.endswith(':'):
-                service_name = service_name[:-1]
-                
-            aggr_key = '{}{}:{}'.format(key_prefix, service_name, key_suffix)
-            for name in STATS_KEYS:
-                self.hset_aggr_key(aggr_key, name, values[name])
-        
-    def hset_aggr_key(self, aggr_key, hash_key, hash_value):
-        self.server.kvdb.conn.hset(aggr_key, hash_key, hash_value)
+        start = datetime.strptime(key_suffix, source_strftime_format)
+        source_suffixes = (elem.strftime(SUFFIX_FORMAT[source_freq]) for elem in
+            stop_excluding_rrset(source_freq, start, start + delta))
+
+        histograms = self.collect_service_stats(source, source_suffixes)
+        self.hset_aggr_keys(self.aggregate_histograms(histograms, total_seconds), target, key_suffix)
 
-        # Expire the aggregated key after that many hours
+    def hset_aggr_keys(self, service_stats, key_prefix, key_suffix):
+        """ Stores aggregated statistics of services, adds the services to the index of a given suffix
+        and adds the suffix to each of the services' sorted set of suffixes they have statistics for.
+        """
+        # Expire the aggregated keys after that many hours
         expire_after = int(self.server.fs_server_config.get('stats', {}).get('expire_after', 24))
         expire_after = expire_after * 60 * 60 # Hours times minutes in an hour and seconds in a minute
-        self.server.kvdb.conn.expire(aggr_key, expire_after)
+
+        index_key = KVDB.SERVICE_TIME_AGGREGATED_INDEX + key_suffix
+        timestamp = get_suffix_timestamp(key_suffix)
+
+        with self.server.kvdb.conn.pipeline() as pipe:
+            for service_name, values in service_stats.items():
+
+                aggr_key = '{}{}:{}'.format(key_prefix, service_name, key_suffix)
+                pipe.hmset(aggr_key, values)
+                pipe.expire(aggr_key, expire_after)
+
+                pipe.sadd(index_key, service_name)
+
+                # Suffixes whose statistics have already expired are no longer needed
+                buckets_key = get_buckets_key(key_prefix, service_name)
+                pipe.zadd(buckets_key, timestamp, key_suffix)
+                pipe.zremrangebyscore(buckets_key, '-inf', timestamp - expire_after)
+                pipe.expire(buckets_key, expire_after)
+
+            if service_stats:
+                pipe.expire(index_key, expire_after)
+
+            pipe.execute()
 
 # ##############################################################################
-        
+
 class ProcessRawTimes(BaseAggregatingService):
     def handle(self):
 
@@ -201,29 +239,40 @@ class ProcessRawTimes(BaseAggregatingService):
             key, value = item.split('=')
             config[key] = int(value)
 
-        for key in self.server.kvdb.conn.keys(KVDB.SERVICE_TIME_RAW + '*'):
-            
-            service_name = key.replace(KVDB.SERVICE_TIME_RAW, '')
-            
-            current_mean = float(
-                self.server.kvdb.conn.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'mean_all_time') or 0)
-            current_min = float(self.server.kvdb.conn.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'min_all_time') or 0)
-            current_max = float(self.server.kvdb.conn.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'max_all_time') or 0)
-            
-            batch_min, batch_max, batch_mean, batch_total = self.aggregate_raw_times(
-                key, service_name, config.max_batch_size)
-            
-            self.server.kvdb.conn.hset(
-               KVDB.SERVICE_TIME_BASIC + service_name, 'mean_all_time', sp_stats.tmean((batch_mean, current_mean)))
-            self.server.kvdb.conn.hset(
-               KVDB.SERVICE_TIME_BASIC + service_name, 'min_all_time', min(current_min, batch_min))
-            self.server.kvdb.conn.hset(
-                KVDB.SERVICE_TIME_BASIC + service_name, 'max_all_time', max(current_max, batch_max))
-            
-            # Services use RPUSH for storing raw times so we are safe to use LTRIM
-            # in order to do away with the already processed ones
-            self.server.kvdb.conn.ltrim(key, batch_total, -1)
-            
+        # Each element is a histogram of processing times a worker collected between two flushes, so there is far fewer
+        # of them than there were invocations. max_batch_size is how many of them to read at most.
+        service_names = list(self.server.kvdb.conn.smembers(KVDB.SERVICE_TIME_SKETCH_INDEX))
+
+        with self.server.kvdb.conn.pipeline() as pipe:
+            for service_name in service_names:
+                pipe.lrange(KVDB.SERVICE_TIME_SKETCH + service_name, 0, config.max_batch_size - 1)
+                pipe.hget(KVDB.SERVICE_TIME_BASIC + service_name, 'sketch_all_time')
+
+            results = pipe.execute()
+
+        with self.server.kvdb.conn.pipeline() as pipe:
+            for idx, service_name in enumerate(service_names):
+                sketches, sketch_all_time = results[idx * 2], results[idx * 2 + 1]
+
+                if not sketches:
+                    continue
+
+                histogram = self.get_histogram(sketches)
+                histogram.merge(Histogram.from_string(sketch_all_time))
+
+                pipe.hmset(KVDB.SERVICE_TIME_BASIC + service_name, {
+                    'sketch_all_time': histogram.to_string(),
+                    'mean_all_time': histogram.mean,
+                    'min_all_time': histogram.min,
+                    'max_all_time': histogram.max,
+                })
+
+                # Workers use RPUSH for storing histograms so we are safe to use LTRIM
+                # in order to do away with the already processed ones
+                pipe.ltrim(KVDB.SERVICE_TIME_SKETCH + service_name, len(sketches), -1)
+
+            pipe.execute()
+
 # ##############################################################################
 
 class AggregateByMinute(BaseAggregatingService):
@@ -237,27 +286,26 @@ class AggregateByMinute(BaseAggregatingService):
         # Get all keys from a minute that is sure to have passed, for instance,
         # say it's 13:19 right now (regardless of the seconds part), we'll process everything
         # that happened in 13:17. Hence it's also important that any changes in the minutes
-        # to be picked up here below be kept in sync with the EXPIRE command Service._post_handle uses.
-        
+        # to be picked up here below be kept in sync with the EXPIRE command ServiceStatsCollector.flush uses.
+
         now = datetime.utcnow()
-        key_suffix = (now - timedelta(minutes=2)).strftime('%Y:%m:%d:%H:%M')
-        
-        for key in self.server.kvdb.conn.keys('{}*:{}'.format(KVDB.SERVICE_TIME_RAW_BY_MINUTE, key_suffix)):
-            
-            service_name = key.replace(KVDB.SERVICE_TIME_RAW_BY_MINUTE, '').replace(':' + key_suffix, '')
-            aggr_key = '{}{}:{}'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, service_name, key_suffix)
-            
-            batch_min, batch_max, batch_mean, batch_total = self.aggregate_raw_times(key, service_name)
-            
-            self.hset_aggr_key(aggr_key, 'min', batch_min)
-            self.hset_aggr_key(aggr_key, 'max', batch_max)
-            self.hset_aggr_key(aggr_key, 'mean', batch_mean)
-            self.hset_aggr_key(aggr_key, 'usage', batch_total)
-            self.hset_aggr_key(aggr_key, 'rate', batch_total / 60.0) # I.e. req/s
-            
-            # Raw per-minute statistics keys will expire by themselves, we don't need
-            # to delete them manually.
-            
+        key_suffix = (now - timedelta(minutes=2)).strftime(SUFFIX_FORMAT[MINUTELY])
+
+        service_names = list(self.server.kvdb.conn.smembers(KVDB.SERVICE_TIME_SKETCH_INDEX_BY_MINUTE + key_suffix))
+
+        with self.server.kvdb.conn.pipeline() as pipe:
+            for service_name in service_names:
+                pipe.lrange('{}{}:{}'.format(KVDB.SERVICE_TIME_SKETCH_BY_MINUTE, service_name, key_suffix), 0, -1)
+
+            histograms = {service_name: self.get_histogram(sketches)
+                for service_name, sketches in zip(service_names, pipe.execute()) if sketches}
+
+        self.hset_aggr_keys(
+            self.aggregate_histograms(histograms, 60.0), KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, key_suffix) # I.e. req/s
+
+        # Raw per-minute statistics keys will expire by themselves, we don't need
+        # to delete them manually.
+
 class AggregateByHour(BaseAggregatingService):
     """ Creates per-hour stats.
     """
@@ -267,12 +315,12 @@ class AggregateByHour(BaseAggregatingService):
             return
 
         delta = timedelta(hours=1)
-        source_strftime_format = '%Y:%m:%d:%H'
+        source_strftime_format = SUFFIX_FORMAT[HOURLY]
         source = KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE
         target = KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR
-        
-        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target)
-        
+
+        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target, MINUTELY)
+
 class AggregateByDay(BaseAggregatingService):
     """ Creates per-day stats.
     """
@@ -282,12 +330,12 @@ class AggregateByDay(BaseAggregatingService):
             return
 
         delta = timedelta(days=1)
-        source_strftime_format = '%Y:%m:%d'
+        source_strftime_format = SUFFIX_FORMAT[DAILY]
         source = KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR
         target = KVDB.SERVICE_TIME_AGGREGATED_BY_DAY
-        
-        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target)
-        
+
+        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target, HOURLY)
+
 class AggregateByMonth(BaseAggregatingService):
     """ Creates per-month stats.
     """
@@ -297,14 +345,14 @@ class AggregateByMonth(BaseAggregatingService):
             return
 
         delta = relativedelta(datetime.utcnow(), months=1)
-        source_strftime_format = '%Y:%m'
+        source_strftime_format = SUFFIX_FORMAT[MONTHLY]
         source = KVDB.SERVICE_TIME_AGGREGATED_BY_DAY
         target = KVDB.SERVICE_TIME_AGGREGATED_BY_MONTH
-        
-        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target)
-        
+
+        self.aggregate_partly_aggregated(delta, source_strftime_format, source, target, DAILY)
+
 # ##############################################################################
-        
+
 class StatsReturningService(AdminService):
     """ A base class for services returning time-oriented statistics.
     """
@@ -350,6 +398,48 @@ class StatsReturningService(AdminService):
     def get_suffixes(self, start, stop):
         return [elem.strftime('%Y:%m:%d:%H:%M') for elem in stop_excluding_rrset(MINUTELY, start, stop)]
 
+    def get_aggr_values(self, key_prefix, service_name, suffixes):
+        """ Yields names of services, time suffixes and aggregated statistics stored under a given key prefix and any
+        of the suffixes. Services that have them are found through indexes, the set of services of each suffix if all
+        of them are needed, i.e. service_name is '*', or the service's sorted set of suffixes otherwise.
+        Only keys that exist are read then, in pipelines of KVDB.SERVICE_TIME_AGGREGATED_BATCH_SIZE commands each.
+        """
+        conn = self.server.kvdb.conn
+        batch_size = KVDB.SERVICE_TIME_AGGREGATED_BATCH_SIZE
+        to_read = []
+
+        if not suffixes:
+            return
+
+        if service_name == '*':
+            for idx in xrange(0, len(suffixes), batch_size):
+                batch = suffixes[idx:idx+batch_size]
+
+                with conn.pipeline() as pipe:
+                    for suffix in batch:
+                        pipe.smembers(KVDB.SERVICE_TIME_AGGREGATED_INDEX + suffix)
+
+                    for suffix, service_names in zip(batch, pipe.execute()):
+                        to_read.extend((name, suffix) for name in service_names)
+
+        else:
+            expected = set(suffixes)
+            for suffix in conn.zrangebyscore(get_buckets_key(key_prefix, service_name),
+                    get_suffix_timestamp(min(suffixes)), get_suffix_timestamp(max(suffixes))):
+                if suffix in expected:
+                    to_read.append((service_name, suffix))
+
+        for idx in xrange(0, len(to_read), batch_size):
+            batch = to_read[idx:idx+batch_size]
+
+            with conn.pipeline() as pipe:
+                for name, suffix in batch:
+                    pipe.hgetall('{}{}:{}'.format(key_prefix, name, suffix))
+
+                for (name, suffix), values in zip(batch, pipe.execute()):
+                    if values:
+                        yield name, suffix, values
+
     def get_stats(self, start, stop, service='*', n=None, n_type=None, needs_trends=True, 
             stats_key_prefix=None, suffixes=None):
         """ Returns statistics for a given interval, as defined by 'start' and 'stop'.
@@ -380,23 +470,22 @@ class StatsReturningService(AdminService):
         
         if not suffixes:
             suffixes = self.get_suffixes(start, stop)
+
+        suffixes = list(suffixes)
         
-        # We make several passes. First two passes are made over Redis keys, one gathers the services, if any at all,
-        # and another one actually collects statistics for each service found. Next pass, a partly optional one,
-        # computes trends for mean response time and service usage. Another one computes each of the service's
-        # average rate and updates other attributes basing on values collected in the previous step.
-        # Optionally, the last one will pick only top n elements of a given type (top mean response time
-        # or top usage).
+        # We make several passes. The first one reads statistics of all the services that have any in the period,
+        # as found through indexes. Next pass, a partly optional one, computes trends for mean response time
+        # and service usage. Another one computes each of the service's average rate and updates other attributes
+        # basing on values collected in the previous step. Optionally, the last one will pick only top n elements
+        # of a given type (top mean response time or top usage).
         
         # 1st pass
-        for suffix in suffixes:
-            keys = self.server.kvdb.conn.keys('{}{}:{}'.format(stats_key_prefix, service, suffix))
-            for key in keys:
-                service_name = key.replace(stats_key_prefix, '').replace(':{}'.format(suffix), '')
-            
-                stats_elem = StatsElem(service_name)
-                stats_elems[service_name] = stats_elem
-                
+        for service_name, suffix, values in self.get_aggr_values(stats_key_prefix, service, suffixes):
+
+            stats_elem = stats_elems.get(service_name)
+            if not stats_elem:
+                stats_elem = stats_elems[service_name] = StatsElem(service_name)
+
                 # When building statistics, we can't expect there will be data for all the time
                 # elems built above so to guard against it, this is a dictionary whose keys are the
                 # said elems and values are mean/usage for each elem. The values will remain
@@ -404,35 +493,29 @@ class StatsReturningService(AdminService):
                 # particular time slice the service wasn't invoked at all.
                 stats_elem.expected_time_elems = OrderedDict(
                     (elem, Bunch({'mean':0, 'usage':0.0})) for elem in suffixes)
-                
-        # 2nd pass
-        for service, stats_elem in stats_elems.items():
-            for suffix in suffixes:
-                key = '{}{}:{}'.format(stats_key_prefix, service, suffix)
-                
-                # We can convert all the values to floats here to ease with computing
-                # all the stuff and convert them still to integers later on, when necessary.
-                key_values = Bunch(
-                    ((name, float(value)) for (name, value) in self.server.kvdb.conn.hgetall(key).items()))
-                    
-                if key_values:
-    
-                    time = (key_values.usage * key_values.mean)
-                    stats_elem.time += time
-                    
-                    mean_all_services_list.append(key_values.mean)
-                    all_services_stats.time += time
-                    all_services_stats.usage += key_values.usage
-                    
-                    stats_elem.min_resp_time = min(stats_elem.min_resp_time, key_values.min)
-                    stats_elem.max_resp_time = max(stats_elem.max_resp_time, key_values.max)
-                    
-                    for attr in('mean', 'usage'):
-                        stats_elem.expected_time_elems[suffix][attr] = key_values[attr]
-                        
+
+            # We can convert all the values to floats here to ease with computing
+            # all the stuff and convert them still to integers later on, when necessary.
+            key_values = Bunch(((name, float(value)) for (name, value) in values.items() if name in STATS_KEYS))
+
+            if key_values:
+
+                time = (key_values.usage * key_values.mean)
+                stats_elem.time += time
+
+                mean_all_services_list.append(key_values.mean)
+                all_services_stats.time += time
+                all_services_stats.usage += key_values.usage
+
+                stats_elem.min_resp_time = min(stats_elem.min_resp_time, key_values.min)
+                stats_elem.max_resp_time = max(stats_elem.max_resp_time, key_values.max)
+
+                for attr in('mean', 'usage'):
+                    stats_elem.expected_time_elems[suffix][attr] = key_values[attr]
+
         mean_all_services = '{:.0f}'.format(sp_stats.tmean(mean_all_services_list)) if mean_all_services_list else 0
                         
-        # 3rd pass (partly optional)
+        # 2nd pass (partly optional)
         for stats_elem in stats_elems.values():
             
             stats_elem.mean_all_services = mean_all_services
@@ -454,7 +537,7 @@ class StatsReturningService(AdminService):
                 stats_elem.mean_trend = ','.join(str(elem) for elem in stats_elem.mean_trend_int)
                 stats_elem.usage_trend = ','.join(str(elem) for elem in stats_elem.usage_trend_int)
                 
-        # 4th pass (optional)
+        # 3rd pass (optional)
         if n:
             for stats_elem in self.yield_top_n(n, n_type, stats_elems):
                 yield stats_elem
@@ -10,10 +10,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 from calendar import monthrange
-from copy import deepcopy
 from datetime import date, datetime, timedelta
-from itertools import chain
-from sys import maxint
 from traceback import format_exc
 
 # Bunch
@@ -24,24 +21,19 @@ from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta, MO, SU
 from dateutil.rrule import DAILY, HOURLY, MINUTELY, MONTHLY, YEARLY
 
+# numpy
+import numpy as np
+
 # paodate
 from paodate import Date
 
-# SciPy
-from scipy import stats as sp_stats
-
 # Zato
 from zato.common import KVDB, StatsElem, ZatoException
 from zato.server.service import Integer, UTC
-from zato.server.service.internal.stats import BaseAggregatingService, STATS_KEYS, StatsReturningService, \
-    stop_excluding_rrset
+from zato.server.service.internal.stats import BaseAggregatingService, StatsReturningService, stop_excluding_rrset
 
 # ##############################################################################
 
-DEFAULT_STATS = {k:0 for k in STATS_KEYS}
-DEFAULT_STATS['mean'] = []
-DEFAULT_STATS['min'] = maxint
-
 class DT_PATTERNS(object):
     CURRENT_YEAR_START = '%Y-01-01'
     CURRENT_MONTH_START = '%Y-%m-01'
@@ -141,27 +133,27 @@ class BaseSummarizingService(BaseAggregatingService):
         
         return (elem.strftime('%Y') for elem in stop_excluding_rrset(YEARLY, start, stop))
     
-    def _get_patterns(self, now, start, stop, kvdb_key, method):
-        return ('{}*:{}'.format(kvdb_key, elem) for elem in method(now, start, stop))
-    
-    def get_by_minute_patterns(self, now, start=None, stop=None):
-        return self._get_patterns(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, self.get_minutely_suffixes)
-    
-    def get_by_hour_patterns(self, now, start=None, stop=None):
-        return self._get_patterns(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, self.get_hourly_suffixes)
-    
-    def get_by_day_patterns(self, now, start=None, stop=None):
-        return self._get_patterns(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_DAY, self.get_daily_suffixes)
-    
-    def get_by_month_patterns(self, now, start=None, stop=None):
-        return self._get_patterns(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_MONTH, self.get_monthly_suffixes)
-    
-    def create_summary(self, target, *pattern_names):
+    def _get_sources(self, now, start, stop, kvdb_key, method):
+        return kvdb_key, method(now, start, stop)
+
+    def get_by_minute_sources(self, now, start=None, stop=None):
+        return self._get_sources(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, self.get_minutely_suffixes)
+
+    def get_by_hour_sources(self, now, start=None, stop=None):
+        return self._get_sources(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, self.get_hourly_suffixes)
+
+    def get_by_day_sources(self, now, start=None, stop=None):
+        return self._get_sources(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_DAY, self.get_daily_suffixes)
+
+    def get_by_month_sources(self, now, start=None, stop=None):
+        return self._get_sources(now, start, stop, KVDB.SERVICE_TIME_AGGREGATED_BY_MONTH, self.get_monthly_suffixes)
+
+    def create_summary(self, target, *source_names):
         try:
 
             now = datetime.utcnow()
             key_prefix = KVDB.SERVICE_SUMMARY_PREFIX_PATTERN.format(target)
-            
+
             if target == 'by-week':
                 start = parse((now + relativedelta(weekday=MO(-1))).strftime('%Y-%m-%d 00:00:00')) # Current week start
                 key_suffix = start.strftime(DT_PATTERNS.SUMMARY_SUFFIX_PATTERNS[target])
@@ -170,35 +162,23 @@ class BaseSummarizingService(BaseAggregatingService):
                 key_suffix = now.strftime(DT_PATTERNS.SUMMARY_SUFFIX_PATTERNS[target])
             total_seconds = (now - start).total_seconds()
 
-            patterns = []
-            for name in pattern_names:
-                patterns.append(getattr(self, 'get_by_{}_patterns'.format(name))(now))
+            # Histograms of each service, merged across all the sources
+            histograms = {}
 
-            services = {}
+            for name in source_names:
+                source, suffixes = getattr(self, 'get_by_{}_sources'.format(name))(now)
 
-            for elem in chain(*patterns):
-                prefix, suffix = elem.split('*')
-                suffix = suffix[1:]
-                stats = self.collect_service_stats(elem, prefix, suffix, None, False, False, False)
-
-                for service_name, values in stats.items():
-                    stats = services.setdefault(service_name, deepcopy(DEFAULT_STATS))
-
-                    for name in STATS_KEYS:
-                        value = values[name]
-                        if name == 'usage':
-                            stats[name] += value
-                        elif name == 'max':
-                            stats[name] = max(stats[name], value)
-                        elif name == 'mean':
-                            stats[name].append(value)
-                        elif name == 'min':
-                            stats[name] = min(stats[name], value)
+                for service_name, histogram in self.collect_service_stats(source, suffixes).items():
+                    if service_name in histograms:
+                        histograms[service_name].merge(histogram)
+                    else:
+                        histograms[service_name] = histogram
 
-            for service_name, values in services.items():
+            services = self.aggregate_histograms(histograms, total_seconds)
 
-                values['mean'] = round(sp_stats.tmean(values['mean']), 2)
-                values['rate'] = round(values['usage'] / total_seconds, 2)
+            for values in services.values():
+                values['mean'] = round(values['mean'], 2)
+                values['rate'] = round(values['rate'], 2)
 
         except Exception, e:
             self.logger.warn('Could not store mean/rate. e=`%r`, locals=`%r`',
@@ -558,41 +538,57 @@ class GetSummaryByRange(StatsReturningService, BaseSummarizingService):
         total_seconds = 0.0
         merged_stats_elems = {}
 
-        for slice in slices:
+        # Names of services and rows of their time, usage, mean, min/max response time and rate multiplied
+        # by the slice's duration, one for each stats elem of each slice, so that all of them can be merged at once.
+        names = []
+        rows = []
 
-            seen_repeated_stats = False
+        for slice in slices:
             total_seconds += slice.total_seconds
-            
+
             if slice.stats:
-                
+
+                # Each slice has a list of per-service stats. Each of the statistics
+                # has certain data repeated hence it's required we pick this data
+                # once only.
+                all_services_stats.time += slice.stats[0].all_services_time
+                all_services_stats.usage += slice.stats[0].all_services_usage
+
                 for stats_elem in slice.stats:
-                    # Each slice has a list of per-service stats. Each of the statistics
-                    # has certain data repeated hence it's required we pick this data
-                    # once only.
-                    if not seen_repeated_stats:
-                        all_services_stats.time += stats_elem.all_services_time
-                        all_services_stats.usage += stats_elem.all_services_usage
-                        seen_repeated_stats = True
-
-                    # Fetch an existing elem or assign a new one
-                    merged_stats_elem = merged_stats_elems.setdefault(stats_elem.service_name, StatsElem(stats_elem.service_name))
-
-                    # Total time spent by this service and its total usage
-                    merged_stats_elem.time += stats_elem.time
-                    merged_stats_elem.usage += stats_elem.usage
-                    all_services_stats.mean += stats_elem.mean
-                    
-                    # Minimum and maximum execution time 
-                    merged_stats_elem.min_resp_time = min(merged_stats_elem.min_resp_time, stats_elem.min_resp_time)
-                    merged_stats_elem.max_resp_time = max(merged_stats_elem.max_resp_time, stats_elem.max_resp_time)
-                    
-                    # Temporary data, will be divided by total_seconds later on,
-                    # after collecting all the stats.
-                    merged_stats_elem.temp_rate += slice.total_seconds * stats_elem.rate
-                    
-                    # Temporary data, aggregated later on
-                    merged_stats_elem.temp_mean += stats_elem.mean
-                    merged_stats_elem.temp_mean_count += 1
+                    names.append(stats_elem.service_name)
+                    rows.append((stats_elem.time, stats_elem.usage, stats_elem.mean, stats_elem.min_resp_time,
+                        stats_elem.max_resp_time, slice.total_seconds * stats_elem.rate))
+
+        if rows:
+            service_names, idx = np.unique(np.array(names, dtype=object), return_inverse=True)
+            rows = np.array(rows, dtype=np.float64)
+            count = len(service_names)
+
+            time = np.bincount(idx, rows[:, 0], count)
+            usage = np.bincount(idx, rows[:, 1], count)
+            temp_mean = np.bincount(idx, rows[:, 2], count)
+            temp_mean_count = np.bincount(idx, minlength=count)
+            temp_rate = np.bincount(idx, rows[:, 5], count)
+
+            # Minimum and maximum execution time - rows of each service are next to each other once sorted
+            order = np.argsort(idx, kind='mergesort')
+            starts = np.searchsorted(idx[order], np.arange(count))
+            min_resp_time = np.minimum.reduceat(rows[order, 3], starts)
+            max_resp_time = np.maximum.reduceat(rows[order, 4], starts)
+
+            all_services_stats.mean = temp_mean.sum()
+
+            for pos, service_name in enumerate(service_names):
+                merged_stats_elem = merged_stats_elems[service_name] = StatsElem(service_name)
+                merged_stats_elem.time = time[pos].item()
+                merged_stats_elem.usage = int(usage[pos])
+                merged_stats_elem.min_resp_time = min_resp_time[pos].item()
+                merged_stats_elem.max_resp_time = max_resp_time[pos].item()
+
+                # Temporary data, aggregated below
+                merged_stats_elem.temp_rate = temp_rate[pos].item()
+                merged_stats_elem.temp_mean = temp_mean[pos].item()
+                merged_stats_elem.temp_mean_count = int(temp_mean_count[pos])
 
         if merged_stats_elems:
             mean_all_services = all_services_stats.mean / len(merged_stats_elems)
@@ -606,7 +602,6 @@ class GetSummaryByRange(StatsReturningService, BaseSummarizingService):
             value.time = round(value.time, 1)
             
             if total_seconds:
-                value.rate = round(value.temp_rate / total_seconds, 1)
                 value.rate = round(value.temp_rate / total_seconds, 1)
                 value.mean_all_services = mean_all_services
                 
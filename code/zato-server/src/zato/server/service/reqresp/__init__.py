@@ -12,7 +12,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import logging
 from copy import deepcopy
 from httplib import OK
-from itertools import chain
 from traceback import format_exc
 
 # anyjson
@@ -32,7 +31,8 @@ from sqlalchemy.util import KeyedTuple
 # Zato
 from zato.common import NO_DEFAULT_VALUE, PARAMS_PRIORITY, SIMPLE_IO, TRACE1, ZatoException, ZATO_OK
 from zato.common.util import make_repr
-from zato.server.service.reqresp.sio import AsIs, convert_param, ForceType, ServiceInput, SIOConverter
+from zato.server.service.reqresp.payload import LazyPayload
+from zato.server.service.reqresp.sio import convert_field, decode_field, get_compiled_sio, ServiceInput, SIOConverter, SIOField
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +43,8 @@ NOT_GIVEN = 'ZATO_NOT_GIVEN'
 class HTTPRequestData(object):
     """ Data regarding an HTTP request.
     """
+    __slots__ = ('method', 'GET', 'POST')
+
     def __init__(self):
         self.method = None
         self.GET = None
@@ -63,10 +65,11 @@ class HTTPRequestData(object):
 class Request(SIOConverter):
     """ Wraps a service request and adds some useful meta-data.
     """
-    __slots__ = ('logger', 'payload', 'raw_request', 'input', 'cid', 'has_simple_io_config',
+    __slots__ = ('logger', '_payload', 'raw_request', 'input', 'cid', 'has_simple_io_config',
                  'simple_io_config', 'bool_parameter_prefixes', 'int_parameters',
                  'int_parameter_suffixes', 'is_xml', 'data_format', 'transport',
-                 '_wsgi_environ', 'channel_params', 'merge_channel_params')
+                 '_wsgi_environ', 'channel_params', 'merge_channel_params', 'params_priority', 'http', 'compiled_sio',
+                 'sio_fields')
 
     def __init__(self, logger, simple_io_config={}, data_format=None, transport=None):
         self.logger = logger
@@ -87,6 +90,48 @@ class Request(SIOConverter):
         self.channel_params = {}
         self.merge_channel_params = True
         self.params_priority = PARAMS_PRIORITY.DEFAULT
+        self.compiled_sio = None
+        self.sio_fields = None
+
+    @property
+    def payload(self):
+        """ The request parsed according to its data format. Requests received through channels are not parsed
+        until they are needed for the first time.
+        """
+        payload = self._payload
+        return payload.get() if payload.__class__ is LazyPayload else payload
+
+    @payload.setter
+    def payload(self, value):
+        self._payload = value
+
+    def iter_payload(self, tag=None):
+        """ Iterates over elements of a top-level JSON array or XML elements of a given tag without parsing the whole
+        request first, unless it's been parsed already. Handy with large requests.
+        """
+        payload = self._payload
+        if payload.__class__ is not LazyPayload:
+            payload = LazyPayload(self.cid, self.raw_request, self.data_format, self.transport)
+
+        return payload.iter_items(tag)
+
+    def reset(self):
+        """ Clears all the invocation-specific data.
+        """
+        self.payload = ''
+        self.raw_request = ''
+        self.input = ServiceInput()
+        self.cid = None
+        self.is_xml = None
+        self.data_format = None
+        self.transport = None
+        self.http.init()
+        self._wsgi_environ = None
+        self.channel_params = {}
+        self.merge_channel_params = True
+        self.params_priority = PARAMS_PRIORITY.DEFAULT
+        self.compiled_sio = None
+        self.sio_fields = None
 
     def init(self, is_sio, cid, sio, data_format, transport, wsgi_environ):
         """ Initializes the object with an invocation-specific data.
@@ -98,12 +143,15 @@ class Request(SIOConverter):
             self.transport = transport
             self._wsgi_environ = wsgi_environ
 
-            path_prefix = getattr(sio, 'request_elem', 'request')
-            required_list = getattr(sio, 'input_required', [])
-            optional_list = getattr(sio, 'input_optional', [])
-            default_value = getattr(sio, 'default_value', NO_DEFAULT_VALUE)
-            use_text = getattr(sio, 'use_text', True)
-            use_channel_params_only = getattr(sio, 'use_channel_params_only', False)
+            self.compiled_sio = get_compiled_sio(sio)
+            self.sio_fields = self.compiled_sio.get_fields(self.simple_io_config)
+
+            path_prefix = self.compiled_sio.request_elem
+            required_list = self.compiled_sio.input_required
+            optional_list = self.compiled_sio.input_optional
+            default_value = self.compiled_sio.default_value
+            use_text = self.compiled_sio.use_text
+            use_channel_params_only = self.compiled_sio.use_channel_params_only
 
             if self.simple_io_config:
                 self.has_simple_io_config = True
@@ -149,17 +197,27 @@ class Request(SIOConverter):
         """
         params = {}
 
-        for param in params_to_visit:
+        # Parameters from a SimpleIO definition have been already compiled, anything else needs to be compiled now
+        compiled_sio = self.compiled_sio
+        if compiled_sio and params_to_visit is compiled_sio.input_required:
+            fields = self.sio_fields.input_required
+        elif compiled_sio and params_to_visit is compiled_sio.input_optional:
+            fields = self.sio_fields.input_optional
+        else:
+            fields = [SIOField(param, path_prefix, self.bool_parameter_prefixes, self.int_parameters,
+                self.int_parameter_suffixes) for param in params_to_visit]
+
+        payload = '' if use_channel_params_only else self.payload
+
+        for field in fields:
             try:
-                param_name, value = convert_param(
-                    self.cid, '' if use_channel_params_only else self.payload, param, self.data_format, is_required,
-                    default_value, path_prefix, use_text, self.channel_params, self.has_simple_io_config,
-                    self.bool_parameter_prefixes, self.int_parameters, self.int_parameter_suffixes)
+                param_name, value = decode_field(self.cid, payload, field, self.data_format, is_required, default_value,
+                    use_text, self.channel_params, self.has_simple_io_config)
                 params[param_name] = value
 
             except Exception, e:
                 msg = 'Caught an exception, param:`{}`, params_to_visit:`{}`, has_simple_io_config:`{}`, e:`{}`'.format(
-                    param, params_to_visit, self.has_simple_io_config, format_exc(e))
+                    field.param, params_to_visit, self.has_simple_io_config, format_exc(e))
                 self.logger.error(msg)
                 raise Exception(msg)
 
@@ -168,13 +226,17 @@ class Request(SIOConverter):
     def deepcopy(self):
         """ Returns a deep copy of self.
         """
-        request = Request(None)
+        request = self.__class__.__new__(self.__class__)
         request.logger = logging.getLogger(self.logger.name)
 
-        for name in Request.__slots__:
-            if name == 'logger':
-                continue
-            setattr(request, name, deepcopy(getattr(self, name)))
+        # Subclasses may add slots of their own and services may set ad-hoc attributes, kept in __dict__
+        for class_ in self.__class__.__mro__:
+            for name in class_.__dict__.get('__slots__', ()):
+                if name in ('logger', '__dict__', '__weakref__') or not hasattr(self, name):
+                    continue
+                setattr(request, name, deepcopy(getattr(self, name)))
+
+        request.__dict__.update(deepcopy(self.__dict__))
 
         return request
 
@@ -198,14 +260,12 @@ class SimpleIOPayload(SIOConverter):
     they don't conflict with user-provided data.
     """
     def __init__(self, zato_cid, logger, data_format, required_list, optional_list, simple_io_config, response_elem, namespace,
-            output_repeated):
+            output_repeated, compiled_sio=None):
         self.zato_cid = zato_cid
         self.zato_logger = logger
         self.zato_data_format = data_format
         self.zato_is_xml = self.zato_data_format == SIMPLE_IO.FORMAT.XML
         self.zato_output = []
-        self.zato_required = [(True, name) for name in required_list]
-        self.zato_optional = [(False, name) for name in optional_list]
         self.zato_output_repeated = output_repeated
         self.bool_parameter_prefixes = simple_io_config.get('bool_parameter_prefixes', [])
         self.int_parameters = simple_io_config.get('int_parameters', [])
@@ -214,11 +274,15 @@ class SimpleIOPayload(SIOConverter):
         self.response_elem = response_elem
         self.namespace = namespace
 
-        self.zato_all_attrs = set()
-        for name in chain(required_list, optional_list):
-            if isinstance(name, ForceType):
-                name = name.name
-            self.zato_all_attrs.add(name)
+        if not compiled_sio:
+            compiled_sio = get_compiled_sio(Bunch(output_required=required_list, output_optional=optional_list,
+                response_elem=response_elem))
+
+        # A list of (is_required, SIOField) tuples
+        self.zato_fields = compiled_sio.get_fields(simple_io_config).output
+
+        # Shared by all the instances, must not be modified
+        self.zato_all_attrs = compiled_sio.output_names
 
         self.set_expected_attrs(required_list, optional_list)
 
@@ -243,9 +307,7 @@ class SimpleIOPayload(SIOConverter):
         """ Dynamically assigns all the expected attributes to self. Setting a value
         of an attribute will actually add data to self.zato_output.
         """
-        for name in chain(required_list, optional_list):
-            if isinstance(name, ForceType):
-                name = name.name
+        for name in self.zato_all_attrs:
             setattr(self, name, '')
 
     def set_payload_attrs(self, attrs):
@@ -271,20 +333,18 @@ class SimpleIOPayload(SIOConverter):
         self.zato_output.append(item)
         self.zato_output_repeated = True
 
-    def _getvalue(self, name, item, is_sa_namedtuple, is_required, leave_as_is):
+    def _getvalue(self, field, item, use_getattr, is_sa_namedtuple, is_required):
         """ Returns an element's value if any has been provided while taking
         into account the differences between dictionaries and other formats
         as well as the type conversions.
         """
-        lookup_name = name.name if isinstance(name, ForceType) else name
-
-        if is_sa_namedtuple or self._is_sqlalchemy(item):
-            elem_value = getattr(item, lookup_name, '')
+        if use_getattr:
+            elem_value = getattr(item, field.name, '')
         else:
-            elem_value = item.get(lookup_name, '')
+            elem_value = item.get(field.name, '')
 
         if isinstance(elem_value, basestring) and not elem_value:
-            msg = self._missing_value_log_msg(name, item, is_sa_namedtuple, is_required)
+            msg = self._missing_value_log_msg(field.param, item, is_sa_namedtuple, is_required)
             if is_required:
                 self.zato_logger.debug(msg)
                 raise ZatoException(self.zato_cid, msg)
@@ -292,11 +352,10 @@ class SimpleIOPayload(SIOConverter):
                 if self.zato_logger.isEnabledFor(TRACE1):
                     self.zato_logger.log(TRACE1, msg)
 
-        if leave_as_is:
+        if field.is_as_is:
             return elem_value
         else:
-            return self.convert(name, lookup_name, elem_value, True, self.zato_is_xml, self.bool_parameter_prefixes,
-                self.int_parameters, self.int_parameter_suffixes, None, self.zato_data_format, True)
+            return convert_field(field, elem_value, True, self.zato_data_format, True)
 
     def _missing_value_log_msg(self, name, item, is_sa_namedtuple, is_required):
         """ Returns a log message indicating that an element was missing.
@@ -326,8 +385,7 @@ class SimpleIOPayload(SIOConverter):
         if self.zato_output_repeated:
             output = self.zato_output
         else:
-            output = set(dir(self)) & self.zato_all_attrs
-            output = [dict((name, getattr(self, name)) for name in output)]
+            output = [dict((name, getattr(self, name)) for name in self.zato_all_attrs if hasattr(self, name))]
 
         if output:
 
@@ -335,24 +393,22 @@ class SimpleIOPayload(SIOConverter):
             is_sa_namedtuple = isinstance(output[0], KeyedTuple)
 
             for item in output:
+                use_getattr = is_sa_namedtuple or self._is_sqlalchemy(item)
+
                 if self.zato_is_xml:
                     out_item = Element('item')
                 else:
                     out_item = {}
-                for is_required, name in chain(self.zato_required, self.zato_optional):
-                    leave_as_is = isinstance(name, AsIs)
-                    elem_value = self._getvalue(name, item, is_sa_namedtuple, is_required, leave_as_is)
-
-                    if isinstance(name, ForceType):
-                        name = name.name
+                for is_required, field in self.zato_fields:
+                    elem_value = self._getvalue(field, item, use_getattr, is_sa_namedtuple, is_required)
 
                     if isinstance(elem_value, basestring):
                         elem_value = elem_value if isinstance(elem_value, unicode) else elem_value.decode('utf-8')
 
                     if self.zato_is_xml:
-                        setattr(out_item, name, elem_value)
+                        setattr(out_item, field.name, elem_value)
                     else:
-                        out_item[name] = elem_value
+                        out_item[field.name] = elem_value
 
                 if self.zato_output_repeated:
                     value.append(out_item)
@@ -476,13 +532,11 @@ class Response(object):
 
     def init(self, cid, io, data_format):
         self.data_format = data_format
-        required_list = getattr(io, 'output_required', [])
-        optional_list = getattr(io, 'output_optional', [])
-        response_elem = getattr(io, 'response_elem', 'response')
-        namespace = getattr(io, 'namespace', '')
-        output_repeated = getattr(io, 'output_repeated', False)
+        compiled_sio = get_compiled_sio(io)
+        required_list = compiled_sio.output_required
+        optional_list = compiled_sio.output_optional
         self.outgoing_declared = True if required_list or optional_list else False
 
         if required_list or optional_list:
             self._payload = SimpleIOPayload(cid, self.logger, data_format, required_list, optional_list, self.simple_io_config,
-                response_elem, namespace, output_repeated)
\ No newline at end of file
+                compiled_sio.response_elem, compiled_sio.namespace, compiled_sio.output_repeated, compiled_sio)
\ No newline at end of file
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import re
+from io import BytesIO
+from json import JSONDecoder
+
+# lxml
+from lxml import etree
+
+# Zato
+from zato.common import DATA_FORMAT
+from zato.common.util import payload_from_request
+
+# ################################################################################################################################
+
+_not_parsed = object()
+_json_ws = re.compile(r'[ \t\n\r]*')
+
+# ################################################################################################################################
+
+class LazyPayload(object):
+    """ A request's payload parsed at most once, on first access, in the data format of a channel it was received through.
+    Anything derived from the parsed payload, such as a copy with some of its contents masked, can be kept along with it
+    so that each consumer of the same request, e.g. security, audit log and SimpleIO, shares the results.
+
+    Large JSON arrays and XML documents can be also iterated over item by item, without parsing them in full first.
+    """
+    __slots__ = ('cid', 'raw_request', 'data_format', 'transport', '_parsed', '_views')
+
+    def __init__(self, cid, raw_request, data_format, transport):
+        self.cid = cid
+        self.raw_request = raw_request
+        self.data_format = data_format
+        self.transport = transport
+        self._parsed = _not_parsed
+        self._views = {}
+
+    def __repr__(self):
+        return '<{} at {} cid:`{}`, data_format:`{}`, transport:`{}`, is_parsed:`{}`>'.format(
+            self.__class__.__name__, hex(id(self)), self.cid, self.data_format, self.transport, self.is_parsed)
+
+# ################################################################################################################################
+
+    @property
+    def is_parsed(self):
+        return self._parsed is not _not_parsed
+
+    def get(self):
+        """ Returns the payload parsed the same way payload_from_request would do it, e.g. an objectified SOAP Body's
+        only child or a dict loaded from JSON. It's parsed on first call only, all subsequent ones return the same object.
+        """
+        if self._parsed is _not_parsed:
+            self._parsed = payload_from_request(self.cid, self.raw_request, self.data_format, self.transport)
+        return self._parsed
+
+    def get_view(self, name, func):
+        """ Returns a view of the payload under a given name, created by calling func with the parsed payload on input
+        if there is no such view yet. func must not modify its input because it's shared by all the other consumers.
+        """
+        view = self._views.get(name, _not_parsed)
+        if view is _not_parsed:
+            view = self._views[name] = func(self.get())
+        return view
+
+# ################################################################################################################################
+
+    def iter_items(self, tag=None):
+        """ Iterates over a payload one item at a time - elements of a top-level JSON array or XML elements of a given tag.
+        If the payload has not been parsed yet, it is never parsed in full - each item is returned as soon as it is read
+        and, in the case of XML, cleared afterwards so only one item at a time is kept in memory. XML items are plain
+        lxml elements rather than objectified ones. A JSON payload other than an array is returned as a single item.
+        """
+        if self.data_format == DATA_FORMAT.XML:
+            if not tag:
+                raise ValueError('Tag is required to iterate over XML payloads')
+
+            if self.is_parsed or not isinstance(self.raw_request, basestring):
+                return self._iter_parsed_xml(tag)
+            return self._iter_xml(tag)
+
+        if self.data_format == DATA_FORMAT.JSON and not self.is_parsed and isinstance(self.raw_request, basestring):
+            return self._iter_json()
+
+        return self._iter_parsed()
+
+    def _iter_parsed(self):
+        payload = self.get()
+
+        if isinstance(payload, list):
+            for item in payload:
+                yield item
+        elif payload is not None and payload != '':
+            yield payload
+
+    def _iter_parsed_xml(self, tag):
+        payload = self.get()
+
+        # The SOAP Body may have had no or several children
+        if isinstance(payload, list):
+            payload = payload[0] if payload else None
+
+        if payload is not None:
+            for elem in payload.getroottree().iter(tag):
+                yield elem
+
+    def _iter_xml(self, tag):
+        raw_request = self.raw_request
+        if isinstance(raw_request, unicode):
+            raw_request = raw_request.encode('utf-8')
+
+        for _, elem in etree.iterparse(BytesIO(raw_request), events=('end',), tag=tag):
+            yield elem
+
+            # Everything read so far is no longer needed
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    def _iter_json(self):
+        raw_request = self.raw_request
+        raw_decode = JSONDecoder().raw_decode
+
+        idx = _json_ws.match(raw_request, 0).end()
+
+        # Empty payloads have no items
+        if idx == len(raw_request):
+            return
+
+        if raw_request[idx] != '[':
+            yield self.get()
+            return
+
+        idx = _json_ws.match(raw_request, idx + 1).end()
+        if raw_request[idx:idx+1] == ']':
+            return
+
+        while True:
+            item, idx = raw_decode(raw_request, idx)
+            yield item
+
+            idx = _json_ws.match(raw_request, idx).end()
+            char = raw_request[idx:idx+1]
+
+            if char == ']':
+                return
+
+            if char != ',':
+                raise ValueError('Expected `,` or `]` at position {} in cid:`{}`'.format(idx, self.cid))
+
+            idx = _json_ws.match(raw_request, idx + 1).end()
+
+# ################################################################################################################################
@@ -11,6 +11,8 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 # stdlib
 import logging
 from copy import deepcopy
+from inspect import isclass
+from itertools import chain
 from traceback import format_exc
 
 # Bunch
@@ -18,7 +20,7 @@ from bunch import Bunch
 
 # lxml
 from lxml import etree
-from lxml.objectify import Element
+from lxml.objectify import Element, ObjectPath
 
 # Paste
 from paste.util.converters import asbool
@@ -417,3 +419,190 @@ def convert_param(cid, payload, param, data_format, is_required, default_value,
                 bool_parameter_prefixes, int_parameters, int_parameter_suffixes, None, data_format, False)
 
     return param_name, value
+
+# ################################################################################################################################
+
+class _InvalidXMLPath(object):
+    """ Raises, when looked up, the same exception that was caught when an ObjectPath was being created.
+    """
+    def __init__(self, exc):
+        self.exc = exc
+
+    def __call__(self, *ignored):
+        raise self.exc
+
+class SIOField(object):
+    """ A single element of a SimpleIO definition along with everything about it that can be established up front,
+    so that converting its values does not need to check its type or compare its name to simple_io_config each time.
+    """
+    __slots__ = ('param', 'name', 'is_force_type', 'is_as_is', 'is_complex', 'is_bool', 'is_int', 'xml_path')
+
+    def __init__(self, param, path_prefix, bool_parameter_prefixes, int_parameters, int_parameter_suffixes):
+        self.param = param
+        self.is_force_type = isinstance(param, ForceType)
+        self.name = param.name if self.is_force_type else param
+        self.is_as_is = isinstance(param, AsIs)
+        self.is_complex = isinstance(param, COMPLEX_VALUE)
+
+        self.is_bool = isinstance(param, Boolean) or any(self.name.startswith(prefix) for prefix in bool_parameter_prefixes)
+
+        # Note that it is never used with ForceType elements
+        self.is_int = self.name in int_parameters or any(self.name.endswith(suffix) for suffix in int_parameter_suffixes)
+
+        # Names that are not valid XML paths are rejected only if there is an XML request to look them up in
+        try:
+            self.xml_path = ObjectPath('{}.{}'.format(path_prefix, self.name))
+        except ValueError, e:
+            self.xml_path = _InvalidXMLPath(e)
+
+    def __repr__(self):
+        return '<{} at {} name:[{}]>'.format(self.__class__.__name__, hex(id(self)), self.name)
+
+class SIOFields(object):
+    """ All the fields of a SimpleIO definition compiled for a particular simple_io_config.
+    """
+    __slots__ = ('has_simple_io_config', 'input_required', 'input_optional', 'output')
+
+    def __init__(self, compiled_sio, simple_io_config):
+        simple_io_config = simple_io_config or {}
+
+        self.has_simple_io_config = bool(simple_io_config)
+        args = (simple_io_config.get('bool_parameter_prefixes', []), simple_io_config.get('int_parameters', []),
+            simple_io_config.get('int_parameter_suffixes', []))
+
+        request_elem = compiled_sio.request_elem
+        response_elem = compiled_sio.response_elem
+
+        self.input_required = [SIOField(param, request_elem, *args) for param in compiled_sio.input_required]
+        self.input_optional = [SIOField(param, request_elem, *args) for param in compiled_sio.input_optional]
+
+        self.output = [(True, SIOField(param, response_elem, *args)) for param in compiled_sio.output_required]
+        self.output.extend((False, SIOField(param, response_elem, *args)) for param in compiled_sio.output_optional)
+
+class CompiledSIO(object):
+    """ A SimpleIO definition of a service with all of its attributes read once rather than during each invocation.
+
+    Fields to convert depend on simple_io_config as well. It is the same for all the services in a server
+    so fields are compiled for the one they were last asked for and recompiled only if it ever changes.
+    """
+    def __init__(self, sio):
+        self.request_elem = getattr(sio, 'request_elem', 'request')
+        self.input_required = getattr(sio, 'input_required', [])
+        self.input_optional = getattr(sio, 'input_optional', [])
+        self.default_value = getattr(sio, 'default_value', NO_DEFAULT_VALUE)
+        self.use_text = getattr(sio, 'use_text', True)
+        self.use_channel_params_only = getattr(sio, 'use_channel_params_only', False)
+
+        self.response_elem = getattr(sio, 'response_elem', 'response')
+        self.output_required = getattr(sio, 'output_required', [])
+        self.output_optional = getattr(sio, 'output_optional', [])
+        self.output_repeated = getattr(sio, 'output_repeated', False)
+        self.namespace = getattr(sio, 'namespace', '')
+
+        self.output_names = set(param.name if isinstance(param, ForceType) else param
+            for param in chain(self.output_required, self.output_optional))
+
+        # A (simple_io_config, SIOFields) tuple
+        self._fields = (None, None)
+
+    def get_fields(self, simple_io_config):
+        config, fields = self._fields
+        if fields is None or config is not simple_io_config:
+            fields = SIOFields(self, simple_io_config)
+            self._fields = (simple_io_config, fields)
+
+        return fields
+
+
+# An attribute compiled SimpleIO definitions are stored in, in each service's SimpleIO class
+_compiled_sio_attr = '_zato_compiled_sio'
+
+def get_compiled_sio(sio):
+    """ Returns a compiled version of a SimpleIO definition. Compiled definitions are stored in SimpleIO classes themselves,
+    in their own __dict__ so that they are never confused with those of their base classes. Anything else, e.g. Bunch objects
+    that tests use, is compiled each time.
+    """
+    if not isclass(sio):
+        return CompiledSIO(sio)
+
+    compiled = sio.__dict__.get(_compiled_sio_attr)
+    if not compiled:
+        compiled = CompiledSIO(sio)
+        setattr(sio, _compiled_sio_attr, compiled)
+
+    return compiled
+
+# ################################################################################################################################
+
+def convert_field(field, value, has_simple_io_config, data_format, from_sio_to_external):
+    """ Same as convert_sio but uses information precomputed in an SIOField.
+    """
+    try:
+        if field.is_bool:
+            value = asbool(value or None) # value can be an empty string and asbool chokes on that
+
+        if value is not None:
+            if field.is_force_type:
+                value = field.param.convert(value, field.name, data_format, from_sio_to_external)
+            else:
+                if value and value != ZATO_NONE and has_simple_io_config and field.is_int:
+                    value = int(value)
+
+        return value
+
+    except Exception, e:
+        msg = 'Conversion error, param:`{}`, param_name:`{}`, repr:`{}`, type:`{}`, e:`{}`'.format(
+            field.param, field.name, repr(value), type(value), format_exc(e))
+        logger.error(msg)
+
+        raise ZatoException(msg=msg)
+
+def decode_field(cid, payload, field, data_format, is_required, default_value, use_text, channel_params,
+        has_simple_io_config):
+    """ Same as convert_param but uses information precomputed in an SIOField.
+    """
+    if payload:
+        if data_format == DATA_FORMAT.XML:
+            try:
+                elem = field.xml_path(payload)
+            except(ValueError, AttributeError), e:
+                if is_required:
+                    msg = 'Caught an exception while parsing, payload:[<![CDATA[{}]]>], e:[{}]'.format(
+                        etree.tostring(payload), format_exc(e))
+                    raise ParsingException(cid, msg)
+                elem = None
+
+            if field.is_complex:
+                value = elem
+            else:
+                if elem is not None:
+                    if use_text:
+                        value = elem.text # We are interested in the text the elem contains ..
+                    else:
+                        return field.name, elem # .. or in the elem itself.
+                else:
+                    value = default_value
+        else:
+            value = payload.get(field.name, NOT_GIVEN)
+    else:
+        value = NOT_GIVEN
+
+    if value == NOT_GIVEN:
+        if default_value != NO_DEFAULT_VALUE:
+            value = default_value
+        else:
+            if is_required and not channel_params.get(field.name):
+                msg = 'Required input element:`{}` not found, value:`{}`, data_format:`{}`, payload:`{}`'.format(
+                    field.param, value, data_format, payload)
+                raise ParsingException(cid, msg)
+            else:
+                # Not required and not provided on input
+                value = ''
+    else:
+        if value is not None and not field.is_complex:
+            value = unicode(value)
+
+        if not field.is_as_is:
+            return field.name, convert_field(field, value, has_simple_io_config, data_format, False)
+
+    return field.name, value
@@ -22,6 +22,9 @@ from gevent.lock import RLock
 # anyjson
 from anyjson import dumps
 
+# Bunch
+from bunch import Bunch
+
 # PyYAML
 try:
     from yaml import CDumper  # Looks awkward but
@@ -34,7 +37,7 @@ except ImportError:
 from springpython.context import InitializingObject
 
 # Zato
-from zato.common import DONT_DEPLOY_ATTR_NAME, SourceInfo, TRACE1
+from zato.common import CHANNEL, DONT_DEPLOY_ATTR_NAME, SourceInfo, TRACE1
 from zato.common.match import Matcher
 from zato.common.util import decompress, deployment_info, fs_safe_now, is_python_file, visit_py_source
 from zato.server.service import Service
@@ -74,9 +77,34 @@ class ServiceStore(InitializingObject):
             logger.error(msg)
 
     def new_instance(self, class_name):
-        """ Returns a new instance of a service of the given impl name.
+        """ Returns a new instance of a service of the given impl name, or a pooled one if the service keeps any.
+        """
+        service_info = self.services[class_name]
+        pool = service_info.get('instance_pool')
+
+        if pool:
+            return pool.pop()
+
+        return service_info['service_class']()
+
+    def release_instance(self, service):
+        """ Returns to its pool an instance that has been invoked, unless the pool is full or its service has been
+        redeployed in the meantime, in which case the instance is simply left to the garbage collector.
         """
-        return self.services[class_name]['service_class']()
+        service_info = self.services.get(service.impl_name)
+        if not service_info or service.__class__ is not service_info['service_class']:
+            return
+
+        # Fan-out/fan-in and parallel execution callbacks make use of the instance after it returns,
+        # unless it was invoked in-process.
+        if service.channel in (CHANNEL.FANOUT_CALL, CHANNEL.PARALLEL_EXEC_CALL) and \
+           not (service.wsgi_environ or {}).get('zato.request_ctx.is_local'):
+            return
+
+        pool = service_info.get('instance_pool')
+        if pool is not None and len(pool) < service.instance_pool_size:
+            service.reset()
+            pool.append(service)
 
     def new_instance_by_id(self, service_id):
         impl_name = self.id_to_impl_name[service_id]
@@ -111,7 +139,11 @@ class ServiceStore(InitializingObject):
     def import_services_from_anywhere(self, items, base_dir, work_dir=None):
         """ Imports services from any of the supported sources, be it module names,
         individual files, directories or distutils2 packages (compressed or not).
+        Services are not added to the ODB, instead, information needed to do it is returned
+        and it is up to the caller to use either add_to_odb or set_odb_info with it.
         """
+        to_deploy = []
+
         for item_name in items:
             logger.debug('About to import services from:[%s]', item_name)
 
@@ -119,17 +151,37 @@ class ServiceStore(InitializingObject):
 
             # A regular directory
             if os.path.isdir(item_name):
-                self.import_services_from_directory(item_name, base_dir)
+                to_deploy.extend(self._import_services_from_directory(item_name, base_dir))
 
             # .. a .py/.pyw
             elif is_python_file(item_name):
-                self.import_services_from_file(item_name, is_internal, base_dir)
+                to_deploy.extend(self._import_services_from_file(item_name, is_internal, base_dir))
 
             # .. must be a module object
             else:
-                self.import_services_from_module(item_name, is_internal)
+                to_deploy.extend(self._import_services_from_module(item_name, is_internal))
+
+        return to_deploy
 
     def import_services_from_file(self, file_name, is_internal, base_dir):
+        """ Imports all the services from the path to a file, adds them to the ODB and returns their IDs.
+        """
+        to_deploy = self._import_services_from_file(file_name, is_internal, base_dir)
+        odb_info = self.add_to_odb(to_deploy)
+
+        return [odb_info[item.name][0] for item in to_deploy if item.name in odb_info]
+
+    def import_services_from_directory(self, dir_name, base_dir):
+        """ Imports all the services from a directory and adds them to the ODB.
+        """
+        self.add_to_odb(self._import_services_from_directory(dir_name, base_dir))
+
+    def import_services_from_module(self, mod_name, is_internal):
+        """ Imports all the services from a module specified by the given name and adds them to the ODB.
+        """
+        self.add_to_odb(self._import_services_from_module(mod_name, is_internal))
+
+    def _import_services_from_file(self, file_name, is_internal, base_dir):
         """ Imports all the services from the path to a file.
         """
         if not os.path.isabs(file_name):
@@ -154,10 +206,11 @@ class ServiceStore(InitializingObject):
             msg = 'Could not load source mod_name:[{}] file_name:[{}], e:[{}]'.format(
                 mod_name, file_name, format_exc(e))
             logger.error(msg)
+            return []
         else:
             return self._visit_module(mod, is_internal, file_name)
 
-    def import_services_from_directory(self, dir_name, base_dir):
+    def _import_services_from_directory(self, dir_name, base_dir):
         """ dir_name points to a directory. 
 
         If dist2 is True, the directory is assumed to be a Distutils2 one and its
@@ -168,14 +221,47 @@ class ServiceStore(InitializingObject):
         of Python source code to import, as is the case with services that have
         been hot-deployed.
         """
+        to_deploy = []
         for py_path in visit_py_source(dir_name):
-            self.import_services_from_file(py_path, False, base_dir)
+            to_deploy.extend(self._import_services_from_file(py_path, False, base_dir))
 
-    def import_services_from_module(self, mod_name, is_internal):
+        return to_deploy
+
+    def _import_services_from_module(self, mod_name, is_internal):
         """ Imports all the services from a module specified by the given name.
         """
         mod = import_module(mod_name)
-        self._visit_module(mod, is_internal, inspect.getfile(mod))
+        return self._visit_module(mod, is_internal, inspect.getfile(mod))
+
+    def add_to_odb(self, to_deploy):
+        """ Adds to the ODB, in one transaction, services previously imported and returns a dictionary
+        of their names to their IDs, is_active flags and slow thresholds, as set_odb_info expects it.
+        """
+        odb_info = self.odb.add_services(to_deploy) if to_deploy else {}
+        self.set_odb_info(to_deploy, odb_info)
+
+        return odb_info
+
+    def set_odb_info(self, to_deploy, odb_info):
+        """ Assigns IDs and options from the ODB to services previously imported, no matter which worker added them to the ODB.
+        """
+        for item in to_deploy:
+            with self.update_lock:
+
+                if item.name not in odb_info:
+                    logger.warn('Service `%s` (%s) not found in ODB, it will not be available', item.name, item.impl_name)
+                    continue
+
+                service_id, is_active, slow_threshold = odb_info[item.name]
+
+                self.services[item.impl_name]['is_active'] = is_active
+                self.services[item.impl_name]['slow_threshold'] = slow_threshold
+
+                self.id_to_impl_name[service_id] = item.impl_name
+                self.impl_name_to_id[item.impl_name] = service_id
+                self.name_to_impl_name[item.name] = item.impl_name
+
+                self.services[item.impl_name]['service_class'].after_add_to_store(logger)
 
     def _should_deploy(self, name, item):
         """ Is an object something we can deploy on a server?
@@ -218,9 +304,13 @@ class ServiceStore(InitializingObject):
         return si
 
     def _visit_module(self, mod, is_internal, fs_location):
-        """ Actually imports services from a module object.
+        """ Actually imports services from a module object and returns what is needed to add them to the ODB.
         """
-        deployed = []
+        to_deploy = []
+
+        # All services from the same module share its source code
+        si = None
+
         try:
             for name in sorted(dir(mod)):
                 with self.update_lock:
@@ -234,6 +324,7 @@ class ServiceStore(InitializingObject):
                             depl_info = deployment_info('service-store', item, timestamp, fs_location)
 
                             item.add_http_method_handlers()
+                            item.compile_sio()
 
                             name = item.get_name()
                             impl_name = item.get_impl_name()
@@ -243,24 +334,17 @@ class ServiceStore(InitializingObject):
                             self.services[impl_name]['deployment_info'] = depl_info
                             self.services[impl_name]['service_class'] = item
 
-                            si = self._get_source_code_info(mod)
-
-                            service_id, is_active, slow_threshold = self.odb.add_service(
-                                name, impl_name, is_internal, timestamp, dumps(str(depl_info)), si)
+                            if item.instance_pool_size:
+                                self.services[impl_name]['instance_pool'] = []
 
-                            deployed.append(service_id)
+                            if si is None:
+                                si = self._get_source_code_info(mod)
 
-                            self.services[impl_name]['is_active'] = is_active
-                            self.services[impl_name]['slow_threshold'] = slow_threshold
-
-                            self.id_to_impl_name[service_id] = impl_name
-                            self.impl_name_to_id[impl_name] = service_id
-                            self.name_to_impl_name[name] = impl_name
+                            to_deploy.append(Bunch(name=name, impl_name=impl_name, is_internal=is_internal,
+                                deployment_time=timestamp, details=dumps(str(depl_info)), source_info=si))
 
                             logger.debug('Imported service:[{}]'.format(name))
 
-                            item.after_add_to_store(logger)
-
                         else:
                             msg = 'Skipping [{}] from [{}], should_add:[{}] is not True'.format(
                                 item, fs_location, should_add)
@@ -270,8 +354,8 @@ class ServiceStore(InitializingObject):
             msg = 'Exception while visit mod:[{}], is_internal:[{}], fs_location:[{}], e:[{}]'.format(
                 mod, is_internal, fs_location, format_exc(e))
             logger.error(msg)
-        else:
-            return deployed
+
+        return to_deploy
 
 if __name__ == '__main__':
     store = ServiceStore()
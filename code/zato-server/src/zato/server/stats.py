@@ -10,12 +10,17 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
+from traceback import format_exc
 
 # dateutil
 from dateutil.rrule import MINUTELY, rrule
 
+# gevent
+from gevent import sleep, spawn
+
 # Zato
-from zato.common import KVDB
+from zato.common import KVDB, STATS_COLLECTOR
+from zato.common.stats import Histogram
 
 logger = logging.getLogger(__name__)
                 
@@ -26,10 +31,198 @@ class MaintenanceTool(object):
         self.conn = conn
         
     def delete(self, start, stop, interval):
+        suffixes = [elem.strftime('%Y:%m:%d:%H:%M') for elem in rrule(MINUTELY, dtstart=start, until=stop)]
+
+        # Services that have any statistics in each of the minutes
         with self.conn.pipeline() as p:
-            suffixes = (elem.strftime(':%Y:%m:%d:%H:%M') for elem in rrule(MINUTELY, dtstart=start, until=stop))
             for suffix in suffixes:
-                for key in self.conn.keys('{}*{}'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, suffix)):
-                    p.delete(key)
-                    
+                p.smembers(KVDB.SERVICE_TIME_AGGREGATED_INDEX + suffix)
+            index = p.execute()
+
+        with self.conn.pipeline() as p:
+            for suffix, service_names in zip(suffixes, index):
+                for service_name in service_names:
+                    p.delete('{}{}:{}'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, service_name, suffix))
+                    p.zrem('{}{}{}'.format(
+                        KVDB.SERVICE_TIME_AGGREGATED_BUCKETS, KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, service_name), suffix)
+                p.delete(KVDB.SERVICE_TIME_AGGREGATED_INDEX + suffix)
+
             p.execute()
+
+# ################################################################################################################################
+
+class _ServiceStats(object):
+    """ Statistics of a single service collected locally since the last flush, along with a histogram of processing times
+    since the worker started.
+    """
+    __slots__ = ('usage', 'usage_delta', 'last', 'times', 'times_by_minute', 'histogram')
+
+    def __init__(self):
+        self.usage = 0
+        self.usage_delta = 0
+        self.last = None
+        self.times = Histogram()
+        self.times_by_minute = {}
+        self.histogram = Histogram()
+
+class ServiceStatsCollector(object):
+    """ Collects statistics of services invoked in a worker and periodically flushes them to Redis, in one pipeline,
+    from a background greenlet.
+
+    Processing times are stored as histograms, one per service and flush, so that zato.stats.* services can merge them
+    instead of reading each value separately. Names of services that stored anything are added to index sets
+    so no one needs to look for the keys with KEYS.
+
+    Note that usage counters available in-process, e.g. as self.usage in services, are per-worker
+    rather than cluster-wide ones.
+    """
+    def __init__(self, kvdb, flush_interval=STATS_COLLECTOR.FLUSH_INTERVAL):
+        self.kvdb = kvdb
+        self.flush_interval = flush_interval
+        self.services = {}
+
+        # Service name -> how often to store a sample request/response, refreshed with each flush
+        self.req_resp_freq = {}
+
+        self.keep_running = True
+        self._flusher = None
+
+    def start(self):
+        if not self._flusher:
+            self._flusher = spawn(self._run_flusher)
+
+    def stop(self):
+        self.keep_running = False
+        if self._flusher:
+            self._flusher.kill()
+            self._flusher = None
+        self.flush()
+
+# ################################################################################################################################
+
+    def _get_service_stats(self, name):
+        stats = self.services.get(name)
+        if not stats:
+            stats = self.services[name] = _ServiceStats()
+        return stats
+
+    def incr_usage(self, name):
+        """ Increments a service's usage counter and returns its new value.
+        """
+        stats = self._get_service_stats(name)
+        stats.usage += 1
+        stats.usage_delta += 1
+        return stats.usage
+
+    def add_time(self, name, processing_time, handle_return_time):
+        """ Stores processing time of a service, in milliseconds.
+        """
+        stats = self._get_service_stats(name)
+        stats.last = processing_time
+        stats.times.add(processing_time)
+        stats.histogram.add(processing_time)
+
+        minute = handle_return_time.strftime('%Y:%m:%d:%H:%M')
+        times = stats.times_by_minute.get(minute)
+        if times is None:
+            times = stats.times_by_minute[minute] = Histogram()
+        times.add(processing_time)
+
+    def get_req_resp_freq(self, name):
+        """ Returns how often, if at all, a sample request/response of a service should be stored, as of the last flush,
+        or None if it has not been read yet.
+        """
+        return self.req_resp_freq.get(name)
+
+    def get_histogram(self, name):
+        """ Returns a histogram of processing times of a service since this worker started.
+        """
+        return self._get_service_stats(name).histogram
+
+# ################################################################################################################################
+
+    def flush(self):
+        """ Stores in Redis everything collected since the previous flush. Collected data is taken out of each service's
+        statistics before the pipeline is executed, so that anything collected in the meantime is kept for the next flush,
+        and it is put back if the pipeline cannot be executed.
+        """
+        pending = []
+
+        for name, stats in self.services.items():
+            if stats.usage_delta or stats.times.count or stats.times_by_minute:
+                pending.append((name, stats, stats.usage_delta, stats.times, stats.times_by_minute))
+                stats.usage_delta = 0
+                stats.times = Histogram()
+                stats.times_by_minute = {}
+
+        if not pending:
+            return
+
+        # Positions of HGET results in the list the pipeline will return, by service name
+        freq_idx = {}
+        idx = 0
+
+        with self.kvdb.conn.pipeline() as pipe:
+            for name, stats, usage_delta, times, times_by_minute in pending:
+
+                if usage_delta:
+                    pipe.incrby('{}{}'.format(KVDB.SERVICE_USAGE, name), usage_delta)
+                    idx += 1
+
+                if times.count:
+                    pipe.hset('{}{}'.format(KVDB.SERVICE_TIME_BASIC, name), 'last', stats.last)
+                    pipe.rpush('{}{}'.format(KVDB.SERVICE_TIME_SKETCH, name), times.to_string())
+                    pipe.sadd(KVDB.SERVICE_TIME_SKETCH_INDEX, name)
+                    idx += 3
+
+                for minute, minute_times in times_by_minute.iteritems():
+                    key = '{}{}:{}'.format(KVDB.SERVICE_TIME_SKETCH_BY_MINUTE, name, minute)
+                    index_key = '{}{}'.format(KVDB.SERVICE_TIME_SKETCH_INDEX_BY_MINUTE, minute)
+
+                    pipe.rpush(key, minute_times.to_string())
+                    pipe.sadd(index_key, name)
+
+                    # .. we'll have 5 minutes (5 * 60 seconds = 300 seconds)
+                    # to aggregate processing times for a given minute and then it will expire
+                    pipe.expire(key, 300)
+                    pipe.expire(index_key, 300)
+                    idx += 4
+
+                # Only services invoked since the previous flush may need to store a sample of their requests/responses
+                if usage_delta:
+                    pipe.hget('{}{}'.format(KVDB.REQ_RESP_SAMPLE, name), 'freq')
+                    freq_idx[name] = idx
+                    idx += 1
+
+            try:
+                results = pipe.execute()
+            except Exception:
+                for name, stats, usage_delta, times, times_by_minute in pending:
+                    self._restore(stats, usage_delta, times, times_by_minute)
+                raise
+
+        for name, idx in freq_idx.iteritems():
+            self.req_resp_freq[name] = int(results[idx] or 0)
+
+    def _restore(self, stats, usage_delta, times, times_by_minute):
+        """ Puts back data that could not be flushed, merging it with anything collected since the flush started.
+        """
+        stats.usage_delta += usage_delta
+        stats.times.merge(times)
+
+        for minute, minute_times in times_by_minute.iteritems():
+            current = stats.times_by_minute.get(minute)
+            if current is None:
+                stats.times_by_minute[minute] = minute_times
+            else:
+                current.merge(minute_times)
+
+    def _run_flusher(self):
+        while self.keep_running:
+            sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception, e:
+                logger.warn('Could not flush service statistics, e:`%s`', format_exc(e))
+
+# ################################################################################################################################
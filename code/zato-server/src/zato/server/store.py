@@ -92,15 +92,7 @@ class BaseStore(object):
         try:
             logger.debug('Creating `%s`', config_no_sensitive)
             impl = self.create_impl(config, config_no_sensitive, **extra)
-
-            def execute(session, statement):
-                def execute_impl(**kwargs):
-                    if not session:
-                        raise Exception('Cannot execute the query without a session')
-                    return session.execute(statement, kwargs)
-                return execute_impl
-
-            item.execute = execute(conn, impl)
+            self.add_execute(item, conn, impl)
 
             logger.debug('Created `%s`', config_no_sensitive)
         except Exception, e:
@@ -118,6 +110,16 @@ class BaseStore(object):
 
         return item
 
+    def add_execute(self, item, session, statement):
+        """ Adds to an item a callable executing its statement in a session. Must be called with self.lock held.
+        """
+        def execute_impl(**kwargs):
+            if not session:
+                raise Exception('Cannot execute the query without a session')
+            return session.execute(statement, kwargs)
+
+        item.execute = execute_impl
+
     def create(self, name, config, **extra):
         """ Adds a new connection definition.
         """
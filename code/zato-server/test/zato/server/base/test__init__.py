@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common.broker_message import BULK, SCHEDULER, SECURITY
+from zato.server.base import BrokerMessageReceiver
+
+# ################################################################################################################################
+
+class DummyReceiver(BrokerMessageReceiver):
+    def __init__(self):
+        super(DummyReceiver, self).__init__()
+        self.handled = []
+
+    def filter(self, msg):
+        return msg.action != SCHEDULER.CREATE.value
+
+    def on_broker_msg_SECURITY_BASIC_AUTH_CREATE(self, msg):
+        self.handled.append(msg)
+
+    def on_broker_msg_SECURITY_BASIC_AUTH_EDIT(self, msg):
+        if msg.name == 'invalid':
+            raise ValueError('Invalid message')
+        self.handled.append(msg)
+
+# ################################################################################################################################
+
+class BulkConfigTestCase(TestCase):
+
+    def test_messages_handled_in_order(self):
+        receiver = DummyReceiver()
+        receiver.on_broker_msg(Bunch({'action':BULK.CONFIG.value, 'messages':[
+            {'action':SECURITY.BASIC_AUTH_CREATE.value, 'name':'a'},
+            {'action':SCHEDULER.CREATE.value, 'name':'b'},
+            {'action':SECURITY.BASIC_AUTH_EDIT.value, 'name':'invalid'},
+            {'action':SECURITY.BASIC_AUTH_EDIT.value, 'name':'c'},
+        ]}))
+
+        # Messages are filtered out one by one and an error in one of them does not stop the rest
+        eq_([msg.name for msg in receiver.handled], ['a', 'c'])
+
+        # Handlers can access messages' attributes just like with messages that are not a part of bulk ones
+        eq_(receiver.handled[0].action, SECURITY.BASIC_AUTH_CREATE.value)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes many greenlets to read configuration of outgoing connections, while a stream of edits
+# to it is coming in, when each read takes a lock against when reads use snapshots of configuration replaced on each
+# edit. Also compares how long it takes to build configuration out of SQL query results attribute by attribute
+# against when all attributes of each row are read in one call.
+#
+# Run it from the zato-server directory: py -m test.zato.server.bench_config_dict
+
+# stdlib
+from threading import RLock
+from time import time
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+import gevent
+from gevent import monkey
+
+# SQLAlchemy
+from sqlalchemy.util import KeyedTuple
+
+# Zato
+from zato.server.config import ConfigDict
+
+# ################################################################################################################################
+
+CONNECTIONS = 200
+READERS = 500
+READS = 2000
+EDITS = 500
+COLUMNS = 30
+ROWS = 5000
+
+# ################################################################################################################################
+
+class LockingConfigDict(object):
+    """ What ConfigDict used to do - reads and writes take the same lock and writes modify the mapping in place.
+    """
+    def __init__(self, name, _bunch=None):
+        self.name = name
+        self._impl = _bunch
+        self.lock = RLock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self._impl.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            self._impl[key] = value
+
+    __setitem__ = set
+
+    def __getitem__(self, key):
+        with self.lock:
+            return self._impl.__getitem__(key)
+
+    def keys(self):
+        with self.lock:
+            return self._impl.keys()
+
+def old_from_query(name, query_data, impl_class=Bunch, item_class=Bunch):
+    config_dict = LockingConfigDict(name)
+    config_dict._impl = impl_class()
+
+    query, attrs = query_data
+
+    for item in query:
+        item_name = item.name
+        config_dict._impl[item_name] = item_class()
+        config_dict._impl[item_name].config = item_class()
+        for attr_name in attrs.keys():
+            config_dict._impl[item_name]['config'][attr_name] = getattr(item, attr_name)
+
+    return config_dict
+
+# ################################################################################################################################
+
+def run(config_dict):
+    names = ['conn-{}'.format(idx) for idx in range(CONNECTIONS)]
+
+    def read(offset):
+        for idx in range(READS):
+            config_dict[names[(offset + idx) % CONNECTIONS]].config
+            config_dict.get('conn-missing')
+
+            # Requests are handled by greenlets switching to each other
+            if not idx % 50:
+                gevent.sleep(0)
+
+    def edit():
+        for idx in range(EDITS):
+            name = names[idx % CONNECTIONS]
+            config_dict[name] = Bunch(config=Bunch(config_dict[name].config, version=idx))
+            gevent.sleep(0)
+
+    start = time()
+    gevent.joinall([gevent.spawn(read, idx) for idx in range(READERS)] + [gevent.spawn(edit)])
+
+    return time() - start
+
+def get_impl():
+    return Bunch(('conn-{}'.format(idx), Bunch(config=Bunch(id=idx, name='conn-{}'.format(idx))))
+        for idx in range(CONNECTIONS))
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    # Sockets and locks must cooperate with greenlets before anything uses them
+    monkey.patch_all()
+
+    locking_time = run(LockingConfigDict('out_plain_http', get_impl()))
+    snapshot_time = run(ConfigDict('out_plain_http', get_impl()))
+
+    reads = READERS * READS * 2
+    print('{} greenlets, {} reads, {} edits'.format(READERS, reads, EDITS))
+    print('Locking   {:>7.3f} s, {:>10.0f} reads/s'.format(locking_time, reads / locking_time))
+    print('Snapshots {:>7.3f} s, {:>10.0f} reads/s'.format(snapshot_time, reads / snapshot_time))
+
+    columns = ['column_{}'.format(idx) for idx in range(COLUMNS)]
+    rows = [KeyedTuple(['row-{}'.format(idx)] + [idx] * COLUMNS, ['name'] + columns) for idx in range(ROWS)]
+    query_data = (rows, Bunch((column, None) for column in columns))
+
+    start = time()
+    old_from_query('out_sql', query_data)
+    old_time = time() - start
+
+    start = time()
+    ConfigDict.from_query('out_sql', query_data)
+    new_time = time() - start
+
+    print('from_query, {} rows of {} columns, attribute by attribute {:.3f} s, one call per row {:.3f} s'.format(
+        ROWS, COLUMNS, old_time, new_time))
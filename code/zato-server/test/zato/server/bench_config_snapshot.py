@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes, and how many ODB queries are needed, for all workers of a server to load their configuration
+# when each of them loads it from the ODB on its own against when only the first one does it and the rest deserialize
+# the snapshot it stored, still loading secret-bearing configuration themselves. The ODB is an SQLite database with many
+# secured channels, each with replace patterns.
+#
+# Run it from the zato-server directory: py -m test.zato.server.bench_config_snapshot
+
+# stdlib
+from time import time
+
+# SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common.odb import model
+from zato.common.odb.model import APIKeySecurity, Cluster, HTTPBasicAuth, HTTPSOAP, HTTSOAPAuditReplacePatternsJSONPointer, \
+     HTTSOAPAuditReplacePatternsXPath, JSONPointer, Service, XPath
+from zato.server.config import add_secret_config, ConfigSnapshot, get_config_from_odb, get_secret_config_from_odb
+from zato.server.odb import ODBManager
+
+# ################################################################################################################################
+
+WORKERS = 16
+CHANNELS = 3000
+
+# ################################################################################################################################
+
+def get_odb():
+    engine = create_engine('sqlite://')
+    model.Base.metadata.create_all(engine)
+
+    odb = ODBManager()
+    odb._Session = sessionmaker(bind=engine)
+    odb._session = odb._Session()
+
+    session = odb._session
+
+    cluster = Cluster(None, 'cluster1', None, 'sqlite', broker_host='localhost', broker_port=6379, lb_host='localhost',
+        lb_port=11223, lb_agent_port=20151)
+    service = Service(None, 'service1', True, 'mod.Service1', False, cluster)
+
+    json_pointer = JSONPointer(None, 'jp1', '/a/b', cluster_id=None)
+    json_pointer.cluster = cluster
+
+    xpath = XPath(None, 'xp1', '//a/b', cluster_id=None)
+    xpath.cluster = cluster
+
+    session.add_all([cluster, service, json_pointer, xpath])
+
+    for idx in range(CHANNELS):
+        if idx % 2:
+            security = HTTPBasicAuth(None, 'basic-{}'.format(idx), True, 'user-{}'.format(idx), 'realm',
+                'password-{}'.format(idx), cluster)
+        else:
+            security = APIKeySecurity(None, 'apikey-{}'.format(idx), True, 'x-key-{}'.format(idx),
+                'password-{}'.format(idx), cluster)
+
+        channel = HTTPSOAP(None, 'channel-{}'.format(idx), True, False, 'channel', 'plain_http', None,
+            '/channel-{}'.format(idx), None, '', data_format='json', service=service, security=security, cluster=cluster)
+
+        jp = HTTSOAPAuditReplacePatternsJSONPointer()
+        jp.replace_patterns_json_pointer = channel
+        jp.pattern = json_pointer
+        jp.cluster_id = 1
+
+        xp = HTTSOAPAuditReplacePatternsXPath()
+        xp.replace_patterns_xpath = channel
+        xp.pattern = xpath
+        xp.cluster_id = 1
+
+        session.add_all([channel, jp, xp])
+
+    session.commit()
+
+    return engine, odb, cluster.id
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    engine, odb, cluster_id = get_odb()
+
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda *ignored: queries.append(None))
+
+    print('{} workers, {} secured channels'.format(WORKERS, CHANNELS))
+
+    # Each worker loads everything from the ODB
+    start = time()
+    for x in range(WORKERS):
+        add_secret_config(get_config_from_odb(odb, cluster_id), get_secret_config_from_odb(odb, cluster_id))
+    each_time, each_queries = time() - start, len(queries)
+
+    del queries[:]
+
+    # The first worker loads it from the ODB, the rest reuse its snapshot, each worker loads secrets on its own
+    start = time()
+    value = ConfigSnapshot('1', 'abc', get_config_from_odb(odb, cluster_id)).dumps()
+    for x in range(WORKERS):
+        add_secret_config(ConfigSnapshot.loads(value).data, get_secret_config_from_odb(odb, cluster_id))
+    snapshot_time, snapshot_queries = time() - start, len(queries)
+
+    print('Each worker loads from the ODB {:>8.3f} s, {:>6} queries'.format(each_time, each_queries))
+    print('Workers share a snapshot       {:>8.3f} s, {:>6} queries, snapshot {} bytes'.format(
+        snapshot_time, snapshot_queries, len(value)))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes to execute a Cassandra query with many sets of parameters one execution after another
+# against when they are executed concurrently with execute_many. Also compares how many rows are kept in memory at most
+# when all of a large result is received at once against when it is received page by page. Cassandra is not needed -
+# each response takes LATENCY to arrive plus PAGE_LATENCY for each thousand rows in it.
+#
+# Run it from the zato-server directory: py -m test.zato.server.bench_query
+
+# stdlib
+from time import time
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+import gevent
+from gevent.event import AsyncResult
+
+# Zato
+from zato.server.query import CassandraQueryStore
+
+# ################################################################################################################################
+
+EXECUTIONS = 200
+CONCURRENCY = (5, 20, 50)
+LATENCY = 0.002
+PAGE_LATENCY = 0.001
+ROWS = 100000
+FETCH_SIZE = 1000
+
+# ################################################################################################################################
+
+class Statement(object):
+    def bind(self, values):
+        return Bunch(params=values, fetch_size=None)
+
+class ResponseFuture(object):
+    """ Pages are lists of integers, each one stands for a row.
+    """
+    def __init__(self, rows, fetch_size):
+        self.rows = rows
+        self.fetch_size = fetch_size or rows
+        self.offset = 0
+        self.callbacks = []
+        self.has_more_pages = False
+        self._start()
+
+    def _start(self):
+        self.page = AsyncResult()
+        gevent.spawn(self._fetch)
+
+    def _fetch(self):
+        count = min(self.fetch_size, self.rows - self.offset)
+        gevent.sleep(LATENCY + PAGE_LATENCY * count / 1000)
+
+        page = range(self.offset, self.offset + count)
+        self.offset += count
+        self.has_more_pages = self.offset < self.rows
+        self.page.set(page)
+
+        for callback, _ in self.callbacks:
+            callback(page)
+
+    def add_callbacks(self, callback, errback):
+        self.callbacks.append((callback, errback))
+        if self.page.ready():
+            callback(self.page.get())
+
+    def result(self, timeout=None):
+        return self.page.get(timeout=timeout)
+
+    def start_fetching_next_page(self):
+        self._start()
+
+class Session(object):
+    default_timeout = 10.0
+
+    def prepare(self, value):
+        return Statement()
+
+    def execute_async(self, statement):
+        return ResponseFuture(statement.params.get('rows', 1), statement.fetch_size)
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    store = CassandraQueryStore()
+    store.create('bench', Bunch(name='bench', value='SELECT', is_active=True), def_=Bunch(conn=Session()))
+    query = store['bench']
+
+    params_list = [{'id': idx} for idx in range(EXECUTIONS)]
+
+    start = time()
+    for params in params_list:
+        query.execute(**params)
+    serial_time = time() - start
+
+    print('{} executions, {:.0f} ms each'.format(EXECUTIONS, LATENCY * 1000))
+    print('One after another       {:>7.3f} s'.format(serial_time))
+
+    for concurrency in CONCURRENCY:
+        start = time()
+        query.execute_many(params_list, concurrency)
+        print('execute_many, {:>2} at most {:>7.3f} s'.format(concurrency, time() - start))
+
+    start = time()
+    all_rows = len(query.execute(rows=ROWS))
+    all_time = time() - start
+
+    start = time()
+    max_rows = max(len(page) for page in query.iter_pages(FETCH_SIZE, rows=ROWS))
+    pages_time = time() - start
+
+    print('{} rows, all at once {:.3f} s, {} rows in memory, page by page {:.3f} s, {} rows in memory'.format(
+        ROWS, all_time, all_rows, pages_time, max_rows))
+    print('{executions} executions, {rows} rows, {time_max:.1f} ms at most'.format(**query.stats))
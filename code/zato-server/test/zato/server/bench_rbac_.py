@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes to check HTTP RBAC permissions when the role hierarchy is walked for each request against
+# when a flattened table of decisions is consulted. Roles form several deep trees, each client has a few of them.
+# Also shows how long it takes to build the table and to update it after a single change.
+#
+# Run it from the zato-server directory: py -m test.zato.server.bench_rbac_
+
+# stdlib
+from random import Random
+from time import time
+
+# Zato
+from zato.server.rbac_ import RBAC
+
+# ################################################################################################################################
+
+TREES = 10
+DEPTH = 30
+RESOURCES = 1000
+RULES_PER_ROLE = 5
+CLIENTS = 500
+ROLES_PER_CLIENT = 3
+CHECKS = 100000
+
+VERBS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# ################################################################################################################################
+
+def get_rbac(random):
+    rbac = RBAC()
+
+    for perm_id, perm_name in enumerate(('Create', 'Read', 'Update', 'Delete'), 1):
+        rbac.create_permission(perm_id, perm_name)
+
+    for resource in range(RESOURCES):
+        rbac.create_resource(resource)
+
+    role_ids = []
+    for tree in range(TREES):
+        parent_id = None
+        for level in range(DEPTH):
+            role_id = tree * DEPTH + level + 1
+            rbac.create_role(role_id, 'role-{}'.format(role_id), parent_id)
+            role_ids.append(role_id)
+            parent_id = role_id
+
+    for role_id in role_ids:
+        for x in range(RULES_PER_ROLE):
+            func = rbac.create_role_permission_allow if random.random() < 0.9 else rbac.create_role_permission_deny
+            func(role_id, random.randint(1, 4), random.randrange(RESOURCES))
+
+    client_defs = ['sec_def:::basic_auth:::client-{}'.format(idx) for idx in range(CLIENTS)]
+    for client_def in client_defs:
+        for role_id in random.sample(role_ids, ROLES_PER_CLIENT):
+            rbac.create_client_role(client_def, role_id)
+
+    return rbac, role_ids, client_defs
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    random = Random(1)
+    rbac, role_ids, client_defs = get_rbac(random)
+
+    start = time()
+    rbac.set_http_permissions()
+    build_time = time() - start
+
+    checks = [(random.choice(client_defs), random.choice(VERBS), random.randrange(RESOURCES)) for x in range(CHECKS)]
+
+    start = time()
+    registry_result = [bool(rbac.is_client_allowed(client_def, rbac.http_permissions[verb], resource))
+        for client_def, verb, resource in checks]
+    registry_time = time() - start
+
+    start = time()
+    table_result = [rbac.is_http_client_allowed(client_def, verb, resource) for client_def, verb, resource in checks]
+    table_time = time() - start
+
+    assert registry_result == table_result
+
+    # A single change near the root of a tree affects all the clients of roles below it
+    start = time()
+    rbac.create_role_permission_allow(role_ids[0], 2, 0)
+    update_time = time() - start
+
+    print('{} trees {} roles deep, {} clients, {} resources'.format(TREES, DEPTH, CLIENTS, RESOURCES))
+    print('Table: {} entries, {} bytes, built in {:.3f} s, updated in {:.3f} s after a change to a root role'.format(
+        rbac.http_decisions_info['entries'], rbac.http_decisions_info['size'], build_time, update_time))
+    print('{} checks, registry {:>8.3f} s, table {:>8.3f} s ({} allowed)'.format(
+        CHECKS, registry_time, table_time, sum(table_result)))
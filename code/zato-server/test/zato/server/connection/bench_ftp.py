@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes to run many short FTP sessions, each storing a small file, when each session logs in
+# on its own against when sessions come from a pool of logged-in connections. Also compares how much memory it takes
+# to download a large file as a whole against when it is streamed to a file chunk by chunk. Needs pyftpdlib, whose
+# server runs in a separate process.
+#
+# Run it from the zato-server directory: py -m test.zato.server.connection.bench_ftp
+
+# stdlib
+import logging
+import os
+from multiprocessing import Process
+from resource import getrusage, RUSAGE_SELF
+from shutil import rmtree
+from tempfile import mkdtemp, TemporaryFile
+from time import sleep, time
+
+# Bunch
+from bunch import Bunch
+
+# pyftpdlib
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import FTPServer
+
+# Zato
+from zato.server.connection.ftp import FTPFacade, FTPStore
+
+# ################################################################################################################################
+
+PORT = 35021
+SESSIONS = 500
+LARGE_FILE_SIZE = 100 * 1024 * 1024
+
+# ################################################################################################################################
+
+def serve(home):
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(b'user1', b'password1', home, perm=b'elradfmw')
+
+    handler = FTPHandler
+    handler.authorizer = authorizer
+
+    logging.basicConfig(level=logging.WARN)
+    FTPServer(('127.0.0.1', PORT), handler).serve_forever()
+
+def get_max_rss():
+    return getrusage(RUSAGE_SELF).ru_maxrss // 1024 # In MB
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    home = mkdtemp()
+    with open(os.path.join(home, 'large.bin'), 'wb') as f:
+        f.truncate(LARGE_FILE_SIZE)
+
+    server = Process(target=serve, args=(home,))
+    server.start()
+    sleep(1)
+
+    try:
+        params = Bunch({'name':'bench', 'is_active':True, 'host':'127.0.0.1', 'port':PORT, 'user':'user1',
+            'password':'password1', 'acct':'', 'dircache':True, 'timeout':None})
+
+        start = time()
+        for idx in range(SESSIONS):
+            conn = FTPFacade(params.host, params.user, params.password, params.acct, port=params.port)
+            conn.setcontents('/file-{}.txt'.format(idx % 10), b'abc')
+            conn.close()
+        login_time = time() - start
+
+        store = FTPStore()
+        store.add_params([params])
+
+        start = time()
+        for idx in range(SESSIONS):
+            with store.get('bench') as conn:
+                conn.setcontents('/file-{}.txt'.format(idx % 10), b'abc')
+        pool_time = time() - start
+
+        print('{} sessions, logging in each time {:.3f} s, pooled {:.3f} s'.format(SESSIONS, login_time, pool_time))
+
+        rss = get_max_rss()
+        with store.get('bench') as conn:
+            with TemporaryFile() as target:
+                conn.download('/large.bin', target)
+        download_rss = get_max_rss() - rss
+
+        with store.get('bench') as conn:
+            conn.getcontents('/large.bin')
+        getcontents_rss = get_max_rss() - rss
+
+        print('{} MB file, memory used when streamed {} MB, when read as a whole {} MB'.format(
+            LARGE_FILE_SIZE // (1024 * 1024), download_rss, getcontents_rss))
+
+    finally:
+        server.terminate()
+        rmtree(home)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes to authenticate requests sent by a few hundred clients of HTTP Basic Auth, technical account
+# and API key channels when each request is checked in full against when positive results are cached. Technical accounts
+# are always checked in full.
+#
+# Run it from the zato-server directory: py -m test.zato.server.connection.http_soap.bench_auth_cache
+
+# stdlib
+from base64 import b64encode
+from hashlib import sha256
+from random import Random
+from time import time
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common import SEC_DEF_TYPE, ZATO_NONE
+from zato.server.connection.http_soap.auth_cache import AuthCache
+from zato.server.connection.http_soap.url_data import URLData
+
+# ################################################################################################################################
+
+CLIENTS = 300
+REQUESTS = 100000
+
+# ################################################################################################################################
+
+def get_requests(random):
+    clients = []
+
+    for idx in range(CLIENTS):
+        name, password = 'client-{}'.format(idx), 'password-{}'.format(idx)
+        kind = idx % 3
+
+        if kind == 0:
+            sec_def = Bunch(name=name, sec_type=SEC_DEF_TYPE.BASIC_AUTH, username=name, password=password, realm='Zato')
+            wsgi_environ = {'HTTP_AUTHORIZATION': 'Basic {}'.format(b64encode('{}:{}'.format(name, password)))}
+
+        elif kind == 1:
+            salt = 'salt-{}'.format(idx)
+            sec_def = Bunch(name=name, sec_type=SEC_DEF_TYPE.TECH_ACCOUNT, salt=salt,
+                password=sha256(password + ':' + salt).hexdigest())
+            wsgi_environ = {'HTTP_X_ZATO_USER': name, 'HTTP_X_ZATO_PASSWORD': password}
+
+        else:
+            sec_def = Bunch(name=name, sec_type=SEC_DEF_TYPE.APIKEY, username='HTTP_X_API_KEY', password=password)
+            wsgi_environ = {'HTTP_X_API_KEY': password}
+
+        clients.append((Bunch(sec_def=sec_def), wsgi_environ))
+
+    return [random.choice(clients) for x in range(REQUESTS)]
+
+def run(url_data, requests):
+    channel_item = Bunch(has_rbac=False)
+
+    start = time()
+    for sec, wsgi_environ in requests:
+        url_data.check_security(sec, 'cid', channel_item, '/', '', wsgi_environ, ZATO_NONE, None)
+
+    return time() - start
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    requests = get_requests(Random(1))
+
+    no_cache = URLData(auth_cache=AuthCache(max_size=0))
+    with_cache = URLData(auth_cache=AuthCache())
+
+    no_cache_time = run(no_cache, requests)
+    with_cache_time = run(with_cache, requests)
+
+    stats = with_cache.auth_cache.get_stats()
+
+    print('{} requests from {} clients'.format(REQUESTS, CLIENTS))
+    print('No cache   {:>8.3f} s'.format(no_cache_time))
+    print('With cache {:>8.3f} s, hit ratio {:.3f}, time saved according to the cache {:.3f} s'.format(
+        with_cache_time, stats['hit_ratio'], stats['time_saved']))
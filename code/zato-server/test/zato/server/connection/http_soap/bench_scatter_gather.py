@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes to invoke a few slow backends through HTTP outgoing connections one call after another
+# against when the calls are scattered across the connections and gathered concurrently. Each backend takes 20 ms
+# to reply. Also shows how a deadline lets a caller return partial results on time when one of the backends hangs.
+#
+# Run it from the zato-server directory: py -m test.zato.server.connection.http_soap.bench_scatter_gather
+
+# stdlib
+from time import time
+
+# gevent
+import gevent
+from gevent import monkey
+from gevent.pywsgi import WSGIServer
+
+# Requests
+import requests
+
+# Zato
+from zato.common import DATA_FORMAT, URL_TYPE, ZATO_NONE
+from zato.server.connection.http_soap.outgoing import HTTPCall, HTTPSOAPWrapper, scatter_gather
+
+# ################################################################################################################################
+
+BACKENDS = 4
+CALLS_PER_BACKEND = 25
+POOL_SIZE = 10
+SLEEP = 0.02
+HANG = 5.0
+DEADLINE = 0.5
+
+# ################################################################################################################################
+
+def app(environ, start_response):
+    gevent.sleep(HANG if environ['PATH_INFO'] == '/hang' else SLEEP)
+    start_response(b'200 OK', [(b'Content-Type', b'application/json')])
+    return [b'{"ok": true}']
+
+class _RequestsModule(object):
+    """ Sessions pool as many connections as outgoing connections are configured to use.
+    """
+    def session(self, pool_maxsize):
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize))
+        return session
+
+def get_wrapper(port, idx, path='/'):
+    return HTTPSOAPWrapper({'name':'backend-{}'.format(idx), 'is_active':True, 'sec_type':None,
+        'address_host':'http://127.0.0.1:{}'.format(port), 'address_url_path':path, 'ping_method':'GET', 'soap_version':'1.1', 'pool_size':POOL_SIZE,
+        'serialization_type':'string', 'timeout':10, 'tls_verify':ZATO_NONE, 'data_format':DATA_FORMAT.JSON,
+        'content_type':'', 'transport':URL_TYPE.PLAIN_HTTP}, _RequestsModule())
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    # Sockets and locks must cooperate with greenlets before anything uses them
+    monkey.patch_all()
+
+    server = WSGIServer(('127.0.0.1', 0), app, log=None)
+    server.start()
+
+    wrappers = [get_wrapper(server.server_port, idx) for idx in range(BACKENDS)]
+    calls = [HTTPCall(wrapper, params={'id':idx}) for wrapper in wrappers for idx in range(CALLS_PER_BACKEND)]
+
+    # Warm up the connection pools
+    scatter_gather('cid', calls)
+
+    start = time()
+    for call in calls:
+        call.conn.get('cid', dict(call.params))
+    serial_time = time() - start
+
+    start = time()
+    results = scatter_gather('cid', calls)
+    scatter_time = time() - start
+
+    assert all(result.is_ok for result in results)
+
+    start = time()
+    results = scatter_gather('cid', calls + [HTTPCall(get_wrapper(server.server_port, BACKENDS, '/hang'))], timeout=DEADLINE)
+    deadline_time = time() - start
+
+    print('{} calls to {} backends, {:.0f} ms each'.format(len(calls), BACKENDS, SLEEP * 1000))
+    print('Serial         {:>7.3f} s'.format(serial_time))
+    print('Scatter-gather {:>7.3f} s'.format(scatter_time))
+    print('With a hanging backend and a deadline of {} s: {:.3f} s, {} ok, {} timed out'.format(
+        DEADLINE, deadline_time, sum(result.is_ok for result in results), sum(result.is_timeout for result in results)))
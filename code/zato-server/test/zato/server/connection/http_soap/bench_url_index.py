@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares the cost of matching a request against HTTP/SOAP channels by scanning all of them in turn with the cost
+# of doing it through the index kept by ChannelData.
+#
+# Run it from the zato-server directory: py -m test.zato.server.connection.http_soap.bench_url_index
+
+# stdlib
+from operator import attrgetter
+from random import choice, seed
+from timeit import repeat
+
+# Bunch
+from bunch import Bunch
+
+# parse
+from parse import compile as parse_compile
+
+# SortedContainers
+from sortedcontainers import SortedListWithKey
+
+# Zato
+from zato.common import MISC
+from zato.server.connection.http_soap.url_index import ChannelData
+
+# ################################################################################################################################
+
+SIZES = (10, 1000, 10000)
+NUMBER = 1000
+REPEAT = 3
+
+# ################################################################################################################################
+
+def get_channels(size):
+    """ Returns a list of channels, every third one of which has parameters in its URL path and every fifth one
+    uses a SOAP action.
+    """
+    out = []
+    for idx in xrange(size):
+
+        if idx % 3:
+            url_path = '/api/v1/object{}/list'.format(idx)
+        else:
+            url_path = '/api/v1/object{}/{{id}}/details'.format(idx)
+
+        soap_action = 'action{}'.format(idx) if not idx % 5 else ''
+
+        item = Bunch()
+        item.name = 'channel-{:06}'.format(idx)
+        item.match_target = '{}{}{}'.format(soap_action, MISC.SEPARATOR, url_path)
+        item.match_target_compiled = parse_compile(item.match_target)
+        out.append(item)
+
+    return out
+
+def get_targets(channels, count=100):
+    """ Returns targets that will match randomly chosen channels.
+    """
+    out = []
+    for _ in xrange(count):
+        item = choice(channels)
+        out.append(item.match_target.replace('{id}', '123'))
+
+    return out
+
+# ################################################################################################################################
+
+def match_scan(channel_data, targets):
+    for target in targets:
+        for item in channel_data:
+            if item.match_target_compiled.parse(target):
+                break
+
+def match_index(channel_data, targets):
+    for target in targets:
+        channel_data.match(target)
+
+# ################################################################################################################################
+
+def run(size):
+    channels = get_channels(size)
+    targets = get_targets(channels)
+
+    scan_data = SortedListWithKey(channels, key=attrgetter('name'))
+    index_data = ChannelData(channels)
+
+    # Fewer runs with larger sizes, otherwise the scan would take ages
+    number = max(1, NUMBER // size)
+
+    scan = min(repeat(lambda: match_scan(scan_data, targets), number=number, repeat=REPEAT))
+    index = min(repeat(lambda: match_index(index_data, targets), number=number, repeat=REPEAT))
+
+    # Per-lookup cost in microseconds
+    lookups = number * len(targets)
+    scan = scan / lookups * 1000000
+    index = index / lookups * 1000000
+
+    print('{:>6} channels: scan {:>12.2f} us, index {:>8.2f} us, speed-up x{:.1f}'.format(size, scan, index, scan / index))
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+    seed(1)
+    for size in SIZES:
+        run(size)
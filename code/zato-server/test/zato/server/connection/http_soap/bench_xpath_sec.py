@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes to authenticate requests against XPath security definitions when expressions are given
+# to lxml as strings, which compiles them on each request, against when they are precompiled, for SOAP payloads
+# of several sizes.
+#
+# Run it from the zato-server directory: py -m test.zato.server.connection.http_soap.bench_xpath_sec
+
+# stdlib
+from timeit import repeat
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common import DATA_FORMAT, URL_TYPE
+from zato.common.util import payload_from_request
+from zato.server.connection.http_soap.url_data import URLData
+
+# ################################################################################################################################
+
+SIZES = (0, 10, 100, 1000) # Number of elements in SOAP Body other than the one with credentials
+NUMBER = 2000
+
+USERNAME_EXPR = "//*[local-name()='Header']/*[local-name()='credentials']/@user"
+PASSWORD_EXPR = "//*[local-name()='Header']/*[local-name()='credentials']/@password"
+
+# ################################################################################################################################
+
+def get_payload(size):
+    body = ''.join('<foo:item id="{0}"><foo:name>Item {0}</foo:name></foo:item>'.format(idx) for idx in range(size))
+    xml = """<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:foo="http://foo.example.com">
+        <soapenv:Header><foo:credentials user="user1" password="password1"/></soapenv:Header>
+        <soapenv:Body><foo:items>{}</foo:items></soapenv:Body>
+        </soapenv:Envelope>""".format(body)
+
+    return payload_from_request('cid', xml, DATA_FORMAT.XML, URL_TYPE.SOAP)
+
+def check_uncompiled(sec_def, payload):
+    """ What authentication used to do - both expressions are compiled each time they are evaluated.
+    """
+    assert payload.xpath(sec_def.username_expr)[0] == sec_def.username
+    assert payload.xpath(sec_def.password_expr)[0] == sec_def.password
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    url_data = URLData(xpath_sec_config={})
+    sec_def = Bunch(name='xpath1', username='user1', password='password1', username_expr=USERNAME_EXPR,
+        password_expr=PASSWORD_EXPR)
+    url_data.on_broker_msg_SECURITY_XPATH_SEC_CREATE(sec_def)
+
+    for size in SIZES:
+        payload = get_payload(size)
+        wsgi_environ = {'zato.request.payload': payload}
+
+        uncompiled = min(repeat(lambda: check_uncompiled(sec_def, payload), number=NUMBER, repeat=3))
+        compiled = min(repeat(lambda: url_data._handle_security_xpath_sec('cid', sec_def, None, None, wsgi_environ),
+            number=NUMBER, repeat=3))
+
+        print('{:>5} elements, uncompiled {:>8.2f} us, compiled {:>8.2f} us per request'.format(
+            size, uncompiled / NUMBER * 1e6, compiled / NUMBER * 1e6))
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from json import loads
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common.util import new_cid
+from zato.server.connection.http_soap.audit import AuditLog
+
+# ################################################################################################################################
+
+class DummyODB(object):
+    def __init__(self, should_raise=False):
+        self.should_raise = should_raise
+        self.batches = []
+
+    def audit_set_http_soap_many(self, entries):
+        if self.should_raise:
+            raise Exception('Dummy exception')
+        self.batches.append(entries)
+
+def get_channel_item():
+    return Bunch(id=1, name='my.channel', transport='plain_http', connection='channel', username='my.user')
+
+def get_wsgi_environ(status=b'200 OK'):
+    return {'REQUEST_METHOD': 'POST', 'zato.http.response.status': status}
+
+# ################################################################################################################################
+
+class AuditLogTestCase(TestCase):
+
+    def tearDown(self):
+        if getattr(self, 'audit_log', None):
+            self.audit_log.keep_running = False
+
+    def get_audit_log(self, odb, **kwargs):
+        self.audit_log = AuditLog(odb, **kwargs)
+        return self.audit_log
+
+    def test_request_response_merged(self):
+        odb = DummyODB()
+        audit_log = self.get_audit_log(odb)
+
+        cid = new_cid()
+        eq_(audit_log.set_request(cid, get_channel_item(), 'my-request', '127.0.0.1', get_wsgi_environ()), True)
+        eq_(audit_log.get_stats()['pending'], 1)
+
+        audit_log.set_response(cid, 'my-response', get_wsgi_environ(b'403 Forbidden'))
+        eq_(audit_log.get_stats()['pending'], 0)
+        eq_(audit_log.get_stats()['queued'], 1)
+
+        audit_log.flush()
+
+        eq_(len(odb.batches), 1)
+        eq_(len(odb.batches[0]), 1)
+
+        entry = odb.batches[0][0]
+        eq_(entry['cid'], cid)
+        eq_(entry['conn_id'], 1)
+        eq_(entry['name'], 'my.channel')
+        eq_(entry['user_token'], 'my.user')
+        eq_(entry['remote_addr'], '127.0.0.1')
+        eq_(entry['req_payload'], b'my-request')
+        eq_(entry['resp_payload'], b'my-response')
+        eq_(entry['invoke_ok'], False)
+        eq_(entry['auth_ok'], False)
+        eq_(loads(entry['req_headers'])['REQUEST_METHOD'], repr('POST'))
+        eq_(loads(entry['resp_headers'])['zato.http.response.status'], repr(b'403 Forbidden'))
+
+        stats = audit_log.get_stats()
+        eq_(stats['enqueued'], 1)
+        eq_(stats['flushed'], 1)
+        eq_(stats['flushes'], 1)
+        eq_(stats['queued'], 0)
+
+    def test_batches(self):
+        odb = DummyODB()
+        audit_log = self.get_audit_log(odb, batch_size=3)
+
+        for x in range(7):
+            cid = new_cid()
+            audit_log.set_request(cid, get_channel_item(), 'req', '127.0.0.1', get_wsgi_environ())
+            audit_log.set_response(cid, 'resp', get_wsgi_environ())
+
+        # The flushing greenlet is asked to run once a whole batch is queued up
+        self.assertTrue(audit_log._flush_needed.is_set())
+
+        audit_log.flush()
+        eq_([len(batch) for batch in odb.batches], [3, 3, 1])
+        eq_(audit_log.get_stats()['flushed'], 7)
+        eq_(audit_log.get_stats()['flushes'], 3)
+
+    def test_backpressure(self):
+        odb = DummyODB()
+        audit_log = self.get_audit_log(odb, queue_max_size=2)
+
+        for x in range(5):
+            audit_log.set_request(new_cid(), get_channel_item(), 'req', '127.0.0.1', get_wsgi_environ())
+
+        stats = audit_log.get_stats()
+        eq_(stats['enqueued'], 2)
+        eq_(stats['dropped'], 3)
+        eq_(stats['pending'], 2)
+
+        # Responses to dropped requests are not stored
+        audit_log.set_response(new_cid(), 'resp', get_wsgi_environ())
+        eq_(audit_log.get_stats()['orphaned'], 1)
+
+    def test_stale_pending(self):
+        odb = DummyODB()
+        audit_log = self.get_audit_log(odb, pending_max_age=-1)
+
+        cid = new_cid()
+        audit_log.set_request(cid, get_channel_item(), 'req', '127.0.0.1', get_wsgi_environ())
+        audit_log.flush()
+
+        eq_(len(odb.batches), 1)
+
+        entry = odb.batches[0][0]
+        eq_(entry['cid'], cid)
+        self.assertNotIn('resp_headers', entry)
+        self.assertNotIn('resp_payload', entry)
+
+        eq_(audit_log.get_stats()['pending'], 0)
+
+    def test_odb_error(self):
+        odb = DummyODB(True)
+        audit_log = self.get_audit_log(odb)
+
+        cid = new_cid()
+        audit_log.set_request(cid, get_channel_item(), 'req', '127.0.0.1', get_wsgi_environ())
+        audit_log.set_response(cid, 'resp', get_wsgi_environ())
+        audit_log.flush()
+
+        stats = audit_log.get_stats()
+        eq_(stats['failed'], 1)
+        eq_(stats['flushed'], 0)
+        eq_(stats['queued'], 0)
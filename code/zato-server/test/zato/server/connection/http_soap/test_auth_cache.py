@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from base64 import b64encode
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# mock
+from mock import patch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import SEC_DEF_TYPE
+from zato.common.test import rand_string
+from zato.server.connection.http_soap import Unauthorized, url_data
+from zato.server.connection.http_soap.auth_cache import AuthCache
+
+# ################################################################################################################################
+
+class AuthCacheTestCase(TestCase):
+
+    def test_get_key(self):
+        cache = AuthCache()
+
+        eq_(cache.get_key('a', 'b'), cache.get_key('a', 'b'))
+        self.assertNotEqual(cache.get_key('a', 'b'), cache.get_key('a', 'c'))
+
+        # Values are never confused with their neighbours or with values that were not provided at all
+        self.assertNotEqual(cache.get_key('ab', 'c'), cache.get_key('a', 'bc'))
+        self.assertNotEqual(cache.get_key('a', ''), cache.get_key('a', None))
+
+        # Non-ASCII values
+        eq_(cache.get_key('ą', b'\xc4\x99'), cache.get_key('ą', b'\xc4\x99'))
+        self.assertNotEqual(cache.get_key('ą', 'ę'), cache.get_key('ą', 'ė'))
+
+    def test_has_add(self):
+        cache = AuthCache()
+
+        self.assertFalse(cache.has('key1'))
+
+        cache.add('key1', 0.5)
+        self.assertTrue(cache.has('key1'))
+        self.assertTrue(cache.has('key1'))
+
+        stats = cache.get_stats()
+        eq_(stats['hits'], 2)
+        eq_(stats['misses'], 1)
+        eq_(stats['size'], 1)
+        eq_(stats['hit_ratio'], 2 / 3.0)
+        eq_(stats['time_saved'], 1.0)
+
+        cache.clear()
+        self.assertFalse(cache.has('key1'))
+        eq_(cache.get_stats()['flushes'], 1)
+
+    def test_ttl(self):
+        cache = AuthCache(ttl=10)
+
+        with patch('zato.server.connection.http_soap.auth_cache.time', lambda: 1000):
+            cache.add('key1', 0.1)
+
+        with patch('zato.server.connection.http_soap.auth_cache.time', lambda: 1010):
+            self.assertTrue(cache.has('key1'))
+
+        with patch('zato.server.connection.http_soap.auth_cache.time', lambda: 1011):
+            self.assertFalse(cache.has('key1'))
+
+        eq_(cache.get_stats()['expired'], 1)
+        eq_(cache.get_stats()['size'], 0)
+
+    def test_max_size(self):
+        cache = AuthCache(max_size=2)
+
+        for key in 'key1', 'key2', 'key3':
+            cache.add(key, 0.1)
+
+        self.assertFalse(cache.has('key1'))
+        self.assertTrue(cache.has('key2'))
+        self.assertTrue(cache.has('key3'))
+        eq_(cache.get_stats()['evicted'], 1)
+
+        # Nothing is cached at all
+        cache = AuthCache(max_size=0)
+        cache.add('key1', 0.1)
+        self.assertFalse(cache.has('key1'))
+
+# ################################################################################################################################
+
+class URLDataAuthCacheTestCase(TestCase):
+
+    def get_basic_auth(self):
+        username, password = rand_string(), rand_string()
+        sec_def = Bunch(name=rand_string(), sec_type=SEC_DEF_TYPE.BASIC_AUTH, username=username, password=password,
+            realm=rand_string())
+        header = 'Basic {}'.format(b64encode('{}:{}'.format(username, password)))
+
+        return sec_def, header
+
+    def test_basic_auth(self):
+        ud = url_data.URLData()
+        sec_def, header = self.get_basic_auth()
+
+        with patch('zato.server.connection.http_soap.url_data.on_basic_auth', wraps=url_data.on_basic_auth) as on_basic_auth:
+
+            for x in range(3):
+                ud._handle_security_basic_auth('cid', sec_def, '/', '', {'HTTP_AUTHORIZATION':header})
+
+            # Checked in full once only
+            eq_(on_basic_auth.call_count, 1)
+
+            # Invalid credentials are never cached
+            invalid_header = 'Basic {}'.format(b64encode('{}:{}'.format(sec_def.username, rand_string())))
+            for x in range(2):
+                self.assertRaises(Unauthorized, ud._handle_security_basic_auth, 'cid', sec_def, '/', '',
+                    {'HTTP_AUTHORIZATION':invalid_header})
+
+            eq_(on_basic_auth.call_count, 3)
+
+            # The password changes - the old one must not be accepted anymore
+            ud.basic_auth_config = {sec_def.name: {'config':{'password':sec_def.password}}}
+            ud.url_sec = {}
+            ud.on_broker_msg_SECURITY_BASIC_AUTH_CHANGE_PASSWORD(Bunch(name=sec_def.name, password=rand_string()))
+            eq_(ud.auth_cache.get_stats()['size'], 0)
+
+            sec_def.password = ud.basic_auth_config[sec_def.name]['config']['password']
+            self.assertRaises(Unauthorized, ud._handle_security_basic_auth, 'cid', sec_def, '/', '',
+                {'HTTP_AUTHORIZATION':header})
+
+    def test_tech_acc(self):
+        ud = url_data.URLData()
+
+        password, salt = rand_string(), rand_string()
+        sec_def = Bunch(name=rand_string(), sec_type=SEC_DEF_TYPE.TECH_ACCOUNT, salt=salt,
+            password=url_data.sha256(password + ':' + salt).hexdigest())
+        wsgi_environ = {'HTTP_X_ZATO_USER':sec_def.name, 'HTTP_X_ZATO_PASSWORD':password}
+
+        eq_(ud._handle_security_tech_acc('cid', sec_def, '/', '', wsgi_environ), sec_def.name)
+        eq_(ud._handle_security_tech_acc('cid', sec_def, '/', '', wsgi_environ), sec_def.name)
+
+        # Technical accounts are never cached
+        stats = ud.auth_cache.get_stats()
+        eq_(stats['size'], 0)
+        eq_(stats['hits'], 0)
+        eq_(stats['misses'], 0)
+
+        wsgi_environ['HTTP_X_ZATO_PASSWORD'] = rand_string()
+        self.assertRaises(Unauthorized, ud._handle_security_tech_acc, 'cid', sec_def, '/', '', wsgi_environ)
+
+    def test_tech_acc_changes_keep_cache(self):
+        ud = url_data.URLData()
+        ud.url_sec = {}
+        ud.tech_acc_config = {}
+        ud.channel_data = []
+
+        sec_def, header = self.get_basic_auth()
+        ud._handle_security_basic_auth('cid', sec_def, '/', '', {'HTTP_AUTHORIZATION':header})
+
+        # Technical accounts are not cached so changes to them do not clear the cache
+        name = rand_string()
+        ud.on_broker_msg_SECURITY_TECH_ACC_CREATE(Bunch(name=name, password=rand_string(), salt=rand_string()))
+        ud.on_broker_msg_SECURITY_TECH_ACC_CHANGE_PASSWORD(Bunch(name=name, password=rand_string(), salt=rand_string()))
+        ud.on_broker_msg_SECURITY_TECH_ACC_EDIT(Bunch(name=name, old_name=name, password=rand_string(), salt=rand_string()))
+        ud.on_broker_msg_SECURITY_TECH_ACC_DELETE(Bunch(name=name))
+
+        stats = ud.auth_cache.get_stats()
+        eq_(stats['size'], 1)
+        eq_(stats['flushes'], 0)
+
+    def test_apikey_no_header(self):
+        ud = url_data.URLData()
+
+        # No password is required so any key is accepted but the header still needs to be sent
+        sec_def = Bunch(name=rand_string(), sec_type=SEC_DEF_TYPE.APIKEY, username='HTTP_X_KEY', password='')
+
+        ud._handle_security_apikey('cid', sec_def, '/', '', {'HTTP_X_KEY':''})
+        self.assertRaises(Unauthorized, ud._handle_security_apikey, 'cid', sec_def, '/', '', {})
+
+# ################################################################################################################################
@@ -412,7 +412,12 @@ class TestRequestHandler(TestCase):
                     @staticmethod
                     def new_instance(service_impl_name):
                         _server.service_impl_name = service_impl_name
-                        return _Service()
+                        _server.service = _Service()
+                        return _server.service
+
+                    @staticmethod
+                    def release_instance(service):
+                        _server.released = service
 
             rh.server = _server
             rh.create_channel_params = _create_channel_params
@@ -420,6 +425,9 @@ class TestRequestHandler(TestCase):
                 expected_wsgi_environ, expected_raw_request, expected_worker_store,
                 expected_simple_io_config, None)
 
+            # The instance is given back to the service store once it is no longer needed
+            self.assertIs(_server.released, _server.service)
+
     def test_create_channel_params(self):
 
         url_match = Bunch()
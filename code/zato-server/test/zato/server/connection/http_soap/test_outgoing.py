@@ -16,6 +16,9 @@ from tempfile import NamedTemporaryFile
 from time import sleep
 from unittest import TestCase
 
+# gevent
+import gevent
+
 # bunch
 from bunch import Bunch
 
@@ -31,7 +34,7 @@ from zato.common.util import get_component_name
 from zato.common.test import rand_float, rand_int, rand_string
 from zato.common.test.tls import TLSServer
 from zato.common.test.tls_material import ca_cert, ca_cert_invalid, client1_cert, client1_key
-from zato.server.connection.http_soap.outgoing import HTTPSOAPWrapper
+from zato.server.connection.http_soap.outgoing import HTTPCall, HTTPSOAPWrapper, scatter_gather
 
 logger = getLogger(__name__)
 
@@ -642,3 +645,128 @@ class TLSHTTPTestCase(TestCase, Base):
                 wrapper.get('123')
 
 # ################################################################################################################################
+
+class _SlowSession(_FakeSession):
+    """ Sleeps for as long as each request's 'sleep' parameter says, or raises an exception if it's negative.
+    """
+    def __init__(self, *args, **kwargs):
+        super(_SlowSession, self).__init__(*args, **kwargs)
+        self.in_progress = 0
+        self.max_in_progress = 0
+        self.timeouts = []
+
+    def request(self, *args, **kwargs):
+        self.timeouts.append(kwargs['timeout'])
+        self.in_progress += 1
+        self.max_in_progress = max(self.max_in_progress, self.in_progress)
+
+        try:
+            sleep_time = kwargs['params']['sleep']
+            if sleep_time < 0:
+                raise ValueError('Invalid request')
+
+            gevent.sleep(sleep_time)
+            return Bunch({'status_code':200, 'text':str(sleep_time)})
+
+        finally:
+            self.in_progress -= 1
+
+class _SlowRequestsModule(_FakeRequestsModule):
+    def session(self, *args, **kwargs):
+        self.session_obj = _SlowSession(*args, **kwargs)
+        return self.session_obj
+
+# ################################################################################################################################
+
+class ScatterGatherTestCase(TestCase, Base):
+
+    def _get_wrapper(self, pool_size=10, timeout=5.0):
+        config = self._get_config()
+        config['name'] = rand_string()
+        config['pool_size'] = pool_size
+        config['timeout'] = timeout
+        config['transport'] = URL_TYPE.PLAIN_HTTP
+
+        return HTTPSOAPWrapper(config, _SlowRequestsModule())
+
+    def test_results_in_order(self):
+        wrapper = self._get_wrapper()
+        sleep_times = [0.05, 0.01, 0.03, 0, 0.02]
+
+        results = wrapper.scatter_gather('cid', [{'params':{'sleep':sleep_time}} for sleep_time in sleep_times])
+
+        eq_([result.response.text for result in results], [str(sleep_time) for sleep_time in sleep_times])
+        self.assertTrue(all(result.is_ok for result in results))
+
+        # The calls were sent concurrently
+        eq_(wrapper.session.max_in_progress, len(sleep_times))
+
+    def test_partial_results(self):
+        wrapper = self._get_wrapper()
+        start = datetime.utcnow()
+
+        results = wrapper.scatter_gather('cid', [
+            {'params':{'sleep':0}},
+            {'params':{'sleep':-1}},
+            {'method':'POST', 'data':'abc', 'params':{'sleep':5}},
+        ], timeout=0.1)
+
+        # The slow call was cancelled at the deadline
+        self.assertLess((datetime.utcnow() - start).total_seconds(), 1)
+
+        self.assertTrue(results[0].is_ok)
+
+        self.assertFalse(results[1].is_ok)
+        self.assertFalse(results[1].is_timeout)
+        self.assertIsInstance(results[1].exception, ValueError)
+
+        self.assertFalse(results[2].is_ok)
+        self.assertTrue(results[2].is_timeout)
+        self.assertIsNone(results[2].exception)
+
+    def test_timeouts(self):
+        wrapper = self._get_wrapper(timeout=3.0)
+
+        wrapper.scatter_gather('cid', [{'params':{'sleep':0}}])
+        eq_(wrapper.session.timeouts[-1], 3.0)
+
+        wrapper.scatter_gather('cid', [{'params':{'sleep':0}}], call_timeout=2.0)
+        eq_(wrapper.session.timeouts[-1], 2.0)
+
+        # Calls are never given more time than there is left until the deadline
+        wrapper.scatter_gather('cid', [{'params':{'sleep':0}}], timeout=1.0, call_timeout=2.0)
+        self.assertLessEqual(wrapper.session.timeouts[-1], 1.0)
+
+    def test_timeouts_no_conn_timeout(self):
+        wrapper = self._get_wrapper()
+        wrapper.config['timeout'] = None
+
+        # Without a timeout of its own, a call is given whatever is left until the deadline
+        results = wrapper.scatter_gather('cid', [{'params':{'sleep':0}}], timeout=1.0)
+
+        self.assertTrue(results[0].is_ok)
+        self.assertFalse(results[0].is_timeout)
+        self.assertGreater(wrapper.session.timeouts[-1], 0)
+        self.assertLessEqual(wrapper.session.timeouts[-1], 1.0)
+
+    def test_limits(self):
+        wrapper1 = self._get_wrapper(pool_size=2)
+        wrapper2 = self._get_wrapper(pool_size=10)
+
+        # Each connection's pool_size is honoured ..
+        calls = [HTTPCall(wrapper1, params={'sleep':0.01}) for x in range(10)]
+        calls += [HTTPCall(wrapper2, params={'sleep':0.01}) for x in range(10)]
+
+        results = scatter_gather('cid', calls, max_concurrent=7)
+
+        eq_(len(results), 20)
+        self.assertTrue(all(result.is_ok for result in results))
+        eq_(wrapper1.session.max_in_progress, 2)
+
+        # .. and so is the limit of calls across all connections.
+        self.assertLessEqual(wrapper1.session.max_in_progress + wrapper2.session.max_in_progress, 7)
+        eq_(wrapper2.session.max_in_progress, 7 - 2)
+
+        eq_(scatter_gather('cid', []), [])
+
+# ################################################################################################################################
@@ -427,6 +427,36 @@ class URLDataTestCase(TestCase):
                     self.fail('Expected Unauthorized, `{}`, `{}`, `{}`, `{}`, `{}`'.format(
                         is_valid, valid_username, xml_username, password, xml))
 
+# ################################################################################################################################
+
+    def test_xpath_sec_compiled(self):
+
+        username_expr = "//*[local-name()='{}']/@user".format(rand_string())
+        password_expr = "//*[local-name()='{}']/@password".format(rand_string())
+
+        key = (username_expr, ())
+
+        ud = url_data.URLData(xpath_sec_config={})
+        url_data.xpath_cache.data.pop(key, None)
+
+        ud.on_broker_msg_SECURITY_XPATH_SEC_CREATE(Bunch(
+            name=rand_string(), username=rand_string(), username_expr=username_expr, password_expr=password_expr))
+
+        # Both expressions are compiled as soon as the definition is created
+        compiled = url_data.xpath_cache.data[key]
+        self.assertIs(url_data.xpath_cache.get(password_expr), url_data.xpath_cache.data[(password_expr, ())])
+
+        # An invalid expression does not prevent a definition from being created
+        ud.on_broker_msg_SECURITY_XPATH_SEC_CREATE(Bunch(
+            name=rand_string(), username=rand_string(), username_expr='//[', password_expr=None))
+
+        # The same compiled expression is used when requests are authenticated
+        sec_def = Bunch(username=rand_string(), username_expr=username_expr, password_expr=None)
+        url_data.xpath_cache.data[key] = lambda payload: [sec_def.username]
+
+        self.assertEqual(ud._handle_security_xpath_sec(rand_string(), sec_def, None, None, {'zato.request.payload':None}), True)
+        url_data.xpath_cache.data[key] = compiled
+
 # ################################################################################################################################
 
     def test_apikey_get(self):
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# parse
+from parse import compile as parse_compile
+
+# Zato
+from zato.common import MISC
+from zato.server.connection.http_soap.url_index import ChannelData
+
+# ################################################################################################################################
+
+def get_item(name, url_path, soap_action=''):
+    item = Bunch()
+    item.name = name
+    item.match_target = '{}{}{}'.format(soap_action, MISC.SEPARATOR, url_path)
+    item.match_target_compiled = parse_compile(item.match_target)
+    return item
+
+def get_target(url_path, soap_action=''):
+    return '{}{}{}'.format(soap_action, MISC.SEPARATOR, url_path)
+
+# ################################################################################################################################
+
+class ChannelDataTestCase(TestCase):
+
+    def test_match_static(self):
+        item1 = get_item('name-1', '/customer/get')
+        item2 = get_item('name-2', '/customer/set')
+        data = ChannelData([item1, item2])
+
+        match, item = data.match(get_target('/customer/set'))
+        eq_(item.name, 'name-2')
+        eq_(match.named, {})
+
+        match, item = data.match(get_target('/customer/get'))
+        eq_(item.name, 'name-1')
+
+        match, item = data.match(get_target('/customer/delete'))
+        self.assertIsNone(match)
+        self.assertIsNone(item)
+
+    def test_match_static_case_insensitive(self):
+        data = ChannelData([get_item('name-1', '/Customer/Get')])
+
+        match, item = data.match(get_target('/customer/GET'))
+        eq_(item.name, 'name-1')
+
+    def test_match_dynamic(self):
+        item1 = get_item('name-1', '/customer/{cid}/order/{oid}')
+        item2 = get_item('name-2', '/customer/{cid}')
+        item3 = get_item('name-3', '{prefix}/customer')
+        data = ChannelData([item1, item2, item3])
+
+        match, item = data.match(get_target('/customer/123/order/456'))
+        eq_(item.name, 'name-1')
+        eq_(sorted(match.named.items()), [('cid', '123'), ('oid', '456')])
+
+        match, item = data.match(get_target('/customer/123'))
+        eq_(item.name, 'name-2')
+        eq_(match.named, {'cid': '123'})
+
+        match, item = data.match(get_target('/abc/customer'))
+        eq_(item.name, 'name-3')
+        eq_(match.named, {'prefix': '/abc'})
+
+        match, item = data.match(get_target('/order/123'))
+        self.assertIsNone(match)
+
+    def test_match_soap_action(self):
+        item1 = get_item('name-1', '/customer/{cid}', 'get')
+        item2 = get_item('name-2', '/customer/{cid}', 'set')
+        data = ChannelData([item1, item2])
+
+        match, item = data.match(get_target('/customer/123', 'set'))
+        eq_(item.name, 'name-2')
+
+        match, item = data.match(get_target('/customer/123', 'get'))
+        eq_(item.name, 'name-1')
+
+        match, item = data.match(get_target('/customer/123', 'delete'))
+        self.assertIsNone(match)
+
+    def test_match_precedence(self):
+        """ Both a static and a parameterized channel match the target, the one with the name sorting first must win,
+        exactly as it would if the whole list was scanned.
+        """
+        static = get_item('name-2', '/customer/list')
+        dynamic = get_item('name-1', '/customer/{cid}')
+        data = ChannelData([static, dynamic])
+
+        _, item = data.match(get_target('/customer/list'))
+        eq_(item.name, 'name-1')
+
+        data.remove(dynamic)
+
+        _, item = data.match(get_target('/customer/list'))
+        eq_(item.name, 'name-2')
+
+        dynamic = get_item('name-3', '/customer/{cid}')
+        data.add(dynamic)
+
+        _, item = data.match(get_target('/customer/list'))
+        eq_(item.name, 'name-2')
+
+        _, item = data.match(get_target('/customer/123'))
+        eq_(item.name, 'name-3')
+
+    def test_incremental_updates(self):
+        item1 = get_item('name-1', '/customer/{cid}')
+        item2 = get_item('name-2', '/order/{oid}')
+
+        data = ChannelData([])
+        data.append(item1)
+        data.add(item2)
+
+        _, item = data.match(get_target('/customer/123'))
+        eq_(item.name, 'name-1')
+
+        _, item = data.match(get_target('/order/123'))
+        eq_(item.name, 'name-2')
+
+        eq_(data.pop(data.index(item1)), item1)
+
+        match, _ = data.match(get_target('/customer/123'))
+        self.assertIsNone(match)
+
+        _, item = data.match(get_target('/order/123'))
+        eq_(item.name, 'name-2')
+
+        del data[0]
+
+        match, _ = data.match(get_target('/order/123'))
+        self.assertIsNone(match)
+
+        eq_(data._static, {})
+        eq_(data._dynamic, {})
+        eq_(data._entries, {})
+
+    def test_get_candidates(self):
+        item1 = get_item('name-1', '/customer/{cid}')
+        item2 = get_item('name-2', '/order/{oid}')
+        item3 = get_item('name-3', '/customer/list')
+        data = ChannelData([item1, item2, item3])
+
+        eq_([item.name for _, _, item in data.get_candidates(get_target('/customer/list'))], ['name-1', 'name-3'])
+        eq_([item.name for _, _, item in data.get_candidates(get_target('/order/123'))], ['name-2'])
+        eq_(list(data.get_candidates(get_target('/invoice/123'))), [])
@@ -9,17 +9,23 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
+from cStringIO import StringIO
+from ftplib import error_temp
 from unittest import TestCase
 
 # Bunch
 from bunch import Bunch
 
 # mock
-from mock import patch
+from mock import Mock, patch
+
+# nose
+from nose.tools import eq_
 
 # Zato
+from zato.common import TimeoutException
 from zato.common.test import rand_string
-from zato.server.connection.ftp import FTPStore
+from zato.server.connection.ftp import FTPFacade, FTPStore
 
 class TestFTP(TestCase):
     def test_timeout_is_float(self):
@@ -41,4 +47,147 @@ class TestFTP(TestCase):
     
             store.add_params([params])
             conn = store.get(conn_name)
-            self.assertIsInstance(conn.timeout, float)
\ No newline at end of file
+            self.assertIsInstance(conn.timeout, float)
+
+# ################################################################################################################################
+
+class DummyFTPFacade(FTPFacade):
+    """ Logs in to nothing, each of its FTP connections is a mock.
+    """
+    def _open_ftp(self):
+        return Mock()
+
+def get_params(name='test', **kwargs):
+    params = Bunch({'name':name, 'is_active':True, 'host':'localhost', 'port':21, 'user':'user1', 'password':'password1',
+        'acct':'', 'dircache':True, 'timeout':None})
+    params.update(kwargs)
+    return params
+
+class TestFTPPool(TestCase):
+
+    def setUp(self):
+        self.patcher = patch('zato.server.connection.ftp.FTPFacade', DummyFTPFacade)
+        self.patcher.start()
+
+        self.store = FTPStore()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_reuse(self):
+        self.store.add_params([get_params()])
+
+        with self.store.get('test') as conn1:
+            ftp = conn1.ftp
+
+        with self.store.get('test') as conn2:
+            self.assertIs(conn2, conn1)
+            self.assertIs(conn2.ftp, ftp)
+
+        self.assertFalse(conn1.closed)
+        eq_(ftp.close.call_count, 0)
+
+        # Closing a connection that is already back in the pool changes nothing
+        conn1.close()
+        self.assertIs(self.store.get('test'), conn1)
+
+    def test_concurrent_get(self):
+        self.store.add_params([get_params(pool_size=2, pool_checkout_timeout=0.01)])
+
+        conn1 = self.store.get('test')
+        conn2 = self.store.get('test')
+        self.assertIsNot(conn1, conn2)
+
+        self.assertRaises(TimeoutException, self.store.get, 'test')
+
+        conn2.close()
+        self.assertIs(self.store.get('test'), conn2)
+
+    def test_idle_and_lifetime(self):
+        self.store.add_params([get_params(pool_max_idle=10, pool_max_lifetime=100)])
+
+        with self.store.get('test') as conn1:
+            pass
+        conn1.zato_last_used -= 11
+
+        with self.store.get('test') as conn2:
+            self.assertIsNot(conn2, conn1)
+            self.assertTrue(conn1.closed)
+
+        conn2.zato_created -= 101
+
+        with self.store.get('test') as conn3:
+            self.assertIsNot(conn3, conn2)
+            self.assertTrue(conn2.closed)
+
+            # Connections are not put back once they are too old
+            conn3.zato_created -= 101
+
+        self.assertTrue(conn3.closed)
+
+    def test_ping(self):
+        self.store.add_params([get_params(pool_ping_interval=1)])
+
+        with self.store.get('test') as conn1:
+            pass
+
+        # Used recently enough not to be pinged
+        with self.store.get('test') as conn2:
+            self.assertIs(conn2, conn1)
+            eq_(conn1.ftp.voidcmd.call_count, 0)
+
+        conn1.zato_last_used -= 2
+
+        with self.store.get('test') as conn2:
+            self.assertIs(conn2, conn1)
+            conn1.ftp.voidcmd.assert_called_once_with(b'NOOP')
+
+        conn1.zato_last_used -= 2
+        conn1.ftp.voidcmd.side_effect = error_temp('421 Timeout')
+
+        with self.store.get('test') as conn2:
+            self.assertIsNot(conn2, conn1)
+            self.assertTrue(conn1.closed)
+
+    def test_create_edit_change_password_delete(self):
+        self.store.add_params([get_params()])
+
+        conn1 = self.store.get('test')
+        with self.store.get('test') as conn2:
+            pass
+
+        self.store.create_edit(get_params('test2'), 'test')
+        self.assertTrue(conn2.closed)
+
+        # In use at the time of the edit so it is closed once put back
+        self.assertFalse(conn1.closed)
+        conn1.close()
+        self.assertTrue(conn1.closed)
+
+        conn3 = self.store.get('test2')
+        conn3.close()
+
+        self.store.change_password('test2', 'password2')
+        self.assertTrue(conn3.closed)
+
+        conn4 = self.store.get('test2')
+        eq_(conn4.passwd, 'password2')
+        conn4.close()
+
+        self.store.delete('test2')
+        self.assertTrue(conn4.closed)
+
+    def test_upload_download(self):
+        self.store.add_params([get_params()])
+
+        with self.store.get('test') as conn:
+            source = StringIO(b'abc' * 100)
+            conn.upload('/dir/file.txt', source, 100)
+            conn.ftp.storbinary.assert_called_once_with('STOR /dir/file.txt', source, blocksize=100)
+
+            target = StringIO()
+            conn.ftp.retrbinary.side_effect = lambda cmd, callback, blocksize: [callback(b'abc') for x in range(3)]
+            conn.download('/dir/file.txt', target)
+
+            eq_(conn.ftp.retrbinary.call_args[0][0], b'RETR /dir/file.txt')
+            eq_(target.getvalue(), b'abcabcabc')
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes a fan-out to 2, 10 and 100 targets to complete, i.e. for its final callback to be invoked,
+# when targets are invoked through Redis and the broker against when they are invoked in-process. Redis and the broker
+# are not needed - each Redis command costs REDIS_RTT and each message sent through the broker costs BROKER_HOP,
+# which is about what they cost with both of them running on localhost. Targets themselves take no time. Note that
+# these costs are simulated with gevent.sleep so the Redis-based times are approximate, unlike the numbers of commands.
+#
+# Run it from the zato-server directory: py -m test.zato.server.pattern.bench_parallel
+
+# stdlib
+from contextlib import contextmanager
+from datetime import datetime
+from time import time
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+import gevent
+from gevent.event import Event
+from gevent.lock import RLock
+
+# Zato
+from zato.server.pattern.fanout import FanOut
+
+# ################################################################################################################################
+
+TARGETS = (2, 10, 100)
+REDIS_RTT = 0.0002
+BROKER_HOP = 0.001
+REPEATS = 5
+
+_utcnow = Bunch(utcnow=lambda: datetime.utcnow().isoformat())
+
+# ################################################################################################################################
+
+class Redis(object):
+    """ Keeps everything in memory but each command takes as long as a round-trip to Redis would.
+    """
+    def __init__(self):
+        self.data = {}
+        self.commands = 0
+
+    def _command(self):
+        self.commands += 1
+        gevent.sleep(REDIS_RTT)
+
+    def set(self, key, value):
+        self._command()
+        self.data[key] = value
+
+    def hmset(self, key, mapping):
+        self._command()
+        self.data.setdefault(key, {}).update(mapping)
+
+    def hmget(self, key, *fields):
+        self._command()
+        return [self.data[key].get(field) for field in fields]
+
+    def hset(self, key, field, value):
+        self._command()
+        self.data[key][field] = value
+
+    def hgetall(self, key):
+        self._command()
+        return dict(self.data[key])
+
+    def decr(self, key):
+        self._command()
+        self.data[key] = int(self.data[key]) - 1
+        return self.data[key]
+
+    def delete(self, key):
+        self._command()
+        self.data.pop(key, None)
+
+# ################################################################################################################################
+
+class RedisService(object):
+    """ Invokes targets and callbacks through the broker, keeping their state in Redis.
+    """
+    def __init__(self, name, redis, locks, done, wsgi_environ=None):
+        self.name = name
+        self.cid = 'cid'
+        self.time = _utcnow
+        self.kvdb = Bunch(conn=redis)
+        self.locks = locks
+        self.done = done
+        self.wsgi_environ = wsgi_environ or {}
+
+    def get_name(self):
+        return self.name
+
+    @contextmanager
+    def lock(self, name):
+        self.kvdb.conn._command() # Acquire
+        with self.locks.setdefault(name, RLock()):
+            yield
+        self.kvdb.conn._command() # Release
+
+    def invoke_async(self, name, payload, channel, zato_ctx, **ignored):
+        gevent.spawn(self._on_broker_msg, name, zato_ctx)
+
+    def _on_broker_msg(self, name, zato_ctx):
+        gevent.sleep(BROKER_HOP)
+
+        if name == 'on-final':
+            self.done.set()
+        elif name.startswith('target'):
+            target = RedisService(name, self.kvdb.conn, self.locks, self.done,
+                {'zato.request_ctx.fanout_cid': zato_ctx['fanout_cid']})
+            FanOut(target).on_call_finished(target, {'ok': True}, None)
+
+class LocalService(object):
+    """ Invokes targets and callbacks in-process.
+    """
+    def __init__(self, done):
+        self.name = 'source'
+        self.cid = 'cid'
+        self.time = _utcnow
+        self.done = done
+
+    def invoke(self, name, payload, channel, wsgi_environ):
+        if name == 'on-final':
+            self.done.set()
+        return {'ok': True}
+
+# ################################################################################################################################
+
+def run(targets, local):
+    done = Event()
+
+    if local:
+        source = LocalService(done)
+    else:
+        source = RedisService('source', Redis(), {}, done)
+
+    start = time()
+    FanOut(source).invoke(targets, 'on-final', local=local)
+    done.wait()
+
+    return time() - start, 0 if local else source.kvdb.conn.commands
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    for count in TARGETS:
+        targets = {'target-{}'.format(idx): {'idx': idx} for idx in range(count)}
+
+        redis_time, commands = min(run(targets, False) for x in range(REPEATS))
+        local_time, _ = min(run(targets, True) for x in range(REPEATS))
+
+        print('{:>3} targets, Redis {:>7.2f} ms ({} commands), in-process {:>7.2f} ms'.format(
+            count, redis_time * 1000, commands, local_time * 1000))
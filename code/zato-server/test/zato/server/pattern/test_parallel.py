@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from datetime import datetime
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+import gevent
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import CHANNEL
+from zato.server.pattern.fanout import FanOut
+from zato.server.pattern.parallel import ParallelExec
+
+# ################################################################################################################################
+
+class DummySourceService(object):
+    """ Invokes targets in-process, has no Redis connections and no broker client to make sure that neither is used.
+    """
+    def __init__(self):
+        self.cid = 'cid-1'
+        self.name = 'source.service'
+        self.time = Bunch(utcnow=lambda: datetime.utcnow().isoformat())
+        self.invoked = []
+        self.in_progress = 0
+        self.max_in_progress = 0
+
+    def invoke(self, name, payload, channel, wsgi_environ):
+        self.invoked.append((name, payload, channel, wsgi_environ))
+
+        if name.startswith('target'):
+            self.in_progress += 1
+            self.max_in_progress = max(self.max_in_progress, self.in_progress)
+            gevent.sleep(0.01)
+            self.in_progress -= 1
+
+            if payload.get('raise'):
+                raise ValueError('Invalid input')
+
+            return {'name': name, 'value': payload['value'] * 2}
+
+        if name == 'callback.invalid':
+            raise ValueError('Invalid callback')
+
+    def get_invoked(self, channel):
+        return [(name, payload, wsgi_environ) for name, payload, _channel, wsgi_environ in self.invoked
+            if _channel == channel]
+
+# ################################################################################################################################
+
+class FanOutLocalTestCase(TestCase):
+
+    def test_invoke_local(self):
+        source = DummySourceService()
+        targets = {'target.1': {'value': 1}, 'target.2': {'value': 2}, 'target.3': {'raise': True}}
+
+        cid = FanOut(source).invoke(targets, ['callback.final', 'callback.invalid'], 'callback.target', local=True)
+        eq_(cid, source.cid)
+
+        # All targets were invoked concurrently
+        eq_(source.max_in_progress, 3)
+
+        for name, payload, channel, wsgi_environ in source.invoked[:3]:
+            eq_(channel, CHANNEL.FANOUT_CALL)
+            eq_(wsgi_environ, {'zato.request_ctx.fanout_cid': cid, 'zato.request_ctx.is_local': True})
+
+        on_target = source.get_invoked(CHANNEL.FANOUT_ON_TARGET)
+        eq_(sorted(payload['target'] for name, payload, wsgi_environ in on_target), ['target.1', 'target.2', 'target.3'])
+
+        # Callbacks receive dicts, as they do when the payload comes through Redis
+        for name, payload, wsgi_environ in on_target:
+            eq_(type(payload), dict)
+
+        # Callbacks are invoked once all the targets have completed, even if one of callbacks fails
+        on_final = source.get_invoked(CHANNEL.FANOUT_ON_FINAL)
+        eq_([name for name, payload, wsgi_environ in on_final], ['callback.final', 'callback.invalid'])
+
+        name, payload, wsgi_environ = on_final[0]
+        eq_(type(payload), dict)
+        eq_(wsgi_environ, {'zato.request_ctx.fanout_cid': cid})
+        eq_(payload['source'], source.name)
+        eq_(payload['on_final'], ['callback.final', 'callback.invalid'])
+        eq_(payload['on_target'], ['callback.target'])
+
+        data = payload['data']
+        eq_(sorted(data), ['target.1', 'target.2', 'target.3'])
+
+        eq_(data['target.1']['response'], {'name': 'target.1', 'value': 2})
+        eq_(data['target.2']['response'], {'name': 'target.2', 'value': 4})
+        self.assertTrue(data['target.1']['ok'])
+        self.assertIsNone(data['target.1']['exception'])
+
+        self.assertFalse(data['target.3']['ok'])
+        self.assertIn('Invalid input', data['target.3']['exception'])
+
+        for target_data in data.values():
+            eq_(target_data['cid'], cid)
+            eq_(target_data['source'], source.name)
+
+# ################################################################################################################################
+
+class ParallelExecLocalTestCase(TestCase):
+
+    def test_invoke_local(self):
+        source = DummySourceService()
+        targets = {'target.1': {'value': 1}, 'target.2': {'value': 2}}
+
+        ParallelExec(source).invoke(targets, 'callback.target', 'cid-2', local=True)
+
+        eq_(len([item for item in source.invoked if item[2] == CHANNEL.PARALLEL_EXEC_CALL]), 2)
+
+        on_target = source.get_invoked(CHANNEL.PARALLEL_EXEC_ON_TARGET)
+        eq_(sorted(payload['response']['value'] for name, payload, wsgi_environ in on_target), [2, 4])
+
+        for name, payload, wsgi_environ in on_target:
+            eq_(type(payload), dict)
+            eq_(payload['cid'], 'cid-2')
+
+        # There are no final callbacks in parallel execution
+        eq_(len(source.invoked), 4)
+
+# ################################################################################################################################
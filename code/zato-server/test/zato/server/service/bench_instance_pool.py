@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares the cost of invoking a service when a new instance, with all of its facades, is created for each request
+# with the cost of doing it through an instance pool and facades shared by the whole worker. Reported are the time
+# it takes and the number of container objects created during a request that are still alive when it is about to return.
+#
+# Run it from the zato-server directory: py -m test.zato.server.service.bench_instance_pool
+
+# stdlib
+import gc
+from timeit import repeat
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common import CHANNEL, DATA_FORMAT, SIMPLE_IO
+from zato.common.util import new_cid
+from zato.server.connection.amqp.outgoing import PublisherFacade
+from zato.server.connection.email import EMailAPI
+from zato.server.connection.jms_wmq.outgoing import WMQFacade
+from zato.server.connection.search import SearchAPI
+from zato.server.connection.zmq_.outgoing import ZMQFacade
+from zato.server.message import MessageFacade
+from zato.server.service import PatternsFacade, Service, ServiceFacades
+from zato.server.service.reqresp import Cloud, Outgoing
+from zato.server.service.store import ServiceStore
+
+# ################################################################################################################################
+
+NUMBER = 10000
+REPEAT = 3
+
+simple_io_config = {
+    'int_parameters': SIMPLE_IO.INT_PARAMETERS.VALUES,
+    'int_parameter_suffixes': SIMPLE_IO.INT_PARAMETERS.SUFFIXES,
+    'bool_parameter_prefixes': SIMPLE_IO.BOOL_PARAMETERS.SUFFIXES,
+}
+
+payload = {'name': 'abc', 'is_active': 'true'}
+
+# ################################################################################################################################
+
+class MyService(Service):
+    instance_pool_size = 100
+
+    class SimpleIO:
+        input_required = ('name', 'is_active')
+        output_required = ('id', 'name')
+
+    def handle(self):
+        self.response.payload.id = 123
+        self.response.payload.name = self.request.input.name
+
+class MyServiceNoPool(MyService):
+    instance_pool_size = 0
+
+# ################################################################################################################################
+
+def get_worker_store():
+    worker_store = Bunch()
+    worker_store.broker_client = None
+    worker_store.kvdb = None
+    worker_store.pubsub = None
+
+    worker_store.worker_config = Bunch()
+    worker_store.worker_config.out_ftp = {}
+    worker_store.worker_config.out_odoo = {}
+    worker_store.worker_config.out_plain_http = {}
+    worker_store.worker_config.out_soap = {}
+    worker_store.worker_config.outgoing_connections = lambda: (
+        worker_store.worker_config.out_ftp, worker_store.worker_config.out_odoo, worker_store.worker_config.out_plain_http,
+        worker_store.worker_config.out_soap)
+    worker_store.worker_config.cloud_openstack_swift = {}
+    worker_store.worker_config.cloud_aws_s3 = {}
+
+    for name in ('sql_pool_store', 'stomp_outconn_api', 'cassandra_api', 'cassandra_query_api', 'email_smtp_api',
+            'email_imap_api', 'search_es_api', 'search_solr_api', 'msg_ns_store', 'json_pointer_store', 'xpath_store'):
+        worker_store[name] = {}
+
+    worker_store.server = Bunch()
+    worker_store.server.odb = None
+    worker_store.server.kvdb = Bunch(translate=None)
+    worker_store.server.user_config = Bunch()
+    worker_store.server.fs_server_config = Bunch(misc=Bunch(zeromq_connect_sleep=0.1))
+
+    worker_store.server.service_store = ServiceStore({})
+    for class_ in (MyService, MyServiceNoPool):
+        class_.compile_sio()
+        worker_store.server.service_store.services[class_.get_impl_name()] = {
+            'service_class': class_, 'slow_threshold': 99999, 'instance_pool': []}
+
+    worker_store.service_facades = ServiceFacades(worker_store)
+
+    return worker_store
+
+# ################################################################################################################################
+
+def init_per_call(service):
+    """ What Service._init amounted to before facades were shared and created lazily.
+    """
+    worker_store = service.worker_store
+
+    service.odb = worker_store.server.odb
+    service.kvdb = worker_store.kvdb
+    service.time.kvdb = service.kvdb
+    service.pubsub = worker_store.pubsub
+    service.slow_threshold = service.server.service_store.services[service.impl_name]['slow_threshold']
+
+    out_amqp = PublisherFacade(service.broker_client)
+    out_jms_wmq = WMQFacade(service.broker_client)
+    out_zmq = ZMQFacade(service.server)
+
+    service._patterns = PatternsFacade(service)
+
+    out_ftp, out_odoo, out_plain_http, out_soap = worker_store.worker_config.outgoing_connections()
+    service.outgoing = Outgoing(
+        out_amqp, out_ftp, out_jms_wmq, out_odoo, out_plain_http, out_soap, worker_store.sql_pool_store,
+        worker_store.stomp_outconn_api, out_zmq)
+
+    service.cloud = Cloud()
+    service.cloud.openstack.swift = worker_store.worker_config.cloud_openstack_swift
+    service.cloud.aws.s3 = worker_store.worker_config.cloud_aws_s3
+
+    service.cassandra_conn = worker_store.cassandra_api
+    service.cassandra_query = worker_store.cassandra_query_api
+    service.email = EMailAPI(worker_store.email_smtp_api, worker_store.email_imap_api)
+    service.search = SearchAPI(worker_store.search_es_api, worker_store.search_solr_api)
+
+    service.request.http.init(service.wsgi_environ)
+    service.request.init(True, service.cid, service.SimpleIO, service.data_format, service.transport, service.wsgi_environ)
+    service.response.init(service.cid, service.SimpleIO, service.data_format)
+
+    service._msg = MessageFacade(worker_store.msg_ns_store, worker_store.json_pointer_store, worker_store.xpath_store,
+        worker_store.msg_ns_store, service.request.payload, service.time)
+
+# ################################################################################################################################
+
+def invoke(worker_store, class_, is_per_call, on_before_release=None):
+    service_store = worker_store.server.service_store
+    service = service_store.new_instance(class_.get_impl_name())
+
+    Service.update(service, CHANNEL.INVOKE, worker_store.server, worker_store.broker_client, worker_store, new_cid(),
+        payload, payload, simple_io_config=simple_io_config, data_format=DATA_FORMAT.JSON, init=not is_per_call)
+
+    if is_per_call:
+        init_per_call(service)
+
+    service.handle()
+    response = service.set_response_data(service, serialize=True, as_bunch=False)
+
+    if on_before_release:
+        on_before_release()
+
+    service_store.release_instance(service)
+
+    return response
+
+def get_objects_per_request(worker_store, class_, is_per_call):
+    """ Returns the number of container objects created during a request and still alive right before it returns.
+    """
+    # Warm up the pool
+    invoke(worker_store, class_, is_per_call)
+
+    gc.collect()
+    before = gc.get_objects()
+    before_ids = set(id(elem) for elem in before)
+    out = []
+
+    def on_before_release():
+        out.append(sum(1 for elem in gc.get_objects() if id(elem) not in before_ids) - 1) # -1 for 'out' itself
+
+    invoke(worker_store, class_, is_per_call, on_before_release)
+
+    return out[0]
+
+# ################################################################################################################################
+
+def run():
+    worker_store = get_worker_store()
+
+    per_call_objects = get_objects_per_request(worker_store, MyServiceNoPool, True)
+    shared_objects = get_objects_per_request(worker_store, MyServiceNoPool, False)
+    pooled_objects = get_objects_per_request(worker_store, MyService, False)
+
+    per_call = min(repeat(lambda: invoke(worker_store, MyServiceNoPool, True), number=NUMBER, repeat=REPEAT))
+    shared = min(repeat(lambda: invoke(worker_store, MyServiceNoPool, False), number=NUMBER, repeat=REPEAT))
+    pooled = min(repeat(lambda: invoke(worker_store, MyService, False), number=NUMBER, repeat=REPEAT))
+
+    template = '{:<40} {:>7.2f} us, {:>3} objects per request'
+    print(template.format('New instance and facades per request', per_call / NUMBER * 1000000, per_call_objects))
+    print(template.format('New instance, shared facades', shared / NUMBER * 1000000, shared_objects))
+    print(template.format('Pooled instance, shared facades', pooled / NUMBER * 1000000, pooled_objects))
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how many Redis round trips, and how much time, it takes to read aggregated statistics for a 1-day per-minute,
+# 1-week per-hour and 1-month per-day range when KEYS is called for each time suffix followed by an HGETALL for each key
+# found against when services are looked up in indexes and only existing hashes are read in pipelines.
+# Redis is kept in memory and its KEYS command scans all of the keys, as the real one does.
+#
+# Run it from the zato-server directory: py -m test.zato.server.service.internal.stats.bench_stats_index
+
+# stdlib
+from datetime import datetime, timedelta
+from fnmatch import filter as fnmatch_filter
+from random import Random
+from time import time
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common import KVDB
+from zato.server.service.internal.stats import AggregateByMinute, StatsReturningService
+from test.zato.server.service.internal.stats.test__init__ import FakeRedis
+
+# ################################################################################################################################
+
+SERVICES = 50
+INVOKED_RATIO = 0.3
+
+RANGES = (
+    ('1 day', KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, timedelta(minutes=1), 1440, '%Y:%m:%d:%H:%M'),
+    ('1 week', KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, timedelta(hours=1), 168, '%Y:%m:%d:%H'),
+    ('1 month', KVDB.SERVICE_TIME_AGGREGATED_BY_DAY, timedelta(days=1), 30, '%Y:%m:%d'),
+)
+
+# ################################################################################################################################
+
+class CountingRedis(FakeRedis):
+    """ Counts round trips - each command sent on its own and each pipeline executed.
+    """
+    class Pipeline(FakeRedis.Pipeline):
+        def execute(self):
+            self.conn.round_trips += 1
+            self.conn.is_pipeline = True
+            try:
+                return super(CountingRedis.Pipeline, self).execute()
+            finally:
+                self.conn.is_pipeline = False
+
+    def __init__(self):
+        super(CountingRedis, self).__init__()
+        self.round_trips = 0
+        self.is_pipeline = False
+
+    def __getattribute__(self, name):
+        if name in ('keys', 'hgetall', 'smembers', 'zrangebyscore') and not object.__getattribute__(self, 'is_pipeline'):
+            object.__setattr__(self, 'round_trips', object.__getattribute__(self, 'round_trips') + 1)
+        return object.__getattribute__(self, name)
+
+    def keys(self, pattern):
+        return fnmatch_filter(self.data.keys(), pattern)
+
+# ################################################################################################################################
+
+def get_keys_values(conn, key_prefix, service_name, suffixes):
+    """ Reads statistics the way it used to be done, through a KEYS call for each suffix.
+    """
+    out = []
+    for suffix in suffixes:
+        for key in conn.keys('{}{}:{}'.format(key_prefix, service_name, suffix)):
+            out.append((key.replace(key_prefix, '').replace(':{}'.format(suffix), ''), suffix, conn.hgetall(key)))
+
+    return out
+
+def populate(conn, random):
+    service_names = ['my.service.{}'.format(idx) for idx in range(SERVICES)]
+    aggregating = AggregateByMinute()
+    aggregating.server = Bunch(kvdb=Bunch(conn=conn), fs_server_config={'stats':{'expire_after':24*31}})
+
+    start = datetime(2016, 5, 1)
+    ranges = []
+
+    for range_name, key_prefix, step, count, suffix_format in RANGES:
+        suffixes = [(start + step * idx).strftime(suffix_format) for idx in range(count)]
+
+        for suffix in suffixes:
+            service_stats = {}
+            for name in service_names:
+                if random.random() < INVOKED_RATIO:
+                    service_stats[name] = {'usage':random.randint(1, 100), 'mean':random.randint(1, 500), 'min':1, 'max':900,
+                        'rate':1.0}
+            aggregating.hset_aggr_keys(service_stats, key_prefix, suffix)
+
+        ranges.append((range_name, key_prefix, suffixes))
+
+    return service_names, ranges
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    conn = CountingRedis()
+    service_names, ranges = populate(conn, Random(1))
+
+    service = StatsReturningService()
+    service.server = Bunch(kvdb=Bunch(conn=conn))
+
+    print('{} services, {} keys in Redis'.format(SERVICES, len(conn.data)))
+
+    for range_name, key_prefix, suffixes in ranges:
+        for service_name in '*', service_names[0]:
+
+            conn.round_trips = 0
+            start = time()
+            keys_result = get_keys_values(conn, key_prefix, service_name, suffixes)
+            keys_time, keys_round_trips = time() - start, conn.round_trips
+
+            conn.round_trips = 0
+            start = time()
+            index_result = list(service.get_aggr_values(key_prefix, service_name, suffixes))
+            index_time, index_round_trips = time() - start, conn.round_trips
+
+            assert sorted(keys_result) == sorted(index_result)
+
+            print('{:<8} {:<13} KEYS {:>6} round trips {:>8.3f} s, index {:>4} round trips {:>8.3f} s'.format(
+                range_name, service_name, keys_round_trips, keys_time, index_round_trips, index_time))
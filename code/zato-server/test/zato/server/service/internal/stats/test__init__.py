@@ -8,14 +8,29 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+# stdlib
+from datetime import datetime, timedelta
+from unittest import TestCase
+
 # Bunch
 from bunch import Bunch
 
+# dateutil
+from dateutil.rrule import MINUTELY
+
+# mock
+from mock import patch
+
+# nose
+from nose.tools import eq_
+
 # Zato
-from zato.common import zato_namespace
+from zato.common import KVDB, zato_namespace
+from zato.common.stats import Histogram
 from zato.common.test import rand_float, rand_int, rand_string, ServiceTestCase
 from zato.server.service import Integer, UTC
-from zato.server.service.internal.stats import Delete, StatsReturningService, GetByService
+from zato.server.service.internal.stats import AggregateByHour, AggregateByMinute, Delete, get_buckets_key, \
+     get_suffix_timestamp, ProcessRawTimes, StatsReturningService, GetByService
 
 ################################################################################
 
@@ -107,3 +122,222 @@ class GetByServiceTestCase(ServiceTestCase):
         
     def test_impl(self):
         self.assertEquals(self.service_class.get_name(), 'zato.stats.get-by-service')
+
+###############################################################################
+
+class FakeRedis(object):
+    """ Implements only as much of Redis as aggregating services need, keeping all the data in a dictionary.
+    """
+    class Pipeline(object):
+        def __init__(self, conn):
+            self.conn = conn
+            self.commands = []
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *ignored):
+            pass
+
+        def __getattr__(self, name):
+            def _call(*args):
+                self.commands.append((name, args))
+            return _call
+
+        def execute(self):
+            out = [getattr(self.conn, name)(*args) for name, args in self.commands]
+            self.commands = []
+            return out
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self):
+        return self.Pipeline(self)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def sadd(self, key, value):
+        self.data.setdefault(key, set()).add(value)
+
+    def hget(self, key, name):
+        return self.data.get(key, {}).get(name)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def zadd(self, key, score, member):
+        self.data.setdefault(key, {})[member] = score
+
+    def zrangebyscore(self, key, min, max):
+        value = self.data.get(key, {})
+        return [member for member, score in sorted(value.items(), key=lambda item: item[1]) if min <= score <= max]
+
+    def zremrangebyscore(self, key, min, max):
+        value = self.data.get(key, {})
+        for member, score in value.items():
+            if (min == '-inf' or min <= score) and score <= max:
+                del value[member]
+
+    def hmset(self, key, values):
+        self.data.setdefault(key, {}).update(values)
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    def lrange(self, key, start, stop):
+        value = self.data.get(key, [])
+        return value[start:] if stop == -1 else value[start:stop+1]
+
+    def ltrim(self, key, start, stop):
+        self.data[key] = self.data[key][start:]
+
+    def expire(self, key, seconds):
+        pass
+
+    def keys(self, pattern):
+        raise AssertionError('KEYS should not be used')
+
+class AggregatingServiceTestCase(TestCase):
+
+    def setUp(self):
+        self.conn = FakeRedis()
+
+    def get_service(self, class_):
+        instance = class_()
+        instance.server = Bunch(kvdb=Bunch(conn=self.conn), fs_server_config={}, component_enabled=Bunch(stats=True))
+        return instance
+
+    def get_sketch(self, *values):
+        histogram = Histogram()
+        for value in values:
+            histogram.add(value)
+        return histogram.to_string()
+
+    def test_process_raw_times(self):
+        name = 'my.service'
+        self.conn.sadd(KVDB.SERVICE_TIME_SKETCH_INDEX, name)
+        self.conn.rpush(KVDB.SERVICE_TIME_SKETCH + name, self.get_sketch(10, 20), self.get_sketch(30))
+        self.conn.hmset(KVDB.SERVICE_TIME_BASIC + name, {'sketch_all_time': self.get_sketch(60)})
+
+        service = self.get_service(ProcessRawTimes)
+        service.request = Bunch(payload='global_slow_threshold=120\nmax_batch_size=99999')
+        service.handle()
+
+        basic = self.conn.data[KVDB.SERVICE_TIME_BASIC + name]
+        eq_(basic['min_all_time'], 10)
+        eq_(basic['max_all_time'], 60)
+        eq_(basic['mean_all_time'], 30)
+        eq_(basic['sketch_all_time'], self.get_sketch(10, 20, 30, 60))
+        eq_(self.conn.data[KVDB.SERVICE_TIME_SKETCH + name], [])
+
+    def test_aggregate_by_minute_and_hour(self):
+
+        class _datetime(datetime):
+            @classmethod
+            def utcnow(cls):
+                return cls(2016, 1, 2, 3, 6, 30)
+
+        name1, name2 = 'my.service.1', 'my.service.2'
+
+        for name, sketches in ((name1, (self.get_sketch(10, 20), self.get_sketch(30))), (name2, (self.get_sketch(5),))):
+            self.conn.sadd(KVDB.SERVICE_TIME_SKETCH_INDEX_BY_MINUTE + '2016:01:02:03:04', name)
+            self.conn.rpush('{}{}:2016:01:02:03:04'.format(KVDB.SERVICE_TIME_SKETCH_BY_MINUTE, name), *sketches)
+
+        # No trimming of processing times for name1, all of them are taken into account
+        self.conn.hmset(KVDB.SERVICE_TIME_BASIC + name1, {'mean_percentile': '100'})
+
+        with patch('zato.server.service.internal.stats.datetime', _datetime):
+            self.get_service(AggregateByMinute).handle()
+
+        eq_(self.conn.smembers(KVDB.SERVICE_TIME_AGGREGATED_INDEX + '2016:01:02:03:04'), set([name1, name2]))
+
+        for name in name1, name2:
+            eq_(self.conn.zrangebyscore(get_buckets_key(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, name), 0, 2**32),
+                ['2016:01:02:03:04'])
+
+        stats = self.conn.data['{}{}:2016:01:02:03:04'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, name1)]
+        eq_(stats['min'], 10)
+        eq_(stats['max'], 30)
+        eq_(stats['mean'], 20)
+        eq_(stats['usage'], 3)
+        eq_(stats['rate'], 3 / 60.0)
+        eq_(stats['sketch'], self.get_sketch(10, 20, 30))
+
+        # Another minute of the same hour
+        self.conn.hmset('{}{}:2016:01:02:03:05'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, name1),
+            {'sketch': self.get_sketch(40)})
+        self.conn.sadd(KVDB.SERVICE_TIME_AGGREGATED_INDEX + '2016:01:02:03:05', name1)
+
+        self.get_service(AggregateByHour).aggregate_partly_aggregated(timedelta(hours=1), '%Y:%m:%d:%H',
+            KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE, KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, MINUTELY, datetime(2016, 1, 2, 4, 15))
+
+        eq_(self.conn.smembers(KVDB.SERVICE_TIME_AGGREGATED_INDEX + '2016:01:02:03'), set([name1, name2]))
+
+        stats = self.conn.data['{}{}:2016:01:02:03'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, name1)]
+        eq_(stats['min'], 10)
+        eq_(stats['max'], 40)
+        eq_(stats['mean'], 25)
+        eq_(stats['usage'], 4)
+        eq_(stats['rate'], 4 / 3600.0)
+        eq_(stats['sketch'], self.get_sketch(10, 20, 30, 40))
+
+        stats = self.conn.data['{}{}:2016:01:02:03'.format(KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, name2)]
+        eq_(stats['usage'], 1)
+        eq_(stats['sketch'], self.get_sketch(5))
+
+        eq_(self.conn.zrangebyscore(get_buckets_key(KVDB.SERVICE_TIME_AGGREGATED_BY_HOUR, name2), 0, 2**32), ['2016:01:02:03'])
+
+    def test_get_suffix_timestamp(self):
+        eq_(get_suffix_timestamp('2016:05:01:10:17'), 1462097820)
+        eq_(get_suffix_timestamp('2016:05:01:10'), 1462096800)
+        eq_(get_suffix_timestamp('2016:05:01'), 1462060800)
+        eq_(get_suffix_timestamp('2016:05'), 1462060800)
+        eq_(get_suffix_timestamp('2016'), 1451606400)
+
+    def test_get_stats(self):
+        name1, name2 = 'my.service.1', 'my.service.2'
+        prefix = KVDB.SERVICE_TIME_AGGREGATED_BY_MINUTE
+
+        aggregating = self.get_service(AggregateByMinute)
+        service = self.get_service(StatsReturningService)
+
+        # name1 was invoked in each of the three minutes, name2 only in the second one,
+        # and there are statistics of name1 from before the period queried.
+        by_minute = (
+            ('2016:01:02:03:03', {name1: {'usage': 1, 'mean': 100, 'min': 100, 'max': 100, 'rate': 1 / 60.0}}),
+            ('2016:01:02:03:04', {name1: {'usage': 2, 'mean': 10, 'min': 5, 'max': 15, 'rate': 2 / 60.0}}),
+            ('2016:01:02:03:05', {name1: {'usage': 4, 'mean': 20, 'min': 10, 'max': 40, 'rate': 4 / 60.0},
+                                  name2: {'usage': 1, 'mean': 30, 'min': 30, 'max': 30, 'rate': 1 / 60.0}}),
+            ('2016:01:02:03:06', {name1: {'usage': 6, 'mean': 30, 'min': 1, 'max': 90, 'rate': 6 / 60.0}}),
+        )
+
+        for suffix, service_stats in by_minute:
+            aggregating.hset_aggr_keys(service_stats, prefix, suffix)
+
+        start, stop = '2016-01-02T03:04:00', '2016-01-02T03:07:00'
+
+        # All the services
+        stats = dict((elem.service_name, elem) for elem in service.get_stats(start, stop))
+        eq_(sorted(stats), [name1, name2])
+
+        eq_(stats[name1].usage, 12)
+        eq_(stats[name1].min_resp_time, 1)
+        eq_(stats[name1].max_resp_time, 90)
+        eq_(stats[name1].usage_trend, '2,4,6')
+        eq_(stats[name1].mean_trend, '10,20,30')
+        eq_(stats[name1].all_services_usage, 13)
+
+        eq_(stats[name2].usage, 1)
+        eq_(stats[name2].usage_trend, '0,1,0')
+
+        # A single service
+        stats = list(service.get_stats(start, stop, name2))
+        eq_(len(stats), 1)
+        eq_(stats[0].service_name, name2)
+        eq_(stats[0].usage, 1)
+        eq_(stats[0].all_services_usage, 1)
+
+        # No statistics in the period
+        eq_(list(service.get_stats('2016-01-02T04:00:00', '2016-01-02T04:05:00', name1)), [])
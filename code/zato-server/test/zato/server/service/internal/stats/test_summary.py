@@ -8,6 +8,9 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+# Bunch
+from bunch import Bunch
+
 # dateutil
 from dateutil.parser import parse
 
@@ -15,6 +18,7 @@ from dateutil.parser import parse
 from nose.tools import eq_
 
 # Zato
+from zato.common import StatsElem
 from zato.common.test import ServiceTestCase
 from zato.server.service.internal.stats.summary import GetSummaryByRange
 
@@ -80,3 +84,56 @@ class GetSummaryByRangeTestCase(ServiceTestCase):
         start = '208-08-11T18:01:34'
         stop = '2012-11-23T03:42:15'
         _check_expected(start, stop, False, False, False, True)
+
+    def test_merge_slices(self):
+
+        def _elem(service_name, time, usage, mean, min_resp_time, max_resp_time, rate, all_services_time, all_services_usage):
+            elem = StatsElem(service_name, mean)
+            elem.time = time
+            elem.usage = usage
+            elem.min_resp_time = min_resp_time
+            elem.max_resp_time = max_resp_time
+            elem.rate = rate
+            elem.all_services_time = all_services_time
+            elem.all_services_usage = all_services_usage
+            return elem
+
+        slices = [
+            Bunch(total_seconds=60.0, stats=[
+                _elem('a', 100.0, 10, 10.0, 5.0, 20.0, 0.2, 150.0, 15),
+                _elem('b', 50.0, 5, 10.0, 8.0, 12.0, 0.1, 150.0, 15),
+            ]),
+            Bunch(total_seconds=3600.0, stats=[
+                _elem('a', 300.0, 10, 30.0, 2.0, 90.0, 0.5, 300.0, 10),
+            ]),
+            Bunch(total_seconds=60.0, stats=[]),
+        ]
+
+        service = GetSummaryByRange()
+        result = dict((elem.service_name, elem) for elem in service.merge_slices(slices))
+
+        eq_(sorted(result), ['a', 'b'])
+        a, b = result['a'], result['b']
+
+        eq_(a.time, 400.0)
+        eq_(a.usage, 20)
+        eq_(a.min_resp_time, 2.0)
+        eq_(a.max_resp_time, 90.0)
+        eq_(a.mean, 20)
+        eq_(a.rate, round((60 * 0.2 + 3600 * 0.5) / 3720.0, 1))
+        eq_(a.all_services_time, 450.0)
+        eq_(a.all_services_usage, 25)
+        eq_(a.mean_all_services, 25.0)
+        eq_(a.usage_perc_all_services, 80.0)
+        eq_(a.time_perc_all_services, 88.89)
+
+        eq_(b.time, 50.0)
+        eq_(b.usage, 5)
+        eq_(b.min_resp_time, 8.0)
+        eq_(b.max_resp_time, 12.0)
+        eq_(b.mean, 10)
+        eq_(b.usage_perc_all_services, 20.0)
+
+        # Top n
+        result = list(service.merge_slices(slices, 1, 'usage'))
+        eq_([elem.service_name for elem in result], ['a'])
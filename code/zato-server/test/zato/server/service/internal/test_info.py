@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from json import loads
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common.test import ServiceTestCase
+from zato.server.connection.http_soap.auth_cache import AuthCache
+from zato.server.service.internal.info import GetAuthCacheStats, GetBrokerQueueStats
+
+# ################################################################################################################################
+
+class GetBrokerQueueStatsTestCase(ServiceTestCase):
+
+    def test_stats(self):
+        stats = {'/zato/to-parallel/any': {'depth': 1, 'enqueued': 5, 'dequeued': 4, 'expired': 0, 'batches': 2,
+            'last_lag': 0.1, 'max_lag': 0.2}}
+
+        instance = self.invoke(GetBrokerQueueStats, {}, None, {'broker_client': [{'get_queue_stats': stats}]})
+
+        eq_(instance.response.content_type, 'application/json')
+        eq_(loads(instance.response.payload.stats), stats)
+
+# ################################################################################################################################
+
+class GetAuthCacheStatsTestCase(ServiceTestCase):
+
+    def test_stats(self):
+        auth_cache = AuthCache()
+        key = auth_cache.get_key('basic_auth', 'user', 'password', 'header')
+        auth_cache.add(key, 0.01)
+        auth_cache.has(key)
+
+        class _GetAuthCacheStats(GetAuthCacheStats):
+            def before_handle(self):
+                self.worker_store.request_dispatcher = Bunch(url_data=Bunch(auth_cache=auth_cache))
+
+        instance = self.invoke(_GetAuthCacheStats, {}, None)
+        stats = loads(instance.response.payload.stats)
+
+        eq_(stats['size'], 1)
+        eq_(stats['hits'], 1)
+        eq_(stats['misses'], 1)
@@ -31,7 +31,8 @@ class GetListTestCase(ServiceTestCase):
         return Bunch({'id':rand_int(), 'name':self.name, 'is_active':rand_bool(), 'job_type':rand_string(),
                       'start_date':rand_datetime(), 'service_id':rand_int(), 'service_name':rand_string(),
                       'extra':rand_string(), 'weeks':rand_int(), 'days':rand_int(), 'minutes':rand_int(), 'seconds':rand_int(),
-                      'repeats':rand_int(), 'cron_definition':rand_string(), '':True}
+                      'repeats':rand_int(), 'cron_definition':rand_string(), 'misfire_policy':rand_string(),
+                      'max_concurrency':rand_int(), '':True}
         )
     
     def test_sio(self):
@@ -39,7 +40,8 @@ class GetListTestCase(ServiceTestCase):
         self.assertEquals(self.sio.response_elem, 'zato_scheduler_job_get_list_response')
         self.assertEquals(self.sio.input_required, ('cluster_id',))
         self.assertEquals(self.sio.output_required, ('id', 'name', 'is_active', 'job_type', 'start_date', 'service_id', 'service_name'))
-        self.assertEquals(self.sio.output_optional, ('extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats', 'cron_definition'))
+        self.assertEquals(self.sio.output_optional, ('extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats',
+            'cron_definition', 'misfire_policy', 'max_concurrency'))
         self.assertEquals(self.sio.output_repeated, (True))
         self.assertEquals(self.sio.namespace, zato_namespace)
         self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
@@ -63,7 +65,8 @@ class GetByNameTestCase(ServiceTestCase):
         return Bunch({'id':rand_int(), 'name':self.name, 'is_active':rand_bool(), 'job_type':rand_string(),
                       'start_date':rand_datetime(), 'service_id':rand_int(), 'service_name':rand_string(),
                       'extra':rand_string(), 'weeks':rand_int(), 'days':rand_int(), 'minutes':rand_int(), 'seconds':rand_int(),
-                      'repeats':rand_int(), 'cron_definition':rand_string(), '':True}
+                      'repeats':rand_int(), 'cron_definition':rand_string(), 'misfire_policy':rand_string(),
+                      'max_concurrency':rand_int(), '':True}
         )
     
     def test_sio(self):
@@ -71,7 +74,8 @@ class GetByNameTestCase(ServiceTestCase):
         self.assertEquals(self.sio.response_elem, 'zato_scheduler_job_get_by_name_response')
         self.assertEquals(self.sio.input_required, ('cluster_id', 'name'))
         self.assertEquals(self.sio.output_required, ('id', 'name', 'is_active', 'job_type', 'start_date', 'service_id', 'service_name'))
-        self.assertEquals(self.sio.output_optional, ('extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats', 'cron_definition'))
+        self.assertEquals(self.sio.output_optional, ('extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats',
+            'cron_definition', 'misfire_policy', 'max_concurrency'))
         self.assertEquals(self.sio.output_repeated, (False))
         self.assertEquals(self.sio.namespace, zato_namespace)
         self.assertRaises(AttributeError, getattr, self.sio, 'input_optional')
@@ -91,7 +95,8 @@ class CreateTestCase(ServiceTestCase):
         return ({'cluster_id':rand_int(), 'name':rand_string(), 'is_active':rand_bool(), 'job_type':rand_string(),
                  'service':rand_string(), 'start_date':rand_datetime(), 'id':rand_int(), 'extra':rand_string(),
                  'weeks':rand_int(), 'days':rand_int(), 'hours':rand_int(), 'minutes':rand_int(),
-                 'seconds':rand_int(), 'repeats':rand_int(), 'cron_definition':rand_string()}
+                 'seconds':rand_int(), 'repeats':rand_int(), 'cron_definition':rand_string(),
+                 'misfire_policy':rand_string(), 'max_concurrency':rand_int()}
                 )
         
     def get_response_data(self):
@@ -102,7 +107,8 @@ class CreateTestCase(ServiceTestCase):
         self.assertEquals(self.sio.request_elem, 'zato_scheduler_job_create_request')
         self.assertEquals(self.sio.response_elem, 'zato_scheduler_job_create_response')
         self.assertEquals(self.sio.input_required, ('cluster_id', 'name', 'is_active', 'job_type', 'service', 'start_date'))
-        self.assertEquals(self.sio.input_optional, ('id', 'extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats', 'cron_definition'))
+        self.assertEquals(self.sio.input_optional, ('id', 'extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats',
+            'cron_definition', 'misfire_policy', 'max_concurrency'))
         self.assertEquals(self.sio.output_required, ('id', 'name'))
         self.assertEquals(self.sio.output_optional, ('cron_definition',))
         self.assertEquals(self.sio.default_value, (''))
@@ -124,7 +130,8 @@ class EditTestCase(ServiceTestCase):
         return ({'cluster_id':rand_int(), 'name':rand_string(), 'is_active':rand_bool(), 'job_type':rand_string(),
                  'service':rand_string(), 'start_date':rand_datetime(), 'id':rand_int(), 'extra':rand_string(),
                  'weeks':rand_int(), 'days':rand_int(), 'hours':rand_int(), 'minutes':rand_int(),
-                 'seconds':rand_int(), 'repeats':rand_int(), 'cron_definition':rand_string()}
+                 'seconds':rand_int(), 'repeats':rand_int(), 'cron_definition':rand_string(),
+                 'misfire_policy':rand_string(), 'max_concurrency':rand_int()}
                 )
         
     def get_response_data(self):
@@ -135,7 +142,8 @@ class EditTestCase(ServiceTestCase):
         self.assertEquals(self.sio.request_elem, 'zato_scheduler_job_edit_request')
         self.assertEquals(self.sio.response_elem, 'zato_scheduler_job_edit_response')
         self.assertEquals(self.sio.input_required, ('cluster_id', 'name', 'is_active', 'job_type', 'service', 'start_date'))
-        self.assertEquals(self.sio.input_optional, ('id', 'extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats', 'cron_definition'))
+        self.assertEquals(self.sio.input_optional, ('id', 'extra', 'weeks', 'days', 'hours', 'minutes', 'seconds', 'repeats',
+            'cron_definition', 'misfire_policy', 'max_concurrency'))
         self.assertEquals(self.sio.output_required, ('id', 'name'))
         self.assertEquals(self.sio.output_optional, ('cron_definition',))
         self.assertEquals(self.sio.default_value, (''))
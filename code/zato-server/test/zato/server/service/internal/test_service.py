@@ -8,8 +8,11 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+# stdlib
+from contextlib import closing
+
 # anyjson
-from anyjson import loads
+from anyjson import dumps, loads
 
 # nose
 from nose.tools import eq_
@@ -17,10 +20,18 @@ from nose.tools import eq_
 # Bunch
 from bunch import Bunch
 
+# gevent
+import gevent
+
+# mock
+from mock import patch
+
 # Zato
+from zato.common import ZatoException
+from zato.common.broker_message import BULK, MESSAGE_TYPE
 from zato.common.odb.model import Service
 from zato.common.test import Expected, rand_bool, rand_int, rand_string, ServiceTestCase
-from zato.server.service.internal.service import GetList, GetByName
+from zato.server.service.internal.service import GetList, GetByName, InvokeMany, InvokeManyInTransaction
 
 def get_data():
     return Bunch({'id':rand_int(), 'name':rand_string(), 'is_active':rand_bool(), 
@@ -82,3 +93,157 @@ class GetByNameTestCase(ServiceTestCase):
         eq_(response.impl_name, expected_impl_name)
         eq_(response.is_internal, expected_is_internal)
         eq_(response.usage, 0)
+
+class InvokeManyTestCase(ServiceTestCase):
+    def test_response(self):
+        invoked = []
+        in_progress = [0, 0] # Current and max
+
+        def invoke(self, name, payload, channel, data_format, transport, serialize):
+            invoked.append((name, payload, channel, data_format))
+
+            in_progress[0] += 1
+            in_progress[1] = max(in_progress)
+            gevent.sleep(0.01)
+            in_progress[0] -= 1
+
+            if name == 'invalid':
+                raise ValueError('Invalid service')
+
+            return dumps({'name':name, 'payload':payload})
+
+        request = {'max_concurrent':2, 'skip_base64':True, 'invocations': [
+            {'name':'service1', 'payload':{'a':1}, 'channel':'invoke', 'data_format':'json'},
+            {'name':'service2', 'payload':'{"b":2}', 'channel':'invoke', 'data_format':'json'},
+            {'name':'invalid'},
+            {'name':'service3'},
+        ]}
+
+        with patch.object(InvokeMany, 'invoke', invoke):
+            instance = self.invoke(InvokeMany, request, None)
+
+        # No more than max_concurrent invocations were in progress at any time
+        eq_(len(invoked), 4)
+        eq_(in_progress[1], 2)
+
+        results = loads(instance.response.payload.getvalue())['zato_service_invoke_many_response']['results']
+        eq_(len(results), 4)
+
+        # Payloads that are not strings are passed on as they are and strings are parsed
+        eq_(results[0]['ok'], True)
+        eq_(loads(results[0]['response']), {'name':'service1', 'payload':{'a':1}})
+        eq_(loads(results[1]['response']), {'name':'service2', 'payload':{'b':2}})
+        eq_(loads(results[3]['response']), {'name':'service3', 'payload':None})
+
+        eq_(results[2]['ok'], False)
+        eq_(results[2]['response'], None)
+        self.assertIn('Invalid service', results[2]['details'])
+
+    def test_response_base64(self):
+
+        def invoke(self, name, payload, channel, data_format, transport, serialize):
+            return dumps({'name':name, 'payload':payload})
+
+        request = {'invocations': [{'name':'service1', 'payload':dumps({'a':1}).encode('base64'), 'data_format':'json'}]}
+
+        with patch.object(InvokeMany, 'invoke', invoke):
+            instance = self.invoke(InvokeMany, request, None)
+
+        results = loads(instance.response.payload.getvalue())['zato_service_invoke_many_response']['results']
+        eq_(loads(results[0]['response'].decode('base64')), {'name':'service1', 'payload':{'a':1}})
+
+class InvokeManyInTransactionTestCase(ServiceTestCase):
+    def setUp(self):
+        self.published = []
+
+    def broker_client_publish(self, msg, msg_type=MESSAGE_TYPE.TO_PARALLEL_ALL):
+        self.published.append((msg, msg_type))
+
+    def get_invoke(self, odb_list):
+
+        def invoke(self_, name, payload, channel, data_format, transport, serialize, environ):
+            odb_list.append(self_.odb)
+
+            if name == 'invalid':
+                raise ValueError('Invalid service')
+
+            with closing(environ['zato.odb'].session()) as session:
+                session.add(name)
+                session.commit()
+
+            self_.broker_client.publish({'action':'1', 'name':name})
+            self_.broker_client.publish({'action':'2', 'name':name}, MESSAGE_TYPE.TO_SINGLETON)
+
+            # Nothing is published before the transaction is committed
+            eq_(self.published, [])
+
+            return dumps({'name':name})
+
+        return invoke
+
+    def test_response(self):
+        odb_list = []
+        request = {'skip_base64':True, 'invocations': [{'name':'service1'}, {'name':'service2'}]}
+
+        with patch.object(InvokeManyInTransaction, 'invoke', self.get_invoke(odb_list)):
+            instance = self.invoke(InvokeManyInTransaction, request, None)
+
+        results = loads(instance.response.payload.getvalue())['zato_service_invoke_many_in_transaction_response']['results']
+        eq_(len(results), 2)
+        eq_(results[0]['ok'], True)
+        eq_(loads(results[0]['response']), {'name':'service1'})
+        eq_(loads(results[1]['response']), {'name':'service2'})
+
+        # Services commit their changes only to the transaction's session, which is committed and closed once
+        session = odb_list[0].session.return_value
+        eq_(session.add.call_count, 2)
+        eq_(session.flush.call_count, 2)
+        eq_(session.commit.call_count, 1)
+        eq_(session.close.call_count, 1)
+        eq_(session.rollback.call_count, 0)
+
+        # A single message is published per message type, after the commit
+        eq_(len(self.published), 2)
+
+        msg, msg_type = self.published[0]
+        eq_(msg_type, MESSAGE_TYPE.TO_PARALLEL_ALL)
+        eq_(msg['action'], BULK.CONFIG.value)
+        eq_(msg['messages'], [
+            {'action':'1', 'name':'service1', 'msg_type':MESSAGE_TYPE.TO_PARALLEL_ALL},
+            {'action':'1', 'name':'service2', 'msg_type':MESSAGE_TYPE.TO_PARALLEL_ALL},
+        ])
+
+        msg, msg_type = self.published[1]
+        eq_(msg_type, MESSAGE_TYPE.TO_SINGLETON)
+        eq_([item['name'] for item in msg['messages']], ['service1', 'service2'])
+
+        # The service's own broker client is restored
+        eq_(instance.broker_client.publish, self.broker_client_publish)
+
+    def test_rollback(self):
+        odb_list = []
+        request = {'skip_base64':True, 'invocations': [{'name':'service1'}, {'name':'invalid'}, {'name':'service2'}]}
+
+        with patch.object(InvokeManyInTransaction, 'invoke', self.get_invoke(odb_list)):
+            self.assertRaises(ValueError, self.invoke, InvokeManyInTransaction, request, None)
+
+        # Services after the failed one are not invoked
+        eq_(len(odb_list), 2)
+
+        session = odb_list[0].session.return_value
+        eq_(session.commit.call_count, 0)
+        eq_(session.rollback.call_count, 1)
+        eq_(session.close.call_count, 1)
+
+        # Nothing is published if the transaction is rolled back
+        eq_(self.published, [])
+
+    def test_async(self):
+        odb_list = []
+        request = {'skip_base64':True, 'invocations': [{'name':'service1', 'async':True}]}
+
+        with patch.object(InvokeManyInTransaction, 'invoke', self.get_invoke(odb_list)):
+            self.assertRaises(ZatoException, self.invoke, InvokeManyInTransaction, request, None)
+
+        eq_(odb_list, [])
+        eq_(self.published, [])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares how long it takes to handle JSON requests of several sizes, with a password masked in audit log,
+# when audit log and the service parse each request on their own against when they share a single lazily parsed one.
+# Also shows the cost of not parsing requests at all for services that only read raw ones.
+#
+# Run it from the zato-server directory: py -m test.zato.server.service.reqresp.bench_payload
+
+# stdlib
+from json import dumps, loads
+from timeit import repeat
+
+# Zato
+from zato.common import AUDIT_LOG, DATA_FORMAT, URL_TYPE
+from zato.common.util import payload_from_request
+from zato.server.message import JSONPointerStore
+from zato.server.service.reqresp.payload import LazyPayload
+
+# ################################################################################################################################
+
+SIZES = (10, 100, 1000, 10000) # Number of items in a request
+NUMBER = 200
+
+# ################################################################################################################################
+
+def get_request(size):
+    return dumps({
+        'user': 'user1',
+        'password': 'password1',
+        'items': [{'id': idx, 'name': 'Item {}'.format(idx), 'tags': ['a', 'b', 'c']} for idx in range(size)]
+    })
+
+def eager(json_pointer_store, raw_request):
+    """ What used to happen - audit log parses, masks in place and serializes a request which is then parsed again.
+    """
+    audit_payload = loads(raw_request)
+    audit_payload = json_pointer_store.set('password', audit_payload, AUDIT_LOG.REPLACE_WITH, True)
+    dumps(audit_payload)
+
+    return payload_from_request('cid', raw_request, DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)['items']
+
+def lazy(json_pointer_store, raw_request):
+    """ A request is parsed once and a masked copy of it is made for audit log.
+    """
+    payload = LazyPayload('cid', raw_request, DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+    payload.get_view('audit', lambda doc: dumps(json_pointer_store.replace('password', doc, AUDIT_LOG.REPLACE_WITH)))
+
+    return payload.get()['items']
+
+def raw_only(raw_request):
+    """ Services that only read raw requests never make them parsed.
+    """
+    return LazyPayload('cid', raw_request, DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP).raw_request
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    json_pointer_store = JSONPointerStore()
+    json_pointer_store.add('password', '/password')
+
+    for size in SIZES:
+        raw_request = get_request(size)
+        number = max(NUMBER * 10 // size, 5)
+
+        eager_time = min(repeat(lambda: eager(json_pointer_store, raw_request), number=number, repeat=3)) / number
+        lazy_time = min(repeat(lambda: lazy(json_pointer_store, raw_request), number=number, repeat=3)) / number
+        raw_time = min(repeat(lambda: raw_only(raw_request), number=number, repeat=3)) / number
+
+        print('{:>6} items, {:>8} bytes, parsed twice {:>9.1f} us, once {:>9.1f} us, raw only {:>6.1f} us'.format(
+            size, len(raw_request), eager_time * 1e6, lazy_time * 1e6, raw_time * 1e6))
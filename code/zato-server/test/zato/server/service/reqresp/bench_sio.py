@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Compares the cost of parsing requests to and producing responses from typical admin services when their SimpleIO
+# definitions are read and checked during each invocation with the cost of doing it through compiled definitions.
+#
+# Run it from the zato-server directory: py -m test.zato.server.service.reqresp.bench_sio
+
+# stdlib
+import logging
+from timeit import repeat
+
+# anyjson
+from anyjson import dumps, loads
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common import DATA_FORMAT, NO_DEFAULT_VALUE, SIMPLE_IO
+from zato.server.service import ForceType
+from zato.server.service.internal.http_soap import Create as HTTPSOAPCreate, GetList as HTTPSOAPGetList
+from zato.server.service.internal.scheduler import Create as SchedulerCreate
+from zato.server.service.internal.security.basic_auth import Create as BasicAuthCreate
+from zato.server.service.reqresp import Request, SimpleIOPayload
+from zato.server.service.reqresp.sio import convert_param, convert_sio, get_compiled_sio
+
+# ################################################################################################################################
+
+NUMBER = 2000
+REPEAT = 3
+LIST_SIZE = 50
+
+logger = logging.getLogger(__name__)
+
+simple_io_config = {
+    'int_parameters': SIMPLE_IO.INT_PARAMETERS.VALUES,
+    'int_parameter_suffixes': SIMPLE_IO.INT_PARAMETERS.SUFFIXES,
+    'bool_parameter_prefixes': SIMPLE_IO.BOOL_PARAMETERS.SUFFIXES,
+}
+
+# ################################################################################################################################
+
+def get_name(param):
+    return param.name if isinstance(param, ForceType) else param
+
+def get_payload(params):
+    """ Returns a dictionary with a value for each of the parameters.
+    """
+    out = {}
+    for param in params:
+        name = get_name(param)
+        if name.startswith('is_') or name.startswith('has_') or name.startswith('merge_'):
+            out[name] = 'true'
+        elif name == 'id' or name.endswith('_id') or name.endswith('_size') or name.endswith('_timeout'):
+            out[name] = '123'
+        else:
+            out[name] = 'abc'
+
+    return out
+
+# ################################################################################################################################
+
+def decode_per_call(sio, payload):
+    """ What parsing a request amounted to before SimpleIO definitions were compiled.
+    """
+    out = {}
+    path_prefix = getattr(sio, 'request_elem', 'request')
+    default_value = getattr(sio, 'default_value', NO_DEFAULT_VALUE)
+    use_text = getattr(sio, 'use_text', True)
+
+    for is_required, params in ((True, getattr(sio, 'input_required', [])), (False, getattr(sio, 'input_optional', []))):
+        for param in params:
+            name, value = convert_param(None, payload, param, DATA_FORMAT.JSON, is_required, default_value, path_prefix,
+                use_text, {}, True, simple_io_config['bool_parameter_prefixes'], simple_io_config['int_parameters'],
+                simple_io_config['int_parameter_suffixes'])
+            out[name] = value
+
+    return out
+
+def decode_compiled(sio, payload):
+    request = Request(logger, simple_io_config)
+    request.payload = payload
+    request.init(True, None, sio, DATA_FORMAT.JSON, None, {})
+    return request.input
+
+def encode_per_call(sio, items):
+    """ What producing a response amounted to before SimpleIO definitions were compiled.
+    """
+    out = []
+    params = [(True, param) for param in getattr(sio, 'output_required', [])]
+    params.extend((False, param) for param in getattr(sio, 'output_optional', []))
+
+    for item in items:
+        out_item = {}
+        for is_required, param in params:
+            name = get_name(param)
+            value = convert_sio(param, name, item.get(name, ''), True, False, simple_io_config['bool_parameter_prefixes'],
+                simple_io_config['int_parameters'], simple_io_config['int_parameter_suffixes'], None, DATA_FORMAT.JSON, True)
+            if isinstance(value, basestring):
+                value = value if isinstance(value, unicode) else value.decode('utf-8')
+            out_item[name] = value
+        out.append(out_item)
+
+    return dumps({sio.response_elem: out})
+
+def encode_compiled(sio, items):
+    compiled_sio = get_compiled_sio(sio)
+    payload = SimpleIOPayload(None, logger, DATA_FORMAT.JSON, compiled_sio.output_required, compiled_sio.output_optional,
+        simple_io_config, compiled_sio.response_elem, compiled_sio.namespace, True, compiled_sio)
+    payload[:] = items
+
+    return payload.getvalue()
+
+# ################################################################################################################################
+
+def run_decode(service_class):
+    sio = service_class.SimpleIO
+    payload = get_payload(list(getattr(sio, 'input_required', [])) + list(getattr(sio, 'input_optional', [])))
+
+    # Sanity check
+    assert decode_per_call(sio, payload) == decode_compiled(sio, payload)
+
+    per_call = min(repeat(lambda: decode_per_call(sio, payload), number=NUMBER, repeat=REPEAT))
+    compiled = min(repeat(lambda: decode_compiled(sio, payload), number=NUMBER, repeat=REPEAT))
+
+    print('{:<35} request   per-call {:>7.2f} us, compiled {:>7.2f} us, speed-up x{:.1f}'.format(
+        service_class.get_name(), per_call / NUMBER * 1000000, compiled / NUMBER * 1000000, per_call / compiled))
+
+def run_encode(service_class):
+    sio = service_class.SimpleIO
+
+    item = get_payload(list(getattr(sio, 'output_required', [])) + list(getattr(sio, 'output_optional', [])))
+    items = [Bunch(item) for _ in range(LIST_SIZE)]
+
+    assert loads(encode_per_call(sio, items)) == loads(encode_compiled(sio, items))
+
+    number = NUMBER // LIST_SIZE
+
+    per_call = min(repeat(lambda: encode_per_call(sio, items), number=number, repeat=REPEAT))
+    compiled = min(repeat(lambda: encode_compiled(sio, items), number=number, repeat=REPEAT))
+
+    print('{:<35} response  per-call {:>7.2f} us, compiled {:>7.2f} us, speed-up x{:.1f} ({} items)'.format(
+        service_class.get_name(), per_call / number * 1000000, compiled / number * 1000000, per_call / compiled, LIST_SIZE))
+
+# ################################################################################################################################
+
+
+if __name__ == '__main__':
+    for service_class in (HTTPSOAPCreate, BasicAuthCreate, SchedulerCreate):
+        run_decode(service_class)
+
+    run_encode(HTTPSOAPGetList)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import logging
+from json import dumps, loads
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# mock
+from mock import patch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import AUDIT_LOG, DATA_FORMAT, MSG_PATTERN_TYPE, URL_TYPE
+from zato.common.util import payload_from_request
+from zato.server.connection.http_soap.url_data import URLData
+from zato.server.message import JSONPointerStore
+from zato.server.service.reqresp import Request
+from zato.server.service.reqresp.payload import LazyPayload
+
+# ################################################################################################################################
+
+_payload_from_request = 'zato.server.service.reqresp.payload.payload_from_request'
+
+SOAP = """<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+    <soapenv:Body><items><item>1</item><item>2</item><item>3</item></items></soapenv:Body>
+    </soapenv:Envelope>"""
+
+# ################################################################################################################################
+
+class LazyPayloadTestCase(TestCase):
+
+    def test_get_parses_once(self):
+        with patch(_payload_from_request, wraps=payload_from_request) as parse:
+            payload = LazyPayload('cid', '{"a": 1}', DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+            self.assertFalse(payload.is_parsed)
+            eq_(parse.call_count, 0)
+
+            eq_(payload.get(), {'a': 1})
+            self.assertIs(payload.get(), payload.get())
+            self.assertTrue(payload.is_parsed)
+            eq_(parse.call_count, 1)
+
+    def test_get_soap(self):
+        payload = LazyPayload('cid', SOAP, DATA_FORMAT.XML, URL_TYPE.SOAP)
+        eq_([elem.text for elem in payload.get().item], ['1', '2', '3'])
+
+    def test_get_empty(self):
+        with patch(_payload_from_request, wraps=payload_from_request) as parse:
+            payload = LazyPayload('cid', '', DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+            eq_(payload.get(), '')
+            eq_(payload.get(), '')
+            eq_(parse.call_count, 1)
+
+    def test_get_view(self):
+        payload = LazyPayload('cid', '{"a": 1}', DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+
+        view1 = payload.get_view('keys', lambda doc: sorted(doc))
+        view2 = payload.get_view('keys', lambda doc: None)
+
+        eq_(view1, ['a'])
+        self.assertIs(view1, view2)
+
+    def test_iter_items_json(self):
+        with patch(_payload_from_request, wraps=payload_from_request) as parse:
+            payload = LazyPayload('cid', ' [ {"a": 1}, [2, 3] ,"4", 5 ] ', DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+            eq_(list(payload.iter_items()), [{'a': 1}, [2, 3], '4', 5])
+
+            # Items are read one by one, the payload is never parsed in full
+            eq_(parse.call_count, 0)
+            self.assertFalse(payload.is_parsed)
+
+            # Once it's parsed, the result is reused
+            payload.get()
+            eq_(list(payload.iter_items()), [{'a': 1}, [2, 3], '4', 5])
+
+        eq_(list(LazyPayload('cid', ' [ ] ', DATA_FORMAT.JSON, None).iter_items()), [])
+        eq_(list(LazyPayload('cid', '', DATA_FORMAT.JSON, None).iter_items()), [])
+        eq_(list(LazyPayload('cid', '{"a": 1}', DATA_FORMAT.JSON, None).iter_items()), [{'a': 1}])
+
+        self.assertRaises(ValueError, list, LazyPayload('cid', '[1 2]', DATA_FORMAT.JSON, None).iter_items())
+
+    def test_iter_items_xml(self):
+        with patch(_payload_from_request, wraps=payload_from_request) as parse:
+            payload = LazyPayload('cid', SOAP, DATA_FORMAT.XML, URL_TYPE.SOAP)
+            eq_([elem.text for elem in payload.iter_items('item')], ['1', '2', '3'])
+            eq_(parse.call_count, 0)
+
+            payload.get()
+            eq_([elem.text for elem in payload.iter_items('item')], ['1', '2', '3'])
+
+        self.assertRaises(ValueError, payload.iter_items)
+
+# ################################################################################################################################
+
+class RequestPayloadTestCase(TestCase):
+
+    def test_payload(self):
+        request = Request(logging.getLogger(__name__))
+        request.payload = LazyPayload('cid', '{"a": 1}', DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+        eq_(request.payload, {'a': 1})
+
+        request.payload = {'b': 2}
+        eq_(request.payload, {'b': 2})
+
+    def test_iter_payload(self):
+        request = Request(logging.getLogger(__name__), data_format=DATA_FORMAT.JSON)
+        request.raw_request = '[1, 2]'
+        eq_(list(request.iter_payload()), [1, 2])
+
+        request.payload = LazyPayload('cid', '[3, 4]', DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+        eq_(list(request.iter_payload()), [3, 4])
+
+# ################################################################################################################################
+
+class AuditMaskingTestCase(TestCase):
+
+    def test_audit_shares_parsed_payload(self):
+        json_pointer_store = JSONPointerStore()
+        json_pointer_store.add('password', '/password')
+
+        ud = URLData(json_pointer_store=json_pointer_store)
+        ud.audit_log = Bunch(set_request=lambda cid, channel_item, payload, *ignored: setattr(self, 'audited', payload))
+
+        raw_request = dumps({'user': 'user1', 'password': 'secret'})
+        lazy_payload = LazyPayload('cid', raw_request, DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+
+        channel_item = Bunch(audit_repl_patt_type=MSG_PATTERN_TYPE.JSON_POINTER.id, replace_patterns_json_pointer=['password'],
+            audit_max_payload=0)
+
+        with patch(_payload_from_request, wraps=payload_from_request) as parse:
+            ud.audit_set_request('cid', channel_item, raw_request, {'zato.request.lazy_payload':lazy_payload})
+
+            eq_(loads(self.audited)['password'], AUDIT_LOG.REPLACE_WITH)
+            eq_(lazy_payload.get()['password'], 'secret')
+            eq_(parse.call_count, 1)
+
+        # Nothing to mask, the request is not parsed
+        channel_item.replace_patterns_json_pointer = []
+        lazy_payload = LazyPayload('cid', raw_request, DATA_FORMAT.JSON, URL_TYPE.PLAIN_HTTP)
+
+        ud.audit_set_request('cid', channel_item, raw_request, {'zato.request.lazy_payload':lazy_payload})
+        eq_(self.audited, raw_request)
+        self.assertFalse(lazy_payload.is_parsed)
+
+# ################################################################################################################################
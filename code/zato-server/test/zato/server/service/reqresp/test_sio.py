@@ -14,10 +14,14 @@ from unittest import TestCase
 # nose
 from nose.tools import eq_
 
+# lxml
+from lxml import etree
+
 # Zato
+from zato.common import DATA_FORMAT, NO_DEFAULT_VALUE, ParsingException
 from zato.common.test import rand_bool, rand_string
-from zato.server.service import Bool, Dict, Nested
-from zato.server.service.reqresp.sio import ValidationException
+from zato.server.service import AsIs, Bool, Dict, Integer, List, Nested
+from zato.server.service.reqresp.sio import decode_field, get_compiled_sio, ValidationException
 
 class SIOTestCase(TestCase):
     def test_dict_no_keys_specified(self):
@@ -116,3 +120,104 @@ class SIOTestCase(TestCase):
               'my_dict1': {'key2': expected_key2_2, 'key1': expected_key1_2},
               'sub1': expected_sub1_2}}
         )
+
+class CompiledSIOTestCase(TestCase):
+
+    def setUp(self):
+        self.simple_io_config = {
+            'bool_parameter_prefixes': ['is_', 'should_'],
+            'int_parameters': ['id'],
+            'int_parameter_suffixes': ['_id', '_count'],
+        }
+
+    def test_compiled_once_per_class(self):
+
+        class BaseSIO:
+            input_required = ('id', 'name')
+
+        class SIO(BaseSIO):
+            input_optional = ('is_active',)
+
+        compiled_base = get_compiled_sio(BaseSIO)
+        compiled = get_compiled_sio(SIO)
+
+        # Compiled definitions are not inherited ..
+        self.assertIsNot(compiled_base, compiled)
+        eq_(compiled.input_optional, ('is_active',))
+
+        # .. and are not compiled again ..
+        self.assertIs(get_compiled_sio(SIO), compiled)
+
+        # .. and neither are their fields unless simple_io_config changes.
+        fields = compiled.get_fields(self.simple_io_config)
+        self.assertIs(compiled.get_fields(self.simple_io_config), fields)
+        self.assertIsNot(compiled.get_fields(dict(self.simple_io_config)), fields)
+
+    def test_fields(self):
+
+        class SIO:
+            input_required = ('id', 'user_id', 'name', 'is_active', Integer('count'), AsIs('zone_id'), List('tags'))
+            output_optional = ('should_retry', 'msg_count')
+
+        fields = get_compiled_sio(SIO).get_fields(self.simple_io_config)
+
+        eq_([field.name for field in fields.input_required],
+            ['id', 'user_id', 'name', 'is_active', 'count', 'zone_id', 'tags'])
+        eq_([field.is_int for field in fields.input_required], [True, True, False, False, False, True, False])
+        eq_([field.is_bool for field in fields.input_required], [False, False, False, True, False, False, False])
+        eq_([field.is_force_type for field in fields.input_required], [False, False, False, False, True, True, True])
+        eq_([field.is_as_is for field in fields.input_required], [False, False, False, False, False, True, False])
+        eq_([field.is_complex for field in fields.input_required], [False, False, False, False, False, False, True])
+
+        eq_([(is_required, field.name, field.is_bool, field.is_int) for is_required, field in fields.output],
+            [(False, 'should_retry', True, False), (False, 'msg_count', False, True)])
+
+    def test_decode_json(self):
+
+        class SIO:
+            input_required = ('user_id', 'is_active', AsIs('zone_id'), List('tags'))
+
+        fields = get_compiled_sio(SIO).get_fields(self.simple_io_config)
+        payload = {'user_id': '123', 'is_active': 'true', 'zone_id': '456', 'tags': ['a', 'b']}
+
+        out = dict(decode_field(None, payload, field, DATA_FORMAT.JSON, True, NO_DEFAULT_VALUE, True, {}, True)
+            for field in fields.input_required)
+
+        eq_(out, {'user_id': 123, 'is_active': True, 'zone_id': '456', 'tags': ['a', 'b']})
+
+    def test_decode_xml(self):
+
+        class SIO:
+            request_elem = 'my_request'
+            input_required = ('user_id', List('tags'))
+            input_optional = ('name',)
+
+        fields = get_compiled_sio(SIO).get_fields(self.simple_io_config)
+        payload = etree.fromstring(
+            '<my_request><user_id>123</user_id><tags><item>a</item><item>b</item></tags></my_request>')
+
+        required = dict(decode_field(None, payload, field, DATA_FORMAT.XML, True, NO_DEFAULT_VALUE, True, {}, True)
+            for field in fields.input_required)
+        eq_(required, {'user_id': 123, 'tags': ['a', 'b']})
+
+        # Missing optional elements are given default values ..
+        eq_(decode_field(None, payload, fields.input_optional[0], DATA_FORMAT.XML, False, 'my-default', True, {},
+            True), ('name', 'my-default'))
+
+        # .. and missing required ones are rejected.
+        self.assertRaises(ParsingException, decode_field, None, payload, fields.input_optional[0], DATA_FORMAT.XML, True,
+            NO_DEFAULT_VALUE, True, {}, True)
+
+    def test_invalid_xml_path(self):
+
+        class SIO:
+            input_required = ('my name',)
+
+        # Such a name can be used with JSON ..
+        fields = get_compiled_sio(SIO).get_fields(self.simple_io_config)
+        eq_(decode_field(None, {'my name': 'abc'}, fields.input_required[0], DATA_FORMAT.JSON, True, NO_DEFAULT_VALUE,
+            True, {}, True), ('my name', 'abc'))
+
+        # .. but not with XML.
+        self.assertRaises(ParsingException, decode_field, None, etree.fromstring('<request><a/></request>'), fields.input_required[0],
+            DATA_FORMAT.XML, True, NO_DEFAULT_VALUE, True, {}, True)
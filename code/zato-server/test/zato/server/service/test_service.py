@@ -25,6 +25,9 @@ from faker import Faker
 # lxml
 from lxml import etree, objectify
 
+# mock
+from mock import MagicMock
+
 # nose
 from nose.tools import eq_
 
@@ -34,9 +37,11 @@ from retools.lock import LockTimeout
 # Zato
 from zato.common import CHANNEL, DATA_FORMAT, KVDB, PARAMS_PRIORITY, \
      SCHEDULER, URL_TYPE
-from zato.common.test import FakeKVDB, rand_string, rand_int, ServiceTestCase
+from zato.common.test import FakeKVDB, FakeServer, rand_string, rand_int, ServiceTestCase
+from zato.common.util import new_cid
 from zato.server.service import List, Service
 from zato.server.service.reqresp import HTTPRequestData, Request
+from zato.server.service.store import ServiceStore
 
 logger = getLogger(__name__)
 faker = Faker()
@@ -296,7 +301,35 @@ class TestRequest(TestCase):
                              'd': 'd-opt', 'e': 'e-opt', 'f': 'f-opt',
                              'g': 'g-msg',
                              'h':'channel_param_h'}.items()))
-                        
+
+    def test_ad_hoc_attrs(self):
+        # Services may keep their own attributes in requests
+        request = Request(logger)
+        request.foo = 1
+        eq_(request.foo, 1)
+
+    def test_deepcopy_subclass(self):
+
+        class _Request(Request):
+            __slots__ = ('extra',)
+
+        request = _Request(logger)
+        request.cid = uuid4().hex
+        request.channel_params = {'a': ['b']}
+        request.extra = {'c': ['d']}
+        request.foo = ['e']
+
+        copy = request.deepcopy()
+
+        self.assertIs(copy.__class__, _Request)
+        eq_(copy.cid, request.cid)
+        eq_(copy.channel_params, request.channel_params)
+        eq_(copy.extra, request.extra)
+        self.assertIsNot(copy.extra, request.extra)
+        eq_(copy.foo, request.foo)
+        self.assertIsNot(copy.foo, request.foo)
+        eq_(copy.logger.name, logger.name)
+
 # ################################################################################################################################
 
 class TestSIOListDataType(ServiceTestCase):
@@ -476,3 +509,129 @@ class RESTTargetType(ServiceTestCase):
 
         MyService2.add_http_method_handlers()
         self.assertDictEqual(MyService2.http_method_handlers, {})
+
+# ################################################################################################################################
+
+class ODBTestCase(TestCase):
+
+    def get_service(self, environ=None):
+
+        class MyService(Service):
+            pass
+
+        service = MyService()
+        worker_store = MagicMock()
+        MyService.update(service, CHANNEL.INVOKE, FakeServer(), None, worker_store, new_cid(), '', '', environ=environ)
+
+        return service, worker_store
+
+    def test_server_odb(self):
+        service, worker_store = self.get_service()
+        self.assertIs(service.odb, worker_store.server.odb)
+
+    def test_environ_odb(self):
+        odb = object()
+        service, _ = self.get_service({'zato.odb': odb})
+        self.assertIs(service.odb, odb)
+
+# ################################################################################################################################
+
+class InstancePool(TestCase):
+
+    def get_store(self, *classes):
+        store = ServiceStore({})
+        for class_ in classes:
+            store.services[class_.get_impl_name()] = {'service_class': class_}
+            if class_.instance_pool_size:
+                store.services[class_.get_impl_name()]['instance_pool'] = []
+
+        return store
+
+    def test_no_pool(self):
+
+        class MyService(Service):
+            pass
+
+        store = self.get_store(MyService)
+        impl_name = MyService.get_impl_name()
+
+        service = store.new_instance(impl_name)
+        store.release_instance(service)
+
+        self.assertIsNot(store.new_instance(impl_name), service)
+
+    def test_pool_reuse_reset(self):
+
+        class MyService(Service):
+            instance_pool_size = 2
+
+        store = self.get_store(MyService)
+        impl_name = MyService.get_impl_name()
+
+        service = store.new_instance(impl_name)
+        request, response = service.request, service.response
+
+        service.cid = new_cid()
+        service.channel = CHANNEL.HTTP_SOAP
+        service.environ['abc'] = 123
+        service.request.payload = 'my-payload'
+        service.request.channel_params['def'] = 456
+        service.request.http.init({'REQUEST_METHOD': 'POST'})
+        service.response.payload = 'my-response'
+
+        store.release_instance(service)
+        eq_(store.services[impl_name]['instance_pool'], [service])
+
+        # The response is left intact for whoever invoked the service
+        eq_(response.payload, 'my-response')
+
+        pooled = store.new_instance(impl_name)
+        self.assertIs(pooled, service)
+        self.assertIs(pooled.request, request)
+        self.assertIsNot(pooled.response, response)
+
+        eq_(pooled.cid, None)
+        eq_(pooled.channel, None)
+        eq_(pooled.environ, {})
+        eq_(pooled.request.payload, '')
+        eq_(pooled.request.channel_params, {})
+        eq_(pooled.request.http.method, None)
+        eq_(pooled.response.payload, '')
+
+    def test_pool_size(self):
+
+        class MyService(Service):
+            instance_pool_size = 2
+
+        store = self.get_store(MyService)
+        impl_name = MyService.get_impl_name()
+
+        services = [store.new_instance(impl_name) for x in range(3)]
+        for service in services:
+            store.release_instance(service)
+
+        eq_(store.services[impl_name]['instance_pool'], services[:2])
+
+    def test_not_pooled(self):
+
+        class MyService(Service):
+            instance_pool_size = 2
+
+        store = self.get_store(MyService)
+        impl_name = MyService.get_impl_name()
+
+        # Fan-out/fan-in callbacks still need the instance
+        service = store.new_instance(impl_name)
+        service.channel = CHANNEL.FANOUT_CALL
+        store.release_instance(service)
+        eq_(store.services[impl_name]['instance_pool'], [])
+
+        # The service has been redeployed in the meantime
+        service = store.new_instance(impl_name)
+
+        class MyService(Service):
+            instance_pool_size = 2
+
+        store.services[impl_name] = {'service_class': MyService, 'instance_pool': []}
+        store.release_instance(service)
+        eq_(store.services[impl_name]['instance_pool'], [])
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.server.service.store import ServiceStore
+
+# ################################################################################################################################
+
+source = """
+from zato.server.service import Service
+
+class MyService1(Service):
+    name = 'test.store.my-service1'
+
+class MyService2(Service):
+    name = 'test.store.my-service2'
+"""
+
+class FakeODB(object):
+    def __init__(self):
+        self.calls = []
+
+    def add_services(self, services):
+        self.calls.append(services)
+        return dict((item.name, (idx, True, 99)) for idx, item in enumerate(services, 1))
+
+# ################################################################################################################################
+
+class ServiceStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.base_dir = mkdtemp()
+        self.file_name = os.path.join(self.base_dir, 'test_store_services.py')
+
+        with open(self.file_name, 'w') as f:
+            f.write(source)
+
+        self.patterns = {'order': 'true_false', '*': 'True'}
+
+    def tearDown(self):
+        rmtree(self.base_dir)
+
+    def get_store(self, odb=None):
+        store = ServiceStore({}, odb=odb)
+        store.patterns_matcher.read_config(self.patterns)
+
+        return store
+
+    def test_import_no_odb(self):
+        store = self.get_store()
+        source_info_calls = []
+
+        def _get_source_code_info(mod, _get_source_code_info=store._get_source_code_info):
+            source_info_calls.append(mod)
+            return _get_source_code_info(mod)
+
+        store._get_source_code_info = _get_source_code_info
+
+        to_deploy = store.import_services_from_anywhere([self.file_name], self.base_dir)
+
+        eq_(sorted(item.name for item in to_deploy), ['test.store.my-service1', 'test.store.my-service2'])
+
+        # The module is read and hashed once for all of its services
+        eq_(len(source_info_calls), 1)
+        self.assertIs(to_deploy[0].source_info, to_deploy[1].source_info)
+        eq_(to_deploy[0].source_info.source, source)
+
+        # Services are in the store but they have no IDs yet
+        eq_(len(store.services), 2)
+        eq_(store.id_to_impl_name, {})
+
+    def test_add_to_odb_set_odb_info(self):
+
+        # The first worker adds all the services to the ODB at once ..
+        odb = FakeODB()
+        store1 = self.get_store(odb)
+        odb_info = store1.add_to_odb(store1.import_services_from_anywhere([self.file_name], self.base_dir))
+
+        eq_(len(odb.calls), 1)
+        eq_(len(odb.calls[0]), 2)
+
+        # .. and another one reuses what the first one found in the ODB.
+        store2 = self.get_store()
+        store2.set_odb_info(store2.import_services_from_anywhere([self.file_name], self.base_dir), odb_info)
+
+        for store in store1, store2:
+            eq_(sorted(store.id_to_impl_name), [1, 2])
+
+            for service_id, impl_name in store.id_to_impl_name.items():
+                name = store.services[impl_name]['name']
+
+                eq_(store.impl_name_to_id[impl_name], service_id)
+                eq_(store.name_to_impl_name[name], impl_name)
+                eq_(store.services[impl_name]['is_active'], True)
+                eq_(store.services[impl_name]['slow_threshold'], 99)
+
+    def test_import_services_from_file(self):
+        odb = FakeODB()
+        store = self.get_store(odb)
+
+        eq_(sorted(store.import_services_from_file(self.file_name, False, self.base_dir)), [1, 2])
+        eq_(len(odb.calls), 1)
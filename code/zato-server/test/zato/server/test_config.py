@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from cPickle import dumps as pickle_dumps, HIGHEST_PROTOCOL
+from json import dumps
+from unittest import TestCase
+from zlib import compress, decompress
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import ZATO_NONE
+from zato.common.test import rand_int, rand_string
+from zato.server.config import add_secret_config, ConfigDict, ConfigSnapshot, get_config_from_odb, get_secret_config_from_odb, \
+     ODB_CONFIG, ODB_CONFIG_SECRET
+
+# ################################################################################################################################
+
+class Column(object):
+    def __init__(self, name):
+        self.name = name
+
+class ConfigDictTestCase(TestCase):
+
+    def test_from_query(self):
+        rows = [Bunch(id=idx, name='name-{}'.format(idx % 2), is_active=True) for idx in range(4)]
+        columns = Bunch((name, Column(name)) for name in ('id', 'name', 'is_active'))
+
+        config_dict = ConfigDict.from_query('out_sql', (rows, columns))
+        eq_(sorted(config_dict.keys()), ['name-0', 'name-1'])
+        eq_(config_dict['name-1'].config, {'id':3, 'name':'name-1', 'is_active':True})
+
+        config_dict = ConfigDict.from_query('pubsub_consumers', (rows, columns), list_config=True)
+        eq_([item.id for item in config_dict['name-0']], [0, 2])
+
+        # A single column
+        config_dict = ConfigDict.from_query('out_sql', (rows, Bunch(id=Column('id'))))
+        eq_(config_dict['name-0'].config, {'id':2})
+
+        eq_(ConfigDict.from_query('out_sql', None).keys(), [])
+
+    def test_snapshots(self):
+        config_dict = ConfigDict('out_sql', Bunch(a=1, b=2))
+        snapshot = config_dict._impl
+
+        config_dict['c'] = 3
+        del config_dict['a']
+        eq_(config_dict.pop('b', None), 2)
+        eq_(config_dict.pop('b', None), None)
+
+        # Changes never modify mappings that readers may still be using
+        eq_(snapshot, {'a':1, 'b':2})
+        eq_(config_dict.items(), [('c', 3)])
+        self.assertIsInstance(config_dict._impl, Bunch)
+
+    def test_iter_during_changes(self):
+        config_dict = ConfigDict('out_sql', Bunch((str(idx), idx) for idx in range(10)))
+
+        keys = []
+        for key in config_dict:
+            config_dict[key + '-new'] = 0
+            keys.append(key)
+
+        eq_(len(keys), 10)
+        eq_(len(config_dict.keys()), 20)
+
+# ################################################################################################################################
+
+class ConfigSnapshotTestCase(TestCase):
+
+    def get_data(self):
+        rows = [Bunch(id=rand_int(), name=rand_string(), is_active=True) for x in range(3)]
+        columns = Bunch((name, Column(name)) for name in ('id', 'name', 'is_active'))
+
+        config_dict = ConfigDict.from_query('out_amqp', (rows, columns))
+
+        return rows, {
+            'config_dicts': {'out_amqp': [config_dict.name, config_dict._impl]},
+            'http_soap': [Bunch(id=row.id, name=row.name) for row in rows],
+            'url_sec': {'/abc': Bunch(is_active=True, sec_def=Bunch(name='def1'))},
+        }
+
+    def test_dumps_loads(self):
+        rows, data = self.get_data()
+        version, deployment_key = '123', rand_string()
+
+        snapshot = ConfigSnapshot.loads(ConfigSnapshot(version, deployment_key, data).dumps())
+
+        eq_(snapshot.version, version)
+        eq_(snapshot.deployment_key, deployment_key)
+        eq_(snapshot.data, data)
+
+        config_name, impl = snapshot.data['config_dicts']['out_amqp']
+        config_dict = ConfigDict(config_name, impl)
+
+        eq_(sorted(config_dict.keys()), sorted(row.name for row in rows))
+
+        for row in rows:
+            eq_(config_dict[row.name].config.id, row.id)
+            eq_(config_dict[row.name].config.is_active, True)
+
+        eq_(snapshot.data['url_sec']['/abc'].sec_def.name, 'def1')
+
+    def test_is_current(self):
+        snapshot = ConfigSnapshot('1', 'abc')
+
+        self.assertTrue(snapshot.is_current('1', 'abc'))
+
+        # Configuration changed
+        self.assertFalse(snapshot.is_current('2', 'abc'))
+
+        # Services were deployed again
+        self.assertFalse(snapshot.is_current('1', 'def'))
+
+    def test_is_current_no_version(self):
+        # No configuration change has been made yet in the cluster so there is no version counter
+        snapshot = ConfigSnapshot(None, 'abc')
+
+        self.assertTrue(snapshot.is_current(None, 'abc'))
+        self.assertFalse(snapshot.is_current('1', 'abc'))
+
+    def test_loads_old_format(self):
+        value = compress(dumps([ConfigSnapshot.format_version - 1, '1', 'abc', {}]))
+        self.assertIsNone(ConfigSnapshot.loads(value))
+
+        # Snapshots used to be pickled and these are never unpickled
+        value = compress(pickle_dumps((1, '1', 'abc', {}), HIGHEST_PROTOCOL))
+        self.assertIsNone(ConfigSnapshot.loads(value))
+
+# ################################################################################################################################
+
+class FakeODB(object):
+    """ Returns one object of each type of configuration, only objects of types that may have secrets have passwords,
+    one HTTP channel secured with HTTP Basic Auth and one without any security definition.
+    """
+    def __init__(self):
+        self.secret_func_names = [func_name for attr_name, _, func_name, _, _ in ODB_CONFIG if attr_name in ODB_CONFIG_SECRET]
+
+    def _get_list(self, func_name):
+        row = Bunch(id=1, name='{}.1'.format(func_name))
+        if func_name in self.secret_func_names:
+            row.password = 'secret'
+
+        return [row], Bunch((key, Column(key)) for key in row)
+
+    def __getattr__(self, name):
+        return lambda *ignored: self._get_list(name)
+
+    def get_http_soap_list(self, cluster_id, connection, *ignored):
+        if connection == 'outgoing':
+            return self._get_list('get_http_soap_list')
+
+        return [
+            Bunch(id=1, name='channel1', soap_action='', url_path='/1', security_id=1, sec_type='basic_auth',
+                security_name='get_basic_auth_list.1', password='secret', replace_patterns_json_pointer=[],
+                replace_patterns_xpath=[]),
+            Bunch(id=2, name='channel2', soap_action='', url_path='/2', security_id=None, sec_type=None,
+                security_name=None, password=None, replace_patterns_json_pointer=[], replace_patterns_xpath=[]),
+        ]
+
+    def get_url_security(self, cluster_id, connection):
+        return {
+            '/1': Bunch(is_active=True, sec_def=Bunch(id=1, name='get_basic_auth_list.1', sec_type='basic_auth',
+                password='secret', username='user1')),
+            '/2': Bunch(is_active=True, sec_def=ZATO_NONE),
+        }, None
+
+    def get_pubsub_default_client(self, cluster_id, name):
+        return 1, name
+
+class SecretConfigTestCase(TestCase):
+
+    def test_secrets_not_in_snapshots(self):
+        odb = FakeODB()
+        value = ConfigSnapshot('1', 'abc', get_config_from_odb(odb, 1)).dumps()
+
+        self.assertNotIn('secret', decompress(value))
+
+        data = ConfigSnapshot.loads(value).data
+        self.assertIn('out_amqp', data['config_dicts'])
+        self.assertNotIn('out_sql', data['config_dicts'])
+        self.assertNotIn('basic_auth', data['config_dicts'])
+
+        add_secret_config(data, get_secret_config_from_odb(odb, 1))
+
+        config_name, impl = data['config_dicts']['out_sql']
+        eq_(ConfigDict(config_name, impl)['get_out_sql_list.1'].config.password, 'secret')
+
+        eq_(data['http_soap'][0].password, 'secret')
+        eq_(data['http_soap'][1].password, None)
+
+        eq_(data['url_sec']['/1'].sec_def.password, 'secret')
+        eq_(data['url_sec']['/1'].sec_def.username, 'user1')
+        eq_(data['url_sec']['/2'].sec_def, ZATO_NONE)
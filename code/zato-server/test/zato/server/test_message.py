@@ -21,7 +21,7 @@ from lxml import etree
 
 # Zato
 from zato.common.test import rand_string
-from zato.server.message import JSONPointerStore, Mapper, XPathStore
+from zato.server.message import JSONPointerStore, Mapper, XPathCache, xpath_cache, XPathStore
 
 logger = getLogger(__name__)
 
@@ -215,6 +215,28 @@ class TestJSONPointerStore(TestCase):
         self.assertEquals(doc.a.b.c.dd, value2)
         self.assertEquals(doc.a.b.cc.d, value3)
 
+    def test_replace(self):
+        jps = JSONPointerStore()
+
+        other = {'x': [1, 2]}
+        doc = {'a': {'b': [{'c': 'old'}, {'c': 'old'}]}, 'other': other}
+
+        jps.add('1', '/a/b/1/c')
+        jps.add('2', '/z')
+
+        new_doc = jps.replace('1', doc, 'new')
+
+        self.assertEquals(new_doc['a']['b'][1]['c'], 'new')
+        self.assertEquals(new_doc['a']['b'][0]['c'], 'old')
+
+        # The original doc is not modified and everything not on the path is shared
+        self.assertEquals(doc['a']['b'][1]['c'], 'old')
+        self.assertIs(new_doc['other'], other)
+        self.assertIs(new_doc['a']['b'][0], doc['a']['b'][0])
+
+        # Nothing to replace
+        self.assertIs(jps.replace('2', doc, 'new'), doc)
+
 # ################################################################################################################################
 
 class TestXPathStore(TestCase):
@@ -327,6 +349,47 @@ class TestXPathStore(TestCase):
 
 # ################################################################################################################################
 
+class TestXPathCache(TestCase):
+
+    def test_get(self):
+        cache = XPathCache()
+        ns_map1 = {'a': 'urn:a'}
+        ns_map2 = {'a': 'urn:b'}
+
+        compiled1 = cache.get('//a:elem', ns_map1)
+        self.assertIs(cache.get('//a:elem', dict(ns_map1)), compiled1)
+
+        # Same expression, different namespaces
+        compiled2 = cache.get('//a:elem', ns_map2)
+        self.assertIsNot(compiled2, compiled1)
+
+        doc = etree.fromstring('<root xmlns:x="urn:a" xmlns:y="urn:b"><x:elem>1</x:elem><y:elem>2</y:elem></root>')
+        self.assertEquals([elem.text for elem in compiled1(doc)], ['1'])
+        self.assertEquals([elem.text for elem in compiled2(doc)], ['2'])
+
+        # No namespaces
+        self.assertIs(cache.get('//root'), cache.get('//root', {}))
+
+    def test_max_size(self):
+        cache = XPathCache(2)
+
+        compiled1 = cache.get('//a')
+        cache.get('//b')
+        cache.get('//c')
+
+        self.assertEquals(len(cache.data), 1)
+        self.assertIsNot(cache.get('//a'), compiled1)
+
+    def test_shared_with_store(self):
+        expr = '//{}'.format(rand_string())
+
+        store = XPathStore()
+        store.add('name', config_value(expr))
+
+        self.assertIs(store.data['name'].compiled_elem, xpath_cache.get(expr))
+
+# ################################################################################################################################
+
 class TestMapper(TestCase):
     def test_map(self):
         source = {
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from datetime import datetime
+
+# Bunch
+from bunch import Bunch
+
+# mock
+from mock import patch
+
+# nose
+from nose.tools import eq_
+
+# SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common import MISC, SEC_DEF_TYPE, SourceInfo, ZATO_NONE
+from zato.common.odb.model import APIKeySecurity, Cluster, DeployedService, HTTPBasicAuth, HTTPSOAP, \
+     HTTSOAPAuditReplacePatternsJSONPointer, HTTSOAPAuditReplacePatternsXPath, JSONPointer, Server, Service, XPath
+from zato.common.test import ODBTestCase
+from zato.server.odb import ODBManager
+
+# ################################################################################################################################
+
+class ODBManagerTestCase(ODBTestCase):
+
+    def setUp(self):
+        super(ODBManagerTestCase, self).setUp()
+
+        self.odb = ODBManager()
+        self.odb._Session = sessionmaker(bind=self.engine)
+        self.odb._session = self.odb._Session()
+
+        self.queries = []
+        event.listen(self.engine, 'before_cursor_execute', self.on_before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.on_before_cursor_execute)
+        self.odb._session.close()
+        super(ODBManagerTestCase, self).tearDown()
+
+    def on_before_cursor_execute(self, conn, cursor, statement, *ignored):
+        self.queries.append(statement)
+
+    def add_channels(self, count):
+        """ Adds count channels, a third of them using HTTP Basic Auth, a third using API keys and a third with no security.
+        Each of the channels has a JSON Pointer replace pattern and each of the ones with security has an XPath one.
+        """
+        session = self.odb._session
+
+        cluster = Cluster(None, 'cluster1', None, 'sqlite', broker_host='localhost', broker_port=6379, lb_host='localhost',
+            lb_port=11223, lb_agent_port=20151)
+        service = Service(None, 'service1', True, 'mod.Service1', False, cluster)
+
+        json_pointer = JSONPointer(None, 'jp1', '/a/b', cluster_id=None)
+        json_pointer.cluster = cluster
+
+        xpath = XPath(None, 'xp1', '//a/b', cluster_id=None)
+        xpath.cluster = cluster
+
+        session.add_all([cluster, service, json_pointer, xpath])
+
+        for idx in range(count):
+            name = 'channel-{}'.format(idx)
+
+            if idx % 3 == 0:
+                security = HTTPBasicAuth(None, 'basic-{}'.format(idx), True, 'user-{}'.format(idx), 'realm-{}'.format(idx),
+                    'password-{}'.format(idx), cluster)
+            elif idx % 3 == 1:
+                security = APIKeySecurity(None, 'apikey-{}'.format(idx), True, 'x-key-{}'.format(idx),
+                    'password-{}'.format(idx), cluster)
+            else:
+                security = None
+
+            channel = HTTPSOAP(None, name, True, False, 'channel', 'plain_http', None, '/{}'.format(name), None, '',
+                data_format='json', service=service, security=security, cluster=cluster)
+            session.add(channel)
+
+            jp = HTTSOAPAuditReplacePatternsJSONPointer()
+            jp.replace_patterns_json_pointer = channel
+            jp.pattern = json_pointer
+            jp.cluster_id = 1
+            session.add(jp)
+
+            if security:
+                xp = HTTSOAPAuditReplacePatternsXPath()
+                xp.replace_patterns_xpath = channel
+                xp.pattern = xpath
+                xp.cluster_id = 1
+                session.add(xp)
+
+        session.commit()
+
+        return cluster.id
+
+    def test_get_url_security(self):
+
+        count = 30
+        cluster_id = self.add_channels(count)
+        del self.queries[:]
+
+        result, columns = self.odb.get_url_security(cluster_id, 'channel')
+
+        # One query for channels and one for each security type, rather than one for each channel
+        eq_(len(self.queries), 3)
+        eq_(len(result), count)
+
+        for idx in range(count):
+            target = '{}/channel-{}'.format(MISC.SEPARATOR, idx)
+            item = result[target]
+
+            eq_(item.is_active, True)
+            eq_(item.transport, 'plain_http')
+            eq_(item.data_format, 'json')
+
+            if idx % 3 == 0:
+                eq_(item.sec_def.sec_type, SEC_DEF_TYPE.BASIC_AUTH)
+                eq_(item.sec_def.name, 'basic-{}'.format(idx))
+                eq_(item.sec_def.username, 'user-{}'.format(idx))
+                eq_(item.sec_def.password, 'password-{}'.format(idx))
+                eq_(item.sec_def.realm, 'realm-{}'.format(idx))
+
+            elif idx % 3 == 1:
+                eq_(item.sec_def.sec_type, SEC_DEF_TYPE.APIKEY)
+                eq_(item.sec_def.name, 'apikey-{}'.format(idx))
+                eq_(item.sec_def.username, 'HTTP_X_KEY_{}'.format(idx))
+                eq_(item.sec_def.password, 'password-{}'.format(idx))
+
+            else:
+                eq_(item.sec_def, ZATO_NONE)
+
+    def test_get_http_soap_list_replace_patterns(self):
+
+        count = 30
+        cluster_id = self.add_channels(count)
+        del self.queries[:]
+
+        item_list = self.odb.get_http_soap_list(cluster_id, 'channel')
+
+        # One query for channels and one for each type of replace patterns, rather than two for each channel
+        eq_(len(self.queries), 3)
+        eq_(len(item_list), count)
+
+        for item in item_list:
+            idx = int(item.name.split('-')[1])
+            eq_(item.replace_patterns_json_pointer, ['jp1'])
+            eq_(item.replace_patterns_xpath, ['xp1'] if idx % 3 != 2 else [])
+
+    def get_services(self, count, source):
+        si = SourceInfo()
+        si.source = source
+        si.path = '/tmp/{}.py'.format(source)
+        si.hash = source
+        si.hash_method = 'SHA-256'
+
+        return [Bunch(name='service-{}'.format(idx), impl_name='mod.Service{}'.format(idx), is_internal=False,
+            deployment_time=datetime.utcnow(), details='{}', source_info=si) for idx in range(count)]
+
+    def test_add_services(self):
+
+        count = 30
+        session = self.odb._session
+
+        cluster = Cluster(None, 'cluster1', None, 'sqlite', broker_host='localhost', broker_port=6379, lb_host='localhost',
+            lb_port=11223, lb_agent_port=20151)
+        server = Server(None, 'server1', cluster, 'token1')
+
+        # One service is already in the ODB, e.g. added by another server
+        existing = Service(None, 'service-0', False, 'mod.Service0', False, cluster)
+        existing.slow_threshold = 123
+
+        session.add_all([cluster, server, existing])
+        session.commit()
+
+        self.odb.cluster = cluster
+        self.odb.server = Bunch(id=server.id)
+
+        # Refreshes the cluster after commit so it does not count below
+        self.assertTrue(cluster.id)
+
+        del self.queries[:]
+        odb_info = self.odb.add_services(self.get_services(count, 'abc'))
+
+        # One query for existing services, one for each service added, one for those already deployed
+        # and one for all the deployment details inserted at once.
+        eq_(len(self.queries), 3 + count - 1)
+
+        eq_(sorted(odb_info), sorted('service-{}'.format(idx) for idx in range(count)))
+        eq_(odb_info['service-0'], (existing.id, False, 123))
+
+        for idx in range(1, count):
+            service = session.query(Service).filter(Service.name=='service-{}'.format(idx)).one()
+            eq_(odb_info[service.name], (service.id, True, service.slow_threshold))
+
+        # Deploying the same services again only updates what is already in the ODB
+        odb_info = self.odb.add_services(self.get_services(count, 'def'))
+
+        eq_(session.query(Service).count(), count)
+        eq_(session.query(DeployedService).count(), count)
+
+        for ds in session.query(DeployedService):
+            eq_(ds.server_id, server.id)
+            eq_(ds.source, 'def')
+            eq_(odb_info[ds.service.name][0], ds.service_id)
+
+    def test_add_services_error(self):
+
+        session = self.odb._session
+
+        cluster = Cluster(None, 'cluster1', None, 'sqlite', broker_host='localhost', broker_port=6379, lb_host='localhost',
+            lb_port=11223, lb_agent_port=20151)
+        server = Server(None, 'server1', cluster, 'token1')
+
+        session.add_all([cluster, server])
+        session.commit()
+
+        self.odb.cluster = cluster
+        self.odb.server = Bunch(id=server.id)
+
+        # Errors other than integrity ones are not retried and the server is not allowed to start without its services
+        with patch.object(self.odb, '_add_services', side_effect=ValueError('ODB error')) as _add_services:
+            self.assertRaises(ValueError, self.odb.add_services, self.get_services(3, 'abc'))
+            eq_(_add_services.call_count, 1)
+
+        eq_(session.query(Service).count(), 0)
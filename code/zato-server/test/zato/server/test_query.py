@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# Cassandra
+from cassandra import OperationTimedOut
+
+# gevent
+import gevent
+from gevent import Timeout
+from gevent.event import AsyncResult
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.server.query import CassandraQueryStore
+
+# ################################################################################################################################
+
+class DummyStatement(object):
+    """ Binds parameters the way the driver's PreparedStatement does.
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def bind(self, values):
+        return Bunch(value=self.value, params=values, fetch_size=None)
+
+class DummyResponseFuture(object):
+    """ Behaves like the driver's ResponseFuture - each page is returned to all of the callbacks
+    and the next one is fetched only when asked for.
+    """
+    def __init__(self, pages, delay, exc=None):
+        self.pages = pages
+        self.delay = delay
+        self.exc = exc
+        self.callbacks = []
+        self.page = None
+        self.current_page = 0
+        self.has_more_pages = False
+        self.result_ = AsyncResult()
+        gevent.spawn(self._fetch)
+
+    def _fetch(self):
+        gevent.sleep(self.delay)
+
+        if self.exc:
+            self.result_.set_exception(self.exc)
+            for callback, errback in self.callbacks:
+                errback(self.exc)
+        else:
+            self.page = self.pages[self.current_page]
+            self.has_more_pages = self.current_page < len(self.pages) - 1
+            self.result_.set(self.page)
+            for callback, errback in self.callbacks:
+                callback(self.page)
+
+    def add_callbacks(self, callback, errback):
+        self.callbacks.append((callback, errback))
+        if self.result_.ready():
+            if self.exc:
+                errback(self.exc)
+            else:
+                callback(self.page)
+
+    def result(self, timeout=None):
+        try:
+            return self.result_.get(timeout=timeout)
+        except Timeout:
+            raise OperationTimedOut()
+
+    def start_fetching_next_page(self):
+        self.current_page += 1
+        self.result_ = AsyncResult()
+        gevent.spawn(self._fetch)
+
+class DummySession(object):
+    """ Returns rows the statement has been bound with, in pages of fetch_size rows.
+    """
+    def __init__(self, delay=0, default_timeout=10.0):
+        self.delay = delay
+        self.default_timeout = default_timeout
+        self.executed = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def prepare(self, value):
+        return DummyStatement(value)
+
+    def execute_async(self, statement):
+        self.executed.append(statement)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        rows = statement.params.get('rows', [])
+        fetch_size = statement.fetch_size or len(rows) or 1
+        pages = [rows[idx:idx+fetch_size] for idx in range(0, len(rows), fetch_size)] or [[]]
+
+        future = DummyResponseFuture(pages, self.delay, statement.params.get('exc'))
+        future.add_callbacks(self._on_done, self._on_done)
+
+        return future
+
+    def _on_done(self, ignored):
+        self.in_flight -= 1
+
+# ################################################################################################################################
+
+class CassandraQueryStoreTestCase(TestCase):
+
+    def get_query(self, delay=0, default_timeout=10.0):
+        session = DummySession(delay, default_timeout)
+        store = CassandraQueryStore()
+        store.create('query1', Bunch(name='query1', value='SELECT * FROM table1', is_active=True), def_=Bunch(conn=session))
+
+        return store['query1'], session
+
+    def test_execute(self):
+        query, session = self.get_query()
+
+        eq_(query.execute(rows=[1, 2, 3]), [1, 2, 3])
+        eq_(session.executed[0].value, 'SELECT * FROM table1')
+        eq_(session.executed[0].params, {'rows': [1, 2, 3]})
+
+        future = query.execute_async(rows=[4, 5])
+        eq_(future.result(), [4, 5])
+
+        self.assertRaises(ValueError, query.execute, exc=ValueError())
+
+        eq_(query.stats.executions, 3)
+        eq_(query.stats.errors, 1)
+        eq_(query.stats.rows, 5)
+        self.assertTrue(query.stats.time_total >= query.stats.time_max >= 0)
+
+    def test_execute_many(self):
+        query, session = self.get_query(0.001)
+
+        results = query.execute_many([{'rows': [idx]} for idx in range(10)], 3)
+
+        eq_(results, [(True, [idx]) for idx in range(10)])
+        eq_(session.max_in_flight, 3)
+        eq_(query.stats.executions, 10)
+        eq_(query.stats.rows, 10)
+
+    def test_execute_many_errors(self):
+        query, session = self.get_query(0.001)
+        exc = ValueError()
+        params_list = [{'rows': [1]}, {'exc': exc}, {'rows': [3]}]
+
+        self.assertRaises(ValueError, query.execute_many, params_list)
+
+        results = query.execute_many(params_list, raise_on_first_error=False)
+        eq_(results, [(True, [1]), (False, exc), (True, [3])])
+
+    def test_iter_pages(self):
+        query, session = self.get_query(0.001)
+        rows = range(10)
+        pages = []
+
+        for page in query.iter_pages(4, rows=rows):
+
+            # Next pages are not fetched before the previous ones are consumed
+            eq_(query.stats.rows, len(pages) * 4 + len(page))
+            pages.append(page)
+
+        eq_(pages, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        eq_(session.executed[0].fetch_size, 4)
+        eq_(query.stats.executions, 1)
+        eq_(query.stats.rows, 10)
+
+        eq_(list(query.iter_pages(rows=[])), [[]])
+        self.assertRaises(ValueError, list, query.iter_pages(exc=ValueError()))
+
+    def test_timeout(self):
+        query, session = self.get_query(1.0, 0.01)
+
+        # A hung node does not block the caller for longer than the session's default timeout
+        self.assertRaises(OperationTimedOut, query.execute, rows=[1])
+        self.assertRaises(OperationTimedOut, query.execute_many, [{'rows': [1]}])
+        self.assertRaises(OperationTimedOut, list, query.iter_pages(rows=[1]))
+
+        results = query.execute_many([{'rows': [1]}], raise_on_first_error=False)
+        eq_(results[0][0], False)
+        self.assertIsInstance(results[0][1], OperationTimedOut)
+
+    def test_no_session(self):
+        store = CassandraQueryStore()
+        store.create('query1', Bunch(name='query1', value='SELECT 1', is_active=True), def_=Bunch(conn=None))
+
+        self.assertRaises(Exception, store['query1'].execute)
+
+# ################################################################################################################################
@@ -793,3 +793,118 @@ class IsAllowedTestCase(TestCase):
         self.assertFalse(rbac.is_role_allowed(role_id1, perm_id1, res_name2))
 
 # ################################################################################################################################
+
+class HTTPDecisionsTestCase(TestCase):
+
+    def get_rbac(self):
+        rbac = RBAC()
+
+        for perm_id, perm_name in ((1, 'Create'), (2, 'Read'), (3, 'Update'), (4, 'Delete')):
+            rbac.create_permission(perm_id, perm_name)
+
+        for resource in 'res1', 'res2', 'res3':
+            rbac.create_resource(resource)
+
+        # root -> branch -> leaf, another root with no children
+        rbac.create_role(10, 'root', None)
+        rbac.create_role(11, 'branch', 10)
+        rbac.create_role(12, 'leaf', 11)
+        rbac.create_role(20, 'other', None)
+
+        rbac.create_client_role('client-root', 10)
+        rbac.create_client_role('client-leaf', 12)
+        rbac.create_client_role('client-both', 12)
+        rbac.create_client_role('client-both', 20)
+
+        rbac.create_role_permission_allow(10, 2, 'res1')
+        rbac.create_role_permission_allow(11, 1, 'res2')
+        rbac.create_role_permission_allow(20, 3, 'res3')
+
+        rbac.set_http_permissions()
+
+        return rbac
+
+    def assert_same_as_registry(self, rbac):
+        """ The table must agree with what the registry says when consulted directly.
+        """
+        for client_def in 'client-root', 'client-leaf', 'client-both', 'client-none':
+            for verb in 'GET', 'POST', 'PUT', 'PATCH', 'DELETE':
+                for resource in 'res1', 'res2', 'res3':
+                    roles = [role_id for role_id in rbac.client_def_to_role_id.get(client_def, [])
+                        if role_id in rbac.registry._roles]
+                    expected = bool(rbac.registry.is_any_allowed(roles, rbac.http_permissions[verb], resource))
+                    self.assertEquals(rbac.is_http_client_allowed(client_def, verb, resource), expected,
+                        (client_def, verb, resource))
+
+    def test_build(self):
+        rbac = self.get_rbac()
+
+        self.assertTrue(rbac.is_http_client_allowed('client-root', 'GET', 'res1'))
+        self.assertFalse(rbac.is_http_client_allowed('client-root', 'POST', 'res2'))
+
+        # Inherited from parents
+        self.assertTrue(rbac.is_http_client_allowed('client-leaf', 'GET', 'res1'))
+        self.assertTrue(rbac.is_http_client_allowed('client-leaf', 'POST', 'res2'))
+
+        # Update maps to two verbs
+        self.assertTrue(rbac.is_http_client_allowed('client-both', 'PUT', 'res3'))
+        self.assertTrue(rbac.is_http_client_allowed('client-both', 'PATCH', 'res3'))
+
+        self.assertFalse(rbac.is_http_client_allowed('client-none', 'GET', 'res1'))
+        self.assertFalse(rbac.is_http_client_allowed('client-root', 'HEAD', 'res1'))
+
+        self.assertEquals(rbac.http_decisions_info['entries'], len(rbac.http_decisions))
+        self.assertTrue(rbac.http_decisions_info['size'] > 0)
+        self.assert_same_as_registry(rbac)
+
+    def test_update_deny(self):
+        rbac = self.get_rbac()
+
+        # A denial in a parent applies to all of its children and wins over other roles' allows
+        rbac.create_role_permission_deny(11, 2, 'res1')
+
+        self.assertTrue(rbac.is_http_client_allowed('client-root', 'GET', 'res1'))
+        self.assertFalse(rbac.is_http_client_allowed('client-leaf', 'GET', 'res1'))
+        self.assertFalse(rbac.is_http_client_allowed('client-both', 'GET', 'res1'))
+        self.assert_same_as_registry(rbac)
+
+        rbac.delete_role_permission_deny(11, 2, 'res1')
+        self.assertTrue(rbac.is_http_client_allowed('client-leaf', 'GET', 'res1'))
+        self.assert_same_as_registry(rbac)
+
+    def test_update_roles_and_clients(self):
+        rbac = self.get_rbac()
+
+        # Leaf no longer inherits from root and branch
+        rbac.edit_role(12, 'leaf', 'leaf', None)
+        self.assertFalse(rbac.is_http_client_allowed('client-leaf', 'GET', 'res1'))
+        self.assert_same_as_registry(rbac)
+
+        rbac.edit_role(12, 'leaf', 'leaf', 11)
+        self.assertTrue(rbac.is_http_client_allowed('client-leaf', 'POST', 'res2'))
+
+        rbac.delete_client_role('client-both', 20)
+        self.assertFalse(rbac.is_http_client_allowed('client-both', 'PUT', 'res3'))
+        self.assert_same_as_registry(rbac)
+
+        # Deleting a role deletes its children as well
+        rbac.delete_role(11, 'branch')
+        self.assertFalse(rbac.is_http_client_allowed('client-leaf', 'GET', 'res1'))
+        self.assertTrue(rbac.is_http_client_allowed('client-root', 'GET', 'res1'))
+        self.assert_same_as_registry(rbac)
+
+    def test_update_permissions_and_resources(self):
+        rbac = self.get_rbac()
+
+        rbac.delete_resource('res1')
+        self.assertFalse(rbac.is_http_client_allowed('client-root', 'GET', 'res1'))
+        self.assertTrue(rbac.is_http_client_allowed('client-leaf', 'POST', 'res2'))
+
+        rbac.delete_role_permission_allow(11, 1, 'res2')
+        self.assertFalse(rbac.is_http_client_allowed('client-leaf', 'POST', 'res2'))
+
+        rbac.delete_permission(3)
+        self.assertFalse(rbac.is_http_client_allowed('client-both', 'PUT', 'res3'))
+        self.assertEquals(rbac.http_decisions, set())
+
+# ################################################################################################################################
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import SCHEDULER
+from zato.common.test import rand_date_utc, rand_int, rand_string
+from zato.server.scheduler import Scheduler
+
+# ################################################################################################################################
+
+class CreateEditTestCase(TestCase):
+
+    def _get_job(self, **job_data):
+        scheduler = Scheduler()
+        jobs = []
+        scheduler.sched.create = lambda job, **kwargs: jobs.append(job)
+
+        job_data = Bunch(job_data)
+        job_data.update({'id':rand_int(), 'name':rand_string(), 'is_active':True, 'start_date':rand_date_utc(),
+            'service':rand_string(), 'extra':None})
+
+        scheduler.create_edit('create', job_data)
+
+        eq_(len(jobs), 1)
+        return jobs[0]
+
+    def test_misfire_policy_max_concurrency(self):
+        max_concurrency = rand_int()
+
+        for job_type, job_data in ((SCHEDULER.JOB_TYPE.ONE_TIME, {}),
+                                   (SCHEDULER.JOB_TYPE.INTERVAL_BASED, {'seconds':rand_int()}),
+                                   (SCHEDULER.JOB_TYPE.CRON_STYLE, {'cron_definition':'* * * * *'})):
+
+            job = self._get_job(job_type=job_type, misfire_policy=SCHEDULER.MISFIRE_POLICY.SKIP,
+                max_concurrency=max_concurrency, **job_data)
+
+            eq_(job.type, job_type)
+            eq_(job.misfire_policy, SCHEDULER.MISFIRE_POLICY.SKIP)
+            eq_(job.max_concurrency, max_concurrency)
+
+    def test_misfire_policy_max_concurrency_defaults(self):
+        job = self._get_job(job_type=SCHEDULER.JOB_TYPE.INTERVAL_BASED, seconds=rand_int(), misfire_policy=None,
+            max_concurrency=None)
+
+        eq_(job.misfire_policy, SCHEDULER.MISFIRE_POLICY.DEFAULT)
+        eq_(job.max_concurrency, SCHEDULER.DEFAULT_MAX_CONCURRENCY)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2016 Dariusz Suchojad <dsuch at zato.io>
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# stdlib
+from datetime import datetime
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# nose
+from nose.tools import eq_
+
+# Zato
+from zato.common import KVDB
+from zato.server.stats import ServiceStatsCollector
+
+# ################################################################################################################################
+
+class DummyPipeline(object):
+    def __init__(self, freq, exc=None):
+        self.freq = freq
+        self.exc = exc
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignored):
+        pass
+
+    def __getattr__(self, name):
+        def _call(*args):
+            self.calls.append((name,) + args)
+        return _call
+
+    def execute(self):
+        if self.exc:
+            raise self.exc
+        return [self.freq if call[0] == 'hget' else None for call in self.calls]
+
+class DummyKVDB(object):
+    def __init__(self, freq=None):
+        self.pipelines = []
+        self.conn = Bunch(pipeline=self.pipeline)
+        self.freq = freq
+        self.exc = None
+
+    def pipeline(self):
+        self.pipelines.append(DummyPipeline(self.freq, self.exc))
+        return self.pipelines[-1]
+
+# ################################################################################################################################
+
+class ServiceStatsCollectorTestCase(TestCase):
+
+    def test_flush(self):
+        kvdb = DummyKVDB('5')
+        collector = ServiceStatsCollector(kvdb)
+
+        handle_return_time = datetime(2016, 1, 2, 3, 4, 5)
+        name = 'my.service'
+
+        eq_(collector.incr_usage(name), 1)
+        eq_(collector.incr_usage(name), 2)
+        collector.add_time(name, 10, handle_return_time)
+        collector.add_time(name, 20, handle_return_time)
+
+        eq_(collector.get_req_resp_freq(name), None)
+
+        collector.flush()
+
+        by_minute_key = '{}{}:2016:01:02:03:04'.format(KVDB.SERVICE_TIME_SKETCH_BY_MINUTE, name)
+        by_minute_index_key = '{}2016:01:02:03:04'.format(KVDB.SERVICE_TIME_SKETCH_INDEX_BY_MINUTE)
+
+        eq_(len(kvdb.pipelines), 1)
+        eq_(kvdb.pipelines[0].calls, [
+            ('incrby', '{}{}'.format(KVDB.SERVICE_USAGE, name), 2),
+            ('hset', '{}{}'.format(KVDB.SERVICE_TIME_BASIC, name), 'last', 20),
+            ('rpush', '{}{}'.format(KVDB.SERVICE_TIME_SKETCH, name), '2,10,20,30,10:1,20:1'),
+            ('sadd', KVDB.SERVICE_TIME_SKETCH_INDEX, name),
+            ('rpush', by_minute_key, '2,10,20,30,10:1,20:1'),
+            ('sadd', by_minute_index_key, name),
+            ('expire', by_minute_key, 300),
+            ('expire', by_minute_index_key, 300),
+            ('hget', '{}{}'.format(KVDB.REQ_RESP_SAMPLE, name), 'freq'),
+        ])
+
+        eq_(collector.get_req_resp_freq(name), 5)
+        eq_(collector.get_histogram(name).count, 2)
+
+        # Usage counters are not reset, only deltas stored in Redis are
+        eq_(collector.incr_usage(name), 3)
+
+        collector.flush()
+        eq_(kvdb.pipelines[1].calls, [
+            ('incrby', '{}{}'.format(KVDB.SERVICE_USAGE, name), 1),
+            ('hget', '{}{}'.format(KVDB.REQ_RESP_SAMPLE, name), 'freq'),
+        ])
+
+    def test_flush_nothing_collected(self):
+        kvdb = DummyKVDB()
+        ServiceStatsCollector(kvdb).flush()
+        eq_(kvdb.pipelines, [])
+
+    def test_flush_error(self):
+        kvdb = DummyKVDB('5')
+        collector = ServiceStatsCollector(kvdb)
+
+        handle_return_time = datetime(2016, 1, 2, 3, 4, 5)
+        name = 'my.service'
+
+        collector.incr_usage(name)
+        collector.add_time(name, 10, handle_return_time)
+
+        kvdb.exc = ValueError()
+        self.assertRaises(ValueError, collector.flush)
+
+        # Nothing is lost if Redis cannot be written to, everything is merged with what has been collected since then
+        collector.incr_usage(name)
+        collector.add_time(name, 20, handle_return_time)
+
+        kvdb.exc = None
+        collector.flush()
+
+        calls = kvdb.pipelines[1].calls
+        eq_(calls[0], ('incrby', '{}{}'.format(KVDB.SERVICE_USAGE, name), 2))
+        eq_(calls[2], ('rpush', '{}{}'.format(KVDB.SERVICE_TIME_SKETCH, name), '2,10,20,30,10:1,20:1'))
+        eq_(calls[4], ('rpush', '{}{}:2016:01:02:03:04'.format(KVDB.SERVICE_TIME_SKETCH_BY_MINUTE, name),
+            '2,10,20,30,10:1,20:1'))
+
+    def test_flush_req_resp_freq_invoked_only(self):
+        kvdb = DummyKVDB('5')
+        collector = ServiceStatsCollector(kvdb)
+
+        collector.incr_usage('my.service1')
+        collector.incr_usage('my.service2')
+        collector.flush()
+
+        # Only the service invoked since the previous flush is asked about
+        collector.incr_usage('my.service2')
+        collector.flush()
+
+        eq_([call for call in kvdb.pipelines[1].calls if call[0] == 'hget'],
+            [('hget', '{}my.service2'.format(KVDB.REQ_RESP_SAMPLE), 'freq')])
+
+        # Nothing new has been collected so Redis is not even connected to
+        collector.flush()
+        eq_(len(kvdb.pipelines), 2)